@@ -0,0 +1,53 @@
+"""Compact per-layer/per-head attention statistics for overview grids."""
+
+import torch
+
+
+def summarize_attention(probs: torch.Tensor, top_k: int) -> dict:
+    """
+    Reduce full attention for every layer and head to summary statistics.
+
+    All statistics are computed in one vectorized pass over the stacked
+    matrices. Rows are causal attention distributions (query i over keys
+    0..i), so entries above the diagonal are zero.
+
+    Args:
+        probs: (L, H, t, t) attention probabilities
+        top_k: Number of most-attended key positions to report per head
+               (clamped to t)
+
+    Returns:
+        Dict of nested lists indexed [layer][head]:
+            - entropy: per-query entropy in nats, [layer][head][query]
+            - mean_entropy: entropy averaged over queries
+            - mean_distance: average query-key distance (i - j) weighted by
+              attention, averaged over queries
+            - first_token: fraction of attention on position 0, averaged
+              over queries
+            - top_positions / top_weights: key positions receiving the most
+              attention (mean over queries) and that mean weight
+    """
+    probs = probs.float()
+    t = probs.shape[-1]
+    k = min(top_k, t)
+
+    # Per-query entropy (L, H, t)
+    entropy = -(probs * torch.log(probs.clamp(min=1e-12))).sum(dim=-1)
+
+    # Attention-weighted query-key distance (L, H, t)
+    pos = torch.arange(t, device=probs.device, dtype=probs.dtype)
+    offsets = (pos[:, None] - pos[None, :]).clamp(min=0)  # (t, t), i - j
+    distance = (probs * offsets).sum(dim=-1)
+
+    # Attention received per key, averaged over queries (L, H, t)
+    received = probs.mean(dim=-2)
+    top_weights, top_positions = received.topk(k, dim=-1)
+
+    return {
+        "entropy": entropy.cpu().tolist(),
+        "mean_entropy": entropy.mean(dim=-1).cpu().tolist(),
+        "mean_distance": distance.mean(dim=-1).cpu().tolist(),
+        "first_token": probs[..., 0].mean(dim=-1).cpu().tolist(),
+        "top_positions": top_positions.cpu().tolist(),
+        "top_weights": top_weights.cpu().tolist(),
+    }
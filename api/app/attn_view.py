@@ -0,0 +1,105 @@
+"""Windowing and downsampling of full attention matrices for overview heatmaps."""
+
+import json
+from typing import Iterator
+
+import torch
+import torch.nn.functional as F
+
+
+def resolve_range(start: int, end: int | None, t: int, name: str) -> tuple[int, int]:
+    """
+    Clamp a half-open [start, end) index range to a length-t axis.
+
+    Args:
+        start: First index (inclusive)
+        end: Last index (exclusive), or None for t
+        t: Axis length
+        name: Range name used in error messages
+
+    Returns:
+        (start, end) with end clamped to t
+
+    Raises:
+        ValueError: If the clamped range is empty
+    """
+    end = t if end is None else min(end, t)
+    if not (0 <= start < end):
+        raise ValueError(f"{name} range [{start}, {end}) is empty for t={t}")
+    return start, end
+
+
+def bin_starts(n: int, out: int, offset: int) -> list[int]:
+    """
+    Absolute start index of each adaptive-pooling bin.
+
+    Matches torch adaptive pooling, where bin i covers
+    [floor(i * n / out), ceil((i + 1) * n / out)).
+    """
+    return [offset + (i * n) // out for i in range(out)]
+
+
+def window_and_pool(
+    attn: torch.Tensor,
+    *,
+    rows: tuple[int, int],
+    cols: tuple[int, int],
+    resolution: int | None,
+    pool: str,
+) -> tuple[torch.Tensor, list[int], list[int]]:
+    """
+    Crop a (t, t) attention matrix to a window and optionally downsample it.
+
+    Args:
+        attn: (t, t) attention matrix for one head
+        rows: (start, end) query range
+        cols: (start, end) key range
+        resolution: Max output size per axis, or None for full detail
+        pool: "max" or "mean" pooling when downsampling
+
+    Returns:
+        (matrix, row_starts, col_starts) where matrix is (out_rows, out_cols)
+        and *_starts give the absolute position each output row/col begins at
+    """
+    window = attn[rows[0]:rows[1], cols[0]:cols[1]]
+    n_rows, n_cols = window.shape
+
+    out_rows = n_rows if resolution is None else min(n_rows, resolution)
+    out_cols = n_cols if resolution is None else min(n_cols, resolution)
+
+    if (out_rows, out_cols) != (n_rows, n_cols):
+        grid = window[None, None, :, :]
+        if pool == "max":
+            grid = F.adaptive_max_pool2d(grid, (out_rows, out_cols))
+        else:
+            grid = F.adaptive_avg_pool2d(grid, (out_rows, out_cols))
+        window = grid[0, 0]
+
+    return (
+        window,
+        bin_starts(n_rows, out_rows, rows[0]),
+        bin_starts(n_cols, out_cols, cols[0]),
+    )
+
+
+def iter_ndjson(meta: dict, matrix: torch.Tensor, row_starts: list[int]) -> Iterator[str]:
+    """
+    Serialize a windowed attention matrix as NDJSON lines.
+
+    Emits one "meta" line, one "row" line per output row (converted lazily so
+    the client can start rendering before the whole matrix is serialized),
+    then a final "done" line.
+
+    Args:
+        meta: Header fields (layer, head, tokens, ranges, shape)
+        matrix: (out_rows, out_cols) attention values
+        row_starts: Absolute start position of each output row
+
+    Yields:
+        Newline-terminated JSON strings
+    """
+    yield json.dumps({"type": "meta", **meta}, separators=(',', ':')) + "\n"
+    for i, row_start in enumerate(row_starts):
+        line = {"type": "row", "index": i, "pos": row_start, "values": matrix[i].tolist()}
+        yield json.dumps(line, separators=(',', ':')) + "\n"
+    yield json.dumps({"type": "done", "rows": len(row_starts)}, separators=(',', ':')) + "\n"
@@ -1,20 +1,37 @@
 """Checkpoint download and model loading utilities."""
 
 from pathlib import Path
-import os
+from typing import Callable
 import torch
-from huggingface_hub import hf_hub_download
 
 from niels_gpt.model.gpt import GPT
 from niels_gpt.config import ModelConfig
-
-from .config import CKPT_REPO_ID, CKPT_FILENAME, CKPT_DIR, CKPT_PATH, HF_TOKEN, DEVICE
+from niels_gpt.tokenizer import encode
+from niels_gpt.chat_format import format_chat
+
+from .config import (
+    CKPT_REPO_ID,
+    CKPT_FILENAME,
+    CKPT_DIR,
+    CKPT_PATH,
+    CKPT_MIRROR,
+    CKPT_SHA256,
+    CKPT_FETCH_WORKERS,
+    CKPT_FETCH_CHUNK_MB,
+    HF_TOKEN,
+    DEVICE,
+)
+from .fetch import fetch_checkpoint
 
 
 def ensure_checkpoint() -> Path:
     """
-    Ensure checkpoint exists locally. Downloads from HuggingFace Hub if missing.
-    Uses atomic rename to prevent corruption from concurrent downloads.
+    Ensure checkpoint exists locally, fetching it if missing.
+
+    Fetching holds a cross-process lock so concurrent workers download once,
+    uses resumable parallel range requests (or a local/file:// mirror via
+    CKPT_MIRROR), verifies sha256 and renames into place atomically, so
+    CKPT_PATH only ever holds a complete, verified file.
 
     Returns:
         Path to the local checkpoint file
@@ -22,47 +39,47 @@ def ensure_checkpoint() -> Path:
     if CKPT_PATH.exists():
         return CKPT_PATH
 
-    # Create checkpoint directory if it doesn't exist
-    CKPT_DIR.mkdir(parents=True, exist_ok=True)
+    return fetch_checkpoint(
+        CKPT_FILENAME,
+        CKPT_DIR,
+        repo_id=CKPT_REPO_ID,
+        token=HF_TOKEN,
+        mirror=CKPT_MIRROR,
+        sha256=CKPT_SHA256,
+        chunk_size=CKPT_FETCH_CHUNK_MB * 1024 * 1024,
+        workers=CKPT_FETCH_WORKERS,
+    )
 
-    # Use temp file for atomic download
-    temp_path = CKPT_DIR / f"{CKPT_FILENAME}.tmp.{os.getpid()}"
 
-    try:
-        # Download to temp file
-        downloaded_path = hf_hub_download(
-            repo_id=CKPT_REPO_ID,
-            filename=CKPT_FILENAME,
-            local_dir=str(CKPT_DIR),
-            local_dir_use_symlinks=False,
-            token=HF_TOKEN
-        )
-
-        # hf_hub_download already writes to the final location
-        # If we got here and CKPT_PATH exists now, another process won
-        if CKPT_PATH.exists():
-            return CKPT_PATH
+def load_model(on_stage: Callable[[str], None] | None = None) -> tuple[GPT, ModelConfig]:
+    """
+    Load the model from checkpoint.
 
-        # Otherwise, the downloaded_path should be our target
-        # (hf_hub_download doesn't support custom temp paths well, so we accept potential race)
-        return Path(downloaded_path)
+    Args:
+        on_stage: Optional callback told "downloading" (only if the checkpoint
+                  must be fetched) and then "loading"
 
-    except Exception:
-        # Clean up temp file if it exists
-        if temp_path.exists():
-            temp_path.unlink()
-        raise
+    Returns:
+        (model, config) tuple
+    """
+    if on_stage is not None and not CKPT_PATH.exists():
+        on_stage("downloading")
+    ckpt_path = ensure_checkpoint()
+    if on_stage is not None:
+        on_stage("loading")
+    return load_checkpoint_file(ckpt_path)
 
 
-def load_model() -> tuple[GPT, ModelConfig]:
+def load_checkpoint_file(ckpt_path: Path) -> tuple[GPT, ModelConfig]:
     """
-    Load the model from checkpoint.
+    Load a model from a local checkpoint file.
+
+    Args:
+        ckpt_path: Path to a niels-gpt checkpoint (.pt)
 
     Returns:
         (model, config) tuple
     """
-    ckpt_path = ensure_checkpoint()
-
     # Load checkpoint
     ckpt = torch.load(ckpt_path, map_location=DEVICE, weights_only=False)
 
@@ -74,3 +91,39 @@ def load_model() -> tuple[GPT, ModelConfig]:
     model.eval()
 
     return model, cfg
+
+
+def build_random_model(seed: int = 0, **cfg_overrides) -> tuple[GPT, ModelConfig]:
+    """
+    Build a random-init model for benchmarks (no checkpoint needed).
+
+    Args:
+        seed: torch RNG seed
+        **cfg_overrides: ModelConfig fields (defaults: a small byte-level model)
+
+    Returns:
+        (model, config) tuple
+    """
+    fields = dict(V=256, T=256, C=256, L=4, H=4, D=64, d_ff=1024, dropout=0.0)
+    fields.update(cfg_overrides)
+    torch.manual_seed(seed)
+    cfg = ModelConfig(**fields)
+    model = GPT(cfg)
+    model.to(DEVICE)
+    model.eval()
+    return model, cfg
+
+
+def warm_model(model, cfg, device: str = DEVICE):
+    """
+    Run one small traced forward so first-request latency excludes
+    lazy allocations and kernel selection.
+
+    Args:
+        model: Loaded GPT model
+        cfg: Model config
+        device: Device the model lives on
+    """
+    ids = encode(format_chat([{"role": "user", "content": "hi"}]))[-cfg.T:]
+    with torch.no_grad():
+        model.forward_with_attn_trace(ids[None, :].to(device), trace_layer=0, return_full_attn=False)
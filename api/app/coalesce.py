@@ -0,0 +1,156 @@
+"""In-flight deduplication of identical, deterministic generation requests."""
+
+import json
+import threading
+from typing import Any, Callable, Iterator
+
+
+class _Broadcast:
+    """
+    One shared event stream with any number of subscribers.
+
+    There is no producer thread: whichever subscriber reaches the end of the
+    buffer pulls the next event from the underlying generator, so the
+    generation advances at the pace of the fastest listener. Events are
+    buffered so late subscribers replay everything from the start.
+    """
+
+    def __init__(self, events: Iterator[dict]):
+        self.events = events
+        self.buffer: list[dict] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self._pulling = False
+        self._cond = threading.Condition()
+
+    def iterate(self) -> Iterator[dict]:
+        """Yield every event, replaying buffered ones first."""
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.buffer) and not self.done and self._pulling:
+                    self._cond.wait()
+                if i < len(self.buffer):
+                    event = self.buffer[i]
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    self._pulling = True
+                    event = None
+
+            if event is None:
+                # This subscriber is the puller: advance the shared generator
+                try:
+                    event = next(self.events)
+                except BaseException as e:
+                    with self._cond:
+                        self.done = True
+                        if not isinstance(e, StopIteration):
+                            self.error = e
+                        self._pulling = False
+                        self._cond.notify_all()
+                    continue
+                with self._cond:
+                    self.buffer.append(event)
+                    self._pulling = False
+                    self._cond.notify_all()
+
+            i += 1
+            yield event
+
+    def cancel(self):
+        """Stop the underlying generation (no subscribers are left)."""
+        with self._cond:
+            if self.done:
+                return
+            self.done = True
+            self.error = RuntimeError("generation cancelled")
+            self._cond.notify_all()
+        self.events.close()
+
+
+class RequestCoalescer:
+    """
+    Shares one in-flight generation among identical requests.
+
+    The first request for a key becomes the producer; requests with the same
+    key arriving while it runs subscribe to its stream instead of running
+    their own. The generation keeps going while at least one subscriber is
+    listening and is closed once the last one disconnects. Finished
+    generations are forgotten, so only concurrent requests are coalesced.
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+        Args:
+            enabled: If False, every request runs its own generation
+        """
+        self.enabled = enabled
+        self.coalesced_total = 0
+        self._inflight: dict[str, _Broadcast] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: Any, **params) -> str:
+        """
+        Key identifying a generation's output.
+
+        Args:
+            model: Model object (identity, so a hot swap starts a new key)
+            **params: Every input the event stream depends on (JSON-serializable)
+        """
+        return f"{id(model)}:" + json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+    def subscribe(self, key: str, start: Callable[[], Iterator[dict]]) -> tuple[Iterator[dict], bool]:
+        """
+        Join the in-flight generation for key, or start it.
+
+        Args:
+            key: Key from make_key
+            start: Creates the event generator if nothing is in flight. Called
+                   eagerly, so validation errors propagate to the caller.
+
+        Returns:
+            (events, coalesced) where coalesced is True if the request joined
+            an existing generation
+        """
+        if not self.enabled:
+            return start(), False
+
+        with self._lock:
+            broadcast = self._inflight.get(key)
+            coalesced = broadcast is not None
+            if broadcast is None:
+                broadcast = _Broadcast(start())
+                self._inflight[key] = broadcast
+            else:
+                self.coalesced_total += 1
+            broadcast.subscribers += 1
+
+        return self._listen(key, broadcast), coalesced
+
+    def _listen(self, key: str, broadcast: _Broadcast) -> Iterator[dict]:
+        try:
+            yield from broadcast.iterate()
+        finally:
+            with self._lock:
+                broadcast.subscribers -= 1
+                finished = broadcast.done or broadcast.subscribers == 0
+                if finished and self._inflight.get(key) is broadcast:
+                    del self._inflight[key]
+                abandoned = broadcast.subscribers == 0
+            if abandoned:
+                broadcast.cancel()
+
+    def status(self) -> dict:
+        """In-flight generations and how many requests have been coalesced."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._inflight),
+                "subscribers": sum(b.subscribers for b in self._inflight.values()),
+                "coalesced_total": self.coalesced_total,
+            }
@@ -10,17 +10,109 @@ API_PORT = int(os.getenv("API_PORT", "8000"))
 # Device config
 DEVICE = os.getenv("DEVICE", "cpu")
 
+# Inference backend: "torch" (eager), "onnx" (onnxruntime CPU graphs in
+# ONNX_DIR) or "numpy" (torch-free engine over NUMPY_WEIGHTS). Exported
+# artifacts are (re)built from the checkpoint if missing or stale.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_DIR = Path(os.getenv("ONNX_DIR", "./checkpoints/onnx"))
+NUMPY_WEIGHTS = Path(os.getenv("NUMPY_WEIGHTS", "./checkpoints/weights.npz"))
+
+# Torch backend: run untraced layers through fused scaled-dot-product
+# attention and materialize probabilities only for the traced layer
+FUSED_ATTENTION = os.getenv("FUSED_ATTENTION", "true").lower() in ("1", "true", "yes")
+
+# CPU tuning profile from tools/tune_cpu.py (applied at startup when DEVICE=cpu)
+CPU_PROFILE = Path(os.getenv("CPU_PROFILE")) if os.getenv("CPU_PROFILE") else None
+CPU_OBJECTIVE = os.getenv("CPU_OBJECTIVE", "latency")
+CPU_PIN_CORES = os.getenv("CPU_PIN_CORES", "false").lower() in ("1", "true", "yes")
+
 # Checkpoint config
 CKPT_REPO_ID = os.getenv("CKPT_REPO_ID", "nnandal/niels-gpt")
 CKPT_FILENAME = os.getenv("CKPT_FILENAME", "best.pt")
 CKPT_DIR = Path(os.getenv("CKPT_DIR", "./checkpoints"))
 CKPT_PATH = CKPT_DIR / CKPT_FILENAME
 
+# Checkpoint fetch: optional mirror (directory, file:// or http(s) base URL),
+# expected sha256 (else from the source's manifest.json / Hub LFS etag)
+CKPT_MIRROR = os.getenv("CKPT_MIRROR") or None
+CKPT_SHA256 = os.getenv("CKPT_SHA256") or None
+CKPT_FETCH_WORKERS = int(os.getenv("CKPT_FETCH_WORKERS", "4"))
+CKPT_FETCH_CHUNK_MB = int(os.getenv("CKPT_FETCH_CHUNK_MB", "8"))
+
+# Model registry (extra checkpoints in CKPT_DIR served by id = file stem)
+DEFAULT_MODEL_ID = Path(CKPT_FILENAME).stem
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "1024"))
+
+# Working memory across in-flight requests (estimated attention tensors and
+# their Python copies, not model weights); requests that would exceed it are
+# rejected (0 = unlimited). MEMORY_TRACE_PYTHON tracks Python allocations
+# with tracemalloc for /admin/memory (adds allocation overhead).
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "0"))
+MEMORY_TRACE_PYTHON = os.getenv("MEMORY_TRACE_PYTHON", "false").lower() in ("1", "true", "yes")
+
+# Hot reload: poll CKPT_PATH every N seconds and swap on change (0 = disabled)
+CKPT_WATCH_SECONDS = float(os.getenv("CKPT_WATCH_SECONDS", "0"))
+
+# Admin endpoints (disabled unless a token is set)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", None)
+
 # Limits
 MAX_PROMPT_BYTES = int(os.getenv("MAX_PROMPT_BYTES", "16384"))
 RATE_LIMIT_PER_MIN = int(os.getenv("RATE_LIMIT_PER_MIN", "10"))
 RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "3"))
 
+# Parallel samples per chat request (ChatRequest.n)
+MAX_CHAT_SAMPLES = int(os.getenv("MAX_CHAT_SAMPLES", "8"))
+
+# Conversation sessions (/sessions): kept server-side with their encoded
+# transcript, dropped after SESSION_TTL_SECONDS idle or LRU past SESSION_MAX
+SESSION_MAX = int(os.getenv("SESSION_MAX", "256"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+
+# Attention inspection (/inspect/*) runs on its own thread pool: forwards run
+# at once, jobs allowed to wait, seconds before a job is abandoned, and worker
+# thread niceness (chat generation goes first)
+INSPECT_WORKERS = int(os.getenv("INSPECT_WORKERS", "1"))
+INSPECT_QUEUE = int(os.getenv("INSPECT_QUEUE", "4"))
+INSPECT_TIMEOUT_SECONDS = float(os.getenv("INSPECT_TIMEOUT_SECONDS", "30"))
+INSPECT_NICE = int(os.getenv("INSPECT_NICE", "10"))
+INSPECT_MAX_DEFERRED_STEPS = int(os.getenv("INSPECT_MAX_DEFERRED_STEPS", "8"))
+
+# Share one generation among identical concurrent /chat/stream requests
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "false").lower() in ("1", "true", "yes")
+
+# Step-level fair scheduling of /chat/stream: generation steps allowed to run
+# at once (0 = unscheduled) and per-client weights ("key=2,1.2.3.4=0.5"),
+# where a client is its X-API-Key header or else its IP
+STEP_SLOTS = int(os.getenv("STEP_SLOTS", "0"))
+CLIENT_WEIGHTS = os.getenv("CLIENT_WEIGHTS", "")
+
+# Adaptive QoS: thin traces, cap max_new_tokens and disable full attention as
+# scheduler pressure rises (waiting steps per slot, step latency in ms)
+QOS_ENABLED = os.getenv("QOS_ENABLED", "false").lower() in ("1", "true", "yes")
+QOS_QUEUE_DEPTH = float(os.getenv("QOS_QUEUE_DEPTH", "4"))
+QOS_TARGET_STEP_MS = float(os.getenv("QOS_TARGET_STEP_MS", "250"))
+QOS_RECOVER_SECONDS = float(os.getenv("QOS_RECOVER_SECONDS", "10"))
+
+# Rolling-context decoding (context_mode="rolling")
+ROLLING_SINK_TOKENS = int(os.getenv("ROLLING_SINK_TOKENS", "4"))
+
+# Trace storage (multi-layer traces retrievable by generation id)
+TRACE_STORE_MAX_GENERATIONS = int(os.getenv("TRACE_STORE_MAX_GENERATIONS", "16"))
+
+# Trace recording: archive every /chat/stream generation's per-step traces as
+# memory-mapped shards under this directory (unset = disabled)
+TRACE_ARCHIVE_DIR = Path(os.environ["TRACE_ARCHIVE_DIR"]) if os.getenv("TRACE_ARCHIVE_DIR") else None
+TRACE_ARCHIVE_SHARD_GENERATIONS = int(os.getenv("TRACE_ARCHIVE_SHARD_GENERATIONS", "64"))
+
+# Session-affinity router (tools/router.py) in front of several API nodes:
+# node base URLs, ring points per node, and the load (queued steps plus open
+# requests per step slot) at which a conversation spills to the next node
+ROUTER_NODES = [u.strip() for u in os.getenv("ROUTER_NODES", "").split(",") if u.strip()]
+ROUTER_VNODES = int(os.getenv("ROUTER_VNODES", "64"))
+ROUTER_MAX_LOAD = float(os.getenv("ROUTER_MAX_LOAD", "4"))
+ROUTER_POLL_SECONDS = float(os.getenv("ROUTER_POLL_SECONDS", "2"))
+
 # CORS
 ALLOWED_ORIGINS_STR = os.getenv(
     "ALLOWED_ORIGINS",
@@ -0,0 +1,302 @@
+"""CPU thread-count and core-affinity tuning for inference."""
+
+import fcntl
+import json
+import os
+import statistics
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+OBJECTIVES = ("latency", "throughput")
+
+# Lock files held for the life of the process; keeps claimed slots reserved
+_slot_handles: list = []
+
+
+@dataclass
+class Layout:
+    """A worker layout: processes x threads, optionally pinned to cores."""
+    workers: int
+    intra_op_threads: int
+    inter_op_threads: int = 1
+
+
+@dataclass
+class BenchResult:
+    """Measured decode performance of one layout at one batch size."""
+    layout: Layout
+    batch: int
+    step_ms_p50: float
+    step_ms_p95: float
+    tokens_per_s: float  # aggregate over all workers
+
+
+def available_cores() -> list[int]:
+    """Cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def candidate_layouts(n_cores: int) -> list[Layout]:
+    """
+    Layouts worth benchmarking on n_cores.
+
+    Thread counts are powers of two up to n_cores (plus n_cores itself);
+    worker counts are those that fit the remaining cores without
+    oversubscription.
+    """
+    threads = sorted({1 << i for i in range(n_cores.bit_length()) if 1 << i <= n_cores} | {n_cores})
+    layouts = []
+    for t in threads:
+        for w in range(1, n_cores // t + 1):
+            if w == 1 or w & (w - 1) == 0 or w == n_cores // t:
+                layouts.append(Layout(workers=w, intra_op_threads=t))
+    return layouts
+
+
+def core_sets(layout: Layout, cores: list[int]) -> list[list[int]]:
+    """Disjoint core sets, one per worker, each intra_op_threads wide."""
+    t = layout.intra_op_threads
+    return [cores[i * t:(i + 1) * t] for i in range(layout.workers)]
+
+
+def time_decode(model, cfg, *, batch: int, steps: int, context: int, warmup: int = 2) -> list[float]:
+    """
+    Time per-token forward passes as the generation loop runs them.
+
+    Args:
+        model: Model exposing forward_with_attn_trace
+        cfg: Model config
+        batch: Sequences per forward
+        steps: Timed forwards
+        context: Tokens per sequence (the cropped context length)
+        warmup: Untimed forwards first
+
+    Returns:
+        Per-step wall times in milliseconds
+    """
+    import torch
+
+    x = torch.randint(0, cfg.V, (batch, min(context, cfg.T)))
+    times = []
+    with torch.no_grad():
+        for i in range(warmup + steps):
+            start = time.perf_counter()
+            model.forward_with_attn_trace(x, trace_layer=0, return_full_attn=False)
+            if i >= warmup:
+                times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _bench_worker(build_model, layout: Layout, cores: list[int] | None, batch, steps, context, barrier, out):
+    """Child process: apply threads/pinning, wait for siblings, time decode."""
+    set_threads(layout.intra_op_threads, layout.inter_op_threads)
+    if cores:
+        pin_cores(cores)
+    model, cfg = build_model()
+    barrier.wait()
+    out.put(time_decode(model, cfg, batch=batch, steps=steps, context=context))
+
+
+def run_layout(
+    build_model,
+    layout: Layout,
+    *,
+    batch: int,
+    steps: int = 20,
+    context: int = 128,
+    pin: bool = True,
+    cores: list[int] | None = None,
+) -> BenchResult:
+    """
+    Benchmark a layout with one spawned process per worker.
+
+    Workers run concurrently (released together by a barrier) so shared
+    memory bandwidth and caches are contended as in production.
+
+    Args:
+        build_model: Picklable callable returning (model, cfg) in each worker
+        layout: Layout to measure
+        batch: Sequences per forward in each worker
+        steps: Timed forwards per worker
+        context: Tokens per sequence
+        pin: Pin each worker to its own core set
+        cores: Cores to use (default: all available)
+
+    Returns:
+        Aggregate result for the layout
+    """
+    import multiprocessing as mp
+
+    ctx = mp.get_context("spawn")
+    sets = core_sets(layout, cores or available_cores()) if pin else [None] * layout.workers
+    barrier = ctx.Barrier(layout.workers)
+    out = ctx.Queue()
+    procs = [
+        ctx.Process(target=_bench_worker, args=(build_model, layout, s, batch, steps, context, barrier, out))
+        for s in sets
+    ]
+    for p in procs:
+        p.start()
+    per_worker = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    all_times = [t for times in per_worker for t in times]
+    throughput = sum(batch * len(times) / (sum(times) / 1000) for times in per_worker)
+    return BenchResult(
+        layout=layout,
+        batch=batch,
+        step_ms_p50=statistics.median(all_times),
+        step_ms_p95=_percentile(all_times, 0.95),
+        tokens_per_s=throughput,
+    )
+
+
+def recommend(results: list[BenchResult], objective: str) -> BenchResult:
+    """
+    Best result for an objective.
+
+    "latency" picks the lowest p50 step time among single-sequence runs;
+    "throughput" picks the highest aggregate tokens/s among batched runs.
+    """
+    if objective == "latency":
+        pool = [r for r in results if r.batch == 1] or results
+        return min(pool, key=lambda r: (r.step_ms_p50, r.layout.intra_op_threads))
+    if objective == "throughput":
+        pool = [r for r in results if r.batch > 1] or results
+        return max(pool, key=lambda r: r.tokens_per_s)
+    raise ValueError(f"unknown objective {objective!r}; expected one of {OBJECTIVES}")
+
+
+def build_profile(results: list[BenchResult], cores: list[int]) -> dict:
+    """JSON-serializable profile with a recommendation per objective."""
+    profile = {
+        "created": time.time(),
+        "cores": cores,
+        "recommended": {},
+        "results": [asdict(r) for r in results],
+    }
+    for objective in OBJECTIVES:
+        best = recommend(results, objective)
+        profile["recommended"][objective] = {
+            **asdict(best.layout),
+            "core_sets": core_sets(best.layout, cores),
+            "batch": best.batch,
+            "step_ms_p50": best.step_ms_p50,
+            "tokens_per_s": best.tokens_per_s,
+        }
+    return profile
+
+
+def save_profile(profile: dict, path: Path):
+    """Write a profile atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(profile, indent=2))
+    os.replace(tmp, path)
+
+
+def load_profile(path: Path) -> dict:
+    """Read a profile written by save_profile."""
+    return json.loads(Path(path).read_text())
+
+
+def set_threads(intra_op: int, inter_op: int | None = None):
+    """
+    Set torch's intra-op (and, if still possible, inter-op) thread counts.
+
+    torch only allows the inter-op count to be set before any inter-op
+    parallel work has run; later attempts are ignored.
+    """
+    import torch
+
+    torch.set_num_threads(intra_op)
+    if inter_op is not None and torch.get_num_interop_threads() != inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            pass
+
+
+def pin_cores(cores: list[int]) -> bool:
+    """
+    Pin every thread of this process to cores; returns False where unsupported.
+
+    On Linux sched_setaffinity(0, ...) only affects the calling thread, so
+    each existing thread (main, threadpool, torch's pools) is pinned by id;
+    threads started later inherit the mask from whichever thread starts them.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        tids = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        tids = [0]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cores)
+        except ProcessLookupError:
+            pass  # exited since the listing
+    return True
+
+
+def claim_worker_slot(lock_dir: Path, n_slots: int) -> int | None:
+    """
+    Claim the first free worker slot in [0, n_slots).
+
+    Each slot is a lock file held for the life of the process, so server
+    workers started together each get a distinct slot (and core set)
+    without any coordination beyond the filesystem. Slots free up
+    automatically when a worker exits.
+
+    Returns:
+        Slot index, or None if every slot is taken
+    """
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    for slot in range(n_slots):
+        f = open(lock_dir / f"worker-{slot}.lock", "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            continue
+        _slot_handles.append(f)
+        return slot
+    return None
+
+
+def apply_profile(profile: dict, objective: str, *, pin: bool = False, lock_dir: Path | None = None) -> dict:
+    """
+    Apply a profile's recommended thread counts (and optional pinning).
+
+    Args:
+        profile: Profile from load_profile
+        objective: "latency" or "throughput"
+        pin: Pin this worker to its slot's core set
+        lock_dir: Where worker slot locks live (required when pin is set)
+
+    Returns:
+        What was applied: threads, inter_op_threads and, if pinned, slot and cores
+    """
+    rec = profile["recommended"][objective]
+    set_threads(rec["intra_op_threads"], rec.get("inter_op_threads"))
+    applied = {
+        "objective": objective,
+        "intra_op_threads": rec["intra_op_threads"],
+        "inter_op_threads": rec.get("inter_op_threads"),
+    }
+
+    if pin and lock_dir is not None:
+        sets = rec.get("core_sets") or []
+        slot = claim_worker_slot(lock_dir, len(sets))
+        if slot is not None and pin_cores(sets[slot]):
+            applied.update(slot=slot, cores=sets[slot])
+    return applied
@@ -0,0 +1,295 @@
+"""Locked, resumable, parallel and sha256-verified checkpoint fetching."""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+class ChecksumMismatch(RuntimeError):
+    """Raised when a downloaded file does not match its expected sha256."""
+
+
+@dataclass
+class RemoteFile:
+    """A file to fetch over HTTP(S)."""
+    url: str
+    size: int | None
+    sha256: str | None
+    headers: dict[str, str]
+
+
+@contextmanager
+def file_lock(path: Path):
+    """
+    Hold an exclusive cross-process lock on `path` (created if missing).
+
+    Other workers block here until the holder releases, so exactly one
+    process downloads while the rest wait and then reuse its result.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Hex sha256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: Path | None) -> dict | None:
+    """Name, size and mtime of a file (None if missing), to detect replacement."""
+    if path is None or not path.exists():
+        return None
+    stat = path.stat()
+    return {"name": path.name, "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def verify_sha256(path: Path, expected: str | None):
+    """
+    Raise ChecksumMismatch if expected is given and doesn't match.
+    """
+    if expected is None:
+        return
+    actual = sha256_file(path)
+    if actual != expected.lower():
+        raise ChecksumMismatch(f"{path.name}: sha256 {actual} != expected {expected}")
+
+
+def _local_dir(mirror: str) -> Path | None:
+    """Directory for a plain path or file:// mirror, else None."""
+    parsed = urlparse(mirror)
+    if parsed.scheme == "file":
+        return Path(unquote(parsed.path))
+    if parsed.scheme in ("", None) or len(parsed.scheme) == 1:  # path or windows drive
+        return Path(mirror)
+    return None
+
+
+def _manifest_digest(manifest: dict, filename: str) -> str | None:
+    """sha256 for filename from a {"files": {name: {"sha256": ...}}} manifest."""
+    entry = manifest.get("files", {}).get(filename)
+    return entry.get("sha256") if entry else None
+
+
+def _http_json(url: str, headers: dict[str, str]) -> dict | None:
+    """GET a small JSON document, or None if it doesn't exist."""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+def _head_size(url: str, headers: dict[str, str]) -> int | None:
+    """Content-Length from a HEAD request (following redirects)."""
+    req = urllib.request.Request(url, headers=headers, method="HEAD")
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        length = resp.headers.get("Content-Length")
+        return int(length) if length is not None else None
+
+
+def _fetch_range(url: str, headers: dict[str, str], start: int, end: int) -> bytes:
+    """Bytes [start, end] (inclusive) of url; fails if ranges are unsupported."""
+    req = urllib.request.Request(url, headers={**headers, "Range": f"bytes={start}-{end}"})
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        if resp.status != 206:
+            raise RuntimeError(f"server ignored Range request (status {resp.status})")
+        data = resp.read()
+    if len(data) != end - start + 1:
+        raise RuntimeError(f"short range read: {len(data)} of {end - start + 1} bytes")
+    return data
+
+
+def download_ranges(
+    remote: RemoteFile,
+    dest: Path,
+    *,
+    chunk_size: int,
+    workers: int,
+):
+    """
+    Download remote into dest with parallel range requests, resumably.
+
+    Progress goes to "<dest>.part" plus a "<dest>.part.json" sidecar listing
+    completed chunks; rerunning after an interruption only fetches missing
+    chunks (as long as size and sha256 are unchanged). On success the file is
+    verified and atomically renamed to dest.
+    """
+    part = dest.with_name(dest.name + ".part")
+    state_path = dest.with_name(dest.name + ".part.json")
+
+    size = remote.size if remote.size is not None else _head_size(remote.url, remote.headers)
+    if size is None:
+        raise RuntimeError(f"cannot determine size of {remote.url}")
+    n_chunks = max(1, -(-size // chunk_size))
+
+    # Resume only if the partial download targets the same file
+    done: set[int] = set()
+    if part.exists() and state_path.exists():
+        state = json.loads(state_path.read_text())
+        if (state.get("size"), state.get("sha256"), state.get("chunk_size")) == (size, remote.sha256, chunk_size):
+            done = set(state.get("done", []))
+    if not done:
+        with open(part, "wb") as f:
+            f.truncate(size)
+
+    def save_state():
+        tmp = state_path.with_name(state_path.name + ".tmp")
+        tmp.write_text(json.dumps({
+            "size": size,
+            "sha256": remote.sha256,
+            "chunk_size": chunk_size,
+            "done": sorted(done),
+        }))
+        os.replace(tmp, state_path)
+
+    save_state()
+    fd = os.open(part, os.O_WRONLY)
+    try:
+        def fetch(index: int) -> int:
+            start = index * chunk_size
+            end = min(size, start + chunk_size) - 1
+            os.pwrite(fd, _fetch_range(remote.url, remote.headers, start, end), start)
+            return index
+
+        missing = [i for i in range(n_chunks) if i not in done]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for index in pool.map(fetch, missing):
+                done.add(index)
+                save_state()
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    try:
+        verify_sha256(part, remote.sha256)
+    except ChecksumMismatch:
+        # Corrupt data can't be resumed; start over next time
+        part.unlink(missing_ok=True)
+        state_path.unlink(missing_ok=True)
+        raise
+    os.replace(part, dest)
+    state_path.unlink(missing_ok=True)
+
+
+def copy_from_dir(src_dir: Path, filename: str, dest: Path, *, sha256: str | None):
+    """
+    Copy filename from a local mirror directory, verify, and rename atomically.
+
+    Falls back to the mirror's manifest.json for the digest if none is given.
+    """
+    src = src_dir / filename
+    if not src.is_file():
+        raise FileNotFoundError(f"{filename} not found in mirror {src_dir}")
+    if sha256 is None and (src_dir / MANIFEST_FILENAME).is_file():
+        sha256 = _manifest_digest(json.loads((src_dir / MANIFEST_FILENAME).read_text()), filename)
+
+    tmp = dest.with_name(dest.name + f".tmp.{os.getpid()}")
+    try:
+        shutil.copyfile(src, tmp)
+        verify_sha256(tmp, sha256)
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def resolve_remote(
+    filename: str,
+    *,
+    mirror: str | None,
+    repo_id: str,
+    token: str | None,
+    sha256: str | None,
+) -> RemoteFile:
+    """
+    Resolve the URL, size and expected digest of a remote checkpoint.
+
+    With an http(s) mirror, the file is "<mirror>/<filename>" and the digest
+    comes from "<mirror>/manifest.json" if not given. Otherwise the Hub's
+    file metadata is used: its resolved download URL, size and, for LFS
+    files, the sha256 etag.
+    """
+    if mirror is not None:
+        base = mirror.rstrip("/")
+        if sha256 is None:
+            manifest = _http_json(f"{base}/{MANIFEST_FILENAME}", {})
+            sha256 = _manifest_digest(manifest, filename) if manifest else None
+        return RemoteFile(url=f"{base}/{filename}", size=None, sha256=sha256, headers={})
+
+    from huggingface_hub import hf_hub_url, get_hf_file_metadata
+
+    url = hf_hub_url(repo_id=repo_id, filename=filename)
+    meta = get_hf_file_metadata(url, token=token)
+    etag = (meta.etag or "").strip('"')
+    if sha256 is None and len(etag) == 64 and all(c in "0123456789abcdef" for c in etag):
+        sha256 = etag  # LFS etags are the file's sha256
+    # LFS files resolve to a CDN URL that must not see the Hub token
+    on_hub = urlparse(meta.location).netloc == urlparse(url).netloc
+    headers = {"Authorization": f"Bearer {token}"} if token and on_hub else {}
+    return RemoteFile(url=meta.location, size=meta.size, sha256=sha256, headers=headers)
+
+
+def fetch_checkpoint(
+    filename: str,
+    dest_dir: Path,
+    *,
+    repo_id: str,
+    token: str | None = None,
+    mirror: str | None = None,
+    sha256: str | None = None,
+    chunk_size: int = 8 << 20,
+    workers: int = 4,
+) -> Path:
+    """
+    Ensure dest_dir/filename exists, fetching it under a cross-process lock.
+
+    Args:
+        filename: Checkpoint filename
+        dest_dir: Local checkpoint directory
+        repo_id: HuggingFace Hub repo (used when no mirror is set)
+        token: Optional Hub token
+        mirror: Local directory, file:// URL or http(s) base URL to fetch
+                from instead of the Hub
+        sha256: Expected digest (else taken from the source's manifest/etag)
+        chunk_size: Range request size in bytes
+        workers: Parallel range requests
+
+    Returns:
+        Path to the verified local checkpoint
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    dest = dest_dir / filename
+
+    with file_lock(dest_dir / f"{filename}.lock"):
+        # Another worker may have finished while we waited for the lock
+        if dest.exists():
+            return dest
+
+        local = _local_dir(mirror) if mirror is not None else None
+        if local is not None:
+            copy_from_dir(local, filename, dest, sha256=sha256)
+        else:
+            remote = resolve_remote(filename, mirror=mirror, repo_id=repo_id, token=token, sha256=sha256)
+            download_ranges(remote, dest, chunk_size=chunk_size, workers=workers)
+    return dest
@@ -0,0 +1,128 @@
+"""Traced forward that uses fused attention everywhere but the traced layer."""
+
+import math
+
+import torch
+import torch.nn.functional as F
+
+from niels_gpt.config import ModelConfig
+from niels_gpt.model.rope import rope_cache, apply_rope
+
+from .kv_cache import attn_projections, project_qkv
+
+
+class FusedForward:
+    """
+    Inference wrapper over a loaded GPT's weights.
+
+    forward_with_attn_trace runs the same blocks as GPT.forward, but only
+    the traced layer computes explicit softmax probabilities, and for
+    streaming (return_full_attn=False) only for the last query row: the
+    (B, H, t, t) probabilities of every other layer are never materialized,
+    as each untraced layer (and the traced layer's output) goes through
+    F.scaled_dot_product_attention. Like the ONNX backend, only
+    last-position logits are computed. Everything else (tok_emb, blocks,
+    parameters(), ...) is the wrapped model's, so the KV-cached decoder,
+    multi-layer traces and exports work on it unchanged.
+    """
+
+    def __init__(self, model, cfg: ModelConfig):
+        """
+        Args:
+            model: GPT model in eval mode
+            cfg: Model config
+        """
+        self.model = model
+        self.cfg = cfg
+        weight = model.tok_emb.weight
+        self.sin, self.cos = rope_cache(cfg.T, cfg.D, device=weight.device, dtype=weight.dtype)
+        self.projections = [attn_projections(block.attn, cfg.C) for block in model.blocks]
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set in __init__
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    @torch.no_grad()
+    def forward_with_attn_trace(self, x: torch.Tensor, trace_layer: int = 0, return_full_attn: bool = False):
+        """
+        Forward over a (B, t) context (t <= cfg.T) with attention trace.
+
+        Returns:
+            (logits, trace): logits (B, 1, V) for the last position; trace has
+            "layer" and "attn_row" (B, H, t) or "attn_full" (B, H, t, t)
+
+        Raises:
+            ValueError: If trace_layer is out of range
+        """
+        model, cfg = self.model, self.cfg
+        if not 0 <= trace_layer < cfg.L:
+            raise ValueError(f"trace_layer must be in [0, {cfg.L - 1}], got {trace_layer}")
+        B, t = x.shape
+        sin, cos = self.sin[:, :, :t], self.cos[:, :, :t]
+        trace = {"layer": trace_layer}
+
+        h = model.tok_emb(x)
+        for i, block in enumerate(model.blocks):
+            in_proj, out_proj = self.projections[i]
+            q, k, v = project_qkv(in_proj, block.ln1(h), cfg.H, cfg.D)
+            q, k = apply_rope(q, k, sin, cos)
+
+            if i == trace_layer and return_full_attn:
+                scores = (q @ k.transpose(-2, -1)) / math.sqrt(cfg.D)  # (B, H, t, t)
+                mask = torch.ones(t, t, dtype=torch.bool, device=x.device).tril()
+                probs = F.softmax(scores.masked_fill(~mask, float("-inf")), dim=-1)
+                trace["attn_full"] = probs
+                y = probs @ v
+            else:
+                y = F.scaled_dot_product_attention(q, k, v, is_causal=True)
+                if i == trace_layer:
+                    # The last query sees every key, so its row needs no mask
+                    scores = (q[:, :, -1:] @ k.transpose(-2, -1)) / math.sqrt(cfg.D)  # (B, H, 1, t)
+                    trace["attn_row"] = F.softmax(scores, dim=-1)[:, :, 0, :]
+
+            h = h + out_proj(y.transpose(1, 2).reshape(B, t, cfg.C))
+            h = h + block.mlp(block.ln2(h))
+
+        logits = model.lm_head(model.ln_f(h[:, -1, :]))
+        return logits[:, None, :], trace
+
+
+def fuse_model(model, cfg: ModelConfig):
+    """
+    Wrap a torch GPT in FusedForward if it reproduces the reference forward.
+
+    FusedForward reads the blocks' internals (ln1, ln2, mlp and the
+    attention projections), so the wrapper is only used if it builds and its
+    last-position logits and traces match GPT.forward_with_attn_trace on a
+    short probe; otherwise the model is returned unwrapped and serves the
+    reference forward. Other backends are returned as is.
+    """
+    if getattr(model, "backend", "torch") != "torch" or isinstance(model, FusedForward):
+        return model
+    try:
+        fused = FusedForward(model, cfg)
+        ok = _matches_reference(fused, model, cfg)
+    except Exception:
+        # Block layout this wrapper doesn't know
+        return model
+    return fused if ok else model
+
+
+@torch.no_grad()
+def _matches_reference(fused: FusedForward, model, cfg: ModelConfig, atol: float = 1e-4) -> bool:
+    """Compare logits and both trace kinds on a probe context, tracing the last layer."""
+    t = min(cfg.T, 16)
+    x = (torch.arange(t, device=model.tok_emb.weight.device) * 7 % cfg.V)[None]
+    for full in (False, True):
+        key = "attn_full" if full else "attn_row"
+        ref_logits, ref = model.forward_with_attn_trace(x, trace_layer=cfg.L - 1, return_full_attn=full)
+        logits, trace = fused.forward_with_attn_trace(x, trace_layer=cfg.L - 1, return_full_attn=full)
+        if logits.shape != (1, 1, cfg.V) or trace[key].shape != ref[key].shape:
+            return False
+        if not torch.allclose(logits[:, -1], ref_logits[:, -1], atol=atol, rtol=atol):
+            return False
+        if not torch.allclose(trace[key], ref[key], atol=atol, rtol=atol):
+            return False
+    return True
@@ -9,7 +9,91 @@ from niels_gpt.config import ModelConfig
 from niels_gpt.tokenizer import encode, decode
 from niels_gpt.chat_format import format_chat, extract_assistant_reply
 
-from .token_utils import token_display
+from .config import ROLLING_SINK_TOKENS
+from .kv_cache import make_decoder
+from .qos import QosStream
+from .attn_view import resolve_range, window_and_pool, iter_ndjson
+from .attn_summary import summarize_attention
+from .token_utils import token_display, stop_position
+from .timing import StepTimer
+from .tracing import TraceStore, forward_with_layer_traces, lens_summary
+
+
+def sample_token(
+    logits_last: torch.Tensor,
+    temperature: float,
+    top_k: int | None,
+    generator: torch.Generator,
+) -> tuple[int, torch.Tensor]:
+    """
+    Sample one token from last-position logits.
+
+    Args:
+        logits_last: (V,) logits on CPU
+        temperature: 0 for greedy, else softmax temperature
+        top_k: Keep only the k most likely tokens (None = all)
+        generator: CPU generator for reproducibility
+
+    Returns:
+        (token_id, probs) where probs is the (V,) sampling distribution
+    """
+    if temperature == 0:
+        # Greedy
+        next_token = logits_last.argmax().item()
+        # For entropy/topk, use uniform distribution at the greedy choice
+        probs = torch.zeros_like(logits_last)
+        probs[next_token] = 1.0
+        return next_token, probs
+
+    # Temperature scaling
+    scaled = logits_last / temperature
+
+    # Top-k filtering
+    if top_k is not None:
+        topk_vals, topk_indices = torch.topk(scaled, min(top_k, len(scaled)))
+        # Set all non-topk logits to -inf
+        mask = torch.full_like(scaled, float('-inf'))
+        mask[topk_indices] = scaled[topk_indices]
+        scaled = mask
+
+    # Compute probabilities
+    probs = F.softmax(scaled, dim=-1)
+
+    # Sample
+    next_token = torch.multinomial(probs, num_samples=1, generator=generator).item()
+    return next_token, probs
+
+
+def distribution_summary(probs: torch.Tensor) -> tuple[float, list[dict]]:
+    """
+    Entropy and top-10 candidates of a sampling distribution.
+
+    Returns:
+        (entropy, topk_list) as sent in trace events
+    """
+    # Clip probs for numerical stability
+    probs_safe = probs.clamp(min=1e-12)
+    entropy = -(probs * torch.log(probs_safe)).sum().item()
+
+    # Get top 10
+    top10_probs, top10_indices = torch.topk(probs, min(10, len(probs)))
+    topk_list = [
+        {
+            "token_id": int(top10_indices[i]),
+            "token_text": decode(torch.tensor([top10_indices[i]], dtype=torch.int64)),
+            "token_display": token_display(int(top10_indices[i])),
+            "prob": float(top10_probs[i])
+        }
+        for i in range(len(top10_indices))
+    ]
+    return entropy, topk_list
+
+
+def encode_prompt(messages: list[dict] | None, prompt_ids: list[int] | None = None) -> torch.Tensor:
+    """Encoded chat transcript: prompt_ids as a tensor if given, else format_chat(messages)."""
+    if prompt_ids is not None:
+        return torch.tensor(prompt_ids, dtype=torch.int64)
+    return encode(format_chat(messages))
 
 
 def stream_chat_events(
@@ -23,24 +107,91 @@ def stream_chat_events(
     seed: int,
     trace_layer: int,
     device: str,
+    trace_layers: list[int] | None = None,
+    logit_lens: bool = False,
+    trace_store: TraceStore | None = None,
+    generation_id: str | None = None,
+    context_mode: str = "crop",
+    n: int = 1,
+    timings: bool = False,
+    prompt_ids: list[int] | None = None,
+    qos: QosStream | None = None,
 ) -> Iterator[dict]:
     """
     Stream chat events with tokens and attention traces.
 
+    With n > 1, n samples are decoded together (see stream_parallel_samples)
+    and every token/trace event carries its "sample" index.
+
+    If trace_layers is given, every listed layer is traced in the same forward
+    pass and recorded in trace_store under generation_id; the trace event still
+    carries only trace_layer's attention.
+
+    context_mode selects how the context window is handled:
+        - "crop": recompute the last cfg.T tokens every step (reference)
+        - "rolling": prefill once, then decode from a KV cache that keeps
+          ROLLING_SINK_TOKENS sink tokens plus the most recent window, so
+          per-step cost stays constant past cfg.T. Trace events then carry
+          "evicted", the number of transcript tokens between the sink columns
+          and the window columns of attn.
+
+    prompt_ids, if given, is the already-encoded transcript (session turns)
+    and messages is not formatted.
+
+    With timings, every trace event carries "timing" (forward_ms,
+    sample_ms, encode_ms, queue_ms and elapsed_ms since the stream started;
+    see timing.StepTimer) and the done event a whole-stream summary. SSE
+    encoding and socket writes happen after each yield and are not
+    included; sse.stream_sse_events adds the encoding time to the summary.
+
+    qos, if given, sets each step's trace fidelity (see qos.QosStream) and
+    adds "qos" events when it is degraded.
+
     Yields dicts with keys:
-        - event: "token" | "trace" | "done"
+        - event: "token" | "trace" | "qos" | "done"
         - data: event-specific data dict
 
     Raises:
-        ValueError: If trace_layer is out of bounds
+        ValueError: If trace_layer or trace_layers are out of bounds
     """
     # Validate trace layer
     if not (0 <= trace_layer < cfg.L):
         raise ValueError(f"trace_layer must be in [0, {cfg.L - 1}], got {trace_layer}")
+    if context_mode not in ("crop", "rolling"):
+        raise ValueError(f"context_mode must be 'crop' or 'rolling', got {context_mode!r}")
+    if n < 1:
+        raise ValueError(f"n must be >= 1, got {n}")
+    if n > 1:
+        if trace_layers is not None:
+            raise ValueError("trace_layers is not supported with n > 1")
+        yield from stream_parallel_samples(
+            model,
+            cfg,
+            messages=messages,
+            n=n,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_k=top_k,
+            seed=seed,
+            trace_layer=trace_layer,
+            device=device,
+            context_mode=context_mode,
+            timings=timings,
+            prompt_ids=prompt_ids,
+            qos=qos,
+        )
+        return
+
+    # Multi-layer capture always includes the streamed layer
+    if trace_layers is not None:
+        if any(not (0 <= layer < cfg.L) for layer in trace_layers):
+            raise ValueError(f"trace_layers must be in [0, {cfg.L - 1}], got {trace_layers}")
+        trace_layers = sorted(set(trace_layers) | {trace_layer})
+        if trace_store is not None and generation_id is not None:
+            trace_store.start(generation_id, trace_layers, logit_lens)
 
     # Build and encode transcript
-    transcript = format_chat(messages)
-    prompt_ids = encode(transcript)  # CPU int64
+    prompt_ids = encode_prompt(messages, prompt_ids)  # CPU int64
     ids = prompt_ids.clone()
 
     # Track where generation starts
@@ -50,72 +201,87 @@ def stream_chat_events(
     generator = torch.Generator(device="cpu")
     generator.manual_seed(seed)
 
+    # Rolling mode decodes incrementally from a KV cache
+    decoder = None
+    if context_mode == "rolling":
+        decoder = make_decoder(model, cfg, sinks=min(ROLLING_SINK_TOKENS, cfg.T - 1))
+    layers = trace_layers if trace_layers is not None else [trace_layer]
+    timer = StepTimer(timings)
+    stop_reason = "max_new_tokens"
+    qos = qos or QosStream()
+
     # Generation loop
     for step in range(max_new_tokens):
-        # Crop to context window
-        ctx = ids[-cfg.T:] if len(ids) > cfg.T else ids
-
-        # Forward pass with attention trace
-        ctx_batch = ctx[None, :].to(device)  # (1, t)
+        event = qos.step()
+        if event is not None:
+            yield event
+        timer.mark()
         with torch.no_grad():
-            logits, trace = model.forward_with_attn_trace(
-                ctx_batch,
-                trace_layer=trace_layer,
-                return_full_attn=False
+            if decoder is not None:
+                # Prefill once, then feed only the newly sampled token
+                if step == 0:
+                    logits, traces = decoder.prefill(
+                        ids[None, :].to(device), layers=layers, logit_lens=logit_lens
+                    )
+                else:
+                    logits, traces = decoder.step(
+                        torch.tensor([next_token], device=device), layers=layers, logit_lens=logit_lens
+                    )
+                logits = logits[:, None, :]  # (1, 1, V)
+                attn_row = traces["attn_rows"][trace_layer]  # (1, H, n)
+            else:
+                # Crop to context window
+                ctx = ids[-cfg.T:] if len(ids) > cfg.T else ids
+
+                # Forward pass with attention trace
+                ctx_batch = ctx[None, :].to(device)  # (1, t)
+                if trace_layers is None:
+                    logits, trace = model.forward_with_attn_trace(
+                        ctx_batch,
+                        trace_layer=trace_layer,
+                        return_full_attn=False
+                    )
+                    attn_row = trace["attn_row"]  # (1, H, t)
+                else:
+                    logits, traces = forward_with_layer_traces(
+                        model,
+                        ctx_batch,
+                        layers=trace_layers,
+                        logit_lens=logit_lens,
+                    )
+                    attn_row = traces["attn_rows"][trace_layer]  # (1, H, t)
+        timer.lap("forward")
+
+        # Record every captured layer for later retrieval by generation id
+        if trace_layers is not None and trace_store is not None and generation_id is not None:
+            lens = None
+            if logit_lens:
+                lens = {
+                    layer: lens_summary(lens_logits[0].cpu())
+                    for layer, lens_logits in traces["lens_logits"].items()
+                }
+            trace_store.record(
+                generation_id,
+                {layer: row[0].cpu() for layer, row in traces["attn_rows"].items()},
+                lens,
             )
 
         # Get last position logits
         logits_last = logits[0, -1].cpu()  # (V,)
 
-        # Sample next token
-        if temperature == 0:
-            # Greedy
-            next_token = logits_last.argmax().item()
-            # For entropy/topk, use uniform distribution at the greedy choice
-            probs = torch.zeros_like(logits_last)
-            probs[next_token] = 1.0
-        else:
-            # Temperature scaling
-            scaled = logits_last / temperature
-
-            # Top-k filtering
-            if top_k is not None:
-                topk_vals, topk_indices = torch.topk(scaled, min(top_k, len(scaled)))
-                # Set all non-topk logits to -inf
-                mask = torch.full_like(scaled, float('-inf'))
-                mask[topk_indices] = scaled[topk_indices]
-                scaled = mask
-
-            # Compute probabilities
-            probs = F.softmax(scaled, dim=-1)
-
-            # Sample
-            next_token = torch.multinomial(probs, num_samples=1, generator=generator).item()
-
-        # Compute entropy and top-10
-        # Clip probs for numerical stability
-        probs_safe = probs.clamp(min=1e-12)
-        entropy = -(probs * torch.log(probs_safe)).sum().item()
-
-        # Get top 10
-        top10_probs, top10_indices = torch.topk(probs, min(10, len(probs)))
-        topk_list = [
-            {
-                "token_id": int(top10_indices[i]),
-                "token_text": decode(torch.tensor([top10_indices[i]], dtype=torch.int64)),
-                "token_display": token_display(int(top10_indices[i])),
-                "prob": float(top10_probs[i])
-            }
-            for i in range(len(top10_indices))
-        ]
+        # Sample next token and summarize the distribution
+        next_token, probs = sample_token(logits_last, temperature, top_k, generator)
+        timer.lap("sample")
+        entropy, topk_list = distribution_summary(probs)
 
         # Decode token text
         token_text = decode(torch.tensor([next_token], dtype=torch.int64))
         token_disp = token_display(next_token)
 
-        # Extract attention row for last position
-        attn_row = trace["attn_row"]  # (1, H, t)
-        attn_list = attn_row[0].cpu().tolist()  # (H, t)
+        # Attention row for last position, as fine as the QoS level allows
+        attn_fields = qos.attn(attn_row[0].cpu(), step)  # (H, t)
+        timer.lap("encode")
+        timer.token()
 
         # Emit token event
         yield {
@@ -129,14 +295,19 @@ def stream_chat_events(
         }
 
         # Emit trace event
+        trace_data = {
+            "step": step,
+            "entropy": entropy,
+            "topk": topk_list,
+            **attn_fields,
+        }
+        if decoder is not None:
+            trace_data["evicted"] = decoder.cache.evicted
+        if timings:
+            trace_data["timing"] = timer.pop()
         yield {
             "event": "trace",
-            "data": {
-                "step": step,
-                "entropy": entropy,
-                "topk": topk_list,
-                "attn": attn_list
-            }
+            "data": trace_data
         }
 
         # Append next token
@@ -144,23 +315,11 @@ def stream_chat_events(
 
         # Check for stop sequences in generated portion
         generated_ids = ids[prompt_len:]
-        generated_bytes = bytes(generated_ids.tolist())
-
-        # Stop if we see role tags in the generated portion
-        if b"\nuser: " in generated_bytes or b"\nsystem: " in generated_bytes:
-            # Find the stop position
-            user_pos = generated_bytes.find(b"\nuser: ")
-            system_pos = generated_bytes.find(b"\nsystem: ")
-
-            # Take the earliest stop position
-            stop_positions = [p for p in [user_pos, system_pos] if p != -1]
-            if stop_positions:
-                stop_pos = min(stop_positions)
-                # Truncate before the stop tag
-                ids = torch.cat([
-                    prompt_ids,
-                    generated_ids[:stop_pos]
-                ])
+        stop_pos = stop_position(bytes(generated_ids.tolist()))
+        if stop_pos is not None:
+            # Truncate before the stop tag
+            ids = torch.cat([prompt_ids, generated_ids[:stop_pos]])
+            stop_reason = "stop_sequence"
             break
 
     # Decode final text and extract reply
@@ -168,39 +327,218 @@ def stream_chat_events(
     reply = extract_assistant_reply(decoded_text)
 
     # Emit done event
+    done_data = {"reply": reply}
+    if generation_id is not None:
+        done_data["generation_id"] = generation_id
+    if timings:
+        done_data["timing"] = timer.summary(stop_reason)
     yield {
         "event": "done",
-        "data": {
-            "reply": reply
-        }
+        "data": done_data
     }
 
 
-def generate_full_attn(
+def stream_parallel_samples(
     model: GPT,
     cfg: ModelConfig,
     *,
     messages: list[dict],
+    n: int,
+    max_new_tokens: int,
+    temperature: float,
+    top_k: int | None,
+    seed: int,
     trace_layer: int,
-    head: int,
     device: str,
-) -> dict:
+    context_mode: str = "crop",
+    timings: bool = False,
+    prompt_ids: list[int] | None = None,
+    qos: QosStream | None = None,
+) -> Iterator[dict]:
     """
-    Generate full attention matrix for a given layer and head.
+    Stream n independent samples of one reply, decoded as a single batch.
 
-    Args:
-        model: GPT model
-        cfg: Model config
-        messages: Chat messages
-        trace_layer: Layer index to trace
-        head: Head index to extract
-        device: Device to run on
+    The prompt is prefilled once into a KV cache, which is then forked into
+    n sequences; each step runs one batched forward over the sequences still
+    generating. Sample i draws from its own generator seeded with seed + i,
+    so sample 0 reproduces the n=1 stream for the same seed and
+    context_mode.
+
+    In "rolling" mode the cache keeps ROLLING_SINK_TOKENS sinks plus the
+    recent window, and trace events carry "evicted". In "crop" mode the
+    cache is only used while the samples fit in cfg.T tokens (where it
+    equals recomputing the context); past that, each step recomputes the
+    last cfg.T tokens of every sample in one batched forward, as n=1 crop
+    does.
+
+    With timings, each sample's trace carries the batched forward's time
+    and its own sampling and encoding time; the done summary's stop_reason
+    is sample 0's, with every sample's in "stop_reasons".
+
+    Yields dicts with keys:
+        - event: "token" | "trace" (data includes "sample") | "done"
+        - data: event-specific data dict; done carries "reply" (sample 0)
+          and "replies" (one per sample)
+    """
+    # Build and encode transcript
+    prompt_ids = encode_prompt(messages, prompt_ids)  # CPU int64
+    prompt_len = len(prompt_ids)
+
+    # One generator per sample for deterministic, independent draws
+    generators = []
+    for i in range(n):
+        generator = torch.Generator(device="cpu")
+        generator.manual_seed(seed + i)
+        generators.append(generator)
+
+    rolling = context_mode == "rolling"
+    sinks = min(ROLLING_SINK_TOKENS, cfg.T - 1) if rolling else 0
+    decoder = make_decoder(model, cfg, sinks=sinks) if rolling or prompt_len <= cfg.T else None
+    samples = [prompt_ids.clone() for _ in range(n)]
+    active = list(range(n))  # sample index of each batch row
+    timer = StepTimer(timings)
+    stop_reasons = ["max_new_tokens"] * n
+    qos = qos or QosStream()
+
+    def crop_forward(rows: list[torch.Tensor]):
+        # Last cfg.T tokens of every sample (all the same length), batched
+        ctx = torch.stack([ids[-cfg.T:] for ids in rows]).to(device)
+        with torch.no_grad():
+            logits, trace = model.forward_with_attn_trace(ctx, trace_layer=trace_layer)
+        return logits[:, -1], trace["attn_row"]
+
+    # Prefill once, then fork the cache into one row per sample
+    timer.mark()
+    if decoder is not None:
+        logits, traces = decoder.prefill(prompt_ids[None, :].to(device), layers=[trace_layer])
+        decoder = decoder.fork(n)
+        attn_rows = traces["attn_rows"][trace_layer]
+    else:
+        logits, attn_rows = crop_forward([prompt_ids])
+    logits = logits.expand(n, -1)
+    attn_rows = attn_rows.expand(n, -1, -1)
+
+    for step in range(max_new_tokens):
+        event = qos.step()
+        if event is not None:
+            yield event
+        next_tokens = []
+        finished = []
+        logits_cpu = logits.cpu()
+        attn_cpu = attn_rows.cpu()
+        timer.lap("forward")
+        forward_timing = timer.pop()
+        for row, i in enumerate(active):
+            timer.mark(queued=False)
+            next_token, probs = sample_token(logits_cpu[row], temperature, top_k, generators[i])
+            timer.lap("sample")
+            entropy, topk_list = distribution_summary(probs)
+            next_tokens.append(next_token)
+            token_text = decode(torch.tensor([next_token], dtype=torch.int64))
+            attn_fields = qos.attn(attn_cpu[row], step)
+            timer.lap("encode")
+            timer.token()
+
+            yield {
+                "event": "token",
+                "data": {
+                    "sample": i,
+                    "step": step,
+                    "token_id": next_token,
+                    "token_text": token_text,
+                    "token_display": token_display(next_token),
+                }
+            }
+            trace_data = {
+                "sample": i,
+                "step": step,
+                "entropy": entropy,
+                "topk": topk_list,
+                **attn_fields,
+            }
+            if rolling:
+                trace_data["evicted"] = decoder.cache.evicted
+            if timings:
+                trace_data["timing"] = {
+                    **timer.pop(),
+                    "forward_ms": forward_timing["forward_ms"],
+                    "queue_ms": forward_timing["queue_ms"],
+                }
+            yield {
+                "event": "trace",
+                "data": trace_data
+            }
+
+            # Append next token and check for stop sequences
+            samples[i] = torch.cat([samples[i], torch.tensor([next_token], dtype=torch.int64)])
+            generated_ids = samples[i][prompt_len:]
+            stop_pos = stop_position(bytes(generated_ids.tolist()))
+            if stop_pos is not None:
+                samples[i] = torch.cat([prompt_ids, generated_ids[:stop_pos]])
+                stop_reasons[i] = "stop_sequence"
+                finished.append(row)
+
+        if step == max_new_tokens - 1:
+            break
+
+        # Drop finished samples from the batch
+        if finished:
+            keep = [row for row in range(len(active)) if row not in finished]
+            if not keep:
+                break
+            if decoder is not None:
+                decoder.select(torch.tensor(keep, device=device))
+            active = [active[row] for row in keep]
+            next_tokens = [next_tokens[row] for row in keep]
+
+        # One batched forward for every active sample
+        timer.mark()
+        if decoder is not None and not rolling and len(samples[active[0]]) > cfg.T:
+            decoder = None  # the window starts sliding: crop recomputes from here on
+        if decoder is not None:
+            with torch.no_grad():
+                logits, traces = decoder.step(torch.tensor(next_tokens, device=device), layers=[trace_layer])
+            attn_rows = traces["attn_rows"][trace_layer]
+        else:
+            logits, attn_rows = crop_forward([samples[i] for i in active])
+
+    # Decode final texts and extract replies
+    replies = [extract_assistant_reply(decode(ids)) for ids in samples]
+
+    # Emit done event
+    done_data = {"reply": replies[0], "replies": replies}
+    if timings:
+        done_data["timing"] = {**timer.summary(stop_reasons[0]), "stop_reasons": stop_reasons}
+    yield {
+        "event": "done",
+        "data": done_data
+    }
+
+
+def _full_attn_window(
+    model: GPT,
+    cfg: ModelConfig,
+    *,
+    messages: list[dict],
+    trace_layer: int,
+    head: int,
+    device: str,
+    row_start: int,
+    row_end: int | None,
+    col_start: int,
+    col_end: int | None,
+    resolution: int | None,
+    pool: str,
+) -> tuple[dict, torch.Tensor, list[int], list[int]]:
+    """
+    Run the full-attention forward and crop/pool the selected head's matrix.
 
     Returns:
-        Dict with keys: layer, head, tokens, attn
+        (meta, matrix, row_starts, col_starts) where meta holds every response
+        field except the matrix itself
 
     Raises:
-        ValueError: If trace_layer or head are out of bounds
+        ValueError: If trace_layer, head or the row/col ranges are out of bounds
     """
     # Validate inputs
     if not (0 <= trace_layer < cfg.L):
@@ -216,6 +554,10 @@ def generate_full_attn(
     ctx = prompt_ids[-cfg.T:] if len(prompt_ids) > cfg.T else prompt_ids
     t = len(ctx)
 
+    # Validate window against the actual context length
+    rows = resolve_range(row_start, row_end, t, "row")
+    cols = resolve_range(col_start, col_end, t, "col")
+
     # Forward pass with full attention
     ctx_batch = ctx[None, :].to(device)  # (1, t)
     with torch.no_grad():
@@ -225,20 +567,195 @@ def generate_full_attn(
             return_full_attn=True
         )
 
-    # Extract full attention matrix for selected head
+    # Extract full attention matrix for selected head, then window/pool it
     attn_full = trace["attn_full"]  # (1, H, t, t)
-    attn_matrix = attn_full[0, head, :t, :t].cpu().tolist()  # (t, t)
+    matrix, row_starts, col_starts = window_and_pool(
+        attn_full[0, head, :t, :t].cpu(),
+        rows=rows,
+        cols=cols,
+        resolution=resolution,
+        pool=pool,
+    )
 
     # Decode tokens
     token_ids = ctx.tolist()
     tokens = [decode(torch.tensor([tid], dtype=torch.int64)) for tid in token_ids]
     tokens_display = [token_display(tid) for tid in token_ids]
 
-    return {
+    meta = {
         "layer": trace_layer,
         "head": head,
+        "t": t,
         "token_ids": token_ids,
         "tokens": tokens,
         "tokens_display": tokens_display,
-        "attn": attn_matrix
+        "rows": list(rows),
+        "cols": list(cols),
+        "shape": list(matrix.shape),
+        "pool": pool if tuple(matrix.shape) != (rows[1] - rows[0], cols[1] - cols[0]) else None,
+        "row_starts": row_starts,
+        "col_starts": col_starts,
+    }
+    return meta, matrix, row_starts, col_starts
+
+
+def generate_full_attn(
+    model: GPT,
+    cfg: ModelConfig,
+    *,
+    messages: list[dict],
+    trace_layer: int,
+    head: int,
+    device: str,
+    row_start: int = 0,
+    row_end: int | None = None,
+    col_start: int = 0,
+    col_end: int | None = None,
+    resolution: int | None = None,
+    pool: str = "max",
+) -> dict:
+    """
+    Generate full attention matrix for a given layer and head.
+
+    By default returns the whole (t, t) matrix. Row/col ranges select a
+    window, and resolution downsamples it with max or mean pooling.
+
+    Args:
+        model: GPT model
+        cfg: Model config
+        messages: Chat messages
+        trace_layer: Layer index to trace
+        head: Head index to extract
+        device: Device to run on
+        row_start, row_end: Query range [row_start, row_end) (end None = t)
+        col_start, col_end: Key range [col_start, col_end) (end None = t)
+        resolution: Max output rows/cols, or None for full detail
+        pool: "max" or "mean" pooling when downsampling
+
+    Returns:
+        Dict with keys: layer, head, tokens, attn, plus window metadata
+
+    Raises:
+        ValueError: If trace_layer, head or the ranges are out of bounds
+    """
+    meta, matrix, _, _ = _full_attn_window(
+        model,
+        cfg,
+        messages=messages,
+        trace_layer=trace_layer,
+        head=head,
+        device=device,
+        row_start=row_start,
+        row_end=row_end,
+        col_start=col_start,
+        col_end=col_end,
+        resolution=resolution,
+        pool=pool,
+    )
+    return {**meta, "attn": matrix.tolist()}
+
+
+def stream_full_attn(
+    model: GPT,
+    cfg: ModelConfig,
+    *,
+    messages: list[dict],
+    trace_layer: int,
+    head: int,
+    device: str,
+    row_start: int = 0,
+    row_end: int | None = None,
+    col_start: int = 0,
+    col_end: int | None = None,
+    resolution: int | None = None,
+    pool: str = "max",
+) -> Iterator[str]:
+    """
+    Same as generate_full_attn, but serialized as NDJSON rows.
+
+    Validation and the forward pass run eagerly, so errors surface before
+    the response starts; only row serialization is streamed.
+
+    Returns:
+        Iterator of NDJSON lines (meta, row..., done)
+
+    Raises:
+        ValueError: If trace_layer, head or the ranges are out of bounds
+    """
+    meta, matrix, row_starts, _ = _full_attn_window(
+        model,
+        cfg,
+        messages=messages,
+        trace_layer=trace_layer,
+        head=head,
+        device=device,
+        row_start=row_start,
+        row_end=row_end,
+        col_start=col_start,
+        col_end=col_end,
+        resolution=resolution,
+        pool=pool,
+    )
+    return iter_ndjson(meta, matrix, row_starts)
+
+
+def generate_attn_summary(
+    model: GPT,
+    cfg: ModelConfig,
+    *,
+    messages: list[dict],
+    device: str,
+    top_k: int = 5,
+) -> dict:
+    """
+    Summarize attention for every layer and head of the transcript.
+
+    Runs a single forward pass that keeps each layer's full attention, then
+    reduces it to per-head statistics, so a client can draw an overview grid
+    and fetch individual matrices from /inspect/full_attn on demand.
+
+    Args:
+        model: GPT model (torch, or ONNX exported with attention outputs)
+        cfg: Model config
+        messages: Chat messages
+        device: Device to run on
+        top_k: Most-attended key positions to report per head
+
+    Returns:
+        Dict with keys: layers, heads, t, token_ids, tokens, tokens_display,
+        plus the statistics from summarize_attention
+
+    Raises:
+        ValueError: If the backend cannot return full attention
+    """
+    # Build and encode transcript, cropped to the context window
+    transcript = format_chat(messages)
+    prompt_ids = encode(transcript)  # CPU int64
+    ctx = prompt_ids[-cfg.T:] if len(prompt_ids) > cfg.T else prompt_ids
+    t = len(ctx)
+
+    # One forward pass capturing every layer's full attention
+    ctx_batch = ctx[None, :].to(device)  # (1, t)
+    with torch.no_grad():
+        if getattr(model, "backend", "torch") == "onnx":
+            if not model.attn_outputs:
+                raise ValueError("attention summary requires graphs exported with attention outputs")
+            probs = model.run_prefill(ctx_batch)[3][:, 0]  # (L, H, t, t)
+        else:
+            _, traces = forward_with_layer_traces(
+                model, ctx_batch, layers=list(range(cfg.L)), full_attn=True
+            )
+            probs = torch.stack([traces["attn_full"][i][0] for i in range(cfg.L)])
+
+        stats = summarize_attention(probs[:, :, :t, :t], top_k)
+
+    token_ids = ctx.tolist()
+    return {
+        "layers": cfg.L,
+        "heads": cfg.H,
+        "t": t,
+        "token_ids": token_ids,
+        "tokens": [decode(torch.tensor([tid], dtype=torch.int64)) for tid in token_ids],
+        "tokens_display": [token_display(tid) for tid in token_ids],
+        **stats,
     }
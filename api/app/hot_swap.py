@@ -0,0 +1,154 @@
+"""Zero-downtime reload of the default checkpoint."""
+
+import asyncio
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Callable
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import DEFAULT_MODEL_ID
+
+
+class ReloadInProgress(RuntimeError):
+    """Raised when a reload is requested while another is still running."""
+
+
+class HotSwapper:
+    """
+    Loads and warms a new checkpoint in a worker thread while the current
+    model keeps serving, then switches app.state.model/cfg in one step on the
+    event loop.
+
+    Requests capture the model object when they start, so in-flight streams
+    finish on the old model; it is freed once the last of them drops its
+    reference. Retired models are tracked by weakref only, to report how many
+    are still draining.
+    """
+
+    def __init__(
+        self,
+        app,
+        *,
+        loader: Callable[[], tuple[Any, Any]],
+        warmer: Callable[[Any, Any], None] | None = None,
+        watch_path: Path | None = None,
+        poll_seconds: float = 0.0,
+    ):
+        """
+        Args:
+            app: FastAPI app whose state holds model, cfg and registry
+            loader: Blocking function returning a freshly loaded (model, cfg)
+            warmer: Optional blocking function run on the new model before swap
+            watch_path: Checkpoint file polled for changes by watch()
+            poll_seconds: Poll interval for watch(); <= 0 disables watching
+        """
+        self.app = app
+        self.loader = loader
+        self.warmer = warmer
+        self.watch_path = Path(watch_path) if watch_path is not None else None
+        self.poll_seconds = poll_seconds
+        self.version = 0
+        self.last_reload: float | None = None
+        self.last_error: str | None = None
+        self._lock = asyncio.Lock()
+        self._retired: list[weakref.ref] = []
+
+    @property
+    def reloading(self) -> bool:
+        """True while a reload is loading or warming."""
+        return self._lock.locked()
+
+    def status(self) -> dict:
+        """Current version, reload state and number of draining old models."""
+        self._retired = [ref for ref in self._retired if ref() is not None]
+        return {
+            "version": self.version,
+            "reloading": self.reloading,
+            "draining": len(self._retired),
+            "last_reload": self.last_reload,
+            "last_error": self.last_error,
+        }
+
+    async def reload(self) -> dict:
+        """
+        Load, warm and swap in the checkpoint.
+
+        Returns:
+            status() after the swap
+
+        Raises:
+            ReloadInProgress: If another reload is running
+            Exception: Whatever the loader/warmer raised (old model keeps serving)
+        """
+        if self._lock.locked():
+            raise ReloadInProgress("reload already in progress")
+
+        async with self._lock:
+            try:
+                model, cfg = await run_in_threadpool(self._load_and_warm)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+
+            # Swap without awaiting so no request sees a mismatched model/cfg
+            state = self.app.state
+            old = state.model
+            state.model, state.cfg = model, cfg
+            state.model_ready = True
+            state.registry.put(DEFAULT_MODEL_ID, model, cfg, pinned=True)
+            if old is not None:
+                self._retired.append(weakref.ref(old))
+            del old
+
+            self.version += 1
+            self.last_reload = time.time()
+            self.last_error = None
+        return self.status()
+
+    async def watch(self):
+        """
+        Poll watch_path and reload when it changes.
+
+        A change is acted on only once the file's (mtime, size) has been
+        stable for one full poll interval, so partially copied checkpoints
+        are not loaded. Runs until cancelled.
+        """
+        if self.watch_path is None or self.poll_seconds <= 0:
+            return
+        seen = self._signature()
+        pending = None
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            current = self._signature()
+            if current is None or current == seen:
+                pending = None
+                continue
+            if current != pending:
+                pending = current
+                continue
+            try:
+                await self.reload()
+                seen = current
+            except ReloadInProgress:
+                pass
+            except Exception:
+                # last_error is recorded; keep serving and retry on next change
+                seen = current
+            pending = None
+
+    def _signature(self) -> tuple[float, int] | None:
+        """(mtime, size) of the watched file, or None if missing."""
+        try:
+            stat = self.watch_path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def _load_and_warm(self):
+        """Blocking load + warm-up (runs in a worker thread)."""
+        model, cfg = self.loader()
+        if self.warmer is not None:
+            self.warmer(model, cfg)
+        return model, cfg
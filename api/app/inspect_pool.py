@@ -0,0 +1,192 @@
+"""Bounded executor for attention inspection jobs, kept off the event loop."""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+POLL_SECONDS = 0.05  # disconnect / chat-queue checks while waiting
+
+
+class InspectBusy(Exception):
+    """Every worker and queue place is taken."""
+
+
+class InspectTimeout(Exception):
+    """The job did not finish within the timeout."""
+
+
+class InspectCancelled(Exception):
+    """The client disconnected while the job waited or ran."""
+
+
+def _lower_priority(nice: int):
+    # Linux threads have their own nice value; elsewhere this is a no-op
+    if nice and hasattr(os, "setpriority"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+        except OSError:
+            pass
+
+
+class InspectExecutor:
+    """
+    Runs inspection jobs (full forwards and their t x t JSON conversion) on
+    a dedicated thread pool, so they never block the event loop or take a
+    chat step slot.
+
+    At most `workers` jobs run at once and `queue` more may wait; beyond
+    that, jobs are refused. Chat generation has priority: a job does not
+    start while chat steps are queued in the scheduler, but only for up to
+    `max_deferred_steps` chat steps, since with busy streams the queue may
+    never drain; worker threads also run at a lower OS priority (nice)
+    where supported. A job that times
+    out or whose client disconnects is abandoned: a queued one never
+    starts, a running one finishes in its worker (which stays counted
+    against the limit) and its result is dropped.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int = 1,
+        queue: int = 4,
+        timeout: float = 30.0,
+        nice: int = 10,
+        scheduler=None,
+        max_deferred_steps: int = 8,
+    ):
+        """
+        Args:
+            workers: Jobs run at once
+            queue: Jobs allowed to wait for a worker
+            timeout: Seconds from submission until a job is abandoned
+            nice: Worker thread niceness (0 = unchanged)
+            scheduler: FairScheduler whose waiting chat steps go first (optional)
+            max_deferred_steps: Chat steps a job with a worker lets go first
+        """
+        self.workers = workers
+        self.queue = queue
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.max_deferred_steps = max_deferred_steps
+        self.pending = 0  # admitted jobs not yet finished or abandoned
+        self.running = 0  # jobs occupying a worker
+        self.rejected_total = 0
+        self.timeouts_total = 0
+        self.cancelled_total = 0
+        self._waiters: list[asyncio.Future] = []
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="inspect",
+            initializer=_lower_priority,
+            initargs=(nice,),
+        )
+
+    def _admit(self):
+        if self.pending >= self.workers + self.queue:
+            self.rejected_total += 1
+            raise InspectBusy(f"{self.pending} inspection jobs in progress, please retry")
+        self.pending += 1
+
+    async def _wait(self, awaitable, deadline: float, is_disconnected):
+        """Await a future, giving up at deadline or when the client disconnects."""
+        loop = asyncio.get_running_loop()
+        future = asyncio.ensure_future(awaitable)
+        while True:
+            remaining = deadline - loop.time()
+            done, _ = await asyncio.wait({future}, timeout=max(0.0, min(POLL_SECONDS, remaining)))
+            if done:
+                return future.result()
+            if loop.time() >= deadline:
+                future.cancel()
+                self.timeouts_total += 1
+                raise InspectTimeout(f"Inspection did not finish within {self.timeout:g}s")
+            if is_disconnected is not None and await is_disconnected():
+                future.cancel()
+                self.cancelled_total += 1
+                raise InspectCancelled()
+
+    async def _acquire(self, deadline: float, is_disconnected):
+        """Take a worker (FIFO), then let waiting chat steps go first, up to max_deferred_steps."""
+        while self.running >= self.workers or self._waiters:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await self._wait(future, deadline, is_disconnected)
+            finally:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+            if self.running < self.workers:
+                break
+        self.running += 1
+        try:
+            if self.scheduler is not None:
+                first = self.scheduler.dispatched
+                while self.scheduler.waiting and self.scheduler.dispatched - first < self.max_deferred_steps:
+                    await self._wait(asyncio.sleep(POLL_SECONDS), deadline, is_disconnected)
+        except BaseException:
+            self._release()
+            raise
+
+    def _release(self):
+        self.running -= 1
+        if self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _submit(self, fn, *args) -> asyncio.Future:
+        """Run fn in the pool; the worker is released when it returns, even if abandoned."""
+        future = asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+        def finished(f):
+            self._release()
+            if not f.cancelled():
+                f.exception()  # retrieved, so abandoned failures aren't logged as unhandled
+
+        future.add_done_callback(finished)
+        return future
+
+    async def run(self, fn: Callable, *args, is_disconnected: Callable[[], Awaitable[bool]] | None = None):
+        """
+        Run fn(*args) on a worker.
+
+        Args:
+            fn: Blocking function
+            is_disconnected: Async check of the client connection (e.g. request.is_disconnected)
+
+        Returns:
+            fn's result (its exceptions propagate)
+
+        Raises:
+            InspectBusy: If the queue is full
+            InspectTimeout: If the job did not finish in time
+            InspectCancelled: If the client disconnected
+        """
+        self._admit()
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        try:
+            await self._acquire(deadline, is_disconnected)
+            return await self._wait(asyncio.shield(self._submit(fn, *args)), deadline, is_disconnected)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        """Stop accepting work; running jobs finish in the background."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def status(self) -> dict:
+        """Workers, queue and abandoned-job counts."""
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": max(self.pending - self.running, 0),
+            "queue_limit": self.queue,
+            "timeout_seconds": self.timeout,
+            "max_deferred_steps": self.max_deferred_steps,
+            "rejected_total": self.rejected_total,
+            "timeouts_total": self.timeouts_total,
+            "cancelled_total": self.cancelled_total,
+        }
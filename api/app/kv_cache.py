@@ -0,0 +1,288 @@
+"""KV-cached incremental decoding with rolling context and attention sinks."""
+
+import math
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from niels_gpt.config import ModelConfig
+from niels_gpt.model.rope import rope_cache, apply_rope
+
+
+def attn_projections(attn: nn.Module, C: int) -> tuple[list[nn.Linear], nn.Linear]:
+    """
+    Locate the input and output projections of a CausalSelfAttention module.
+
+    Supports a fused qkv Linear (C -> 3C) or separate q, k, v Linears,
+    followed by the output projection, in registration order.
+
+    Returns:
+        (input_projections, output_projection)
+
+    Raises:
+        ValueError: If the module layout is not recognized
+    """
+    linears = [m for m in attn.modules() if isinstance(m, nn.Linear)]
+    if len(linears) == 2 and linears[0].out_features == 3 * C:
+        return linears[:1], linears[1]
+    if len(linears) == 4 and all(m.out_features == C for m in linears):
+        return linears[:3], linears[3]
+    raise ValueError(
+        "unrecognized attention layout: expected qkv+proj or q,k,v+proj Linears"
+    )
+
+
+def project_qkv(
+    projections: list[nn.Linear],
+    x: torch.Tensor,
+    H: int,
+    D: int,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Project (B, t, C) activations to per-head q, k, v of shape (B, H, t, D).
+    """
+    B, t, C = x.shape
+    if len(projections) == 1:
+        q, k, v = projections[0](x).split(C, dim=-1)
+    else:
+        q, k, v = (proj(x) for proj in projections)
+    return tuple(z.view(B, t, H, D).transpose(1, 2) for z in (q, k, v))
+
+
+class KVCache:
+    """
+    Per-layer pre-RoPE keys and values, each (B, H, n, D).
+
+    Keeps the first `sinks` positions forever and evicts the oldest
+    non-sink positions once `capacity` is reached, so n <= capacity.
+    """
+
+    def __init__(self, n_layers: int, capacity: int, sinks: int):
+        """
+        Args:
+            n_layers: Number of transformer blocks
+            capacity: Maximum cached positions (normally cfg.T)
+            sinks: Leading positions that are never evicted
+        """
+        if not (0 <= sinks < capacity):
+            raise ValueError(f"sinks must be in [0, {capacity - 1}], got {sinks}")
+        self.capacity = capacity
+        self.sinks = sinks
+        self.k: list[torch.Tensor | None] = [None] * n_layers
+        self.v: list[torch.Tensor | None] = [None] * n_layers
+        self.evicted = 0  # transcript tokens dropped between sinks and window
+
+    @property
+    def length(self) -> int:
+        """Number of cached positions."""
+        return 0 if self.k[0] is None else self.k[0].shape[2]
+
+    def make_room(self, n_new: int):
+        """Evict the oldest non-sink positions so n_new more fit."""
+        overflow = self.length + n_new - self.capacity
+        if overflow <= 0:
+            return
+        s = self.sinks
+        for i in range(len(self.k)):
+            self.k[i] = torch.cat([self.k[i][:, :, :s], self.k[i][:, :, s + overflow:]], dim=2)
+            self.v[i] = torch.cat([self.v[i][:, :, :s], self.v[i][:, :, s + overflow:]], dim=2)
+        self.evicted += overflow
+
+    def append(self, layer: int, k: torch.Tensor, v: torch.Tensor):
+        """Append (B, H, t, D) keys/values for one layer."""
+        if self.k[layer] is None:
+            self.k[layer], self.v[layer] = k, v
+        else:
+            self.k[layer] = torch.cat([self.k[layer], k], dim=2)
+            self.v[layer] = torch.cat([self.v[layer], v], dim=2)
+
+    def repeat(self, n: int) -> "KVCache":
+        """Return a copy with the batch dimension repeated n times."""
+        out = KVCache(len(self.k), self.capacity, self.sinks)
+        out.k = [None if k is None else k.repeat(n, 1, 1, 1) for k in self.k]
+        out.v = [None if v is None else v.repeat(n, 1, 1, 1) for v in self.v]
+        out.evicted = self.evicted
+        return out
+
+    def select(self, index: torch.Tensor):
+        """Keep only the batch rows in index (e.g. drop finished sequences)."""
+        self.k = [None if k is None else k.index_select(0, index) for k in self.k]
+        self.v = [None if v is None else v.index_select(0, index) for v in self.v]
+
+
+def make_decoder(model, cfg: ModelConfig, *, sinks: int = 0) -> "CachedDecoder":
+    """
+    Cached decoder for model: the model's own (e.g. an ONNX backend's
+    cached_decoder) if it provides one, else a CachedDecoder over its weights.
+    """
+    factory = getattr(model, "cached_decoder", None)
+    if factory is not None:
+        return factory(cfg, sinks=sinks)
+    return CachedDecoder(model, cfg, sinks=sinks)
+
+
+class CachedDecoder:
+    """
+    Incremental decoder over a loaded GPT's weights.
+
+    Runs the same blocks as GPT.forward, but caches keys/values so each new
+    token costs one position per layer instead of a full-window forward.
+    RoPE is applied on the fly using positions within the cache (sinks at
+    0..sinks-1, the recent window after them), matching how the model sees a
+    cropped window, so decoding can continue past cfg.T at constant cost.
+    """
+
+    def __init__(self, model, cfg: ModelConfig, *, sinks: int = 0, capacity: int | None = None):
+        """
+        Args:
+            model: GPT model in eval mode
+            cfg: Model config
+            sinks: Leading tokens kept when the context window rolls
+            capacity: Maximum cached positions (default cfg.T)
+        """
+        self.model = model
+        self.cfg = cfg
+        self.capacity = capacity or cfg.T
+        self.cache = KVCache(cfg.L, self.capacity, sinks)
+
+        weight = model.tok_emb.weight
+        self.sin, self.cos = rope_cache(
+            self.capacity, cfg.D, device=weight.device, dtype=weight.dtype
+        )
+        self.projections = [attn_projections(block.attn, cfg.C) for block in model.blocks]
+
+    @torch.no_grad()
+    def prefill(
+        self,
+        ids: torch.Tensor,
+        *,
+        layers: list[int],
+        logit_lens: bool = False,
+    ) -> tuple[torch.Tensor, dict]:
+        """
+        Fill the cache from a prompt.
+
+        If the prompt is longer than the capacity, the first `sinks` tokens
+        and the most recent capacity - sinks tokens are kept.
+
+        Args:
+            ids: (B, P) int64 token ids on the model device
+            layers: Layers whose last-row attention to return
+            logit_lens: If True, also return per-layer logit-lens logits
+
+        Returns:
+            (logits, traces): logits (B, V) for the last position, traces as
+            in tracing.forward_with_layer_traces
+        """
+        P = ids.shape[1]
+        if P > self.capacity:
+            s = self.cache.sinks
+            ids = torch.cat([ids[:, :s], ids[:, P - (self.capacity - s):]], dim=1)
+            self.cache.evicted += P - self.capacity
+        return self._run(ids, layers=layers, logit_lens=logit_lens)
+
+    @torch.no_grad()
+    def step(
+        self,
+        token_ids: torch.Tensor,
+        *,
+        layers: list[int],
+        logit_lens: bool = False,
+    ) -> tuple[torch.Tensor, dict]:
+        """
+        Append one token per sequence and return next-token logits.
+
+        Args:
+            token_ids: (B,) int64 token ids on the model device
+            layers: Layers whose last-row attention to return
+            logit_lens: If True, also return per-layer logit-lens logits
+
+        Returns:
+            (logits, traces) as in prefill
+        """
+        return self._run(token_ids[:, None], layers=layers, logit_lens=logit_lens)
+
+    def fork(self, n: int) -> "CachedDecoder":
+        """Return a decoder whose cache is this one's repeated n times along batch."""
+        out = object.__new__(type(self))
+        out.__dict__.update(self.__dict__)
+        out.cache = self.cache.repeat(n)
+        return out
+
+    def select(self, index: torch.Tensor):
+        """Keep only the batch rows in index."""
+        self.cache.select(index)
+
+    def _run(
+        self,
+        ids: torch.Tensor,
+        *,
+        layers: list[int],
+        logit_lens: bool,
+        full_attn: bool = False,
+    ) -> tuple[torch.Tensor, dict]:
+        """
+        Run new positions through every block, extending the cache.
+
+        With full_attn, traces also holds "attn_full": {layer: (B, H, t_new, n)}.
+        """
+        model, cfg = self.model, self.cfg
+        t_new = ids.shape[1]
+        wanted = set(layers)
+        attn_rows = {}
+        attn_full = {}
+        lens_logits = {}
+
+        self.cache.make_room(t_new)
+        n = self.cache.length + t_new
+
+        # RoPE tables for query positions n-t_new..n-1 and key positions 0..n-1
+        sin_q, cos_q = self.sin[:, :, n - t_new:n], self.cos[:, :, n - t_new:n]
+        sin_k, cos_k = self.sin[:, :, :n], self.cos[:, :, :n]
+
+        # Causal mask between new queries and all cached keys
+        mask = None
+        if t_new > 1:
+            q_pos = torch.arange(n - t_new, n, device=ids.device)[:, None]
+            k_pos = torch.arange(n, device=ids.device)[None, :]
+            mask = k_pos <= q_pos  # (t_new, n)
+
+        h = model.tok_emb(ids)
+        for i, block in enumerate(model.blocks):
+            in_proj, out_proj = self.projections[i]
+            x = block.ln1(h)
+            q, k, v = project_qkv(in_proj, x, cfg.H, cfg.D)
+            self.cache.append(i, k, v)
+            k_all, v_all = self.cache.k[i], self.cache.v[i]
+
+            if t_new == n:
+                q, k_all = apply_rope(q, k_all, sin_k, cos_k)
+            else:
+                q, _ = apply_rope(q, q, sin_q, cos_q)
+                _, k_all = apply_rope(k_all, k_all, sin_k, cos_k)
+
+            scores = (q @ k_all.transpose(-2, -1)) / math.sqrt(cfg.D)  # (B, H, t_new, n)
+            if mask is not None:
+                scores = scores.masked_fill(~mask, float("-inf"))
+            probs = F.softmax(scores, dim=-1)
+            if i in wanted:
+                attn_rows[i] = probs[:, :, -1, :]
+                if full_attn:
+                    attn_full[i] = probs
+
+            y = (probs @ v_all).transpose(1, 2).reshape(h.shape[0], t_new, cfg.C)
+            h = h + out_proj(y)
+            h = h + block.mlp(block.ln2(h))
+
+            if logit_lens and i in wanted:
+                lens_logits[i] = model.lm_head(model.ln_f(h[:, -1, :]))
+
+        logits = model.lm_head(model.ln_f(h[:, -1, :]))
+
+        traces = {"attn_rows": attn_rows}
+        if full_attn:
+            traces["attn_full"] = attn_full
+        if logit_lens:
+            traces["lens_logits"] = lens_logits
+        return logits, traces
@@ -1,45 +1,246 @@
 """FastAPI application factory and routes."""
 
-from contextlib import asynccontextmanager
+import asyncio
+import functools
+import secrets
+import uuid
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
-from niels_gpt.chat_format import format_chat
-
-from .checkpoint import load_model
-from .config import ALLOWED_ORIGINS, MAX_PROMPT_BYTES, DEVICE
-from .schemas import ChatRequest, FullAttnRequest, ErrorResponse
+from .config import (
+    ALLOWED_ORIGINS,
+    MAX_PROMPT_BYTES,
+    DEVICE,
+    INFERENCE_BACKEND,
+    FUSED_ATTENTION,
+    ONNX_DIR,
+    NUMPY_WEIGHTS,
+    CPU_PROFILE,
+    CPU_OBJECTIVE,
+    CPU_PIN_CORES,
+    CKPT_DIR,
+    CKPT_PATH,
+    CKPT_WATCH_SECONDS,
+    DEFAULT_MODEL_ID,
+    MODEL_MEMORY_BUDGET_MB,
+    ADMIN_TOKEN,
+    COALESCE_REQUESTS,
+    STEP_SLOTS,
+    CLIENT_WEIGHTS,
+    QOS_ENABLED,
+    QOS_QUEUE_DEPTH,
+    QOS_TARGET_STEP_MS,
+    QOS_RECOVER_SECONDS,
+    TRACE_ARCHIVE_DIR,
+    TRACE_ARCHIVE_SHARD_GENERATIONS,
+    MEMORY_BUDGET_MB,
+    MEMORY_TRACE_PYTHON,
+    SESSION_MAX,
+    SESSION_TTL_SECONDS,
+    INSPECT_WORKERS,
+    INSPECT_QUEUE,
+    INSPECT_TIMEOUT_SECONDS,
+    INSPECT_NICE,
+    INSPECT_MAX_DEFERRED_STEPS,
+)
+from .coalesce import RequestCoalescer
+from .scheduler import FairScheduler, parse_weights
+from .qos import QosController
+from .sessions import SessionStore, SessionNotFound, SessionBusy, SessionTooLarge
+from .inspect_pool import InspectExecutor, InspectBusy, InspectTimeout, InspectCancelled
+from .memory import (
+    Estimate,
+    MemoryAccountant,
+    MemoryBudgetExceeded,
+    current_rss,
+    estimate_attn_summary,
+    estimate_chat,
+    estimate_full_attn,
+    peak_rss,
+)
+from .hot_swap import HotSwapper, ReloadInProgress
+from .registry import ModelRegistry, ModelNotFound
+from .schemas import (
+    ChatRequest,
+    GenerationParams,
+    SessionCreateRequest,
+    SessionTurnRequest,
+    FullAttnRequest,
+    AttnSummaryRequest,
+    ErrorResponse,
+)
 from .rate_limit import rate_limiter
-from .generation import stream_chat_events, generate_full_attn
-from .sse import stream_sse_events
+from .tracing import trace_store, layers_from_mask
+from .sse import forward_counter, stream_sse_events
+
+# torch, niels_gpt and huggingface_hub are imported lazily (inside the
+# functions that need them) so the server binds and answers /health
+# immediately while the model loads in the background.
+
+
+def load_default_model(on_stage=None):
+    """
+    Blocking download -> load -> warm of the default checkpoint on the
+    configured INFERENCE_BACKEND.
+
+    Args:
+        on_stage: Optional callback receiving each readiness stage
+
+    Returns:
+        (model, config) tuple
+    """
+    if INFERENCE_BACKEND == "numpy":
+        from .numpy_engine import load_numpy_model
+
+        def load_torch():
+            from .checkpoint import load_model
+
+            return load_model(on_stage=on_stage)
+
+        if on_stage is not None:
+            on_stage("loading")
+        _model, _cfg = load_numpy_model(NUMPY_WEIGHTS, load_torch=load_torch, source=CKPT_PATH)
+        if on_stage is not None:
+            on_stage("warming")
+        _model.warm()
+        return _model, _cfg
+
+    from .checkpoint import load_model, warm_model
+
+    if INFERENCE_BACKEND == "onnx":
+        from .onnx_backend import load_onnx_model
+
+        _model, _cfg = load_onnx_model(
+            ONNX_DIR, load_torch=lambda: load_model(on_stage=on_stage), source=CKPT_PATH
+        )
+    else:
+        _model, _cfg = load_model(on_stage=on_stage)
+        if FUSED_ATTENTION:
+            from .fused_forward import fuse_model
 
+            _model = fuse_model(_model, _cfg)
+    if on_stage is not None:
+        on_stage("warming")
+    warm_model(_model, _cfg, DEVICE)
 
-def create_app(*, model=None, cfg=None, load_on_startup: bool = True) -> FastAPI:
+    # Import the inference path now so the first request doesn't pay for it
+    from . import generation  # noqa: F401
+    return _model, _cfg
+
+
+def load_registry_checkpoint(path):
+    """Load an extra checkpoint for the registry (fused like the default model)."""
+    from .checkpoint import load_checkpoint_file
+
+    _model, _cfg = load_checkpoint_file(path)
+    if FUSED_ATTENTION:
+        from .fused_forward import fuse_model
+
+        _model = fuse_model(_model, _cfg)
+    return _model, _cfg
+
+
+def apply_cpu_tuning() -> dict | None:
+    """
+    Apply CPU_PROFILE's thread counts (and core pinning if enabled).
+
+    Returns:
+        What was applied, or None when no profile is configured
+    """
+    if DEVICE != "cpu" or CPU_PROFILE is None or not CPU_PROFILE.exists():
+        return None
+    if INFERENCE_BACKEND == "numpy":
+        return None  # torch thread settings don't apply (and would import torch)
+    from .cpu_tuning import load_profile, apply_profile
+
+    return apply_profile(
+        load_profile(CPU_PROFILE),
+        CPU_OBJECTIVE,
+        pin=CPU_PIN_CORES,
+        lock_dir=CPU_PROFILE.with_name(CPU_PROFILE.stem + ".slots"),
+    )
+
+
+def transcript_bytes(messages: list[dict]) -> int:
+    """UTF-8 size of the formatted chat transcript."""
+    return len(transcript_ids(messages))
+
+
+def transcript_ids(messages: list[dict]) -> list[int]:
+    """Token ids of the formatted chat transcript (byte-level: one per UTF-8 byte)."""
+    from niels_gpt.chat_format import format_chat
+
+    return list(format_chat(messages).encode("utf-8"))
+
+
+def create_app(
+    *,
+    model=None,
+    cfg=None,
+    load_on_startup: bool = True,
+    registry: ModelRegistry | None = None,
+) -> FastAPI:
     """
     Create FastAPI application.
 
     Args:
         model: Optional GPT model (for testing). If None, loads on startup.
         cfg: Optional ModelConfig (for testing). If None, loads on startup.
-        load_on_startup: If True and model/cfg are None, load during startup event.
-                        If False, load immediately (for backwards compat).
+        load_on_startup: If True and model/cfg are None, load in a background
+                        task started at startup; requests get 503 with the
+                        current stage until it finishes.
+        registry: Optional model registry for requests naming a model id.
+                  Defaults to one over CKPT_DIR.
 
     Returns:
         FastAPI application instance
     """
+    async def background_load(app: FastAPI):
+        """Load the default model off the event loop, tracking readiness stages."""
+        def set_stage(stage: str):
+            app.state.load_stage = stage
+
+        def load():
+            # Thread counts must be set before the first torch op
+            app.state.cpu_tuning = apply_cpu_tuning()
+            return load_default_model(set_stage)
+
+        try:
+            _model, _cfg = await run_in_threadpool(load)
+        except Exception as e:
+            app.state.load_stage = "failed"
+            app.state.load_error = f"{type(e).__name__}: {e}"
+            return
+        app.state.model = _model
+        app.state.cfg = _cfg
+        app.state.registry.put(DEFAULT_MODEL_ID, _model, _cfg, pinned=True)
+        app.state.model_ready = True
+        app.state.load_stage = "ready"
+
     # Define lifespan for model loading
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        # Startup: load model if needed
+        # Startup: load model in the background if needed
+        tasks = []
         if not app.state.model_ready and load_on_startup:
-            _model, _cfg = load_model()
-            app.state.model = _model
-            app.state.cfg = _cfg
-            app.state.model_ready = True
+            tasks.append(asyncio.create_task(background_load(app)))
+
+        # Watch the checkpoint for replacement (no-op unless enabled)
+        tasks.append(asyncio.create_task(app.state.swapper.watch()))
         yield
-        # Shutdown: cleanup if needed
-        pass
+        # Shutdown: stop background tasks
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        # Write recorded traces still buffered
+        if app.state.trace_recorder is not None:
+            await run_in_threadpool(app.state.trace_recorder.flush)
+        app.state.inspect.shutdown()
 
     app = FastAPI(title="niels-gpt Inference API", lifespan=lifespan)
 
@@ -56,11 +257,244 @@ def create_app(*, model=None, cfg=None, load_on_startup: bool = True) -> FastAPI
     app.state.model = model
     app.state.cfg = cfg
     app.state.model_ready = model is not None and cfg is not None
+    # Readiness stage: pending -> downloading -> loading -> warming -> ready (or failed)
+    app.state.load_stage = "ready" if app.state.model_ready else "pending"
+    app.state.load_error = None
+    app.state.cpu_tuning = None
+
+    # Registry for additional checkpoints; the default model is pinned
+    app.state.registry = registry or ModelRegistry(
+        CKPT_DIR,
+        budget_bytes=MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
+        loader=load_registry_checkpoint,
+    )
+    if app.state.model_ready:
+        app.state.registry.put(DEFAULT_MODEL_ID, model, cfg, pinned=True)
+
+    # Background reload of the default checkpoint
+    app.state.swapper = HotSwapper(
+        app,
+        loader=load_default_model,
+        watch_path=CKPT_PATH,
+        poll_seconds=CKPT_WATCH_SECONDS,
+    )
+    app.state.admin_token = ADMIN_TOKEN
+    app.state.coalescer = RequestCoalescer(enabled=COALESCE_REQUESTS)
+    app.state.scheduler = FairScheduler(STEP_SLOTS, parse_weights(CLIENT_WEIGHTS))
+    app.state.trace_recorder = None
+    if TRACE_ARCHIVE_DIR is not None:
+        from .trace_archive import TraceRecorder
+
+        app.state.trace_recorder = TraceRecorder(
+            TRACE_ARCHIVE_DIR, shard_generations=TRACE_ARCHIVE_SHARD_GENERATIONS
+        )
+    app.state.qos = QosController(
+        app.state.scheduler,
+        enabled=QOS_ENABLED,
+        queue_depth=QOS_QUEUE_DEPTH,
+        target_step_ms=QOS_TARGET_STEP_MS,
+        recover_seconds=QOS_RECOVER_SECONDS,
+    )
+    app.state.sessions = SessionStore(
+        max_sessions=SESSION_MAX, ttl_seconds=SESSION_TTL_SECONDS, max_tokens=MAX_PROMPT_BYTES
+    )
+    app.state.memory = MemoryAccountant(
+        MEMORY_BUDGET_MB * 1024 * 1024, trace_python=MEMORY_TRACE_PYTHON
+    )
+    app.state.inspect = InspectExecutor(
+        workers=INSPECT_WORKERS,
+        queue=INSPECT_QUEUE,
+        timeout=INSPECT_TIMEOUT_SECONDS,
+        nice=INSPECT_NICE,
+        scheduler=app.state.scheduler,
+        max_deferred_steps=INSPECT_MAX_DEFERRED_STEPS,
+    )
+
+    def check_admin(request: Request):
+        """Return a 403 JSONResponse unless the request carries the admin token."""
+        token = request.headers.get("x-admin-token", "")
+        expected = app.state.admin_token
+        if not expected or not secrets.compare_digest(token, expected):
+            return JSONResponse(
+                status_code=403,
+                content=ErrorResponse(
+                    error="Admin token missing or invalid",
+                    code="forbidden"
+                ).model_dump()
+            )
+        return None
+
+    def not_ready_response():
+        """503 response naming the current loading stage."""
+        return JSONResponse(
+            status_code=503,
+            content=ErrorResponse(
+                error=f"Model not ready yet ({app.state.load_stage}), please retry",
+                code="model_loading"
+            ).model_dump()
+        )
+
+    def degraded_response():
+        """503 response for endpoints switched off by the current QoS level."""
+        return JSONResponse(
+            status_code=503,
+            content=ErrorResponse(
+                error="Server under heavy load: full attention is temporarily disabled, please retry",
+                code="degraded"
+            ).model_dump()
+        )
+
+    def memory_budget_response(e: MemoryBudgetExceeded):
+        """503 while in-flight requests hold the memory budget, 413 if the request could never fit."""
+        return JSONResponse(
+            status_code=503 if e.retryable else 413,
+            content=ErrorResponse(error=str(e), code="memory_budget").model_dump()
+        )
+
+    async def run_inspection(request: Request, fn, **kwargs):
+        """
+        Run an inspection function on the inspect pool.
+
+        Returns:
+            (result, None) or (None, error response) if the pool is full,
+            the job timed out or the client went away
+        """
+        try:
+            result = await app.state.inspect.run(
+                functools.partial(fn, **kwargs), is_disconnected=request.is_disconnected
+            )
+            return result, None
+        except InspectBusy as e:
+            status, code, message = 503, "inspect_busy", str(e)
+        except InspectTimeout as e:
+            status, code, message = 504, "inspect_timeout", str(e)
+        except InspectCancelled:
+            status, code, message = 499, "client_closed", "Client closed the request"
+        return None, JSONResponse(
+            status_code=status,
+            content=ErrorResponse(error=message, code=code).model_dump()
+        )
+
+    async def resolve_model(model_id: str | None):
+        """
+        Look up (model, cfg) for a request, loading from CKPT_DIR if needed.
+
+        Returns:
+            (model, cfg, None) on success, or (None, None, JSONResponse) on error
+        """
+        if model_id is None or model_id == DEFAULT_MODEL_ID:
+            app.state.registry.record_request(DEFAULT_MODEL_ID)
+            return app.state.model, app.state.cfg, None
+        try:
+            _model, _cfg = await run_in_threadpool(app.state.registry.get, model_id)
+        except ModelNotFound:
+            return None, None, JSONResponse(
+                status_code=404,
+                content=ErrorResponse(
+                    error=f"Unknown model: {model_id}",
+                    code="model_not_found"
+                ).model_dump()
+            )
+        app.state.registry.record_request(model_id)
+        return _model, _cfg, None
 
     @app.get("/health")
     async def health():
         """Health check endpoint."""
-        return {"ok": True, "model_ready": app.state.model_ready}
+        return {
+            "ok": True,
+            "model_ready": app.state.model_ready,
+            "stage": app.state.load_stage,
+            "stage_error": app.state.load_error,
+            "default_model": DEFAULT_MODEL_ID,
+            "models": app.state.registry.status(),
+            "reload": app.state.swapper.status(),
+            "cpu_tuning": app.state.cpu_tuning,
+            "coalescing": app.state.coalescer.status(),
+            "scheduler": app.state.scheduler.status(),
+            "qos": app.state.qos.status(),
+            "trace_archive": app.state.trace_recorder.status() if app.state.trace_recorder else None,
+            "memory": app.state.memory.status(),
+            "sessions": app.state.sessions.status(),
+            "inspect": app.state.inspect.status(),
+        }
+
+    @app.get("/admin/memory")
+    async def admin_memory(request: Request):
+        """
+        Process memory, model weights, cache sizes and the largest consumers.
+
+        Per-request figures are estimates plus the growth of process-wide
+        high-water marks while each ran (see RequestMemory), so under
+        concurrency they include other requests' growth.
+        """
+        error = check_admin(request)
+        if error is not None:
+            return error
+
+        models = app.state.registry.status()
+        recorder = app.state.trace_recorder
+        caches = {
+            "trace_store": trace_store.usage(),
+            "trace_archive_pending": (
+                {"bytes": recorder.pending_bytes(), **recorder.status()} if recorder else None
+            ),
+            "coalescer": app.state.coalescer.status(),
+        }
+        requests = app.state.memory.requests()
+
+        # Largest known consumers first
+        consumers = [
+            {"name": f"model:{m['id']}", "bytes": m["bytes"]} for m in models["warm"]
+        ]
+        consumers.append({"name": "trace_store", "bytes": caches["trace_store"]["bytes"]})
+        if recorder is not None:
+            consumers.append({"name": "trace_archive_pending", "bytes": caches["trace_archive_pending"]["bytes"]})
+        for r in requests["active"]:
+            consumers.append({
+                "name": f"request:{r['id']}:{r['kind']}",
+                "bytes": r["estimate_tensor_bytes"] + r["estimate_python_bytes"],
+            })
+        consumers.sort(key=lambda c: c["bytes"], reverse=True)
+
+        return {
+            "rss_bytes": current_rss(),
+            "peak_rss_bytes": peak_rss(),
+            "models": models,
+            "caches": caches,
+            "budget": app.state.memory.status(),
+            "requests": requests,
+            "consumers": consumers,
+            "python": await run_in_threadpool(app.state.memory.python_top),
+        }
+
+    @app.post("/admin/reload")
+    async def admin_reload(request: Request):
+        """
+        Load and warm the checkpoint in the background, then swap it in.
+
+        The current model keeps serving until the swap; in-flight streams
+        finish on the model they started with.
+        """
+        error = check_admin(request)
+        if error is not None:
+            return error
+
+        try:
+            return await app.state.swapper.reload()
+        except ReloadInProgress as e:
+            return JSONResponse(
+                status_code=409,
+                content=ErrorResponse(error=str(e), code="reload_in_progress").model_dump()
+            )
+        except Exception as e:
+            return JSONResponse(
+                status_code=500,
+                content=ErrorResponse(
+                    error=f"Reload failed, still serving previous model: {e}",
+                    code="reload_failed"
+                ).model_dump()
+            )
 
     @app.post("/chat/stream")
     async def chat_stream(request: Request, req: ChatRequest):
@@ -71,13 +505,7 @@ def create_app(*, model=None, cfg=None, load_on_startup: bool = True) -> FastAPI
         """
         # Check model ready
         if not app.state.model_ready:
-            return JSONResponse(
-                status_code=503,
-                content=ErrorResponse(
-                    error="Model not ready yet, please retry",
-                    code="model_loading"
-                ).model_dump()
-            )
+            return not_ready_response()
 
         # Check rate limit
         client_ip = request.client.host
@@ -92,67 +520,358 @@ def create_app(*, model=None, cfg=None, load_on_startup: bool = True) -> FastAPI
 
         # Check prompt size
         messages_dict = [msg.model_dump() for msg in req.messages]
-        transcript = format_chat(messages_dict)
-        prompt_bytes = transcript.encode("utf-8")
-        if len(prompt_bytes) > MAX_PROMPT_BYTES:
+        prompt_ids = transcript_ids(messages_dict)
+        prompt_bytes = len(prompt_ids)
+        if prompt_bytes > MAX_PROMPT_BYTES:
             return JSONResponse(
                 status_code=413,
                 content=ErrorResponse(
-                    error=f"Prompt too large: {len(prompt_bytes)} bytes (max {MAX_PROMPT_BYTES})",
+                    error=f"Prompt too large: {prompt_bytes} bytes (max {MAX_PROMPT_BYTES})",
                     code="prompt_too_large"
                 ).model_dump()
             )
 
+        # Encoded once here; generation reuses the ids
+        return await open_chat_stream(
+            request,
+            req,
+            model_id=req.model,
+            messages_dict=messages_dict,
+            prompt_bytes=prompt_bytes,
+            prompt_ids=prompt_ids,
+        )
+
+    async def open_chat_stream(
+        request: Request,
+        req: GenerationParams,
+        *,
+        model_id: str | None,
+        messages_dict: list[dict],
+        prompt_bytes: int,
+        prompt_ids: list[int] | None = None,
+        wrap=None,
+        session_turn: tuple[str, int] | None = None,
+    ):
+        """
+        Validate, admit and start a generation; shared by /chat/stream and session turns.
+
+        Args:
+            request: The HTTP request (client identity for scheduling)
+            req: Sampling and tracing options
+            model_id: Registry model id (None = default)
+            messages_dict: Full transcript messages (recorded and coalesced on
+                           unless session_turn is given)
+            prompt_bytes: Transcript size, already checked against MAX_PROMPT_BYTES
+            prompt_ids: Pre-encoded transcript (skips formatting in generation)
+            wrap: Optional function applied to the event iterator after QoS
+            session_turn: (session id, turn index) for session turns; keys
+                          coalescing and archiving instead of the full history
+
+        Returns:
+            StreamingResponse of SSE events, or an error JSONResponse
+
+        Raises:
+            HTTPException: 422 on invalid options
+        """
+        client_ip = request.client.host
+
+        # Resolve model (default or registry checkpoint)
+        model, cfg, error = await resolve_model(model_id)
+        if error is not None:
+            return error
+
         # Validate trace_layer
-        if not (0 <= req.trace_layer < app.state.cfg.L):
+        if not (0 <= req.trace_layer < cfg.L):
             raise HTTPException(
                 status_code=422,
-                detail=f"trace_layer must be in [0, {app.state.cfg.L - 1}]"
+                detail=f"trace_layer must be in [0, {cfg.L - 1}]"
             )
 
-        # Generate events
+        # Expand multi-layer trace mask
+        trace_layers = None
+        generation_id = None
+        if req.trace_layers is not None:
+            if req.n > 1:
+                raise HTTPException(
+                    status_code=422,
+                    detail="trace_layers is not supported with n > 1"
+                )
+            if getattr(model, "backend", "torch") != "torch":
+                raise HTTPException(
+                    status_code=422,
+                    detail="trace_layers requires the torch backend"
+                )
+            try:
+                trace_layers = layers_from_mask(req.trace_layers, cfg.L)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            generation_id = uuid.uuid4().hex
+
+        # The numpy engine decodes one sample at a time
+        numpy_backend = getattr(model, "backend", "torch") == "numpy"
+        if numpy_backend and req.n > 1:
+            raise HTTPException(
+                status_code=422,
+                detail="n > 1 requires the torch or onnx backend"
+            )
+
+        # Under load, new generations run shorter
+        max_new_tokens = app.state.qos.cap_tokens(req.max_new_tokens)
+
+        # Reserve working memory (byte-level tokens: one per transcript byte)
+        estimate = estimate_chat(
+            cfg,
+            prompt_tokens=prompt_bytes,
+            max_new_tokens=max_new_tokens,
+            n=req.n,
+            context_mode=req.context_mode,
+            stored_layers=len(trace_layers) if trace_layers is not None else 0,
+        )
         try:
+            usage = app.state.memory.reserve("chat", estimate, label=model_id or DEFAULT_MODEL_ID)
+        except MemoryBudgetExceeded as e:
+            return memory_budget_response(e)
+
+        # Generate events
+        if numpy_backend:
+            from .numpy_engine import stream_chat_events
+        else:
+            from .generation import stream_chat_events
+
+        # A session turn is identified by its position, not by re-serializing
+        # a history that grows every turn
+        if session_turn is not None:
+            session_id, turn = session_turn
+            conversation = {"session_id": session_id, "turn": turn, "message": messages_dict[-1]}
+        else:
+            conversation = {"messages": messages_dict}
+
+        # Trace fidelity follows the QoS level step by step, at the source
+        qos = app.state.qos.stream(requested_tokens=req.max_new_tokens, max_new_tokens=max_new_tokens)
+
+        def start():
             events = stream_chat_events(
-                model=app.state.model,
-                cfg=app.state.cfg,
+                model=model,
+                cfg=cfg,
                 messages=messages_dict,
-                max_new_tokens=req.max_new_tokens,
+                max_new_tokens=max_new_tokens,
                 temperature=req.temperature,
                 top_k=req.top_k,
                 seed=req.seed,
                 trace_layer=req.trace_layer,
                 device=DEVICE,
+                trace_layers=trace_layers,
+                logit_lens=req.logit_lens,
+                trace_store=trace_store,
+                generation_id=generation_id,
+                context_mode=req.context_mode,
+                n=req.n,
+                timings=req.timings,
+                prompt_ids=prompt_ids,
+                qos=qos,
             )
+            # Archive per-step traces (once per generation, not per subscriber)
+            if app.state.trace_recorder is not None:
+                events = app.state.trace_recorder.record(events, {
+                    "model": model_id or DEFAULT_MODEL_ID,
+                    "backend": getattr(model, "backend", "torch"),
+                    **conversation,
+                    "max_new_tokens": max_new_tokens,
+                    "temperature": req.temperature,
+                    "top_k": req.top_k,
+                    "seed": req.seed,
+                    "trace_layer": req.trace_layer,
+                    "context_mode": req.context_mode,
+                })
+            return events
+
+        try:
+            # Identical requests share one in-flight generation; output only
+            # depends on these inputs. Multi-layer traces are stored per
+            # generation id, so those always run their own.
+            coalesced = False
+            if generation_id is None:
+                key = app.state.coalescer.make_key(
+                    model,
+                    **conversation,
+                    max_new_tokens=max_new_tokens,
+                    temperature=req.temperature,
+                    top_k=req.top_k,
+                    seed=req.seed,
+                    trace_layer=req.trace_layer,
+                    logit_lens=req.logit_lens,
+                    context_mode=req.context_mode,
+                    n=req.n,
+                    timings=req.timings,
+                )
+                events, coalesced = app.state.coalescer.subscribe(key, start)
+                if coalesced:
+                    # The shared generation is already accounted for
+                    app.state.memory.resize(usage, Estimate(0, estimate.python_bytes))
+            else:
+                events = start()
+
+            if wrap is not None:
+                events = wrap(events)
+            events = app.state.memory.track(events, usage)
 
             # Stream as SSE with proper headers
+            headers = {
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+                "Connection": "keep-alive",
+            }
+            if generation_id is not None:
+                headers["X-Generation-Id"] = generation_id
+            if coalesced:
+                headers["X-Coalesced"] = "1"
+            # Interleave with other streams one step at a time, fair per client
+            client = request.headers.get("x-api-key") or client_ip
             return StreamingResponse(
-                stream_sse_events(events),
+                app.state.scheduler.run(
+                    stream_sse_events(events, timings=req.timings), client, is_forward=forward_counter()
+                ),
                 media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "X-Accel-Buffering": "no",
-                    "Connection": "keep-alive",
-                },
+                headers=headers,
             )
         except ValueError as e:
+            app.state.memory.release(usage)
             raise HTTPException(status_code=422, detail=str(e))
 
-    @app.post("/inspect/full_attn")
-    async def inspect_full_attn(request: Request, req: FullAttnRequest):
+    def session_not_found_response(session_id: str):
+        return JSONResponse(
+            status_code=404,
+            content=ErrorResponse(
+                error=f"Session not found or expired: {session_id}",
+                code="session_not_found"
+            ).model_dump()
+        )
+
+    def session_too_large_response(e: SessionTooLarge):
+        return JSONResponse(
+            status_code=413,
+            content=ErrorResponse(error=str(e), code="prompt_too_large").model_dump()
+        )
+
+    @app.post("/sessions")
+    async def create_session(request: Request, req: SessionCreateRequest):
         """
-        Get full attention matrix for a given layer and head.
+        Start a conversation kept server-side.
 
-        Returns JSON with tokens and attention matrix.
+        Turns then send only their new message to
+        /sessions/{session_id}/chat/stream.
+        """
+        # Check rate limit (creating a session encodes its whole transcript)
+        client_ip = request.client.host
+        if not rate_limiter.allow(client_ip):
+            return JSONResponse(
+                status_code=429,
+                content=ErrorResponse(
+                    error="Rate limit exceeded",
+                    code="rate_limited"
+                ).model_dump()
+            )
+
+        messages_dict = [msg.model_dump() for msg in req.messages]
+        try:
+            session = await run_in_threadpool(app.state.sessions.create, messages_dict, req.model)
+        except SessionTooLarge as e:
+            return session_too_large_response(e)
+        return {**session.info(), "ttl_seconds": app.state.sessions.ttl_seconds}
+
+    @app.get("/sessions/{session_id}")
+    async def get_session(session_id: str):
+        """Get a session's messages and encoded length."""
+        try:
+            return app.state.sessions.get(session_id).info()
+        except SessionNotFound:
+            return session_not_found_response(session_id)
+
+    @app.delete("/sessions/{session_id}")
+    async def delete_session(session_id: str):
+        """End a session."""
+        try:
+            app.state.sessions.delete(session_id)
+        except SessionNotFound:
+            return session_not_found_response(session_id)
+        return {"deleted": session_id}
+
+    @app.post("/sessions/{session_id}/chat/stream")
+    async def session_chat_stream(request: Request, session_id: str, req: SessionTurnRequest):
+        """
+        Stream the reply to one new message in a session.
+
+        Same events as /chat/stream. The message and the reply are added to
+        the session when the done event is sent; a cancelled turn leaves the
+        session as it was.
         """
         # Check model ready
         if not app.state.model_ready:
+            return not_ready_response()
+
+        # Check rate limit
+        client_ip = request.client.host
+        if not rate_limiter.allow(client_ip):
+            return JSONResponse(
+                status_code=429,
+                content=ErrorResponse(
+                    error="Rate limit exceeded",
+                    code="rate_limited"
+                ).model_dump()
+            )
+
+        # Look up the session and build the prompt from its encoded history
+        sessions = app.state.sessions
+        message = req.message.model_dump()
+        try:
+            session = sessions.get(session_id)
+            prompt_ids, messages_dict = sessions.begin_turn(session, message)
+        except SessionNotFound:
+            return session_not_found_response(session_id)
+        except SessionBusy:
             return JSONResponse(
-                status_code=503,
+                status_code=409,
                 content=ErrorResponse(
-                    error="Model not ready yet, please retry",
-                    code="model_loading"
+                    error="A reply is already streaming in this session",
+                    code="session_busy"
                 ).model_dump()
             )
+        except SessionTooLarge as e:
+            return session_too_large_response(e)
+
+        try:
+            response = await open_chat_stream(
+                request,
+                req,
+                model_id=session.model,
+                messages_dict=messages_dict,
+                prompt_bytes=len(prompt_ids),
+                prompt_ids=prompt_ids,
+                wrap=lambda events: sessions.commit(events, session, message),
+                session_turn=(session.id, session.turn),
+            )
+        except Exception:
+            sessions.end_turn(session)
+            raise
+        if not isinstance(response, StreamingResponse):
+            sessions.end_turn(session)
+        return response
+
+    @app.post("/inspect/full_attn")
+    async def inspect_full_attn(request: Request, req: FullAttnRequest):
+        """
+        Get full attention matrix for a given layer and head.
+
+        Returns JSON with tokens and attention matrix, optionally windowed
+        and downsampled. With stream=true, returns NDJSON rows instead.
+        """
+        # Check model ready
+        if not app.state.model_ready:
+            return not_ready_response()
+
+        # Check load (full attention is disabled at high QoS levels)
+        if not app.state.qos.level().full_attn:
+            return degraded_response()
 
         # Check rate limit
         client_ip = request.client.host
@@ -167,30 +886,256 @@ def create_app(*, model=None, cfg=None, load_on_startup: bool = True) -> FastAPI
 
         # Check prompt size
         messages_dict = [msg.model_dump() for msg in req.messages]
-        transcript = format_chat(messages_dict)
-        prompt_bytes = transcript.encode("utf-8")
-        if len(prompt_bytes) > MAX_PROMPT_BYTES:
+        prompt_bytes = transcript_bytes(messages_dict)
+        if prompt_bytes > MAX_PROMPT_BYTES:
             return JSONResponse(
                 status_code=413,
                 content=ErrorResponse(
-                    error=f"Prompt too large: {len(prompt_bytes)} bytes (max {MAX_PROMPT_BYTES})",
+                    error=f"Prompt too large: {prompt_bytes} bytes (max {MAX_PROMPT_BYTES})",
                     code="prompt_too_large"
                 ).model_dump()
             )
 
+        # Resolve model (default or registry checkpoint)
+        model, cfg, error = await resolve_model(req.model)
+        if error is not None:
+            return error
+
+        if getattr(model, "backend", "torch") == "numpy":
+            raise HTTPException(
+                status_code=422,
+                detail="full attention requires the torch or onnx backend"
+            )
+
         # Generate full attention
+        from .generation import generate_full_attn, stream_full_attn
+
+        window = dict(
+            row_start=req.row_start,
+            row_end=req.row_end,
+            col_start=req.col_start,
+            col_end=req.col_end,
+            resolution=req.resolution,
+            pool=req.pool,
+        )
+
+        # Reserve working memory for the t x t attention and its JSON copy
+        estimate = estimate_full_attn(
+            cfg,
+            tokens=prompt_bytes,
+            row_start=req.row_start,
+            row_end=req.row_end,
+            col_start=req.col_start,
+            col_end=req.col_end,
+            resolution=req.resolution,
+            stream=req.stream,
+        )
         try:
-            result = generate_full_attn(
-                model=app.state.model,
-                cfg=app.state.cfg,
+            usage = app.state.memory.reserve("full_attn", estimate, label=req.model or DEFAULT_MODEL_ID)
+        except MemoryBudgetExceeded as e:
+            return memory_budget_response(e)
+
+        # Run the forward on the inspect pool (streamed rows are serialized
+        # in the threadpool as they are sent)
+        streaming = False
+        try:
+            result, error = await run_inspection(
+                request,
+                stream_full_attn if req.stream else generate_full_attn,
+                model=model,
+                cfg=cfg,
                 messages=messages_dict,
                 trace_layer=req.trace_layer,
                 head=req.head,
                 device=DEVICE,
+                **window,
+            )
+            if error is not None:
+                return error
+            if not req.stream:
+                return result
+            streaming = True
+            return StreamingResponse(
+                app.state.memory.track(result, usage),
+                media_type="application/x-ndjson",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        finally:
+            if not streaming:
+                app.state.memory.release(usage)
+
+    @app.post("/inspect/attn_summary")
+    async def inspect_attn_summary(request: Request, req: AttnSummaryRequest):
+        """
+        Get per-layer/per-head attention statistics for the transcript.
+
+        One forward pass covers every layer and head; fetch individual
+        matrices from /inspect/full_attn.
+        """
+        # Check model ready
+        if not app.state.model_ready:
+            return not_ready_response()
+
+        # Check load (full attention is disabled at high QoS levels)
+        if not app.state.qos.level().full_attn:
+            return degraded_response()
+
+        # Check rate limit
+        client_ip = request.client.host
+        if not rate_limiter.allow(client_ip):
+            return JSONResponse(
+                status_code=429,
+                content=ErrorResponse(
+                    error="Rate limit exceeded",
+                    code="rate_limited"
+                ).model_dump()
+            )
+
+        # Check prompt size
+        messages_dict = [msg.model_dump() for msg in req.messages]
+        prompt_bytes = transcript_bytes(messages_dict)
+        if prompt_bytes > MAX_PROMPT_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content=ErrorResponse(
+                    error=f"Prompt too large: {prompt_bytes} bytes (max {MAX_PROMPT_BYTES})",
+                    code="prompt_too_large"
+                ).model_dump()
+            )
+
+        # Resolve model (default or registry checkpoint)
+        model, cfg, error = await resolve_model(req.model)
+        if error is not None:
+            return error
+
+        if getattr(model, "backend", "torch") == "numpy":
+            raise HTTPException(
+                status_code=422,
+                detail="attention summary requires the torch or onnx backend"
+            )
+
+        from .generation import generate_attn_summary
+
+        # Reserve working memory for every layer's full attention
+        estimate = estimate_attn_summary(cfg, tokens=prompt_bytes, top_k=req.top_k)
+        try:
+            usage = app.state.memory.reserve("attn_summary", estimate, label=req.model or DEFAULT_MODEL_ID)
+        except MemoryBudgetExceeded as e:
+            return memory_budget_response(e)
+
+        try:
+            result, error = await run_inspection(
+                request,
+                generate_attn_summary,
+                model=model,
+                cfg=cfg,
+                messages=messages_dict,
+                device=DEVICE,
+                top_k=req.top_k,
             )
-            return result
+            return result if error is None else error
         except ValueError as e:
             raise HTTPException(status_code=422, detail=str(e))
+        finally:
+            app.state.memory.release(usage)
+
+    def trace_archive_reader():
+        """Archive reader (created on first use), refreshed with new shards."""
+        if app.state.trace_recorder is None:
+            return None
+        from .trace_archive import TraceArchive
+
+        reader = getattr(app.state, "trace_archive", None)
+        if reader is None:
+            reader = app.state.trace_archive = TraceArchive(app.state.trace_recorder.root)
+        reader.refresh()
+        return reader
+
+    def archive_disabled_response():
+        return JSONResponse(
+            status_code=404,
+            content=ErrorResponse(
+                error="Trace recording is disabled (set TRACE_ARCHIVE_DIR)",
+                code="archive_disabled"
+            ).model_dump()
+        )
+
+    @app.get("/traces/archive")
+    async def list_archived_traces(request: Request, offset: int = 0, limit: int = 100, model: str | None = None):
+        """
+        List recorded generations, oldest first (admin only: records hold
+        the transcripts and replies).
+
+        Only generations in written shards are listed; buffered ones appear
+        after the next shard is written (or POST /admin/traces/flush).
+        """
+        error = check_admin(request)
+        if error is not None:
+            return error
+        reader = await run_in_threadpool(trace_archive_reader)
+        if reader is None:
+            return archive_disabled_response()
+        filters = {"model": model} if model is not None else {}
+        return {
+            "total": len(reader),
+            "records": reader.index(offset=max(offset, 0), limit=min(max(limit, 0), 1000), **filters),
+        }
+
+    @app.get("/traces/archive/{archive_id}")
+    async def get_archived_trace(request: Request, archive_id: str, start: int = 0, end: int | None = None):
+        """Get steps [start, end) of one recorded generation (admin only)."""
+        error = check_admin(request)
+        if error is not None:
+            return error
+        reader = await run_in_threadpool(trace_archive_reader)
+        if reader is None:
+            return archive_disabled_response()
+        try:
+            steps = await run_in_threadpool(reader.steps, archive_id, max(start, 0), end)
+        except KeyError:
+            return JSONResponse(
+                status_code=404,
+                content=ErrorResponse(
+                    error="Unknown archived generation id",
+                    code="archive_not_found"
+                ).model_dump()
+            )
+        return {"record": reader.generation(archive_id)["record"], "steps": steps}
+
+    @app.post("/admin/traces/flush")
+    async def admin_flush_traces(request: Request):
+        """Write buffered recorded generations to a shard now."""
+        error = check_admin(request)
+        if error is not None:
+            return error
+        if app.state.trace_recorder is None:
+            return archive_disabled_response()
+        await run_in_threadpool(app.state.trace_recorder.flush)
+        return app.state.trace_recorder.status()
+
+    @app.get("/traces/{generation_id}")
+    async def get_traces(generation_id: str, layer: int):
+        """
+        Get one layer's per-step attention traces for a past generation.
+
+        Only available for /chat/stream requests made with trace_layers.
+        """
+        try:
+            result = trace_store.get(generation_id, layer)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        if result is None:
+            return JSONResponse(
+                status_code=404,
+                content=ErrorResponse(
+                    error="Unknown or expired generation id",
+                    code="trace_not_found"
+                ).model_dump()
+            )
+        return {"generation_id": generation_id, **result}
 
     return app
 
@@ -0,0 +1,335 @@
+"""Per-request memory accounting and the working-memory budget."""
+
+import itertools
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterator
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+FLOAT32_BYTES = 4
+PY_FLOAT_BYTES = 32  # a float in a list: 24-byte object + 8-byte slot
+
+
+def current_rss() -> int | None:
+    """Resident set size of this process in bytes (None where unsupported)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss() -> int | None:
+    """Highest RSS this process has reached, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+@dataclass
+class Estimate:
+    """Expected peak working memory of one request (beyond the model weights)."""
+    tensor_bytes: int
+    python_bytes: int
+
+    @property
+    def total(self) -> int:
+        return self.tensor_bytes + self.python_bytes
+
+
+def _forward_bytes(cfg, t: int) -> int:
+    """Transient tensors of one forward over t tokens: activations plus one layer's scores and probabilities."""
+    width = max(3 * cfg.C, getattr(cfg, "d_ff", 4 * cfg.C))
+    activations = 2 * t * width * FLOAT32_BYTES
+    attention = 2 * cfg.H * t * t * FLOAT32_BYTES
+    return activations + attention
+
+
+def estimate_chat(
+    cfg,
+    *,
+    prompt_tokens: int,
+    max_new_tokens: int,
+    n: int = 1,
+    context_mode: str = "crop",
+    stored_layers: int = 0,
+) -> Estimate:
+    """
+    Estimate a /chat/stream generation.
+
+    Args:
+        cfg: Model config
+        prompt_tokens: Encoded transcript length
+        max_new_tokens: Generation cap
+        n: Parallel samples
+        context_mode: "crop" or "rolling"
+        stored_layers: Layers recorded per step in the trace store
+    """
+    t = min(prompt_tokens + max_new_tokens, cfg.T)
+    if context_mode == "rolling" or n > 1:
+        # Prefill over the prompt, then decode from a KV cache per sample
+        tensor = _forward_bytes(cfg, min(prompt_tokens, cfg.T))
+        tensor += 2 * cfg.L * n * cfg.T * cfg.C * FLOAT32_BYTES
+    else:
+        # Every step recomputes the whole (cropped) context
+        tensor = _forward_bytes(cfg, t)
+    # Multi-layer traces keep an (H, t) row per layer and step
+    tensor += stored_layers * max_new_tokens * cfg.H * t * FLOAT32_BYTES
+    # One trace event's attention as Python floats
+    python = n * cfg.H * t * PY_FLOAT_BYTES
+    return Estimate(tensor, python)
+
+
+def estimate_full_attn(
+    cfg,
+    *,
+    tokens: int,
+    row_start: int = 0,
+    row_end: int | None = None,
+    col_start: int = 0,
+    col_end: int | None = None,
+    resolution: int | None = None,
+    stream: bool = False,
+) -> Estimate:
+    """
+    Estimate an /inspect/full_attn request.
+
+    Args:
+        cfg: Model config
+        tokens: Transcript length
+        row_start, row_end, col_start, col_end, resolution: The request's window
+        stream: Whether rows are streamed one at a time
+    """
+    t = min(tokens, cfg.T)
+    tensor = _forward_bytes(cfg, t) + cfg.H * t * t * FLOAT32_BYTES
+    rows = max(min(row_end or t, t) - row_start, 0)
+    cols = max(min(col_end or t, t) - col_start, 0)
+    if resolution is not None:
+        rows, cols = min(rows, resolution), min(cols, resolution)
+    python = (cols if stream else rows * cols) * PY_FLOAT_BYTES
+    return Estimate(tensor, python)
+
+
+def estimate_attn_summary(cfg, *, tokens: int, top_k: int) -> Estimate:
+    """Estimate an /inspect/attn_summary request (every layer's full attention)."""
+    t = min(tokens, cfg.T)
+    tensor = _forward_bytes(cfg, t) + cfg.L * cfg.H * t * t * FLOAT32_BYTES
+    python = cfg.L * cfg.H * (t + 2 * top_k) * PY_FLOAT_BYTES
+    return Estimate(tensor, python)
+
+
+class MemoryBudgetExceeded(Exception):
+    """A request's estimate does not fit in the working-memory budget."""
+
+    def __init__(self, estimate: Estimate, reserved: int, budget: int):
+        self.estimate = estimate
+        self.reserved = reserved
+        self.budget = budget
+        # Requests that could never fit are not worth retrying
+        self.retryable = estimate.total <= budget
+        super().__init__(
+            f"Request needs ~{estimate.total // 2**20} MB of working memory; "
+            f"{(budget - reserved) // 2**20} MB of {budget // 2**20} MB available"
+        )
+
+
+def _traced_peak(tracing: bool) -> int | None:
+    if not (tracing and tracemalloc.is_tracing()):
+        return None
+    return tracemalloc.get_traced_memory()[1]
+
+
+@dataclass
+class RequestMemory:
+    """
+    Accounting of one request: its estimate, and how far the process's
+    memory high-water marks rose while it ran.
+
+    The marks are ru_maxrss (peak RSS, kept by the kernel, so spikes inside
+    a forward pass count) and, with tracing, tracemalloc's peak of traced
+    Python allocations. Both are process-wide: a request that stays under
+    an earlier peak shows no growth, and concurrent requests are credited
+    with the growth of marks they raise together.
+    """
+    id: int
+    kind: str
+    label: str
+    estimate: Estimate
+    started: float = field(default_factory=time.time)
+    maxrss_start: int | None = None
+    maxrss_end: int | None = None
+    traced_peak_start: int | None = None
+    traced_peak_end: int | None = None
+    finished: float | None = None
+
+    def mark_start(self, tracing: bool):
+        self.maxrss_start = peak_rss()
+        self.traced_peak_start = _traced_peak(tracing)
+
+    def mark_end(self, tracing: bool):
+        self.maxrss_end = peak_rss()
+        self.traced_peak_end = _traced_peak(tracing)
+
+    @property
+    def maxrss_growth(self) -> int | None:
+        """Rise of the process's peak RSS while this request ran."""
+        end = self.maxrss_end if self.finished else peak_rss()
+        if self.maxrss_start is None or end is None:
+            return None
+        return end - self.maxrss_start
+
+    @property
+    def traced_peak_growth(self) -> int | None:
+        """Rise of tracemalloc's traced-memory peak while this request ran."""
+        end = self.traced_peak_end if self.finished else _traced_peak(True)
+        if self.traced_peak_start is None or end is None:
+            return None
+        return end - self.traced_peak_start
+
+    def to_dict(self) -> dict:
+        end = self.finished or time.time()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "active": self.finished is None,
+            "seconds": round(end - self.started, 3),
+            "estimate_tensor_bytes": self.estimate.tensor_bytes,
+            "estimate_python_bytes": self.estimate.python_bytes,
+            "process_maxrss_growth_bytes": self.maxrss_growth,
+            "process_traced_peak_growth_bytes": self.traced_peak_growth,
+        }
+
+
+class MemoryAccountant:
+    """
+    Admission against a working-memory budget plus per-request high-water
+    growth.
+
+    Every request reserves its Estimate while it runs; with a budget set,
+    a request whose estimate does not fit next to the reservations of the
+    requests in flight is rejected. Reservations are estimates; what is
+    measured is how far the process's peak RSS (and, with trace_python,
+    tracemalloc's peak) rose between a request's start and end (see
+    RequestMemory).
+    """
+
+    def __init__(self, budget_bytes: int = 0, *, trace_python: bool = False, history: int = 100):
+        """
+        Args:
+            budget_bytes: Working-memory budget across in-flight requests (0 = unlimited)
+            trace_python: Track Python allocations with tracemalloc (slows allocation-heavy code)
+            history: Finished requests kept for reports
+        """
+        self.budget_bytes = budget_bytes
+        self.trace_python = trace_python
+        self.rejected_total = 0
+        self._active: dict[int, RequestMemory] = {}
+        self._finished: deque[RequestMemory] = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        if trace_python and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @property
+    def reserved_bytes(self) -> int:
+        return sum(r.estimate.total for r in self._active.values())
+
+    def reserve(self, kind: str, estimate: Estimate, *, label: str = "") -> RequestMemory:
+        """
+        Admit a request, reserving its estimate until release().
+
+        Raises:
+            MemoryBudgetExceeded: If a budget is set and the estimate does not fit
+        """
+        with self._lock:
+            reserved = self.reserved_bytes
+            if self.budget_bytes and reserved + estimate.total > self.budget_bytes:
+                self.rejected_total += 1
+                raise MemoryBudgetExceeded(estimate, reserved, self.budget_bytes)
+            usage = RequestMemory(next(self._ids), kind, label, estimate)
+            self._active[usage.id] = usage
+        usage.mark_start(self.trace_python)
+        return usage
+
+    def resize(self, usage: RequestMemory, estimate: Estimate):
+        """Replace an active request's reservation (e.g. once it shares another's work)."""
+        with self._lock:
+            usage.estimate = estimate
+
+    def release(self, usage: RequestMemory):
+        """Finish a request (idempotent)."""
+        with self._lock:
+            if self._active.pop(usage.id, None) is None:
+                return
+        usage.mark_end(self.trace_python)
+        usage.finished = time.time()
+        self._finished.append(usage)
+
+    def track(self, events: Iterator, usage: RequestMemory) -> Iterator:
+        """
+        Pass events through, releasing the reservation at the end.
+
+        The reservation is also released if the iterator is discarded
+        without being started.
+        """
+        def tracked():
+            try:
+                yield from events
+            finally:
+                self.release(usage)
+
+        stream = tracked()
+        weakref.finalize(stream, self.release, usage)
+        return stream
+
+    def status(self) -> dict:
+        """Budget, reservations and rejections."""
+        with self._lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "reserved_bytes": self.reserved_bytes,
+                "active": len(self._active),
+                "rejected_total": self.rejected_total,
+                "trace_python": self.trace_python,
+            }
+
+    def requests(self, top: int = 10) -> dict:
+        """Active requests and the recent ones with the largest high-water growth."""
+        with self._lock:
+            active = list(self._active.values())
+            finished = list(self._finished)
+
+        def cost(r: RequestMemory) -> int:
+            return max(r.maxrss_growth or 0, r.traced_peak_growth or 0)
+
+        return {
+            "active": [r.to_dict() for r in active],
+            "top": [r.to_dict() for r in sorted(finished, key=cost, reverse=True)[:top]],
+        }
+
+    def python_top(self, limit: int = 10) -> dict | None:
+        """Traced Python memory and its largest allocation sites (None unless tracing)."""
+        if not (self.trace_python and tracemalloc.is_tracing()):
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+        return {
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {"site": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+                for stat in stats
+            ],
+        }
@@ -0,0 +1,566 @@
+"""
+Pure-NumPy GPT engine for torch-free, low-memory deployments.
+
+Weights come from an .npz file written by export_weights (the only part
+that needs torch). The engine reimplements the forward pass (pre-norm
+blocks, RoPE, causal attention with trace output, MLP, tied head) plus a
+KV-cached decoder, and streams events with the same contract as
+generation.stream_chat_events.
+"""
+
+import json
+import math
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Iterator
+
+import numpy as np
+
+from .config import ROLLING_SINK_TOKENS
+from .fetch import file_fingerprint
+from .qos import QosStream
+from .token_utils import token_display, stop_position
+from .timing import StepTimer
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class NumpyConfig:
+    """Model config (same fields as niels_gpt's ModelConfig)."""
+    V: int
+    T: int
+    C: int
+    L: int
+    H: int
+    D: int
+    d_ff: int
+    dropout: float = 0.0
+
+
+def _erf(x: np.ndarray) -> np.ndarray:
+    """erf via Abramowitz & Stegun 7.1.26 (|error| < 1.5e-7)."""
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1.0 - poly * np.exp(-x * x))
+
+
+ACTIVATIONS: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "gelu": lambda x: 0.5 * x * (1.0 + _erf(x / math.sqrt(2.0))),
+    "gelu_tanh": lambda x: 0.5 * x * (1.0 + np.tanh(math.sqrt(2.0 / math.pi) * (x + 0.044715 * x ** 3))),
+    "relu": lambda x: np.maximum(x, 0.0),
+    "silu": lambda x: x / (1.0 + np.exp(-x)),
+}
+
+
+def _norm(x: np.ndarray, weight: np.ndarray, bias: np.ndarray, eps: float, kind: str) -> np.ndarray:
+    if kind == "rms":
+        return x / np.sqrt((x * x).mean(-1, keepdims=True) + eps) * weight
+    mean = x.mean(-1, keepdims=True)
+    var = ((x - mean) ** 2).mean(-1, keepdims=True)
+    return (x - mean) / np.sqrt(var + eps) * weight + bias
+
+
+def _rope(x: np.ndarray, sin: np.ndarray, cos: np.ndarray, mode: str) -> np.ndarray:
+    """Rotate (..., t, D) by (t, D/2) tables; pairs are (2i, 2i+1) or (i, i+D/2)."""
+    if mode == "interleaved":
+        x1, x2 = x[..., 0::2], x[..., 1::2]
+        return np.stack([x1 * cos - x2 * sin, x1 * sin + x2 * cos], axis=-1).reshape(x.shape)
+    half = x.shape[-1] // 2
+    x1, x2 = x[..., :half], x[..., half:]
+    return np.concatenate([x1 * cos - x2 * sin, x1 * sin + x2 * cos], axis=-1)
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    x = x - x.max(-1, keepdims=True)
+    e = np.exp(x)
+    return e / e.sum(-1, keepdims=True)
+
+
+class NumpyKVCache:
+    """Per-layer pre-RoPE keys/values (B, H, n, D) with sink-preserving eviction."""
+
+    def __init__(self, n_layers: int, capacity: int, sinks: int):
+        if not (0 <= sinks < capacity):
+            raise ValueError(f"sinks must be in [0, {capacity - 1}], got {sinks}")
+        self.capacity = capacity
+        self.sinks = sinks
+        self.k: list[np.ndarray | None] = [None] * n_layers
+        self.v: list[np.ndarray | None] = [None] * n_layers
+        self.evicted = 0
+
+    @property
+    def length(self) -> int:
+        return 0 if self.k[0] is None else self.k[0].shape[2]
+
+    def make_room(self, n_new: int):
+        """Evict the oldest non-sink positions so n_new more fit."""
+        overflow = self.length + n_new - self.capacity
+        if overflow <= 0:
+            return
+        s = self.sinks
+        for i in range(len(self.k)):
+            self.k[i] = np.concatenate([self.k[i][:, :, :s], self.k[i][:, :, s + overflow:]], axis=2)
+            self.v[i] = np.concatenate([self.v[i][:, :, :s], self.v[i][:, :, s + overflow:]], axis=2)
+        self.evicted += overflow
+
+
+class NumpyGPT:
+    """GPT forward pass over exported NumPy weights."""
+
+    backend = "numpy"
+
+    def __init__(self, weights: dict[str, np.ndarray], meta: dict):
+        """
+        Args:
+            weights: Arrays from export_weights
+            meta: Export metadata (config, norm, activation, RoPE layout)
+        """
+        self.w = weights
+        self.meta = meta
+        self.cfg = NumpyConfig(**meta["model_cfg"])
+        self.norm_kind = meta["norm"]
+        self.norm_eps = meta["norm_eps"]
+        self.act = ACTIVATIONS[meta["activation"]]
+        self.rope_mode = meta["rope"]
+        self.lm_head = weights.get("lm_head", weights["tok_emb"])
+        self.nbytes = sum(a.nbytes for a in weights.values())
+
+    @classmethod
+    def load(cls, path: Path) -> "NumpyGPT":
+        """Load an .npz written by export_weights."""
+        with np.load(path) as data:
+            weights = {k: data[k] for k in data.files if k != "meta"}
+            meta = json.loads(str(data["meta"]))
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"unsupported weights format {meta.get('format')!r}")
+        return cls(weights, meta)
+
+    def run(self, ids: np.ndarray, cache: NumpyKVCache) -> tuple[np.ndarray, list[np.ndarray]]:
+        """
+        Run new positions through every block, extending the cache.
+
+        RoPE uses positions within the cache, so an empty cache gives the
+        plain forward over a (cropped) window.
+
+        Args:
+            ids: (B, t_new) int token ids
+            cache: Cache to extend (caller makes room first)
+
+        Returns:
+            (logits, probs): last-position logits (B, V) and per-layer
+            attention (B, H, t_new, n)
+        """
+        cfg, w = self.cfg, self.w
+        B, t_new = ids.shape
+        n = cache.length + t_new
+        sin, cos = w["rope_sin"], w["rope_cos"]
+        sin_q, cos_q = sin[n - t_new:n], cos[n - t_new:n]
+        mask = np.arange(n)[None, :] <= np.arange(n - t_new, n)[:, None]  # (t_new, n)
+
+        h = w["tok_emb"][ids]  # (B, t_new, C)
+        all_probs = []
+        for i in range(cfg.L):
+            p = f"blocks.{i}."
+            x = _norm(h, w[p + "ln1.weight"], w[p + "ln1.bias"], self.norm_eps, self.norm_kind)
+            qkv = x @ w[p + "qkv.weight"] + w[p + "qkv.bias"]
+            q, k, v = (
+                z.reshape(B, t_new, cfg.H, cfg.D).transpose(0, 2, 1, 3)
+                for z in np.split(qkv, 3, axis=-1)
+            )
+            cache.k[i] = k if cache.k[i] is None else np.concatenate([cache.k[i], k], axis=2)
+            cache.v[i] = v if cache.v[i] is None else np.concatenate([cache.v[i], v], axis=2)
+
+            q = _rope(q, sin_q, cos_q, self.rope_mode)
+            k_all = _rope(cache.k[i], sin[:n], cos[:n], self.rope_mode)
+            scores = (q @ k_all.transpose(0, 1, 3, 2)) / math.sqrt(cfg.D)
+            scores = np.where(mask, scores, -np.inf)
+            probs = _softmax(scores)
+            all_probs.append(probs)
+
+            y = (probs @ cache.v[i]).transpose(0, 2, 1, 3).reshape(B, t_new, cfg.C)
+            h = h + y @ w[p + "proj.weight"] + w[p + "proj.bias"]
+            x = _norm(h, w[p + "ln2.weight"], w[p + "ln2.bias"], self.norm_eps, self.norm_kind)
+            x = self.act(x @ w[p + "fc.weight"] + w[p + "fc.bias"])
+            h = h + x @ w[p + "out.weight"] + w[p + "out.bias"]
+
+        h_last = _norm(h[:, -1], w["ln_f.weight"], w["ln_f.bias"], self.norm_eps, self.norm_kind)
+        return h_last @ self.lm_head.T, all_probs
+
+    def forward_with_attn_trace(self, x: np.ndarray, trace_layer: int = 0, return_full_attn: bool = False):
+        """
+        Forward over a (B, t) window with attention trace (NumPy arrays).
+
+        Returns:
+            (logits, trace): logits (B, 1, V) for the last position; trace has
+            "attn_row" (B, H, t) or "attn_full" (B, H, t, t)
+        """
+        cache = NumpyKVCache(self.cfg.L, max(self.cfg.T, x.shape[1]), 0)
+        logits, probs = self.run(np.asarray(x), cache)
+        trace = {"layer": trace_layer}
+        if return_full_attn:
+            trace["attn_full"] = probs[trace_layer]
+        else:
+            trace["attn_row"] = probs[trace_layer][:, :, -1, :]
+        return logits[:, None, :], trace
+
+    def warm(self):
+        """One small forward so first-request latency excludes lazy setup."""
+        self.forward_with_attn_trace(np.frombuffer(b"user: hi\nassistant: ", dtype=np.uint8)[None, :].astype(np.int64))
+
+    def eval(self):
+        """No-op (inference only)."""
+        return self
+
+    def to(self, device):
+        """No-op (CPU only)."""
+        return self
+
+
+class NumpyDecoder:
+    """KV-cached incremental decoding with rolling context (see kv_cache.CachedDecoder)."""
+
+    def __init__(self, model: NumpyGPT, *, sinks: int = 0, capacity: int | None = None):
+        self.model = model
+        self.cache = NumpyKVCache(model.cfg.L, capacity or model.cfg.T, sinks)
+
+    def prefill(self, ids: np.ndarray) -> tuple[np.ndarray, list[np.ndarray]]:
+        """Fill the cache from a (B, P) prompt, keeping sinks + the tail if it's too long."""
+        P = ids.shape[1]
+        if P > self.cache.capacity:
+            s = self.cache.sinks
+            ids = np.concatenate([ids[:, :s], ids[:, P - (self.cache.capacity - s):]], axis=1)
+            self.cache.evicted += P - self.cache.capacity
+        return self.model.run(ids, self.cache)
+
+    def step(self, token_ids: np.ndarray) -> tuple[np.ndarray, list[np.ndarray]]:
+        """Append one (B,) token per sequence and return next-token logits."""
+        self.cache.make_room(1)
+        return self.model.run(token_ids[:, None], self.cache)
+
+
+def _decode(ids) -> str:
+    """Byte tokens to text (invalid utf-8 replaced), as niels_gpt.tokenizer.decode."""
+    return bytes(int(i) for i in ids).decode("utf-8", errors="replace")
+
+
+def sample_token(
+    logits_last: np.ndarray,
+    temperature: float,
+    top_k: int | None,
+    rng: np.random.Generator,
+) -> tuple[int, np.ndarray]:
+    """
+    Sample one token (NumPy counterpart of generation.sample_token).
+
+    Greedy results match the torch path; sampled tokens come from NumPy's
+    RNG, so they differ from torch for the same seed.
+    """
+    if temperature == 0:
+        next_token = int(logits_last.argmax())
+        probs = np.zeros_like(logits_last)
+        probs[next_token] = 1.0
+        return next_token, probs
+
+    scaled = logits_last / temperature
+    if top_k is not None:
+        k = min(top_k, len(scaled))
+        keep = np.argpartition(-scaled, k - 1)[:k]
+        masked = np.full_like(scaled, -np.inf)
+        masked[keep] = scaled[keep]
+        scaled = masked
+    probs = _softmax(scaled.astype(np.float64))
+    next_token = int(rng.choice(len(probs), p=probs))
+    return next_token, probs.astype(np.float32)
+
+
+def distribution_summary(probs: np.ndarray) -> tuple[float, list[dict]]:
+    """Entropy and top-10 candidates, as in trace events."""
+    entropy = float(-(probs * np.log(np.clip(probs, 1e-12, None))).sum())
+    top = np.argsort(-probs, kind="stable")[:10]
+    topk_list = [
+        {
+            "token_id": int(i),
+            "token_text": _decode([i]),
+            "token_display": token_display(int(i)),
+            "prob": float(probs[i]),
+        }
+        for i in top
+    ]
+    return entropy, topk_list
+
+
+def stream_chat_events(
+    model: NumpyGPT,
+    cfg: NumpyConfig,
+    *,
+    messages: list[dict],
+    max_new_tokens: int,
+    temperature: float,
+    top_k: int | None,
+    seed: int,
+    trace_layer: int,
+    device: str = "cpu",
+    trace_layers: list[int] | None = None,
+    logit_lens: bool = False,
+    trace_store=None,
+    generation_id: str | None = None,
+    context_mode: str = "crop",
+    n: int = 1,
+    timings: bool = False,
+    prompt_ids: list[int] | None = None,
+    qos: QosStream | None = None,
+) -> Iterator[dict]:
+    """
+    Stream chat events with the same contract as generation.stream_chat_events.
+
+    Supports "crop" and "rolling" context modes with single-layer traces;
+    multi-layer traces (and so the logit lens) and n > 1 need the torch
+    backend.
+
+    Raises:
+        ValueError: On out-of-range trace_layer, unknown context_mode or an
+                    unsupported option
+    """
+    from niels_gpt.chat_format import format_chat, extract_assistant_reply
+
+    if not (0 <= trace_layer < cfg.L):
+        raise ValueError(f"trace_layer must be in [0, {cfg.L - 1}], got {trace_layer}")
+    if context_mode not in ("crop", "rolling"):
+        raise ValueError(f"context_mode must be 'crop' or 'rolling', got {context_mode!r}")
+    if trace_layers is not None or n != 1:
+        raise ValueError("trace_layers and n > 1 require the torch backend")
+
+    # Byte-level tokens: one id per utf-8 byte
+    if prompt_ids is None:
+        prompt_ids = format_chat(messages).encode("utf-8")
+    prompt_ids = list(prompt_ids)
+    ids = list(prompt_ids)
+    prompt_len = len(prompt_ids)
+    rng = np.random.default_rng(seed)
+
+    decoder = None
+    if context_mode == "rolling":
+        decoder = NumpyDecoder(model, sinks=min(ROLLING_SINK_TOKENS, cfg.T - 1))
+    timer = StepTimer(timings)
+    stop_reason = "max_new_tokens"
+    qos = qos or QosStream()
+
+    for step in range(max_new_tokens):
+        event = qos.step()
+        if event is not None:
+            yield event
+        timer.mark()
+        if decoder is not None:
+            if step == 0:
+                logits, probs = decoder.prefill(np.array([ids], dtype=np.int64))
+            else:
+                logits, probs = decoder.step(np.array([next_token], dtype=np.int64))
+            attn_row = probs[trace_layer][0, :, -1, :]  # (H, n)
+        else:
+            ctx = ids[-cfg.T:]
+            logits, trace = model.forward_with_attn_trace(np.array([ctx], dtype=np.int64), trace_layer=trace_layer)
+            logits = logits[:, -1]
+            attn_row = trace["attn_row"][0]  # (H, t)
+        timer.lap("forward")
+
+        next_token, dist = sample_token(logits[0], temperature, top_k, rng)
+        timer.lap("sample")
+        entropy, topk_list = distribution_summary(dist)
+        token_text = _decode([next_token])
+        attn_fields = qos.attn(attn_row, step)
+        timer.lap("encode")
+        timer.token()
+
+        yield {
+            "event": "token",
+            "data": {
+                "step": step,
+                "token_id": next_token,
+                "token_text": token_text,
+                "token_display": token_display(next_token),
+            }
+        }
+        trace_data = {
+            "step": step,
+            "entropy": entropy,
+            "topk": topk_list,
+            **attn_fields,
+        }
+        if decoder is not None:
+            trace_data["evicted"] = decoder.cache.evicted
+        if timings:
+            trace_data["timing"] = timer.pop()
+        yield {
+            "event": "trace",
+            "data": trace_data
+        }
+
+        ids.append(next_token)
+        stop_pos = stop_position(bytes(ids[prompt_len:]))
+        if stop_pos is not None:
+            ids = prompt_ids + ids[prompt_len:][:stop_pos]
+            stop_reason = "stop_sequence"
+            break
+
+    done_data = {"reply": extract_assistant_reply(_decode(ids))}
+    if generation_id is not None:
+        done_data["generation_id"] = generation_id
+    if timings:
+        done_data["timing"] = timer.summary(stop_reason)
+    yield {
+        "event": "done",
+        "data": done_data
+    }
+
+
+def export_weights(model, cfg, path: Path, *, source: Path | None = None, atol: float = 1e-3) -> Path:
+    """
+    Export a torch GPT's weights for NumpyGPT (requires torch).
+
+    The norm type, MLP activation and RoPE pairing are detected numerically
+    against the torch modules, and the whole forward is checked against the
+    torch model before anything is written.
+
+    Args:
+        model: GPT model in eval mode
+        cfg: Model config
+        path: Output .npz
+        source: Checkpoint the model came from (recorded to detect staleness)
+        atol: Maximum allowed logit difference vs torch
+
+    Returns:
+        path
+
+    Raises:
+        ValueError: If the model layout is not recognized or the engine
+                    doesn't reproduce its outputs
+    """
+    import torch
+    import torch.nn as nn
+    from niels_gpt.model.rope import rope_cache, apply_rope
+
+    from .kv_cache import attn_projections
+
+    def arr(t):
+        return t.detach().float().cpu().numpy()
+
+    def norm_params(module):
+        bias = getattr(module, "bias", None)
+        return arr(module.weight), arr(bias) if bias is not None else np.zeros(cfg.C, np.float32)
+
+    def linear_params(linear):
+        b = linear.bias
+        return arr(linear.weight).T, arr(b) if b is not None else np.zeros(linear.out_features, np.float32)
+
+    ln_cls = type(model.ln_f).__name__
+    norm_kind = "rms" if "rms" in ln_cls.lower() else "layer"
+    norm_eps = float(getattr(model.ln_f, "eps", None) or 1e-5)
+
+    weights = {"tok_emb": arr(model.tok_emb.weight)}
+    if model.lm_head.weight.data_ptr() != model.tok_emb.weight.data_ptr():
+        weights["lm_head"] = arr(model.lm_head.weight)
+    weights["ln_f.weight"], weights["ln_f.bias"] = norm_params(model.ln_f)
+
+    sin, cos = rope_cache(cfg.T, cfg.D)
+    weights["rope_sin"], weights["rope_cos"] = arr(sin[0, 0]), arr(cos[0, 0])
+
+    for i, block in enumerate(model.blocks):
+        p = f"blocks.{i}."
+        in_proj, out_proj = attn_projections(block.attn, cfg.C)
+        parts = [linear_params(lin) for lin in in_proj]
+        weights[p + "qkv.weight"] = np.concatenate([w for w, _ in parts], axis=1)
+        weights[p + "qkv.bias"] = np.concatenate([b for _, b in parts])
+        weights[p + "proj.weight"], weights[p + "proj.bias"] = linear_params(out_proj)
+        weights[p + "ln1.weight"], weights[p + "ln1.bias"] = norm_params(block.ln1)
+        weights[p + "ln2.weight"], weights[p + "ln2.bias"] = norm_params(block.ln2)
+        mlp_linears = [m for m in block.mlp.modules() if isinstance(m, nn.Linear)]
+        if len(mlp_linears) != 2:
+            raise ValueError("unrecognized MLP layout: expected two Linears")
+        weights[p + "fc.weight"], weights[p + "fc.bias"] = linear_params(mlp_linears[0])
+        weights[p + "out.weight"], weights[p + "out.bias"] = linear_params(mlp_linears[1])
+
+    generator = torch.Generator().manual_seed(0)
+
+    # MLP activation: whichever candidate reproduces block 0's MLP
+    x = torch.randn(1, 4, cfg.C, generator=generator)
+    with torch.no_grad():
+        ref = arr(model.blocks[0].mlp(x))
+    w0 = "blocks.0."
+
+    def mlp_error(name):
+        h = ACTIVATIONS[name](arr(x) @ weights[w0 + "fc.weight"] + weights[w0 + "fc.bias"])
+        return np.abs(h @ weights[w0 + "out.weight"] + weights[w0 + "out.bias"] - ref).max()
+
+    activation = min(ACTIVATIONS, key=mlp_error)
+
+    # RoPE pairing: whichever layout reproduces apply_rope
+    q = torch.randn(1, 1, cfg.T, cfg.D, generator=generator)
+    ref_q, _ = apply_rope(q, q, sin, cos)
+    rope_mode = min(
+        ("interleaved", "half"),
+        key=lambda mode: np.abs(_rope(arr(q), weights["rope_sin"], weights["rope_cos"], mode) - arr(ref_q)).max(),
+    )
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "model_cfg": asdict(NumpyConfig(**{k: getattr(cfg, k) for k in ("V", "T", "C", "L", "H", "D", "d_ff", "dropout")})),
+        "norm": norm_kind,
+        "norm_eps": norm_eps,
+        "activation": activation,
+        "rope": rope_mode,
+        "source": file_fingerprint(source),
+    }
+
+    # End-to-end check before writing anything
+    engine = NumpyGPT(weights, meta)
+    ids = torch.randint(0, cfg.V, (1, min(cfg.T, 32)), generator=generator)
+    with torch.no_grad():
+        ref_logits, _ = model.forward_with_attn_trace(ids, trace_layer=0, return_full_attn=False)
+    logits, _ = engine.forward_with_attn_trace(ids.numpy())
+    diff = float(np.abs(logits[0, -1] - arr(ref_logits[0, -1])).max())
+    if diff > atol:
+        raise ValueError(f"numpy engine does not reproduce the model (max |logit diff| {diff:.2e})")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp, meta=np.array(json.dumps(meta)), **weights)
+    tmp.replace(path)
+    return path
+
+
+def load_numpy_model(
+    path: Path,
+    *,
+    load_torch: Callable[[], tuple],
+    source: Path | None = None,
+) -> tuple[NumpyGPT, NumpyConfig]:
+    """
+    Load exported weights, (re-)exporting first if missing or stale.
+
+    Only exporting imports torch; with an up-to-date .npz (or none of the
+    checkpoint present, e.g. an edge image shipping just the .npz) startup
+    is torch-free.
+
+    Args:
+        path: .npz weights path
+        load_torch: Returns the torch (model, cfg) to export from
+        source: Checkpoint path used for the staleness check
+
+    Returns:
+        (NumpyGPT, config) tuple
+    """
+    stale = not path.exists()
+    fingerprint = file_fingerprint(source)
+    if not stale and fingerprint is not None:
+        model = NumpyGPT.load(path)
+        stale = model.meta.get("source") != fingerprint
+        if not stale:
+            return model, model.cfg
+    if stale:
+        torch_model, cfg = load_torch()
+        export_weights(torch_model, cfg, path, source=source)
+    model = NumpyGPT.load(path)
+    return model, model.cfg
@@ -0,0 +1,332 @@
+"""ONNX Runtime inference backend: exported prefill/decode graphs behind the GPT API."""
+
+import json
+import os
+import shutil
+import time
+import warnings
+from pathlib import Path
+from typing import Callable
+
+import torch
+import torch.nn as nn
+
+from niels_gpt.config import ModelConfig
+
+from .fetch import file_fingerprint
+from .kv_cache import CachedDecoder, KVCache
+
+PREFILL_FILENAME = "prefill.onnx"
+DECODE_FILENAME = "decode.onnx"
+META_FILENAME = "meta.json"
+CURRENT_FILENAME = "CURRENT"
+OPSET = 17
+
+
+class _CachedGraph(nn.Module):
+    """
+    One CachedDecoder pass as a traceable module.
+
+    Without past keys/values this is the prefill graph (causal attention over
+    the whole input); with them it is the single-token decode graph. Keys in
+    past/present are pre-RoPE, exactly as CachedDecoder caches them, and the
+    caller evicts (sinks + recent window) before each decode call.
+
+    Outputs: logits (B, V) for the last position, present_k/present_v
+    (L, B, H, n, D) and, with attn_outputs, attn (L, B, H, t_new, n).
+    """
+
+    def __init__(self, model, cfg: ModelConfig, capacity: int, attn_outputs: bool):
+        super().__init__()
+        self.model = model
+        self.cfg = cfg
+        self.capacity = capacity
+        self.attn_outputs = attn_outputs
+        self.decoder = CachedDecoder(model, cfg, capacity=capacity)
+
+    def forward(self, ids, past_k=None, past_v=None):
+        cfg = self.cfg
+        self.decoder.cache = KVCache(cfg.L, self.capacity, 0)
+        if past_k is not None:
+            self.decoder.cache.k = list(past_k.unbind(0))
+            self.decoder.cache.v = list(past_v.unbind(0))
+        logits, traces = self.decoder._run(
+            ids, layers=list(range(cfg.L)), logit_lens=False, full_attn=self.attn_outputs
+        )
+        outputs = [logits, torch.stack(self.decoder.cache.k), torch.stack(self.decoder.cache.v)]
+        if self.attn_outputs:
+            outputs.append(torch.stack([traces["attn_full"][i] for i in range(cfg.L)]))
+        return tuple(outputs)
+
+
+def export_onnx(
+    model,
+    cfg: ModelConfig,
+    out_dir: Path,
+    *,
+    attn_outputs: bool = True,
+    source: Path | None = None,
+) -> Path:
+    """
+    Export prefill and cached-decode graphs for a loaded GPT.
+
+    Args:
+        model: GPT model in eval mode (on CPU)
+        cfg: Model config
+        out_dir: Directory for prefill.onnx, decode.onnx and meta.json
+        attn_outputs: Also output per-layer attention (needed for trace
+                      attention and /inspect/full_attn)
+        source: Checkpoint the model came from (recorded to detect staleness)
+
+    Returns:
+        out_dir
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    graph = _CachedGraph(model, cfg, cfg.T, attn_outputs).eval()
+    names = ["logits", "present_k", "present_v"] + (["attn"] if attn_outputs else [])
+    cache_axes = {1: "batch", 3: "n"}
+    attn_axes = {1: "batch", 3: "t_new", 4: "n"}
+
+    ids = torch.zeros(1, 3, dtype=torch.int64)
+    past = torch.zeros(cfg.L, 2, cfg.H, 3, cfg.D)
+    # The TorchScript exporter handles the data-dependent cache shapes; its
+    # deprecation notices are expected. TracerWarnings stay visible.
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="You are using the legacy TorchScript-based ONNX export",
+                                category=DeprecationWarning)
+        warnings.filterwarnings("ignore", message="The feature will be removed", category=DeprecationWarning,
+                                module=r"torch\.onnx")
+        # Prefill: (B, t) ids -> logits, cache, attention over the prompt
+        torch.onnx.export(
+            graph,
+            (ids,),
+            str(out_dir / PREFILL_FILENAME),
+            dynamo=False,
+            opset_version=OPSET,
+            input_names=["ids"],
+            output_names=names,
+            dynamic_axes={
+                "ids": {0: "batch", 1: "t_new"},
+                "logits": {0: "batch"},
+                "present_k": cache_axes,
+                "present_v": cache_axes,
+                **({"attn": attn_axes} if attn_outputs else {}),
+            },
+        )
+        # Decode: one new token per sequence against the cached keys/values
+        torch.onnx.export(
+            graph,
+            (torch.zeros(2, 1, dtype=torch.int64), past, past),
+            str(out_dir / DECODE_FILENAME),
+            dynamo=False,
+            opset_version=OPSET,
+            input_names=["ids", "past_k", "past_v"],
+            output_names=names,
+            dynamic_axes={
+                "ids": {0: "batch"},
+                "past_k": {1: "batch", 3: "n_past"},
+                "past_v": {1: "batch", 3: "n_past"},
+                "logits": {0: "batch"},
+                "present_k": cache_axes,
+                "present_v": cache_axes,
+                **({"attn": attn_axes} if attn_outputs else {}),
+            },
+        )
+
+    meta = {
+        "model_cfg": {k: getattr(cfg, k) for k in ("V", "T", "C", "L", "H", "D", "d_ff", "dropout")},
+        "capacity": cfg.T,
+        "attn_outputs": attn_outputs,
+        "opset": OPSET,
+        "source": file_fingerprint(source),
+    }
+    (out_dir / META_FILENAME).write_text(json.dumps(meta, indent=2))
+    return out_dir
+
+
+def graph_dir(onnx_dir: Path) -> Path:
+    """Directory holding the current graphs (onnx_dir itself without a CURRENT pointer)."""
+    pointer = onnx_dir / CURRENT_FILENAME
+    if pointer.exists():
+        return onnx_dir / pointer.read_text().strip()
+    return onnx_dir
+
+
+def publish_onnx(model, cfg: ModelConfig, onnx_dir: Path, **kwargs) -> Path:
+    """
+    Export into a fresh version directory under onnx_dir and make it current.
+
+    The CURRENT pointer is swapped in a single rename, so a reader sees
+    either the previous graph set or the new one, never a mix. Versions
+    older than the one just replaced are removed.
+
+    Args:
+        model: GPT model in eval mode (on CPU)
+        cfg: Model config
+        onnx_dir: Graph directory
+        **kwargs: Passed to export_onnx
+
+    Returns:
+        The new version directory
+    """
+    onnx_dir.mkdir(parents=True, exist_ok=True)
+    previous = graph_dir(onnx_dir)
+    name = f"graphs.{time.time_ns():020d}.{os.getpid()}"
+    export_onnx(model, cfg, onnx_dir / name, **kwargs)
+
+    tmp = onnx_dir / f"{CURRENT_FILENAME}.tmp.{os.getpid()}"
+    tmp.write_text(name + "\n")
+    os.replace(tmp, onnx_dir / CURRENT_FILENAME)
+
+    # Keep the replaced version for readers that resolved it before the swap
+    for old in onnx_dir.glob("graphs.*"):
+        if old.is_dir() and old.name not in (name, previous.name):
+            shutil.rmtree(old, ignore_errors=True)
+    return onnx_dir / name
+
+
+class OnnxModel:
+    """
+    GPT stand-in that runs exported graphs on onnxruntime's CPU provider.
+
+    Provides forward_with_attn_trace (full-context prefill) and
+    cached_decoder (KV-cached rolling/parallel decoding), so the generation
+    code runs unchanged. Per-layer traces and the logit lens need the torch
+    model's internals and are not available.
+    """
+
+    backend = "onnx"
+
+    def __init__(self, onnx_dir: Path, *, threads: int | None = None):
+        """
+        Args:
+            onnx_dir: Directory written by export_onnx or publish_onnx
+            threads: intra-op threads (default: torch's current setting, so
+                     a CPU tuning profile applies to both backends)
+        """
+        import onnxruntime as ort
+
+        onnx_dir = graph_dir(onnx_dir)
+        meta = json.loads((onnx_dir / META_FILENAME).read_text())
+        self.meta = meta
+        self.cfg = ModelConfig(**meta["model_cfg"])
+        self.capacity = meta["capacity"]
+        self.attn_outputs = meta["attn_outputs"]
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or torch.get_num_threads()
+        options.inter_op_num_threads = 1
+        providers = ["CPUExecutionProvider"]
+        self.prefill_session = ort.InferenceSession(str(onnx_dir / PREFILL_FILENAME), options, providers=providers)
+        self.decode_session = ort.InferenceSession(str(onnx_dir / DECODE_FILENAME), options, providers=providers)
+
+    def _outputs(self, outputs: list) -> tuple[torch.Tensor, ...]:
+        return tuple(torch.from_numpy(o) for o in outputs)
+
+    def run_prefill(self, ids: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        """(B, t) ids -> (logits, present_k, present_v[, attn])."""
+        return self._outputs(self.prefill_session.run(None, {"ids": ids.cpu().numpy()}))
+
+    def run_decode(self, ids: torch.Tensor, past_k: torch.Tensor, past_v: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        """(B, 1) ids plus (L, B, H, n, D) cache -> (logits, present_k, present_v[, attn])."""
+        return self._outputs(self.decode_session.run(None, {
+            "ids": ids.cpu().numpy(),
+            "past_k": past_k.contiguous().numpy(),
+            "past_v": past_v.contiguous().numpy(),
+        }))
+
+    def forward_with_attn_trace(self, x, trace_layer=0, return_full_attn=False):
+        """
+        Forward over a (B, t) context with attention trace.
+
+        Only last-position logits are computed, returned as (B, 1, V). Graphs
+        exported without the attention head report all-zero attention rows
+        and cannot return the full matrix.
+        """
+        outputs = self.run_prefill(x)
+        logits = outputs[0]
+        trace = {"layer": trace_layer}
+        if return_full_attn:
+            if not self.attn_outputs:
+                raise ValueError("full attention requires graphs exported with attention outputs")
+            trace["attn_full"] = outputs[3][trace_layer]  # (B, H, t, t)
+        else:
+            trace["attn_row"] = self.attn_rows(outputs, [trace_layer])[trace_layer]  # (B, H, t)
+        return logits[:, None, :], trace
+
+    def attn_rows(self, outputs: tuple, layers: list[int]) -> dict[int, torch.Tensor]:
+        """Last-row attention (B, H, n) per layer (zeros without the attention head)."""
+        if not self.attn_outputs:
+            B, H, n = outputs[1].shape[1], self.cfg.H, outputs[1].shape[3]
+            return {layer: torch.zeros(B, H, n) for layer in layers}
+        return {layer: outputs[3][layer][:, :, -1, :] for layer in layers}
+
+    def cached_decoder(self, cfg: ModelConfig, *, sinks: int = 0) -> "OnnxCachedDecoder":
+        """KV-cached decoder running the exported decode graph."""
+        return OnnxCachedDecoder(self, cfg, sinks=sinks)
+
+    def eval(self):
+        """No-op (graphs are exported in eval mode)."""
+        return self
+
+    def to(self, device):
+        """No-op (CPU provider only)."""
+        return self
+
+
+class OnnxCachedDecoder(CachedDecoder):
+    """CachedDecoder whose passes run the exported prefill/decode graphs."""
+
+    def __init__(self, model: OnnxModel, cfg: ModelConfig, *, sinks: int = 0):
+        self.model = model
+        self.cfg = cfg
+        self.capacity = model.capacity
+        self.cache = KVCache(cfg.L, self.capacity, sinks)
+
+    def _run(self, ids, *, layers, logit_lens, full_attn=False):
+        if logit_lens or full_attn:
+            raise ValueError("logit_lens and full attention require the torch backend")
+
+        self.cache.make_room(ids.shape[1])
+        if self.cache.length == 0:
+            outputs = self.model.run_prefill(ids)
+        else:
+            outputs = self.model.run_decode(
+                ids, torch.stack(self.cache.k), torch.stack(self.cache.v)
+            )
+        self.cache.k = list(outputs[1].unbind(0))
+        self.cache.v = list(outputs[2].unbind(0))
+        return outputs[0], {"attn_rows": self.model.attn_rows(outputs, layers)}
+
+
+def load_onnx_model(
+    onnx_dir: Path,
+    *,
+    load_torch: Callable[[], tuple],
+    source: Path | None = None,
+) -> tuple[OnnxModel, ModelConfig]:
+    """
+    Load exported graphs, (re-)exporting first if missing or stale.
+
+    Graphs are stale when the checkpoint they were exported from has
+    changed size or mtime (e.g. after a hot reload replaced it).
+
+    Args:
+        onnx_dir: Graph directory
+        load_torch: Returns the torch (model, cfg) to export from
+        source: Checkpoint path used for the staleness check
+
+    Returns:
+        (OnnxModel, config) tuple
+    """
+    meta_path = graph_dir(onnx_dir) / META_FILENAME
+    fingerprint = file_fingerprint(source)
+    stale = not meta_path.exists()
+    if not stale and fingerprint is not None:
+        stale = json.loads(meta_path.read_text()).get("source") != fingerprint
+    if stale:
+        model, cfg = load_torch()
+        publish_onnx(model.cpu(), cfg, onnx_dir, source=source)
+
+    onnx_model = OnnxModel(onnx_dir)
+    return onnx_model, onnx_model.cfg
@@ -0,0 +1,298 @@
+"""Step-by-step numerical parity checks of inference paths against the reference forward."""
+
+import math
+from dataclasses import asdict, dataclass, field
+from typing import Protocol
+
+import torch
+
+from niels_gpt.config import ModelConfig
+from niels_gpt.tokenizer import encode
+from niels_gpt.chat_format import format_chat
+
+from .generation import distribution_summary, sample_token
+from .kv_cache import make_decoder
+from .token_utils import stop_position
+
+
+@dataclass
+class StepOutput:
+    """What an engine produced for one decoding step (batch of 1, on CPU)."""
+    logits: torch.Tensor  # (V,) next-token logits
+    attn_row: torch.Tensor  # (H, n) last-row attention of the traced layer
+    attn_full: torch.Tensor | None = None  # (H, t, t), if the engine provides it
+
+
+class Engine(Protocol):
+    """
+    One inference path under test.
+
+    start() consumes the prompt; step() appends one token. Both return the
+    next-token StepOutput for the context so far.
+    """
+
+    name: str
+
+    def start(self, prompt_ids: torch.Tensor) -> StepOutput: ...
+
+    def step(self, token_id: int) -> StepOutput: ...
+
+
+class ForwardEngine:
+    """
+    Full-context forward_with_attn_trace on every step (cropped to cfg.T).
+
+    With the torch GPT this is the reference. Any model exposing
+    forward_with_attn_trace (quantized or compiled copies, OnnxModel,
+    NumpyGPT) can be wrapped as a candidate.
+    """
+
+    def __init__(self, model, cfg: ModelConfig, *, trace_layer: int, full_attn: bool = False, name: str = "reference"):
+        self.model = model
+        self.cfg = cfg
+        self.trace_layer = trace_layer
+        self.full_attn = full_attn
+        self.name = name
+        self.ids: list[int] = []
+
+    def start(self, prompt_ids: torch.Tensor) -> StepOutput:
+        self.ids = prompt_ids.tolist()
+        return self._forward()
+
+    def step(self, token_id: int) -> StepOutput:
+        self.ids.append(token_id)
+        return self._forward()
+
+    @torch.no_grad()
+    def _forward(self) -> StepOutput:
+        ctx = torch.tensor(self.ids[-self.cfg.T:], dtype=torch.int64)[None, :]
+        if getattr(self.model, "backend", "torch") == "numpy":
+            ctx = ctx.numpy()
+        logits, trace = self.model.forward_with_attn_trace(
+            ctx, trace_layer=self.trace_layer, return_full_attn=self.full_attn
+        )
+        logits = torch.as_tensor(logits)[0, -1].float()
+        if self.full_attn:
+            attn_full = torch.as_tensor(trace["attn_full"])[0].float()
+            return StepOutput(logits, attn_full[:, -1, :], attn_full)
+        return StepOutput(logits, torch.as_tensor(trace["attn_row"])[0].float())
+
+
+class CachedEngine:
+    """KV-cached decoding via make_decoder (torch CachedDecoder or the ONNX decode graph)."""
+
+    def __init__(self, model, cfg: ModelConfig, *, trace_layer: int, sinks: int = 0, name: str = "cached"):
+        self.decoder = make_decoder(model, cfg, sinks=sinks)
+        self.trace_layer = trace_layer
+        self.name = name
+
+    def start(self, prompt_ids: torch.Tensor) -> StepOutput:
+        return self._output(*self.decoder.prefill(prompt_ids[None, :], layers=[self.trace_layer]))
+
+    def step(self, token_id: int) -> StepOutput:
+        return self._output(*self.decoder.step(torch.tensor([token_id]), layers=[self.trace_layer]))
+
+    def _output(self, logits: torch.Tensor, traces: dict) -> StepOutput:
+        return StepOutput(logits[0].float(), traces["attn_rows"][self.trace_layer][0].float())
+
+
+class NumpyCachedEngine:
+    """KV-cached decoding on the NumPy engine."""
+
+    def __init__(self, model, *, trace_layer: int, sinks: int = 0, name: str = "numpy-cached"):
+        from .numpy_engine import NumpyDecoder
+
+        self.decoder = NumpyDecoder(model, sinks=sinks)
+        self.trace_layer = trace_layer
+        self.name = name
+
+    def start(self, prompt_ids: torch.Tensor) -> StepOutput:
+        return self._output(*self.decoder.prefill(prompt_ids.numpy()[None, :]))
+
+    def step(self, token_id: int) -> StepOutput:
+        import numpy as np
+
+        return self._output(*self.decoder.step(np.array([token_id], dtype=np.int64)))
+
+    def _output(self, logits, probs) -> StepOutput:
+        attn = probs[self.trace_layer][0, :, -1, :]
+        return StepOutput(torch.from_numpy(logits[0]).float(), torch.from_numpy(attn).float())
+
+
+@dataclass
+class Tolerances:
+    """Maximum absolute differences accepted per metric."""
+    logits: float = 1e-3
+    entropy: float = 1e-4
+    topk_prob: float = 1e-4
+    attn: float = 1e-5
+
+
+@dataclass
+class Divergence:
+    """One metric out of tolerance at one step."""
+    step: int
+    metric: str
+    error: float
+    tolerance: float
+
+
+@dataclass
+class PromptReport:
+    """Parity of one corpus prompt."""
+    name: str
+    steps: int = 0
+    max_error: dict[str, float] = field(default_factory=dict)
+    first_divergence: Divergence | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.first_divergence is None
+
+
+def _max_abs(a: torch.Tensor, b: torch.Tensor) -> float:
+    if a.shape != b.shape:
+        return math.inf
+    return (a - b).abs().max().item() if a.numel() else 0.0
+
+
+def _topk_error(ref: list[dict], cand: list[dict], tol: float) -> float:
+    """
+    Largest rank-wise probability difference between two top-k lists.
+
+    Token ids must agree at every rank, except between candidates whose
+    reference probabilities are within tol of each other (ties may swap).
+    """
+    if len(ref) != len(cand):
+        return math.inf
+    error = 0.0
+    for i, (r, c) in enumerate(zip(ref, cand)):
+        error = max(error, abs(r["prob"] - c["prob"]))
+        if r["token_id"] != c["token_id"]:
+            near = [ref[j]["prob"] for j in (i - 1, i + 1) if 0 <= j < len(ref)]
+            if not any(abs(r["prob"] - p) <= tol for p in near):
+                return math.inf
+    return error
+
+
+def compare_prompt(
+    reference: Engine,
+    candidate: Engine,
+    prompt_ids: torch.Tensor,
+    *,
+    name: str,
+    max_new_tokens: int,
+    temperature: float,
+    top_k: int | None,
+    seed: int,
+    tolerances: Tolerances,
+) -> PromptReport:
+    """
+    Decode one prompt through both engines and compare every step.
+
+    The candidate is teacher-forced with the reference's tokens, so each
+    step compares the two engines on an identical context even after a
+    divergence; the report keeps the first out-of-tolerance step and the
+    worst error of every metric. Sampled tokens are drawn from each
+    engine's own logits with identically seeded generators, so a token
+    mismatch means the logit differences changed a sample.
+
+    Returns:
+        PromptReport for the prompt
+    """
+    report = PromptReport(name=name)
+    ref_gen = torch.Generator().manual_seed(seed)
+    cand_gen = torch.Generator().manual_seed(seed)
+    ref_out, cand_out = reference.start(prompt_ids), candidate.start(prompt_ids)
+    generated: list[int] = []
+
+    for step in range(max_new_tokens):
+        ref_token, ref_probs = sample_token(ref_out.logits, temperature, top_k, ref_gen)
+        cand_token, cand_probs = sample_token(cand_out.logits, temperature, top_k, cand_gen)
+        ref_entropy, ref_topk = distribution_summary(ref_probs)
+        cand_entropy, cand_topk = distribution_summary(cand_probs)
+
+        errors = {
+            "logits": (_max_abs(ref_out.logits, cand_out.logits), tolerances.logits),
+            "token": (0.0 if ref_token == cand_token else math.inf, 0.0),
+            "entropy": (abs(ref_entropy - cand_entropy), tolerances.entropy),
+            "topk": (_topk_error(ref_topk, cand_topk, tolerances.topk_prob), tolerances.topk_prob),
+            "attn_row": (_max_abs(ref_out.attn_row, cand_out.attn_row), tolerances.attn),
+        }
+        if ref_out.attn_full is not None and cand_out.attn_full is not None:
+            errors["attn_full"] = (_max_abs(ref_out.attn_full, cand_out.attn_full), tolerances.attn)
+
+        for metric, (error, tol) in errors.items():
+            report.max_error[metric] = max(report.max_error.get(metric, 0.0), error)
+            if error > tol and report.first_divergence is None:
+                report.first_divergence = Divergence(step, metric, error, tol)
+        report.steps = step + 1
+
+        generated.append(ref_token)
+        if stop_position(bytes(generated)) is not None or step == max_new_tokens - 1:
+            break
+        ref_out, cand_out = reference.step(ref_token), candidate.step(ref_token)
+
+    return report
+
+
+def run_parity(
+    reference_factory,
+    candidate_factory,
+    corpus: list[dict],
+    *,
+    max_new_tokens: int = 32,
+    temperature: float = 0.0,
+    top_k: int | None = None,
+    seed: int = 0,
+    tolerances: Tolerances | None = None,
+) -> list[PromptReport]:
+    """
+    Compare a candidate engine against the reference over a prompt corpus.
+
+    Args:
+        reference_factory: Returns a fresh reference Engine
+        candidate_factory: Returns a fresh candidate Engine
+        corpus: [{"name": ..., "messages": [...]}] chat transcripts
+        max_new_tokens: Steps per prompt
+        temperature: Sampling temperature (0 = greedy)
+        top_k: Sampling top-k
+        seed: Sampling seed (per prompt, both engines)
+        tolerances: Per-metric tolerances (default Tolerances())
+
+    Returns:
+        One PromptReport per corpus entry
+    """
+    tolerances = tolerances or Tolerances()
+    reports = []
+    for i, entry in enumerate(corpus):
+        prompt_ids = encode(format_chat(entry["messages"]))
+        reports.append(compare_prompt(
+            reference_factory(),
+            candidate_factory(),
+            prompt_ids,
+            name=entry.get("name", f"prompt-{i}"),
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_k=top_k,
+            seed=seed,
+            tolerances=tolerances,
+        ))
+    return reports
+
+
+def report_dict(reports: list[PromptReport]) -> dict:
+    """JSON-serializable summary of a parity run."""
+    return {
+        "ok": all(r.ok for r in reports),
+        "prompts": [
+            {
+                "name": r.name,
+                "ok": r.ok,
+                "steps": r.steps,
+                "max_error": r.max_error,
+                "first_divergence": asdict(r.first_divergence) if r.first_divergence else None,
+            }
+            for r in reports
+        ],
+    }
@@ -0,0 +1,195 @@
+"""Load-aware quality-of-service degradation of trace fidelity."""
+
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from .scheduler import FairScheduler
+
+
+@dataclass(frozen=True)
+class QosLevel:
+    """What a stream gives up at one pressure level."""
+    name: str
+    trace_every: int  # attention rows only on every Nth step
+    max_heads: int | None  # attention rows for the first N heads only
+    precision: int | None  # decimals kept in attention weights
+    max_new_tokens: int | None  # cap on newly started generations
+    full_attn: bool  # /inspect/full_attn and /inspect/attn_summary allowed
+
+
+LEVELS = (
+    QosLevel("normal", 1, None, None, None, True),
+    QosLevel("elevated", 2, None, 3, None, True),
+    QosLevel("high", 4, 2, 2, 128, False),
+    QosLevel("critical", 8, 1, 2, 64, False),
+)
+
+
+class QosController:
+    """
+    Picks a QosLevel from measured scheduler pressure.
+
+    Pressure is the larger of queue depth (waiting steps per slot, relative
+    to queue_depth) and step latency (queue wait + run, relative to
+    target_step_ms). Levels 1..3 start at pressure 1, 2 and 4. The level
+    rises as soon as pressure does, and steps back down one level at a time
+    once pressure has stayed below the current level for recover_seconds.
+    """
+
+    THRESHOLDS = (1.0, 2.0, 4.0)
+
+    def __init__(
+        self,
+        scheduler: FairScheduler,
+        *,
+        enabled: bool = True,
+        queue_depth: float = 4.0,
+        target_step_ms: float = 250.0,
+        recover_seconds: float = 10.0,
+    ):
+        """
+        Args:
+            scheduler: Step scheduler whose queue and latency are measured
+            enabled: If False, always report the normal level
+            queue_depth: Waiting steps per slot counted as pressure 1
+            target_step_ms: Step latency counted as pressure 1
+            recover_seconds: Calm period before stepping down a level
+        """
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.queue_depth = queue_depth
+        self.target_step_ms = target_step_ms
+        self.recover_seconds = recover_seconds
+        self.index = 0
+        self._calm_since: float | None = None
+
+    def pressure(self) -> float:
+        """Current load relative to the configured targets (1.0 = at target)."""
+        scheduler = self.scheduler
+        queue = scheduler.waiting / max(scheduler.slots, 1) / self.queue_depth
+        # An idle scheduler has no latency, whatever the last measurement was
+        idle = scheduler.busy == 0 and scheduler.waiting == 0
+        latency = 0.0 if idle else scheduler.step_latency * 1000 / self.target_step_ms
+        return max(queue, latency)
+
+    def level(self, now: float | None = None) -> QosLevel:
+        """Update and return the current level."""
+        if not self.enabled:
+            return LEVELS[0]
+        now = time.monotonic() if now is None else now
+        target = sum(self.pressure() >= t for t in self.THRESHOLDS)
+
+        if target > self.index:
+            self.index = target
+            self._calm_since = None
+        elif target < self.index:
+            if self._calm_since is None:
+                self._calm_since = now
+            if now - self._calm_since >= self.recover_seconds:
+                self.index -= 1
+                self._calm_since = now
+        else:
+            self._calm_since = None
+        return LEVELS[self.index]
+
+    def cap_tokens(self, max_new_tokens: int) -> int:
+        """max_new_tokens after the current level's cap."""
+        cap = self.level().max_new_tokens
+        return max_new_tokens if cap is None else min(max_new_tokens, cap)
+
+    def stream(self, *, requested_tokens: int, max_new_tokens: int) -> "QosStream":
+        """
+        Per-generation QoS state to pass to stream_chat_events.
+
+        Args:
+            requested_tokens: max_new_tokens the client asked for
+            max_new_tokens: What the stream actually runs with
+        """
+        capped = max_new_tokens if max_new_tokens < requested_tokens else None
+        return QosStream(self.level, capped_tokens=capped)
+
+    @staticmethod
+    def describe(level: QosLevel, capped_tokens: int | None = None) -> dict:
+        """Payload of a qos event."""
+        data = {
+            "level": level.name,
+            "degraded": level is not LEVELS[0],
+            "trace_every": level.trace_every,
+            "max_heads": level.max_heads,
+            "precision": level.precision,
+            "full_attn": level.full_attn,
+        }
+        if capped_tokens is not None:
+            data["max_new_tokens"] = capped_tokens
+        return data
+
+    def status(self) -> dict:
+        """Current level and pressure."""
+        return {
+            "enabled": self.enabled,
+            "level": self.level().name,
+            "pressure": round(self.pressure(), 3),
+        }
+
+
+class QosStream:
+    """
+    One generation's view of the QoS level, applied where traces are built.
+
+    Generators call step() once per decoding step and yield the qos event
+    it returns: at the start of a degraded or token-capped stream, then
+    whenever the level changes, so the client can show it. Trace events are
+    never dropped (their entropy and top-k stay per step); their attention
+    comes from attn(), so degraded levels skip converting the rows and
+    heads they leave out.
+    """
+
+    def __init__(self, level: Callable[[], QosLevel] = lambda: LEVELS[0], *, capped_tokens: int | None = None):
+        """
+        Args:
+            level: Current level (e.g. QosController.level)
+            capped_tokens: max_new_tokens, if the level cut it down
+        """
+        self._level = level
+        self.capped_tokens = capped_tokens
+        self.current: QosLevel | None = None
+
+    def step(self) -> dict | None:
+        """Take the level for the next step; returns a qos event if it should be announced."""
+        level = self._level()
+        announce = level is not self.current and (
+            self.current is not None or level is not LEVELS[0] or self.capped_tokens is not None
+        )
+        self.current = level
+        if not announce:
+            return None
+        event = {"event": "qos", "data": QosController.describe(level, self.capped_tokens)}
+        self.capped_tokens = None
+        return event
+
+    def attn(self, attn, step: int) -> dict:
+        """A trace event's attention fields for an (H, t) tensor or array at the current level."""
+        return thin_attn(attn, step, self.current or LEVELS[0])
+
+
+def thin_attn(attn, step: int, level: QosLevel) -> dict:
+    """
+    Attention fields of one trace event at a QoS level.
+
+    Off-cadence steps get no "attn"; kept rows are limited to the first
+    max_heads heads (listed in "heads") and rounded to precision before
+    the (H, t) tensor or array is converted to lists.
+    """
+    if step % level.trace_every:
+        return {}
+    fields = {}
+    if level.max_heads is not None and level.max_heads < len(attn):
+        attn = attn[:level.max_heads]
+        fields["heads"] = list(range(level.max_heads))
+    if level.precision is not None:
+        # In float64, so the rounded values stay short in JSON
+        attn = attn.double() if hasattr(attn, "double") else attn.astype("float64")
+        attn = attn.round(decimals=level.precision)
+    fields["attn"] = attn.tolist()
+    return fields
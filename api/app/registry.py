@@ -0,0 +1,208 @@
+"""Multi-checkpoint model registry with memory-budgeted LRU residency."""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+MODEL_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+class ModelNotFound(KeyError):
+    """Raised when a model id has no checkpoint in the registry directory."""
+
+
+@dataclass
+class ModelMetrics:
+    """Per-model usage counters."""
+    requests: int = 0
+    loads: int = 0
+    evictions: int = 0
+    load_seconds: float = 0.0
+    last_used: float | None = None
+
+
+@dataclass
+class ResidentModel:
+    """A loaded model held by the registry."""
+    model: Any
+    cfg: Any
+    nbytes: int
+    pinned: bool = False
+
+
+def model_nbytes(model) -> int:
+    """
+    Parameter + buffer bytes of a model, counting shared (tied) tensors once.
+
+    Models that report their own size (e.g. the numpy engine's nbytes) are
+    taken at their word; objects without parameters (e.g. test doubles)
+    count as 0.
+    """
+    if hasattr(model, "nbytes"):
+        return int(model.nbytes)
+    if not hasattr(model, "parameters"):
+        return 0
+    seen = set()
+    total = 0
+    tensors = list(model.parameters()) + list(getattr(model, "buffers", lambda: [])())
+    for tensor in tensors:
+        if tensor.data_ptr() in seen:
+            continue
+        seen.add(tensor.data_ptr())
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelRegistry:
+    """
+    Loads checkpoints from a directory on demand and keeps an LRU of
+    resident models within a byte budget.
+
+    Model ids are checkpoint file stems: "<ckpt_dir>/<id>.pt". Pinned models
+    (the startup default) are never evicted and don't count against eviction
+    order, but their bytes do count toward the budget.
+    """
+
+    def __init__(
+        self,
+        ckpt_dir: Path,
+        *,
+        budget_bytes: int,
+        loader: Callable[[Path], tuple[Any, Any]] | None = None,
+    ):
+        """
+        Args:
+            ckpt_dir: Directory containing <id>.pt checkpoints
+            budget_bytes: Max resident parameter bytes before LRU eviction
+            loader: Function loading (model, cfg) from a path (default
+                    checkpoint.load_checkpoint_file)
+        """
+        self.ckpt_dir = Path(ckpt_dir)
+        self.budget_bytes = budget_bytes
+        self._loader = loader
+        self._resident: OrderedDict[str, ResidentModel] = OrderedDict()
+        self._metrics: dict[str, ModelMetrics] = {}
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+
+    def path_for(self, model_id: str) -> Path:
+        """
+        Checkpoint path for a model id.
+
+        Raises:
+            ModelNotFound: If the id is malformed or the file doesn't exist
+        """
+        if not MODEL_ID_PATTERN.match(model_id):
+            raise ModelNotFound(model_id)
+        path = self.ckpt_dir / f"{model_id}.pt"
+        if not path.is_file():
+            raise ModelNotFound(model_id)
+        return path
+
+    def available(self) -> list[str]:
+        """Model ids with a checkpoint on disk or currently resident."""
+        on_disk = {p.stem for p in self.ckpt_dir.glob("*.pt")} if self.ckpt_dir.is_dir() else set()
+        with self._lock:
+            return sorted(on_disk | set(self._resident))
+
+    def put(self, model_id: str, model, cfg, *, pinned: bool = False):
+        """Register an already-loaded model (e.g. the startup default)."""
+        with self._lock:
+            self._resident[model_id] = ResidentModel(model, cfg, model_nbytes(model), pinned)
+            self._resident.move_to_end(model_id)
+            self._metrics.setdefault(model_id, ModelMetrics())
+            self._evict_over_budget(keep=model_id)
+
+    def get(self, model_id: str) -> tuple[Any, Any]:
+        """
+        Return (model, cfg), loading the checkpoint if not resident.
+
+        Blocking; call from a worker thread in async code.
+
+        Raises:
+            ModelNotFound: If no checkpoint exists for the id
+        """
+        with self._lock:
+            entry = self._resident.get(model_id)
+            if entry is not None:
+                self._resident.move_to_end(model_id)
+                return entry.model, entry.cfg
+
+        # Validate before keeping any per-id state, so unknown ids leave none
+        path = self.path_for(model_id)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        # One loader per id; concurrent callers wait and reuse its result
+        with load_lock:
+            with self._lock:
+                entry = self._resident.get(model_id)
+                if entry is not None:
+                    self._resident.move_to_end(model_id)
+                    return entry.model, entry.cfg
+
+            start = time.monotonic()
+            try:
+                model, cfg = self._load(path)
+            except BaseException:
+                with self._lock:
+                    if self._load_locks.get(model_id) is load_lock:
+                        del self._load_locks[model_id]
+                raise
+            elapsed = time.monotonic() - start
+
+            with self._lock:
+                self._resident[model_id] = ResidentModel(model, cfg, model_nbytes(model))
+                metrics = self._metrics.setdefault(model_id, ModelMetrics())
+                metrics.loads += 1
+                metrics.load_seconds += elapsed
+                self._evict_over_budget(keep=model_id)
+            return model, cfg
+
+    def record_request(self, model_id: str):
+        """Count a request served by model_id."""
+        with self._lock:
+            metrics = self._metrics.setdefault(model_id, ModelMetrics())
+            metrics.requests += 1
+            metrics.last_used = time.time()
+
+    def status(self) -> dict:
+        """Resident models, budget usage and per-model metrics."""
+        with self._lock:
+            warm = [
+                {"id": model_id, "bytes": entry.nbytes, "pinned": entry.pinned}
+                for model_id, entry in self._resident.items()
+            ]
+            metrics = {model_id: vars(m).copy() for model_id, m in self._metrics.items()}
+            resident_bytes = sum(entry.nbytes for entry in self._resident.values())
+        return {
+            "warm": warm,
+            "available": self.available(),
+            "resident_bytes": resident_bytes,
+            "budget_bytes": self.budget_bytes,
+            "metrics": metrics,
+        }
+
+    def _load(self, path: Path):
+        """Load a checkpoint with the configured loader."""
+        if self._loader is None:
+            from .checkpoint import load_checkpoint_file
+            return load_checkpoint_file(path)
+        return self._loader(path)
+
+    def _evict_over_budget(self, *, keep: str):
+        """Evict least recently used unpinned models until within budget (lock held)."""
+        total = sum(entry.nbytes for entry in self._resident.values())
+        for model_id in list(self._resident):
+            if total <= self.budget_bytes:
+                break
+            entry = self._resident[model_id]
+            if entry.pinned or model_id == keep:
+                continue
+            del self._resident[model_id]
+            total -= entry.nbytes
+            self._metrics[model_id].evictions += 1
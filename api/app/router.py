@@ -0,0 +1,498 @@
+"""Session-affinity routing front end for several API nodes."""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import re
+import secrets
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from .schemas import ErrorResponse
+
+SESSION_PATH = re.compile(r"^/sessions/([^/]+)")
+# Node admin endpoints act on that node's own state, so they go to every node
+ADMIN_PATH = re.compile(r"^/admin(/|$)")
+CONVERSATION_HEADER = "x-conversation-key"
+# Hop-by-hop and length headers are recomputed for each leg
+SKIP_HEADERS = {"host", "content-length", "connection", "keep-alive", "transfer-encoding", "upgrade"}
+
+
+class NoNodeAvailable(Exception):
+    """No node in the ring is healthy with its model loaded."""
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Each node owns `vnodes` points on the ring and a key belongs to the
+    first point clockwise from its hash, so adding or removing a node only
+    moves the keys of that node's arcs (about 1/N of them).
+    """
+
+    def __init__(self, vnodes: int = 64):
+        self.vnodes = vnodes
+        self.nodes: set[str] = set()
+        self._points: list[int] = []
+        self._owners: dict[int, str] = {}
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            if point in self._owners:  # vanishingly rare; first owner keeps it
+                continue
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: n for p, n in self._owners.items() if n != node}
+
+    def candidates(self, key: str) -> list[str]:
+        """Every node, in ring order from the key's owner."""
+        if not self._points:
+            return []
+        start = bisect.bisect(self._points, _hash(key))
+        ordered: list[str] = []
+        for i in range(len(self._points)):
+            node = self._owners[self._points[(start + i) % len(self._points)]]
+            if node not in ordered:
+                ordered.append(node)
+                if len(ordered) == len(self.nodes):
+                    break
+        return ordered
+
+
+@dataclass
+class NodeState:
+    """Health and load of one node, from its /health and the router's own traffic."""
+    url: str
+    healthy: bool = True  # until the first check says otherwise
+    model_ready: bool = True
+    slots: int = 1
+    waiting: int = 0
+    inflight: int = 0  # requests the router has open on the node
+    routed: int = 0
+    failures: int = 0
+    last_checked: float | None = None
+    error: str | None = None
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and self.model_ready
+
+    @property
+    def load(self) -> float:
+        """Queued chat steps plus open requests, per step slot."""
+        return (self.waiting + self.inflight) / max(self.slots, 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "available": self.available,
+            "healthy": self.healthy,
+            "model_ready": self.model_ready,
+            "load": round(self.load, 3),
+            "waiting": self.waiting,
+            "inflight": self.inflight,
+            "routed": self.routed,
+            "failures": self.failures,
+            "last_checked": self.last_checked,
+            "error": self.error,
+        }
+
+
+class AffinityRouter:
+    """
+    Picks a node per request so a conversation keeps hitting the same one.
+
+    Stateless requests go to the ring owner of their conversation key,
+    unless it is unavailable or its load (queued steps plus open requests
+    per step slot) has reached max_load; then the next node clockwise
+    takes them, and if every node is that loaded the least loaded one.
+    Sessions live on the node that created them, so their ids are pinned
+    to it rather than hashed; a pinned node that leaves takes its sessions
+    with it.
+    """
+
+    def __init__(self, nodes: list[str], *, vnodes: int = 64, max_load: float = 4.0, max_pins: int = 100_000):
+        """
+        Args:
+            nodes: Node base URLs (e.g. http://127.0.0.1:8001)
+            vnodes: Ring points per node
+            max_load: Load at which requests spill to the next node
+            max_pins: Session ids remembered (least recently used dropped first)
+        """
+        self.ring = HashRing(vnodes)
+        self.max_load = max_load
+        self.max_pins = max_pins
+        self.nodes: dict[str, NodeState] = {}
+        self.owner_hits = 0
+        self.spills = 0
+        self._pins: OrderedDict[str, str] = OrderedDict()
+        for url in nodes:
+            self.add_node(url)
+
+    def add_node(self, url: str) -> NodeState:
+        url = url.rstrip("/")
+        if url not in self.nodes:
+            self.nodes[url] = NodeState(url)
+            self.ring.add(url)
+        return self.nodes[url]
+
+    def remove_node(self, url: str) -> bool:
+        url = url.rstrip("/")
+        if self.nodes.pop(url, None) is None:
+            return False
+        self.ring.remove(url)
+        for session_id in [s for s, node in self._pins.items() if node == url]:
+            del self._pins[session_id]
+        return True
+
+    def pin(self, session_id: str, url: str):
+        """Remember which node holds a session."""
+        self._pins[session_id] = url
+        self._pins.move_to_end(session_id)
+        while len(self._pins) > self.max_pins:
+            self._pins.popitem(last=False)
+
+    def unpin(self, session_id: str):
+        self._pins.pop(session_id, None)
+
+    def pinned(self, session_id: str) -> str | None:
+        url = self._pins.get(session_id)
+        if url is not None:
+            self._pins.move_to_end(session_id)
+        return url
+
+    def order(self, key: str) -> list[NodeState]:
+        """
+        Available nodes in the order to try them for key.
+
+        Raises:
+            NoNodeAvailable: If no node is available
+        """
+        ring = self.ring.candidates(key)
+        nodes = [self.nodes[url] for url in ring if self.nodes[url].available]
+        if not nodes:
+            raise NoNodeAvailable("No API node is available, please retry")
+        below = [n for n in nodes if n.load < self.max_load]
+        above = sorted((n for n in nodes if n.load >= self.max_load), key=lambda n: n.load)
+        ordered = below + above
+        if ordered[0].url == ring[0]:
+            self.owner_hits += 1
+        else:
+            self.spills += 1
+        return ordered
+
+    def update(self, url: str, health: dict | None, error: str | None = None):
+        """Record a /health response (None with error if the check failed)."""
+        node = self.nodes.get(url)
+        if node is None:
+            return
+        node.last_checked = time.time()
+        node.error = error
+        if health is None:
+            node.healthy = False
+            node.failures += 1
+            return
+        scheduler = health.get("scheduler") or {}
+        node.healthy = bool(health.get("ok"))
+        node.model_ready = bool(health.get("model_ready"))
+        node.slots = scheduler.get("slots") or 1
+        node.waiting = scheduler.get("waiting", 0)
+
+    def status(self) -> dict:
+        """Nodes, their load and how often requests reached their key's owner."""
+        routed = self.owner_hits + self.spills
+        return {
+            "nodes": [node.to_dict() for node in self.nodes.values()],
+            "vnodes": self.ring.vnodes,
+            "max_load": self.max_load,
+            "pinned_sessions": len(self._pins),
+            "owner_hits": self.owner_hits,
+            "spills": self.spills,
+            "owner_hit_rate": round(self.owner_hits / routed, 4) if routed else None,
+        }
+
+
+def conversation_key(request: Request, body: bytes) -> str:
+    """
+    Routing key of a stateless request.
+
+    An X-Conversation-Key header wins. Otherwise chat and inspect bodies are
+    keyed by their model and messages up to the first user message, which
+    every later turn of the same conversation resends unchanged; anything
+    else by client (X-API-Key or IP).
+    """
+    key = request.headers.get(CONVERSATION_HEADER)
+    if key:
+        return key
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        payload = None
+    if isinstance(payload, dict) and isinstance(payload.get("messages"), list):
+        opening = []
+        for message in payload["messages"]:
+            opening.append(message)
+            if isinstance(message, dict) and message.get("role") == "user":
+                break
+        return json.dumps([payload.get("model"), opening], sort_keys=True)
+    return request.headers.get("x-api-key") or request.client.host
+
+
+def create_router(
+    nodes: list[str],
+    *,
+    vnodes: int = 64,
+    max_load: float = 4.0,
+    poll_seconds: float = 2.0,
+    admin_token: str | None = None,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> FastAPI:
+    """
+    Create the routing front end.
+
+    Every request except the router's own /health and /admin/nodes is
+    proxied (streaming) to the node chosen by an AffinityRouter; session
+    ids from POST /sessions responses are pinned to the node that made
+    them. Other /admin/* requests are sent to every node and answered with
+    each node's response. Node /health is polled every poll_seconds.
+
+    Args:
+        nodes: Node base URLs
+        vnodes: Ring points per node
+        max_load: Load at which requests spill to the next node
+        poll_seconds: Health poll interval (0 = no polling)
+        admin_token: Token for /admin/nodes (None = disabled)
+        transport: httpx transport for the upstream client (for testing)
+
+    Returns:
+        FastAPI app
+    """
+    router = AffinityRouter(nodes, vnodes=vnodes, max_load=max_load)
+
+    async def check(client: httpx.AsyncClient, node: NodeState):
+        try:
+            response = await client.get(f"{node.url}/health", timeout=max(poll_seconds, 1.0))
+            response.raise_for_status()
+            router.update(node.url, response.json())
+        except (httpx.HTTPError, ValueError) as e:
+            router.update(node.url, None, error=f"{type(e).__name__}: {e}")
+
+    async def poll(client: httpx.AsyncClient):
+        while True:
+            await asyncio.gather(*(check(client, node) for node in list(router.nodes.values())))
+            await asyncio.sleep(poll_seconds)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        task = asyncio.create_task(poll(app.state.client)) if poll_seconds > 0 else None
+        yield
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        await app.state.client.aclose()
+
+    app = FastAPI(title="niels-gpt Router", lifespan=lifespan)
+    app.state.router = router
+    app.state.admin_token = admin_token
+    # Generation streams stay open for as long as the model writes
+    app.state.client = httpx.AsyncClient(
+        transport=transport, timeout=httpx.Timeout(10.0, read=None)
+    )
+
+    def error_response(status_code: int, error: str, code: str):
+        return JSONResponse(
+            status_code=status_code,
+            content=ErrorResponse(error=error, code=code).model_dump()
+        )
+
+    def check_admin(request: Request):
+        """Return a 403 JSONResponse unless the request carries the admin token."""
+        token = request.headers.get("x-admin-token", "")
+        expected = app.state.admin_token
+        if not expected or not secrets.compare_digest(token, expected):
+            return error_response(403, "Admin token missing or invalid", "forbidden")
+        return None
+
+    @app.get("/health")
+    async def health():
+        """Router status (ok while any node is available)."""
+        available = any(node.available for node in router.nodes.values())
+        return {"ok": available, "router": router.status()}
+
+    @app.post("/admin/nodes")
+    async def add_node(request: Request):
+        """Add a node ({"url": ...}) and check its health; its share of keys moves to it."""
+        error = check_admin(request)
+        if error is not None:
+            return error
+        url = (await request.json()).get("url")
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            return error_response(422, "url must be an http(s) base URL", "invalid_url")
+        node = router.add_node(url)
+        await check(app.state.client, node)
+        return router.status()
+
+    @app.delete("/admin/nodes")
+    async def remove_node(request: Request, url: str):
+        """Remove a node; its keys move to their next node clockwise."""
+        error = check_admin(request)
+        if error is not None:
+            return error
+        if not router.remove_node(url):
+            return error_response(404, f"Unknown node: {url}", "node_not_found")
+        return router.status()
+
+    async def locate(session_id: str) -> str | None:
+        """Find and pin the node holding a session the router has not seen."""
+        for node in list(router.nodes.values()):
+            if not node.available:
+                continue
+            with suppress(httpx.HTTPError):
+                response = await app.state.client.get(f"{node.url}/sessions/{session_id}")
+                if response.status_code == 200:
+                    router.pin(session_id, node.url)
+                    return node.url
+        return None
+
+    async def send(node: NodeState, request: Request, body: bytes) -> httpx.Response:
+        headers = [(k, v) for k, v in request.headers.items() if k.lower() not in SKIP_HEADERS]
+        # Nodes key rate limits and fair scheduling by client address
+        forwarded = request.headers.get("x-forwarded-for")
+        headers.append(("x-forwarded-for", f"{forwarded}, {request.client.host}" if forwarded else request.client.host))
+        upstream = app.state.client.build_request(
+            request.method,
+            node.url + request.url.path,
+            params=request.url.query,
+            headers=headers,
+            content=body,
+        )
+        return await app.state.client.send(upstream, stream=True)
+
+    async def fan_out(request: Request, body: bytes) -> JSONResponse:
+        """
+        Send a request to every node and collect their responses.
+
+        The status is the nodes' common status code, or 207 when they differ
+        ({"nodes": [{"url", "status_code", "body"} | {"url", "error"}]}).
+        """
+        async def one(node: NodeState) -> dict:
+            try:
+                response = await send(node, request, body)
+                try:
+                    await response.aread()
+                finally:
+                    await response.aclose()
+            except httpx.HTTPError as e:
+                return {"url": node.url, "error": f"{type(e).__name__}: {e}"}
+            try:
+                content = response.json()
+            except ValueError:
+                content = response.text
+            return {"url": node.url, "status_code": response.status_code, "body": content}
+
+        results = await asyncio.gather(*(one(node) for node in list(router.nodes.values())))
+        codes = {r["status_code"] for r in results if "status_code" in r}
+        if not codes:
+            return error_response(503, "No API node is reachable, please retry", "no_node_available")
+        status_code = codes.pop() if len(codes) == 1 and all("status_code" in r for r in results) else 207
+        return JSONResponse(status_code=status_code, content={"nodes": results})
+
+    async def relay(node: NodeState, response: httpx.Response) -> Response:
+        if response.is_stream_consumed:
+            # Already read (to pin a session): send the decoded body
+            await response.aclose()
+            node.inflight -= 1
+            headers = {
+                k: v for k, v in response.headers.items()
+                if k.lower() not in SKIP_HEADERS and k.lower() != "content-encoding"
+            }
+            headers["x-routed-node"] = node.url
+            return Response(response.content, status_code=response.status_code, headers=headers)
+
+        async def chunks():
+            try:
+                async for chunk in response.aiter_raw():
+                    yield chunk
+            finally:
+                await response.aclose()
+                node.inflight -= 1
+
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in SKIP_HEADERS}
+        headers["x-routed-node"] = node.url
+        return StreamingResponse(chunks(), status_code=response.status_code, headers=headers)
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def proxy(request: Request, path: str):
+        """Forward a request to its conversation's node."""
+        body = await request.body()
+        if ADMIN_PATH.match(request.url.path):
+            return await fan_out(request, body)
+
+        # Sessions go to the node holding them; everything else by key
+        match = SESSION_PATH.match(request.url.path)
+        session_id = match.group(1) if match else None
+        try:
+            if session_id is not None:
+                url = router.pinned(session_id) or await locate(session_id)
+                if url is None or not router.nodes[url].available:
+                    return error_response(
+                        404, f"Session not found or expired: {session_id}", "session_not_found"
+                    )
+                candidates = [router.nodes[url]]
+            elif request.url.path == "/sessions" and request.method == "POST":
+                # New sessions spread over the ring unless the client names a key
+                key = request.headers.get(CONVERSATION_HEADER) or uuid.uuid4().hex
+                candidates = router.order(key)
+            else:
+                candidates = router.order(conversation_key(request, body))
+        except NoNodeAvailable as e:
+            return error_response(503, str(e), "no_node_available")
+
+        # Try nodes in order while they refuse the connection (nothing was sent)
+        for node in candidates:
+            node.inflight += 1
+            try:
+                response = await send(node, request, body)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                node.inflight -= 1
+                router.update(node.url, None, error=f"{type(e).__name__}: {e}")
+                continue
+            except BaseException:
+                node.inflight -= 1
+                raise
+            node.routed += 1
+            if session_id is None and request.url.path == "/sessions" and response.status_code == 200:
+                await response.aread()
+                with suppress(ValueError, KeyError):
+                    router.pin(response.json()["session_id"], node.url)
+            elif session_id is not None and request.method == "DELETE" and response.status_code == 200:
+                router.unpin(session_id)
+            return await relay(node, response)
+
+        return error_response(503, "No API node is reachable, please retry", "no_node_available")
+
+    return app
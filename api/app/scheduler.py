@@ -0,0 +1,226 @@
+"""Step-level weighted fair scheduling of generation streams across clients."""
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Iterator
+
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from .timing import queue_wait
+
+_DONE = object()
+
+
+def _close(items: Iterator):
+    close = getattr(items, "close", None)
+    if close is not None:
+        close()
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    """
+    Parse a "client=weight,client=weight" spec.
+
+    Raises:
+        ValueError: If an entry is malformed or a weight is not positive
+    """
+    weights = {}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        client, sep, weight = entry.rpartition("=")
+        if not sep or not client:
+            raise ValueError(f"Bad client weight entry: {entry!r} (expected client=weight)")
+        weights[client.strip()] = float(weight)
+        if weights[client.strip()] <= 0:
+            raise ValueError(f"Client weight must be positive: {entry!r}")
+    return weights
+
+
+class FairScheduler:
+    """
+    Start-time fair queuing of generation steps.
+
+    Every advance of a stream (prefill, or one decode step) is a unit of
+    work run in the threadpool while holding one of `slots` step slots.
+    Each client carries a virtual time: the wall-clock seconds its steps
+    have used, divided by its weight. A free slot goes to the waiting step
+    whose client has the lowest virtual time, so long streams interleave
+    with others one step at a time, and a client's share of the step slots
+    is bounded by weight / (sum of active weights) however many streams it
+    opens.
+
+    A client arriving after being idle starts at the current virtual clock
+    (the start tag of the last dispatched step): its first token is not
+    queued behind others' backlogs, and idle time does not bank credit.
+
+    All methods run on the event loop; only the steps themselves run in
+    worker threads.
+    """
+
+    def __init__(self, slots: int = 1, weights: dict[str, float] | None = None):
+        """
+        Args:
+            slots: Steps allowed to run at once (<= 0 disables scheduling)
+            weights: Per-client weight (default 1.0)
+        """
+        self.slots = slots
+        self.weights = weights or {}
+        self.clock = 0.0
+        self.busy = 0
+        self.vtime: dict[str, float] = {}
+        self.streams: dict[str, int] = defaultdict(int)
+        self.steps: dict[str, int] = defaultdict(int)
+        self.dispatched = 0  # steps started since creation
+        self.step_latency = 0.0  # EWMA of queue wait + run per forward step, seconds
+        self._waiting: list[tuple[int, str, asyncio.Future]] = []
+        self._seq = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.slots > 0
+
+    def weight(self, client: str) -> float:
+        return self.weights.get(client, 1.0)
+
+    @property
+    def waiting(self) -> int:
+        """Steps queued for a slot."""
+        return len(self._waiting)
+
+    async def acquire(self, client: str):
+        """Wait for a step slot on behalf of client."""
+        if self.busy < self.slots and not self._waiting:
+            self._start(client)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        self._waiting.append((self._seq, client, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we were cancelled: pass it on
+                self.release(client, 0.0)
+            else:
+                self._waiting = [w for w in self._waiting if w[2] is not future]
+            raise
+
+    def release(self, client: str, seconds: float):
+        """Charge client for a finished step and hand the slot on."""
+        self.vtime[client] = self.vtime.get(client, self.clock) + seconds / self.weight(client)
+        self.busy -= 1
+        # Dispatch on the next loop turn, so a stream that is still producing
+        # has re-queued its next step and competes for the slot too
+        asyncio.get_running_loop().call_soon(self._dispatch)
+
+    def _start(self, client: str):
+        # Idle clients restart at the clock rather than keeping old credit
+        start = max(self.vtime.get(client, self.clock), self.clock)
+        self.vtime[client] = start
+        self.clock = start
+        self.busy += 1
+        self.dispatched += 1
+
+    def _dispatch(self):
+        while self.busy < self.slots and self._waiting:
+            # Lowest virtual time wins; FIFO among equals
+            best = min(
+                self._waiting,
+                key=lambda w: (max(self.vtime.get(w[1], self.clock), self.clock), w[0]),
+            )
+            self._waiting.remove(best)
+            self._start(best[1])
+            best[2].set_result(None)
+
+    async def run(
+        self,
+        items: Iterator,
+        client: str,
+        is_forward: Callable[[object], bool] | None = None,
+    ) -> AsyncIterator:
+        """
+        Advance a blocking iterator one scheduled step at a time.
+
+        Each step's wait for a slot is visible to the iterator as
+        timing.queue_wait while its next() runs. Every next() is charged
+        to the client, but only those yielding an item that is_forward
+        accepts (e.g. a token event) count as steps and feed step_latency:
+        the cheap trace, qos and done events in between would otherwise
+        dilute the per-forward latency the QoS controller targets.
+
+        Args:
+            items: Sync iterator whose next() does the work (e.g. SSE events)
+            client: Client key the steps are charged to
+            is_forward: Whether an item cost a model forward (default: all do)
+
+        Yields:
+            The iterator's items
+        """
+        if not self.enabled:
+            async for item in iterate_in_threadpool(items):
+                yield item
+            return
+
+        self.streams[client] += 1
+        step = None
+        try:
+            while True:
+                queued = time.perf_counter()
+                await self.acquire(client)
+                started = time.perf_counter()
+                queue_wait.set(started - queued)
+                # Shielded: a cancelled consumer must not free the slot or
+                # close the iterator while a worker is still inside next()
+                step = asyncio.ensure_future(run_in_threadpool(next, items, _DONE))
+                item = await asyncio.shield(step)
+                step = None
+                finished = time.perf_counter()
+                self.release(client, finished - started)
+                if item is _DONE:
+                    return
+                if is_forward is None or is_forward(item):
+                    self.steps[client] += 1
+                    self.step_latency += 0.2 * ((finished - queued) - self.step_latency)
+                yield item
+        finally:
+            self.streams[client] -= 1
+            if not self.streams[client]:
+                del self.streams[client]
+                self.steps.pop(client, None)
+                # Forget clients with no debt; they would restart at the clock anyway
+                if self.vtime.get(client, 0.0) <= self.clock:
+                    self.vtime.pop(client, None)
+            if step is None:
+                _close(items)
+            elif step.done():
+                # next() raised: the slot is still held
+                self.release(client, time.perf_counter() - started)
+                _close(items)
+            else:
+                # Cancelled mid-step: finish once the worker returns
+                step.add_done_callback(lambda _: self._abandon(step, client, started, items))
+
+    def _abandon(self, step: asyncio.Future, client: str, started: float, items: Iterator):
+        """Release the slot of a step whose consumer went away, then close its iterator."""
+        if not step.cancelled():
+            step.exception()  # retrieved; nobody is waiting for it
+        self.release(client, time.perf_counter() - started)
+        _close(items)
+
+    def status(self) -> dict:
+        """Slots in use, queued steps and per-client active streams."""
+        return {
+            "slots": self.slots,
+            "busy": self.busy,
+            "waiting": len(self._waiting),
+            "step_latency_ms": round(self.step_latency * 1000, 3),
+            "clients": {
+                client: {
+                    "streams": count,
+                    "weight": self.weight(client),
+                    "steps": self.steps.get(client, 0),
+                    "lag_seconds": round(max(self.vtime.get(client, self.clock) - self.clock, 0.0), 6),
+                }
+                for client, count in self.streams.items()
+            },
+        }
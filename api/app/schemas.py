@@ -3,27 +3,63 @@
 from typing import Literal
 from pydantic import BaseModel, Field
 
+from .config import MAX_CHAT_SAMPLES
+
 
 class ChatMessage(BaseModel):
     role: Literal["system", "user", "assistant"]
     content: str
 
 
-class ChatRequest(BaseModel):
-    messages: list[ChatMessage]
+class GenerationParams(BaseModel):
+    """Sampling and tracing options shared by /chat/stream and session turns."""
     max_new_tokens: int = 256
     temperature: float = 0.9
     top_k: int | None = 50
     seed: int = 42
     trace_layer: int
+    trace_layers: int | None = None  # bitmask: bit i captures layer i for /traces
+    logit_lens: bool = False
+    context_mode: Literal["crop", "rolling"] = "crop"
+    n: int = Field(default=1, ge=1, le=MAX_CHAT_SAMPLES)  # parallel samples, seeds seed..seed+n-1
+    timings: bool = False  # per-step "timing" in trace events, summary in done
+
+
+class ChatRequest(GenerationParams):
+    messages: list[ChatMessage]
+    model: str | None = None  # checkpoint id in CKPT_DIR; None = default model
+
+
+class SessionCreateRequest(BaseModel):
+    messages: list[ChatMessage] = []  # starting history, e.g. a system prompt
+    model: str | None = None  # used for every turn
+
+
+class SessionTurnRequest(GenerationParams):
+    message: ChatMessage  # only the new message; history is kept server-side
 
 
 class FullAttnRequest(BaseModel):
     messages: list[ChatMessage]
+    model: str | None = None
     trace_layer: int
     head: int
     seed: int = 42
     max_new_tokens: int = 0
+    # Optional window [start, end) and overview downsampling
+    row_start: int = Field(default=0, ge=0)
+    row_end: int | None = Field(default=None, ge=1)
+    col_start: int = Field(default=0, ge=0)
+    col_end: int | None = Field(default=None, ge=1)
+    resolution: int | None = Field(default=None, ge=1)
+    pool: Literal["max", "mean"] = "max"
+    stream: bool = False  # NDJSON rows instead of one JSON body
+
+
+class AttnSummaryRequest(BaseModel):
+    messages: list[ChatMessage]
+    model: str | None = None
+    top_k: int = Field(default=5, ge=1, le=32)  # most-attended positions per head
 
 
 class ErrorResponse(BaseModel):
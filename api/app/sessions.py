@@ -0,0 +1,274 @@
+"""Server-side conversation sessions that keep the encoded transcript between turns."""
+
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterator
+
+
+class SessionNotFound(KeyError):
+    """Unknown, expired or evicted session id."""
+
+
+class SessionBusy(Exception):
+    """A turn is already streaming on this session."""
+
+
+class SessionTooLarge(ValueError):
+    """The transcript would exceed the session token limit."""
+
+    def __init__(self, tokens: int, max_tokens: int):
+        self.tokens = tokens
+        self.max_tokens = max_tokens
+        super().__init__(f"Prompt too large: {tokens} bytes (max {max_tokens})")
+
+
+def _encode(text: str) -> list[int]:
+    # Byte-level tokens: one id per utf-8 byte
+    return list(text.encode("utf-8"))
+
+
+class ChatEncoder:
+    """
+    Encodes transcripts one message at a time where the chat format allows.
+
+    format_chat renders a list of messages followed by the generation
+    prompt. When it is a plain concatenation (format_chat(a + b) ==
+    body(a) + body(b) + prompt, with body(m) = format_chat([m]) minus the
+    prompt), a session can keep the ids of the history and encode only the
+    new message each turn. That is checked once on construction; otherwise
+    every turn formats the full history.
+    """
+
+    def __init__(self, format_chat):
+        self.format_chat = format_chat
+        self.incremental = False
+        try:
+            self.prompt = format_chat([])
+            sample = [
+                {"role": "system", "content": "s"},
+                {"role": "user", "content": "u é"},
+                {"role": "assistant", "content": "a\n"},
+            ]
+            self.incremental = bool(self.prompt) and format_chat(sample) == (
+                "".join(self._body(m) for m in sample) + self.prompt
+            )
+        except Exception:
+            self.incremental = False
+        if self.incremental:
+            self.prompt_ids = _encode(self.prompt)
+
+    def _body(self, message: dict) -> str:
+        text = self.format_chat([message])
+        if not text.endswith(self.prompt):
+            raise ValueError("format_chat output does not end with the generation prompt")
+        return text[:len(text) - len(self.prompt)]
+
+    def history(self, messages: list[dict]) -> list[int] | None:
+        """Ids of messages without the generation prompt (None if not incremental)."""
+        if not self.incremental:
+            return None
+        return [i for m in messages for i in _encode(self._body(m))]
+
+    def extend(self, history: list[int] | None, messages: list[dict]) -> list[int] | None:
+        """History ids with messages appended (None if not incremental)."""
+        if history is None:
+            return None
+        return history + self.history(messages)
+
+    def prompt_for(self, history: list[int] | None, all_messages: list[dict]) -> list[int]:
+        """Ids of the full generation prompt."""
+        if history is None:
+            return _encode(self.format_chat(all_messages))
+        return history + self.prompt_ids
+
+
+@dataclass
+class Session:
+    """One conversation: its messages and the encoded history."""
+    id: str
+    model: str | None
+    messages: list[dict]
+    history_ids: list[int] | None
+    created: float
+    last_used: float
+    busy: bool = False
+    turn: int = 0  # incremented by every begin_turn
+
+    def info(self) -> dict:
+        return {
+            "session_id": self.id,
+            "model": self.model,
+            "messages": self.messages,
+            "tokens": len(self.history_ids) if self.history_ids is not None else None,
+            "created": self.created,
+            "last_used": self.last_used,
+            "busy": self.busy,
+        }
+
+
+class SessionStore:
+    """
+    In-memory LRU of sessions with an idle TTL.
+
+    Sessions idle for ttl_seconds are dropped, and the least recently used
+    one is dropped once there are more than max_sessions. A turn's user
+    message and the generated reply are committed together when its done
+    event arrives, so a cancelled turn leaves the session unchanged.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_sessions: int,
+        ttl_seconds: float,
+        max_tokens: int,
+        encoder: ChatEncoder | None = None,
+    ):
+        """
+        Args:
+            max_sessions: Sessions kept before LRU eviction
+            ttl_seconds: Idle time before a session expires
+            max_tokens: Longest generation prompt a session may reach
+            encoder: ChatEncoder to use (default: over niels_gpt's format_chat,
+                     created on first use)
+        """
+        self._encoder = encoder
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_tokens = max_tokens
+        self.evicted_total = 0
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def encoder(self) -> ChatEncoder:
+        if self._encoder is None:
+            from niels_gpt.chat_format import format_chat
+
+            self._encoder = ChatEncoder(format_chat)
+        return self._encoder
+
+    def _evict(self, now: float):
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[oldest.id]
+            self.evicted_total += 1
+
+    def create(self, messages: list[dict], model: str | None = None) -> Session:
+        """
+        Start a session from an initial history (e.g. a system prompt).
+
+        Raises:
+            SessionTooLarge: If the history alone exceeds max_tokens
+        """
+        history = self.encoder.history(messages)
+        tokens = len(self.encoder.prompt_for(history, messages))
+        if tokens > self.max_tokens:
+            raise SessionTooLarge(tokens, self.max_tokens)
+        now = time.time()
+        session = Session(uuid.uuid4().hex, model, list(messages), history, now, now)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict(now)
+        return session
+
+    def get(self, session_id: str) -> Session:
+        """
+        Look up a session and mark it used.
+
+        Raises:
+            SessionNotFound: If unknown or expired
+        """
+        with self._lock:
+            now = time.time()
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise SessionNotFound(session_id)
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str):
+        """
+        Drop a session.
+
+        Raises:
+            SessionNotFound: If unknown or expired
+        """
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                raise SessionNotFound(session_id)
+
+    def begin_turn(self, session: Session, message: dict) -> tuple[list[int], list[dict]]:
+        """
+        Reserve the session for a turn and build its prompt.
+
+        Returns:
+            (prompt_ids, messages) for the generation, including message
+
+        Raises:
+            SessionBusy: If another turn is streaming
+            SessionTooLarge: If the prompt would exceed max_tokens
+        """
+        with self._lock:
+            if session.busy:
+                raise SessionBusy(session.id)
+            messages = session.messages + [message]
+            prompt_ids = self.encoder.prompt_for(
+                self.encoder.extend(session.history_ids, [message]), messages
+            )
+            if len(prompt_ids) > self.max_tokens:
+                raise SessionTooLarge(len(prompt_ids), self.max_tokens)
+            session.busy = True
+            session.turn += 1
+        return prompt_ids, messages
+
+    def commit(self, events: Iterator[dict], session: Session, message: dict) -> Iterator[dict]:
+        """
+        Pass a turn's events through, appending message and the reply on done.
+
+        The session is released however the stream ends, including when the
+        returned iterator is discarded without being started.
+        """
+        turn = session.turn
+
+        def committed():
+            try:
+                for event in events:
+                    if event["event"] == "done":
+                        added = [message, {"role": "assistant", "content": event["data"]["reply"]}]
+                        with self._lock:
+                            session.messages = session.messages + added
+                            session.history_ids = self.encoder.extend(session.history_ids, added)
+                            session.last_used = time.time()
+                    yield event
+            finally:
+                self.end_turn(session, turn)
+
+        stream = committed()
+        weakref.finalize(stream, self.end_turn, session, turn)
+        return stream
+
+    def end_turn(self, session: Session, turn: int | None = None):
+        """Release a session's turn (only that turn's, if given)."""
+        with self._lock:
+            if turn is None or session.turn == turn:
+                session.busy = False
+
+    def status(self) -> dict:
+        """Session counts and limits."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "incremental": self.encoder.incremental,
+                "evicted_total": self.evicted_total,
+            }
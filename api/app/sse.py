@@ -1,7 +1,11 @@
 """Server-Sent Events (SSE) formatting utilities."""
 
 import json
-from typing import Iterator
+import re
+import time
+from typing import Callable, Iterator
+
+_STEP = re.compile(r'"step":(\d+)')
 
 
 def format_sse_event(event: str, data: dict) -> str:
@@ -19,15 +23,62 @@ def format_sse_event(event: str, data: dict) -> str:
     return f"event: {event}\ndata: {data_json}\n\n"
 
 
-def stream_sse_events(events: Iterator[dict]) -> Iterator[str]:
+def is_token_event(chunk: str) -> bool:
+    """Whether an SSE-formatted chunk is a token event."""
+    return chunk.startswith("event: token\n")
+
+
+def forward_counter() -> Callable[[str], bool]:
+    """
+    Per-stream check of which SSE chunks cost a model forward.
+
+    Each step's first token event does: with n samples, one batched
+    forward yields n token events for the same step, and only the first
+    counts.
+    """
+    last_step = None
+
+    def is_forward(chunk: str) -> bool:
+        nonlocal last_step
+        if not is_token_event(chunk):
+            return False
+        match = _STEP.search(chunk)
+        step = match.group(1) if match else None
+        if step is not None and step == last_step:
+            return False
+        last_step = step
+        return True
+
+    return is_forward
+
+
+def stream_sse_events(events: Iterator[dict], *, timings: bool = False) -> Iterator[str]:
     """
     Convert event dicts to SSE-formatted strings.
 
     Args:
         events: Iterator of event dicts with keys "event" and "data"
+        timings: Add serialize_ms (time spent encoding every earlier event)
+                 to the done event's timing summary. Writing to the socket
+                 and waiting on other streams happen outside this generator
+                 and are not measured; they are the gap between total_ms and
+                 the sum of the phases.
 
     Yields:
         SSE-formatted strings
     """
+    if not timings:
+        for event_dict in events:
+            yield format_sse_event(event_dict["event"], event_dict["data"])
+        return
+
+    serialize_ns = 0
     for event_dict in events:
-        yield format_sse_event(event_dict["event"], event_dict["data"])
+        data = event_dict["data"]
+        if event_dict["event"] == "done" and data.get("timing") is not None:
+            # Coalesced subscribers share event dicts; leave them untouched
+            data = {**data, "timing": {**data["timing"], "serialize_ms": round(serialize_ns / 1e6, 3)}}
+        start = time.perf_counter_ns()
+        chunk = format_sse_event(event_dict["event"], data)
+        serialize_ns += time.perf_counter_ns() - start
+        yield chunk
@@ -0,0 +1,113 @@
+"""Server-side timing breakdown of generation streams."""
+
+import time
+from contextvars import ContextVar
+
+# Seconds the step now being computed waited for a scheduler slot. Set by
+# FairScheduler.run before each next(); the threadpool copies the context
+# into the worker thread, so the generator reads it when it resumes.
+queue_wait: ContextVar[float] = ContextVar("queue_wait", default=0.0)
+
+
+def _ms(ns: int) -> float:
+    return round(ns / 1e6, 3)
+
+
+class StepTimer:
+    """
+    Phase durations of one generation, from time.perf_counter_ns.
+
+    The generator calls mark() when it resumes to compute a step and lap()
+    after each phase, so time spent suspended at a yield (serialization,
+    the client, other streams) is never charged to a phase. A disabled
+    timer returns from every method before reading the clock.
+    """
+
+    def __init__(self, enabled: bool):
+        """
+        Args:
+            enabled: Whether to record anything
+        """
+        self.enabled = enabled
+        self.start = time.perf_counter_ns() if enabled else 0
+        self.first_token: int | None = None
+        self.tokens = 0
+        self.queue_ns = 0
+        self.totals: dict[str, int] = {}
+        self._phases: dict[str, int] = {}
+        self._queue = 0
+        self._mark = self.start
+
+    def mark(self, *, queued: bool = True):
+        """
+        Start timing a step.
+
+        Args:
+            queued: Whether this resumption's scheduler queue wait belongs
+                    to the step (False for work that shares another step's)
+        """
+        if not self.enabled:
+            return
+        if queued:
+            self._queue = int(queue_wait.get() * 1e9)
+            self.queue_ns += self._queue
+        self._mark = time.perf_counter_ns()
+
+    def lap(self, phase: str):
+        """Charge the time since the last mark/lap to phase."""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        self._phases[phase] = self._phases.get(phase, 0) + now - self._mark
+        self.totals[phase] = self.totals.get(phase, 0) + now - self._mark
+        self._mark = now
+
+    def token(self):
+        """Count an emitted token."""
+        if not self.enabled:
+            return
+        self.tokens += 1
+        if self.first_token is None:
+            self.first_token = time.perf_counter_ns()
+
+    def pop(self) -> dict | None:
+        """
+        Phases since the last pop, in milliseconds, and reset them.
+
+        Returns:
+            {"<phase>_ms": ..., "queue_ms": ..., "elapsed_ms": ...} with
+            elapsed_ms measured from the start of the stream, or None
+            when disabled
+        """
+        if not self.enabled:
+            return None
+        timing = {f"{phase}_ms": _ms(ns) for phase, ns in self._phases.items()}
+        timing["queue_ms"] = _ms(self._queue)
+        timing["elapsed_ms"] = _ms(time.perf_counter_ns() - self.start)
+        self._phases = {}
+        self._queue = 0
+        return timing
+
+    def summary(self, stop_reason: str) -> dict | None:
+        """
+        Whole-stream summary for the done event.
+
+        Args:
+            stop_reason: "stop_sequence" or "max_new_tokens"
+
+        Returns:
+            Dict with ttft_ms, total_ms, tokens, tokens_per_s, stop_reason
+            and the per-phase totals, or None when disabled
+        """
+        if not self.enabled:
+            return None
+        total = time.perf_counter_ns() - self.start
+        return {
+            "ttft_ms": _ms(self.first_token - self.start) if self.first_token is not None else None,
+            "total_ms": _ms(total),
+            "tokens": self.tokens,
+            "tokens_per_s": round(self.tokens / (total / 1e9), 3) if total else 0.0,
+            "stop_reason": stop_reason,
+            **{f"{phase}_ms": _ms(ns) for phase, ns in self.totals.items()},
+            "queue_ms": _ms(self.queue_ns),
+        }
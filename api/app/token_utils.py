@@ -1,4 +1,4 @@
-"""Utilities for displaying byte-level tokens."""
+"""Utilities for displaying byte-level tokens and detecting stop tags."""
 
 
 def token_display(token_id: int) -> str:
@@ -17,3 +17,12 @@ def token_display(token_id: int) -> str:
         return chr(token_id)
     else:
         return f"\\x{token_id:02x}"
+
+
+def stop_position(generated_bytes: bytes) -> int | None:
+    """Byte offset of the earliest role tag in generated output, if any."""
+    # Stop if we see role tags in the generated portion
+    stop_positions = [
+        p for p in (generated_bytes.find(b"\nuser: "), generated_bytes.find(b"\nsystem: ")) if p != -1
+    ]
+    return min(stop_positions) if stop_positions else None
@@ -0,0 +1,337 @@
+"""Recording of per-step generation traces into memory-mapped columnar shards."""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+INDEX_FILENAME = "index.jsonl"
+TOPK = 10  # candidates per step in trace events
+
+# Per-step columns of a shard; attn is flat, sliced per step by attn_offsets
+COLUMNS = ("token_ids", "entropy", "topk_ids", "topk_probs", "attn_offsets", "attn")
+
+
+class _Generation:
+    """Steps of one (generation, sample) collected from its event stream."""
+
+    def __init__(self, meta: dict):
+        self.meta = meta
+        self.token_ids: list[int] = []
+        self.entropy: list[float] = []
+        self.topk_ids: list[list[int]] = []
+        self.topk_probs: list[list[float]] = []
+        self.attn: list[np.ndarray] = []  # per step (H, n)
+        self.heads = 0
+
+    def add_token(self, data: dict):
+        self.token_ids.append(data["token_id"])
+
+    def add_trace(self, data: dict, dtype):
+        topk = data["topk"][:TOPK]
+        self.entropy.append(data["entropy"])
+        self.topk_ids.append([c["token_id"] for c in topk] + [-1] * (TOPK - len(topk)))
+        self.topk_probs.append([c["prob"] for c in topk] + [0.0] * (TOPK - len(topk)))
+        attn = np.asarray(data.get("attn", []), dtype=dtype)
+        if attn.ndim == 2:
+            self.heads = attn.shape[0]
+        self.attn.append(attn.reshape(-1))
+
+
+class TraceRecorder:
+    """
+    Appends recorded generations to shards under a root directory.
+
+    Generations are buffered in memory and written as one shard of
+    uncompressed .npy columns per shard_generations generations (and on
+    flush()), so readers can np.load them with mmap_mode="r". Shards are
+    written by a single background thread, in order, so a full buffer
+    never holds up the stream whose done event filled it. Each shard
+    directory is written under a temporary name and renamed into place
+    before its generations are appended to index.jsonl, so readers only
+    ever see complete shards.
+    """
+
+    def __init__(self, root: Path, *, shard_generations: int = 64, attn_dtype: str = "float16"):
+        """
+        Args:
+            root: Archive directory (created if missing)
+            shard_generations: Generations buffered per shard
+            attn_dtype: Storage dtype of attention weights
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.shard_generations = shard_generations
+        self.attn_dtype = np.dtype(attn_dtype)
+        self.recorded_total = 0
+        self.write_errors = 0
+        self.last_error: str | None = None
+        self._pending: list[_Generation] = []
+        self._writing: list[list[_Generation]] = []  # handed to the writer, not yet written
+        self._last_write: Future | None = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+        self._lock = threading.Lock()
+
+    def record(self, events: Iterator[dict], meta: dict) -> Iterator[dict]:
+        """
+        Pass events through, recording token and trace data.
+
+        A generation is archived when its done event arrives; cancelled
+        streams are dropped. With n > 1, each sample is archived as its own
+        generation.
+
+        Args:
+            events: Event dicts from stream_chat_events
+            meta: Request fields stored in the index (JSON-serializable)
+
+        Yields:
+            The events, unchanged
+        """
+        samples: dict[int, _Generation] = {}
+        for event in events:
+            kind, data = event["event"], event["data"]
+            if kind in ("token", "trace"):
+                sample = data.get("sample", 0)
+                generation = samples.get(sample)
+                if generation is None:
+                    generation = samples[sample] = _Generation({**meta, "sample": sample})
+                if kind == "token":
+                    generation.add_token(data)
+                else:
+                    generation.add_trace(data, self.attn_dtype)
+            elif kind == "done":
+                replies = data.get("replies", [data.get("reply")])
+                for sample, generation in samples.items():
+                    generation.meta["reply"] = replies[sample] if sample < len(replies) else None
+                    if "generation_id" in data:
+                        generation.meta["generation_id"] = data["generation_id"]
+                self._add(list(samples.values()))
+            yield event
+
+    def _add(self, generations: list[_Generation]):
+        with self._lock:
+            self._pending.extend(generations)
+            if len(self._pending) >= self.shard_generations:
+                self._submit()
+
+    def _submit(self):
+        """Hand the buffer to the writer thread (lock held)."""
+        pending, self._pending = self._pending, []
+        self._writing.append(pending)
+        self._last_write = self._writer.submit(self._write_queued, pending)
+
+    def _write_queued(self, generations: list[_Generation]):
+        try:
+            self._write_shard(generations)
+        except Exception as e:
+            with self._lock:
+                self.write_errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            with self._lock:
+                self._writing.remove(generations)
+
+    def flush(self):
+        """Write buffered generations as a (possibly short) shard and wait for every queued write."""
+        with self._lock:
+            if self._pending:
+                self._submit()
+            last = self._last_write
+        if last is not None:
+            last.result()  # one writer thread: earlier shards are written first
+
+    def _write_shard(self, generations: list[_Generation]):
+        name = f"shard-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        tmp = self.root / f".{name}.tmp"
+        tmp.mkdir()
+
+        records = []
+        token_ids, entropy, topk_ids, topk_probs, attn = [], [], [], [], []
+        offsets = [0]
+        for generation in generations:
+            # Steps without a matching trace (or vice versa) are not kept
+            steps = min(len(generation.token_ids), len(generation.entropy))
+            step_start = len(token_ids)
+            token_ids.extend(generation.token_ids[:steps])
+            entropy.extend(generation.entropy[:steps])
+            topk_ids.extend(generation.topk_ids[:steps])
+            topk_probs.extend(generation.topk_probs[:steps])
+            for row in generation.attn[:steps]:
+                attn.append(row)
+                offsets.append(offsets[-1] + row.size)
+            records.append({
+                "id": uuid.uuid4().hex,
+                "shard": name,
+                "step_start": step_start,
+                "step_end": step_start + steps,
+                "heads": generation.heads,
+                "created": time.time(),
+                **generation.meta,
+            })
+
+        columns = {
+            "token_ids": np.asarray(token_ids, dtype=np.int32),
+            "entropy": np.asarray(entropy, dtype=np.float32),
+            "topk_ids": np.asarray(topk_ids, dtype=np.int32).reshape(-1, TOPK),
+            "topk_probs": np.asarray(topk_probs, dtype=np.float32).reshape(-1, TOPK),
+            "attn_offsets": np.asarray(offsets, dtype=np.int64),
+            "attn": np.concatenate(attn) if attn else np.zeros(0, dtype=self.attn_dtype),
+        }
+        for column, array in columns.items():
+            np.save(tmp / f"{column}.npy", array)
+        os.replace(tmp, self.root / name)
+
+        with self._lock:
+            with open(self.root / INDEX_FILENAME, "a") as f:
+                for record in records:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.recorded_total += len(records)
+
+    def pending_bytes(self) -> int:
+        """Attention bytes buffered in generations not yet written."""
+        with self._lock:
+            generations = self._pending + [g for batch in self._writing for g in batch]
+            return sum(row.nbytes for generation in generations for row in generation.attn)
+
+    def status(self) -> dict:
+        """Archive location and counts."""
+        with self._lock:
+            return {
+                "dir": str(self.root),
+                "recorded": self.recorded_total,
+                "pending": len(self._pending),
+                "writing": sum(len(batch) for batch in self._writing),
+                "write_errors": self.write_errors,
+                "last_error": self.last_error,
+            }
+
+
+class TraceArchive:
+    """
+    Read-only view of a recorded archive.
+
+    Shard columns are memory-mapped, so every array returned here is a
+    zero-copy slice of the files; nothing is read until it is touched.
+    """
+
+    def __init__(self, root: Path):
+        """
+        Args:
+            root: Archive directory written by TraceRecorder
+        """
+        self.root = Path(root)
+        self._shards: dict[str, dict[str, np.ndarray]] = {}
+        self._records: list[dict] = []
+        self._by_id: dict[str, dict] = {}
+        self._index_pos = 0
+        self._lock = threading.Lock()  # requests refresh and read concurrently
+        self.refresh()
+
+    def refresh(self):
+        """Pick up generations appended to the index since the last read."""
+        index = self.root / INDEX_FILENAME
+        if not index.exists():
+            return
+        with self._lock, open(index) as f:
+            f.seek(self._index_pos)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # partially written line: read it next time
+                record = json.loads(line)
+                self._records.append(record)
+                self._by_id[record["id"]] = record
+                self._index_pos += len(line.encode())
+
+    def index(self, *, offset: int = 0, limit: int | None = None, **filters) -> list[dict]:
+        """
+        Index records, oldest first.
+
+        Args:
+            offset: Records to skip
+            limit: Maximum records returned (None = all)
+            **filters: Keep records whose field equals the value (e.g. model="best")
+        """
+        with self._lock:
+            records = [r for r in self._records if all(r.get(k) == v for k, v in filters.items())]
+        return records[offset:] if limit is None else records[offset:offset + limit]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _shard(self, name: str) -> dict[str, np.ndarray]:
+        shard = self._shards.get(name)
+        if shard is None:
+            shard = {
+                column: np.load(self.root / name / f"{column}.npy", mmap_mode="r")
+                for column in COLUMNS
+            }
+            self._shards[name] = shard
+        return shard
+
+    def generation(self, generation_id: str) -> dict:
+        """
+        Columns of one generation as memory-mapped views.
+
+        Returns:
+            Dict with the index record under "record" and token_ids (S,),
+            entropy (S,), topk_ids (S, 10), topk_probs (S, 10)
+
+        Raises:
+            KeyError: If the id is not in the archive
+        """
+        record = self._by_id[generation_id]
+        shard = self._shard(record["shard"])
+        steps = slice(record["step_start"], record["step_end"])
+        return {
+            "record": record,
+            "token_ids": shard["token_ids"][steps],
+            "entropy": shard["entropy"][steps],
+            "topk_ids": shard["topk_ids"][steps],
+            "topk_probs": shard["topk_probs"][steps],
+        }
+
+    def attn(self, generation_id: str, step: int) -> np.ndarray:
+        """
+        Attention rows of one step as an (H, n) memory-mapped view.
+
+        Steps whose attention was not recorded give an (H, 0) array.
+
+        Raises:
+            KeyError: If the id is not in the archive
+            IndexError: If step is out of range
+        """
+        record = self._by_id[generation_id]
+        if not (0 <= step < record["step_end"] - record["step_start"]):
+            raise IndexError(f"step {step} out of range for {record['step_end'] - record['step_start']} steps")
+        shard = self._shard(record["shard"])
+        i = record["step_start"] + step
+        start, end = shard["attn_offsets"][i], shard["attn_offsets"][i + 1]
+        return shard["attn"][start:end].reshape(record["heads"] or 1, -1)
+
+    def steps(self, generation_id: str, start: int = 0, end: int | None = None) -> list[dict]:
+        """
+        Steps [start, end) as JSON-serializable dicts (same fields as trace events).
+        """
+        columns = self.generation(generation_id)
+        n = len(columns["token_ids"])
+        end = n if end is None else min(end, n)
+        out = []
+        for step in range(start, end):
+            k = int((columns["topk_ids"][step] >= 0).sum())
+            out.append({
+                "step": step,
+                "token_id": int(columns["token_ids"][step]),
+                "entropy": float(columns["entropy"][step]),
+                "topk": [
+                    {"token_id": int(t), "prob": float(p)}
+                    for t, p in zip(columns["topk_ids"][step][:k], columns["topk_probs"][step][:k])
+                ],
+                "attn": self.attn(generation_id, step).astype(np.float32).tolist(),
+            })
+        return out
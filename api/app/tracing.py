@@ -0,0 +1,215 @@
+"""Multi-layer attention tracing and per-generation trace storage."""
+
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from .config import TRACE_STORE_MAX_GENERATIONS
+from .token_utils import token_display
+
+# torch is imported lazily so app.main can use the trace store without it
+if TYPE_CHECKING:
+    import torch
+
+
+def layers_from_mask(mask: int, n_layers: int) -> list[int]:
+    """
+    Expand a layer bitmask into a sorted list of layer indices.
+
+    Args:
+        mask: Bitmask where bit i selects layer i
+        n_layers: Number of layers in the model
+
+    Returns:
+        Sorted list of selected layer indices
+
+    Raises:
+        ValueError: If the mask is empty or selects a layer >= n_layers
+    """
+    if mask <= 0:
+        raise ValueError("trace_layers mask must select at least one layer")
+    if mask >> n_layers:
+        raise ValueError(f"trace_layers mask selects layers beyond {n_layers - 1}")
+    return [layer for layer in range(n_layers) if mask & (1 << layer)]
+
+
+def forward_with_layer_traces(
+    model,
+    x: "torch.Tensor",
+    *,
+    layers: list[int],
+    logit_lens: bool = False,
+    full_attn: bool = False,
+) -> tuple["torch.Tensor", dict]:
+    """
+    Run one forward pass capturing the last-row attention of several layers.
+
+    Mirrors GPT.forward (embedding -> blocks -> ln_f -> lm_head) in eval mode,
+    but asks every selected block for its attention probabilities, so one pass
+    replaces len(layers) calls to forward_with_attn_trace.
+
+    Args:
+        model: GPT model in eval mode
+        x: (B, t) int64 token ids
+        layers: Layer indices to capture
+        logit_lens: If True, also project each captured layer's residual
+                    stream at the last position through ln_f + lm_head
+        full_attn: If True, also keep each captured layer's full (B, H, t, t)
+                   attention
+
+    Returns:
+        (logits, traces) where traces has keys:
+            - attn_rows: {layer: (B, H, t) tensor}
+            - lens_logits: {layer: (B, V) tensor} (only if logit_lens)
+            - attn_full: {layer: (B, H, t, t) tensor} (only if full_attn)
+    """
+    wanted = set(layers)
+    attn_rows = {}
+    lens_logits = {}
+    attn_full = {}
+
+    h = model.tok_emb(x)
+    for i, block in enumerate(model.blocks):
+        if i in wanted:
+            h, probs = block(h, return_attn=True)
+            attn_rows[i] = probs[:, :, -1, :]
+            if full_attn:
+                attn_full[i] = probs
+            if logit_lens:
+                lens_logits[i] = model.lm_head(model.ln_f(h[:, -1, :]))
+        else:
+            h = block(h)
+    logits = model.lm_head(model.ln_f(h))
+
+    traces = {"attn_rows": attn_rows}
+    if logit_lens:
+        traces["lens_logits"] = lens_logits
+    if full_attn:
+        traces["attn_full"] = attn_full
+    return logits, traces
+
+
+def lens_summary(lens_logits: "torch.Tensor") -> dict:
+    """
+    Summarize one layer's logit-lens projection for a single position.
+
+    Args:
+        lens_logits: (V,) logits from projecting an intermediate residual
+
+    Returns:
+        Dict with the top token id, its probability and the entropy
+    """
+    import torch
+    import torch.nn.functional as F
+
+    probs = F.softmax(lens_logits.float(), dim=-1)
+    entropy = -(probs * torch.log(probs.clamp(min=1e-12))).sum().item()
+    top_prob, top_id = probs.max(dim=-1)
+    return {
+        "token_id": int(top_id),
+        "token_display": token_display(int(top_id)),
+        "prob": float(top_prob),
+        "entropy": entropy,
+    }
+
+
+class TraceStore:
+    """In-memory LRU of per-step layer traces keyed by generation id."""
+
+    def __init__(self, max_generations: int):
+        """
+        Args:
+            max_generations: Maximum number of generations kept before eviction
+        """
+        self.max_generations = max_generations
+        self._generations: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, generation_id: str, layers: list[int], logit_lens: bool):
+        """Register a new generation, evicting the oldest if over capacity."""
+        with self._lock:
+            self._generations[generation_id] = {
+                "layers": list(layers),
+                "attn": {layer: [] for layer in layers},
+                "lens": {layer: [] for layer in layers} if logit_lens else None,
+            }
+            self._generations.move_to_end(generation_id)
+            while len(self._generations) > self.max_generations:
+                self._generations.popitem(last=False)
+
+    def record(
+        self,
+        generation_id: str,
+        attn_rows: dict[int, "torch.Tensor"],
+        lens: dict[int, dict] | None = None,
+    ):
+        """
+        Append one step of traces.
+
+        Args:
+            generation_id: Generation to append to
+            attn_rows: {layer: (H, t) CPU tensor}
+            lens: Optional {layer: logit-lens summary dict}
+        """
+        with self._lock:
+            entry = self._generations.get(generation_id)
+            if entry is None:
+                return
+            for layer, row in attn_rows.items():
+                entry["attn"][layer].append(row)
+            if lens is not None and entry["lens"] is not None:
+                for layer, summary in lens.items():
+                    entry["lens"][layer].append(summary)
+
+    def get(self, generation_id: str, layer: int) -> dict | None:
+        """
+        Fetch one layer's per-step traces.
+
+        Returns:
+            Dict with keys layer, steps and logit_lens (None if not recorded),
+            or None if the generation is unknown or was evicted
+
+        Raises:
+            ValueError: If the layer was not captured for this generation
+        """
+        with self._lock:
+            entry = self._generations.get(generation_id)
+            if entry is None:
+                return None
+            self._generations.move_to_end(generation_id)
+            if layer not in entry["attn"]:
+                raise ValueError(
+                    f"layer {layer} was not traced; captured layers: {entry['layers']}"
+                )
+            rows = list(entry["attn"][layer])
+            lens = list(entry["lens"][layer]) if entry["lens"] is not None else None
+
+        return {
+            "layer": layer,
+            "layers": entry["layers"],
+            "steps": [
+                {"step": step, "attn": row.tolist()}
+                for step, row in enumerate(rows)
+            ],
+            "logit_lens": lens,
+        }
+
+    def usage(self) -> dict:
+        """Stored generations and the bytes held by their attention rows."""
+        with self._lock:
+            nbytes = sum(
+                row.numel() * row.element_size()
+                for entry in self._generations.values()
+                for rows in entry["attn"].values()
+                for row in rows
+            )
+            return {"generations": len(self._generations), "bytes": nbytes}
+
+    def reset(self):
+        """Drop all stored traces (for testing)."""
+        with self._lock:
+            self._generations.clear()
+
+
+# Global trace store instance
+trace_store = TraceStore(max_generations=TRACE_STORE_MAX_GENERATIONS)
@@ -4,7 +4,12 @@ import pytest
 import torch
 from dataclasses import dataclass
 
+from niels_gpt.config import ModelConfig
+from niels_gpt.model.gpt import GPT
+
+from app.generation import stream_chat_events
 from app.rate_limit import rate_limiter
+from app.tracing import trace_store
 
 
 @dataclass
@@ -20,9 +25,43 @@ class DummyConfig:
     dropout: float = 0.1
 
 
+class DummyBlock:
+    """Dummy transformer block that passes activations through unchanged."""
+
+    def __init__(self, H: int):
+        self.H = H
+
+    def __call__(self, x, return_attn=False):
+        if not return_attn:
+            return x
+        B, T, _ = x.shape
+        # Uniform causal-agnostic attention (B, H, T, T)
+        return x, torch.ones(B, self.H, T, T) / T
+
+
 class DummyModel:
     """Dummy model that returns deterministic outputs without real computation."""
 
+    def __init__(self):
+        # GPT-shaped submodules used by multi-layer tracing
+        self.C = 64
+        self.blocks = [DummyBlock(H=4) for _ in range(4)]
+
+    def tok_emb(self, x):
+        """Dummy token embedding: (B, T) -> (B, T, C) zeros."""
+        B, T = x.shape
+        return torch.zeros(B, T, self.C)
+
+    def ln_f(self, h):
+        """Dummy final norm (identity)."""
+        return h
+
+    def lm_head(self, h):
+        """Dummy output head with logits that favor token 72 ('H')."""
+        logits = torch.zeros(*h.shape[:-1], 256)
+        logits[..., 72] = 10.0
+        return logits
+
     def forward_with_attn_trace(self, x, trace_layer=0, return_full_attn=False):
         """
         Dummy forward pass with attention trace.
@@ -64,6 +103,28 @@ class DummyModel:
         return self
 
 
+def small_gpt(T: int = 64, L: int = 2):
+    """Small random-init GPT (seeded, eval mode) and its config."""
+    torch.manual_seed(0)
+    cfg = ModelConfig(V=256, T=T, C=32, L=L, H=2, D=16, d_ff=64, dropout=0.0)
+    return GPT(cfg).eval(), cfg
+
+
+def collect_events(model, cfg, **kwargs) -> list[dict]:
+    """All events of a greedy "hi" generation; kwargs override stream_chat_events arguments."""
+    params = {
+        "messages": [{"role": "user", "content": "hi"}],
+        "max_new_tokens": 4,
+        "temperature": 0.0,
+        "top_k": None,
+        "seed": 0,
+        "trace_layer": 0,
+        "device": "cpu",
+        **kwargs,
+    }
+    return list(stream_chat_events(model, cfg, **params))
+
+
 @pytest.fixture
 def dummy_model():
     """Provide a dummy model for testing."""
@@ -76,9 +137,23 @@ def dummy_cfg():
     return DummyConfig()
 
 
+@pytest.fixture(scope="module")
+def small_model():
+    """Provide small_gpt() for a test module (override for other sizes)."""
+    return small_gpt()
+
+
 @pytest.fixture(autouse=True)
 def reset_rate_limiter():
     """Reset rate limiter before each test."""
     rate_limiter.reset()
     yield
     rate_limiter.reset()
+
+
+@pytest.fixture(autouse=True)
+def reset_trace_store():
+    """Reset stored generation traces before each test."""
+    trace_store.reset()
+    yield
+    trace_store.reset()
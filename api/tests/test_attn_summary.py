@@ -0,0 +1,70 @@
+"""Tests for the all-layer attention summary."""
+
+import math
+
+import pytest
+import torch
+from fastapi.testclient import TestClient
+
+from app.attn_summary import summarize_attention
+from app.generation import generate_attn_summary, generate_full_attn
+from app.main import create_app
+from tests.conftest import small_gpt
+
+MESSAGES = [{"role": "user", "content": "hello there"}]
+
+
+def test_summary_of_known_patterns():
+    """Test statistics for uniform-causal and attend-to-first-token heads."""
+    t = 4
+    uniform = torch.tril(torch.ones(t, t)) / torch.arange(1, t + 1)[:, None]
+    first = torch.zeros(t, t)
+    first[:, 0] = 1.0
+    probs = torch.stack([uniform, first])[None]  # (1, 2, t, t)
+
+    stats = summarize_attention(probs, top_k=2)
+
+    assert stats["entropy"][0][0] == pytest.approx([math.log(i) for i in range(1, t + 1)], abs=1e-6)
+    assert stats["entropy"][0][1] == pytest.approx([0.0] * t, abs=1e-6)
+    # Query i spreads uniformly over distances 0..i, so its mean is i/2
+    assert stats["mean_distance"][0][0] == pytest.approx(sum(i / 2 for i in range(t)) / t)
+    assert stats["mean_distance"][0][1] == pytest.approx(sum(range(t)) / t)
+    assert stats["first_token"][0][1] == pytest.approx(1.0)
+    assert stats["top_positions"][0][0] == [0, 1]
+    assert stats["top_positions"][0][1][0] == 0
+    assert stats["top_weights"][0][1][0] == pytest.approx(1.0)
+
+
+def test_summary_matches_full_attn():
+    """Test that per-head stats agree with the single-head full matrices."""
+    model, cfg = small_gpt()
+
+    summary = generate_attn_summary(model, cfg, messages=MESSAGES, device="cpu", top_k=3)
+
+    assert (summary["layers"], summary["heads"]) == (2, 2)
+    for layer in range(cfg.L):
+        for head in range(cfg.H):
+            full = generate_full_attn(
+                model, cfg, messages=MESSAGES, trace_layer=layer, head=head, device="cpu"
+            )
+            attn = torch.tensor(full["attn"])
+            assert summary["token_ids"] == full["token_ids"]
+            assert summary["first_token"][layer][head] == pytest.approx(attn[:, 0].mean().item(), abs=1e-5)
+            assert len(summary["entropy"][layer][head]) == summary["t"]
+            assert len(summary["top_positions"][layer][head]) == 3
+
+
+def test_endpoint(dummy_model, dummy_cfg):
+    """Test the endpoint shape and top_k validation."""
+    client = TestClient(create_app(model=dummy_model, cfg=dummy_cfg))
+
+    response = client.post("/inspect/attn_summary", json={"messages": MESSAGES, "top_k": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["mean_entropy"]) == dummy_cfg.L
+    assert len(data["mean_entropy"][0]) == dummy_cfg.H
+    assert len(data["top_positions"][0][0]) == 2
+    assert len(data["tokens_display"]) == data["t"]
+
+    response = client.post("/inspect/attn_summary", json={"messages": MESSAGES, "top_k": 0})
+    assert response.status_code == 422
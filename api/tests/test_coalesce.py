@@ -0,0 +1,168 @@
+"""Tests for in-flight request coalescing."""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.coalesce import RequestCoalescer
+from app.main import create_app
+
+
+class Producer:
+    """Event generator factory that counts starts and records closing."""
+
+    def __init__(self, n_events: int = 5):
+        self.n_events = n_events
+        self.starts = 0
+        self.closed = False
+        self.finished = False
+
+    def __call__(self):
+        self.starts += 1
+        return self._events()
+
+    def _events(self):
+        try:
+            for i in range(self.n_events):
+                yield {"event": "token", "data": {"i": i}}
+            yield {"event": "done", "data": {}}
+            self.finished = True
+        except GeneratorExit:
+            self.closed = True
+            raise
+
+
+def test_identical_requests_share_one_generation():
+    """Test that a late subscriber replays buffered events and both see everything."""
+    coalescer = RequestCoalescer()
+    producer = Producer()
+    key = coalescer.make_key(object(), seed=1)
+
+    first, coalesced = coalescer.subscribe(key, producer)
+    assert not coalesced
+    head = [next(first), next(first)]
+
+    second, coalesced = coalescer.subscribe(key, producer)
+    assert coalesced
+
+    assert head + list(first) == list(second)
+    assert producer.starts == 1
+    assert coalescer.status()["in_flight"] == 0
+    assert coalescer.status()["coalesced_total"] == 1
+
+
+def test_different_params_do_not_coalesce():
+    """Test that different keys start separate generations."""
+    coalescer = RequestCoalescer()
+    producer = Producer()
+    model = object()
+
+    coalescer.subscribe(coalescer.make_key(model, seed=1), producer)
+    _, coalesced = coalescer.subscribe(coalescer.make_key(model, seed=2), producer)
+
+    assert not coalesced
+    assert producer.starts == 2
+
+
+def test_cancelled_subscriber_does_not_stop_others():
+    """Test that the generation runs until its last subscriber disconnects."""
+    coalescer = RequestCoalescer()
+    producer = Producer()
+    key = coalescer.make_key(object(), seed=1)
+
+    first, _ = coalescer.subscribe(key, producer)
+    second, _ = coalescer.subscribe(key, producer)
+    next(first)
+    first.close()
+
+    assert len(list(second)) == producer.n_events + 1
+    assert producer.finished and not producer.closed
+
+
+def test_last_cancel_closes_generation():
+    """Test that the shared generation is closed when nobody is listening."""
+    coalescer = RequestCoalescer()
+    producer = Producer()
+    key = coalescer.make_key(object(), seed=1)
+
+    first, _ = coalescer.subscribe(key, producer)
+    second, _ = coalescer.subscribe(key, producer)
+    next(first)
+    first.close()
+    next(second)
+    second.close()
+
+    assert producer.closed
+    assert coalescer.status()["in_flight"] == 0
+
+    # The next identical request starts fresh
+    third, coalesced = coalescer.subscribe(key, producer)
+    assert not coalesced
+    assert len(list(third)) == producer.n_events + 1
+
+
+def test_concurrent_subscribers_see_same_stream():
+    """Test subscribers pulling from several threads at once."""
+    coalescer = RequestCoalescer()
+    producer = Producer(n_events=200)
+    key = coalescer.make_key(object(), seed=1)
+    streams = [coalescer.subscribe(key, producer)[0] for _ in range(4)]
+    results = [None] * len(streams)
+
+    def consume(i):
+        results[i] = list(streams[i])
+
+    threads = [threading.Thread(target=consume, args=(i,)) for i in range(len(streams))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert producer.starts == 1
+    assert all(r == results[0] for r in results)
+    assert len(results[0]) == 201
+
+
+def test_producer_error_reaches_all_subscribers():
+    """Test that an exception in the generation is raised to every subscriber."""
+    coalescer = RequestCoalescer()
+
+    def failing():
+        yield {"event": "token", "data": {}}
+        raise ValueError("boom")
+
+    key = coalescer.make_key(object(), seed=1)
+    first, _ = coalescer.subscribe(key, failing)
+    second, _ = coalescer.subscribe(key, failing)
+
+    for stream in (first, second):
+        with pytest.raises(ValueError, match="boom"):
+            list(stream)
+
+
+def test_disabled_runs_every_request():
+    """Test that a disabled coalescer never shares generations."""
+    coalescer = RequestCoalescer(enabled=False)
+    producer = Producer()
+    key = coalescer.make_key(object(), seed=1)
+
+    coalescer.subscribe(key, producer)
+    _, coalesced = coalescer.subscribe(key, producer)
+
+    assert not coalesced
+    assert producer.starts == 2
+
+
+def test_endpoint_streams_identical_output(dummy_model, dummy_cfg, monkeypatch):
+    """Test that coalesced and fresh responses are identical."""
+    monkeypatch.setattr("app.main.COALESCE_REQUESTS", True)
+    client = TestClient(create_app(model=dummy_model, cfg=dummy_cfg))
+    body = {"messages": [{"role": "user", "content": "hi"}], "trace_layer": 0, "max_new_tokens": 4}
+
+    first = client.post("/chat/stream", json=body)
+    second = client.post("/chat/stream", json=body)
+
+    assert first.status_code == second.status_code == 200
+    assert first.text == second.text
+    assert client.get("/health").json()["coalescing"]["in_flight"] == 0
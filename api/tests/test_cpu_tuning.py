@@ -0,0 +1,121 @@
+"""Tests for CPU thread/affinity tuning."""
+
+import os
+import time
+
+import pytest
+import torch
+from fastapi.testclient import TestClient
+
+from app.cpu_tuning import (
+    BenchResult,
+    Layout,
+    apply_profile,
+    build_profile,
+    candidate_layouts,
+    claim_worker_slot,
+    core_sets,
+    load_profile,
+    pin_cores,
+    recommend,
+    save_profile,
+    time_decode,
+)
+from app.main import create_app
+
+
+def result(workers, threads, batch, p50, tps):
+    return BenchResult(Layout(workers, threads), batch, p50, p50, tps)
+
+
+@pytest.fixture
+def restore_threads():
+    """Restore torch's intra-op thread count after the test."""
+    before = torch.get_num_threads()
+    yield
+    torch.set_num_threads(before)
+
+
+def test_candidate_layouts_never_oversubscribe():
+    """Test that workers x threads always fits the core count."""
+    for n in (1, 2, 6, 8, 16):
+        layouts = candidate_layouts(n)
+        assert Layout(1, 1) in layouts
+        assert Layout(1, n) in layouts
+        assert all(l.workers * l.intra_op_threads <= n for l in layouts)
+
+
+def test_core_sets_are_disjoint():
+    """Test that each worker gets its own cores."""
+    sets = core_sets(Layout(workers=3, intra_op_threads=2), [0, 1, 2, 3, 4, 5, 6, 7])
+    assert sets == [[0, 1], [2, 3], [4, 5]]
+
+
+def test_recommend_per_objective(tmp_path):
+    """Test latency picks fastest batch-1 step, throughput the most tokens/s."""
+    results = [
+        result(1, 1, 1, p50=20.0, tps=50),
+        result(1, 4, 1, p50=8.0, tps=125),
+        result(1, 4, 8, p50=30.0, tps=266),
+        result(4, 1, 8, p50=60.0, tps=533),
+    ]
+    assert recommend(results, "latency").layout == Layout(1, 4)
+    assert recommend(results, "throughput").layout == Layout(4, 1)
+    with pytest.raises(ValueError):
+        recommend(results, "vibes")
+
+    path = tmp_path / "profile.json"
+    save_profile(build_profile(results, [0, 1, 2, 3]), path)
+    profile = load_profile(path)
+    assert profile["recommended"]["throughput"]["core_sets"] == [[0], [1], [2], [3]]
+    assert len(profile["results"]) == 4
+
+
+def test_apply_profile_sets_threads(restore_threads):
+    """Test that the recommended intra-op thread count is applied."""
+    profile = build_profile([result(1, 1, 1, p50=5.0, tps=200)], [0])
+
+    applied = apply_profile(profile, "latency")
+
+    assert applied["intra_op_threads"] == 1
+    assert torch.get_num_threads() == 1
+
+
+def test_worker_slots_are_exclusive(tmp_path):
+    """Test that each claim gets a distinct slot until none are left."""
+    slots = [claim_worker_slot(tmp_path, 2) for _ in range(3)]
+    assert slots == [0, 1, None]
+
+
+def test_time_decode(dummy_model, dummy_cfg):
+    """Test timing the per-token forward."""
+    times = time_decode(dummy_model, dummy_cfg, batch=2, steps=3, context=16, warmup=1)
+    assert len(times) == 3
+    assert all(t >= 0 for t in times)
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_getaffinity"), reason="no CPU affinity API")
+def test_startup_pins_the_whole_process(dummy_model, dummy_cfg, tmp_path, monkeypatch, restore_threads):
+    """Test that pinning from the loader thread also pins the main thread."""
+    before = os.sched_getaffinity(0)
+    cores = [min(before)]
+    profile = build_profile([result(1, 1, 1, p50=5.0, tps=200)], cores)
+    path = tmp_path / "profile.json"
+    save_profile(profile, path)
+    monkeypatch.setattr("app.main.DEVICE", "cpu")
+    monkeypatch.setattr("app.main.INFERENCE_BACKEND", "torch")
+    monkeypatch.setattr("app.main.CPU_PROFILE", path)
+    monkeypatch.setattr("app.main.CPU_PIN_CORES", True)
+    monkeypatch.setattr("app.main.load_default_model", lambda on_stage=None: (dummy_model, dummy_cfg))
+
+    try:
+        # Startup loads (and tunes) in a threadpool worker
+        with TestClient(create_app(load_on_startup=True)) as client:
+            for _ in range(100):
+                if client.get("/health").json()["model_ready"]:
+                    break
+                time.sleep(0.02)
+            assert client.app.state.cpu_tuning["cores"] == cores
+            assert os.sched_getaffinity(0) == set(cores)
+    finally:
+        pin_cores(sorted(before))
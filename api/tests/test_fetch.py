@@ -0,0 +1,157 @@
+"""Tests for locked, resumable, verified checkpoint fetching."""
+
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.fetch import (
+    ChecksumMismatch,
+    RemoteFile,
+    download_ranges,
+    fetch_checkpoint,
+    resolve_remote,
+)
+
+PAYLOAD = bytes(range(256)) * 40  # 10240 bytes
+DIGEST = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD at /best.pt with Range support, plus a manifest."""
+
+    requested_ranges: list[str] = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/manifest.json":
+            body = json.dumps({"files": {"best.pt": {"sha256": DIGEST}}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path != "/best.pt":
+            self.send_error(404)
+            return
+        spec = self.headers["Range"].removeprefix("bytes=")
+        RangeHandler.requested_ranges.append(spec)
+        start, end = (int(x) for x in spec.split("-"))
+        body = PAYLOAD[start:end + 1]
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    """Local HTTP mirror on a random port."""
+    RangeHandler.requested_ranges = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_parallel_range_fetch_verifies_manifest(server, tmp_path):
+    """Test chunked parallel download verified against the mirror manifest."""
+    path = fetch_checkpoint(
+        "best.pt", tmp_path, repo_id="unused", mirror=server, chunk_size=1000, workers=4
+    )
+
+    assert path.read_bytes() == PAYLOAD
+    assert len(RangeHandler.requested_ranges) == 11
+    assert not (tmp_path / "best.pt.part").exists()
+    assert not (tmp_path / "best.pt.part.json").exists()
+
+
+def test_resume_fetches_only_missing_chunks(server, tmp_path):
+    """Test that an interrupted download resumes from its sidecar state."""
+    dest = tmp_path / "best.pt"
+    part = tmp_path / "best.pt.part"
+    part.write_bytes(PAYLOAD[:4000] + b"\0" * (len(PAYLOAD) - 4000))
+    (tmp_path / "best.pt.part.json").write_text(json.dumps({
+        "size": len(PAYLOAD), "sha256": DIGEST, "chunk_size": 1000, "done": [0, 1, 2, 3],
+    }))
+
+    remote = RemoteFile(url=f"{server}/best.pt", size=None, sha256=DIGEST, headers={})
+    download_ranges(remote, dest, chunk_size=1000, workers=2)
+
+    assert dest.read_bytes() == PAYLOAD
+    assert sorted(RangeHandler.requested_ranges)[0] != "0-999"
+    assert len(RangeHandler.requested_ranges) == 7
+
+
+def test_checksum_mismatch_leaves_no_file(server, tmp_path):
+    """Test that a bad digest never produces the final checkpoint."""
+    with pytest.raises(ChecksumMismatch):
+        fetch_checkpoint(
+            "best.pt", tmp_path, repo_id="unused", mirror=server, sha256="0" * 64, chunk_size=4096
+        )
+
+    assert not (tmp_path / "best.pt").exists()
+    assert not (tmp_path / "best.pt.part").exists()
+
+
+def test_local_mirror_dir_and_file_url(tmp_path):
+    """Test copying from a directory mirror and a file:// mirror."""
+    mirror = tmp_path / "mirror"
+    mirror.mkdir()
+    (mirror / "best.pt").write_bytes(PAYLOAD)
+    (mirror / "manifest.json").write_text(json.dumps({"files": {"best.pt": {"sha256": DIGEST}}}))
+
+    a = fetch_checkpoint("best.pt", tmp_path / "a", repo_id="unused", mirror=str(mirror))
+    b = fetch_checkpoint("best.pt", tmp_path / "b", repo_id="unused", mirror=mirror.as_uri())
+
+    assert a.read_bytes() == PAYLOAD
+    assert b.read_bytes() == PAYLOAD
+
+
+def test_concurrent_callers_download_once(server, tmp_path):
+    """Test that the file lock lets only one caller download."""
+    results = []
+
+    def worker():
+        results.append(fetch_checkpoint(
+            "best.pt", tmp_path, repo_id="unused", mirror=server, chunk_size=4096
+        ))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(results)) == 1
+    assert len(RangeHandler.requested_ranges) == 3  # one download of 3 chunks
+
+
+@pytest.mark.parametrize("location, sends_token", [
+    ("https://huggingface.co/org/model/resolve/main/best.pt", True),
+    ("https://cdn-lfs.hf.co/repos/ab/cd/best.pt?X-Amz-Signature=x", False),
+])
+def test_hub_token_only_goes_to_the_hub(monkeypatch, location, sends_token):
+    """Test that a download URL off the Hub host (the LFS CDN) gets no Authorization header."""
+    huggingface_hub = pytest.importorskip("huggingface_hub")
+
+    class Meta:
+        etag = DIGEST
+        size = len(PAYLOAD)
+
+    Meta.location = location
+    monkeypatch.setattr(huggingface_hub, "get_hf_file_metadata", lambda url, token: Meta)
+
+    remote = resolve_remote("best.pt", mirror=None, repo_id="org/model", token="hf_secret", sha256=None)
+    assert remote.url == location and remote.sha256 == DIGEST
+    assert ("Authorization" in remote.headers) == sends_token
@@ -1,5 +1,7 @@
 """Tests for full attention matrix endpoint."""
 
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 
@@ -135,3 +137,97 @@ def test_full_attn_returns_correct_layer_head(client):
 
     assert data["layer"] == 2
     assert data["head"] == 3
+
+
+def test_full_attn_window(client):
+    """Test that row/col ranges return only the requested window."""
+    payload = {
+        "messages": [
+            {"role": "user", "content": "hello"}
+        ],
+        "trace_layer": 0,
+        "head": 0,
+        "row_start": 2,
+        "row_end": 7,
+        "col_start": 1,
+        "col_end": 4,
+    }
+
+    response = client.post("/inspect/full_attn", json=payload)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows"] == [2, 7]
+    assert data["cols"] == [1, 4]
+    assert data["shape"] == [5, 3]
+    assert len(data["attn"]) == 5
+    assert all(len(row) == 3 for row in data["attn"])
+    # Token labels still cover the whole context
+    assert len(data["tokens"]) == data["t"]
+
+
+def test_full_attn_downsampled(client):
+    """Test that resolution pools the matrix down to at most N x N."""
+    payload = {
+        "messages": [
+            {"role": "user", "content": "hello"}
+        ],
+        "trace_layer": 0,
+        "head": 0,
+        "resolution": 4,
+        "pool": "mean",
+    }
+
+    response = client.post("/inspect/full_attn", json=payload)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["shape"] == [4, 4]
+    assert data["pool"] == "mean"
+    assert data["row_starts"][0] == 0
+    # Dummy attention is uniform 1/t, so mean pooling preserves it
+    t = data["t"]
+    assert abs(data["attn"][0][0] - 1 / t) < 1e-6
+
+
+def test_full_attn_empty_window(client):
+    """Test that an empty window returns 422."""
+    payload = {
+        "messages": [
+            {"role": "user", "content": "hello"}
+        ],
+        "trace_layer": 0,
+        "head": 0,
+        "row_start": 10000,
+    }
+
+    response = client.post("/inspect/full_attn", json=payload)
+
+    assert response.status_code == 422
+
+
+def test_full_attn_stream_ndjson(client):
+    """Test that stream mode sends a meta line, one line per row, then done."""
+    payload = {
+        "messages": [
+            {"role": "user", "content": "hello"}
+        ],
+        "trace_layer": 0,
+        "head": 0,
+        "resolution": 8,
+        "stream": True,
+    }
+
+    response = client.post("/inspect/full_attn", json=payload)
+
+    assert response.status_code == 200
+    assert "application/x-ndjson" in response.headers["content-type"]
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["type"] == "meta"
+    assert lines[-1]["type"] == "done"
+
+    rows = [line for line in lines if line["type"] == "row"]
+    assert len(rows) == lines[0]["shape"][0] == 8
+    assert [r["index"] for r in rows] == list(range(8))
+    assert all(len(r["values"]) == 8 for r in rows)
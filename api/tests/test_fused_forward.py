@@ -0,0 +1,87 @@
+"""Tests for the fused-attention traced forward."""
+
+import json
+from pathlib import Path
+
+import pytest
+import torch
+
+from app.fused_forward import FusedForward, fuse_model
+from app.kv_cache import make_decoder
+from app.parity import ForwardEngine, run_parity
+from app.registry import model_nbytes
+from tests.conftest import collect_events, small_gpt
+
+CORPUS = json.loads((Path(__file__).parent.parent / "tools" / "parity" / "corpus.json").read_text())
+
+
+@pytest.fixture(scope="module")
+def small_model():
+    """Three layers, so untraced layers surround the traced one; T fits the corpus."""
+    return small_gpt(T=256, L=3)
+
+
+@pytest.mark.parametrize("full", [False, True])
+def test_trace_matches_reference(small_model, full):
+    """Test that logits and the trace match GPT.forward_with_attn_trace in shape, dtype and value."""
+    model, cfg = small_model
+    fused = FusedForward(model, cfg)
+    x = torch.randint(0, cfg.V, (2, 40))
+    key = "attn_full" if full else "attn_row"
+
+    with torch.no_grad():
+        ref_logits, ref = model.forward_with_attn_trace(x, trace_layer=1, return_full_attn=full)
+    logits, trace = fused.forward_with_attn_trace(x, trace_layer=1, return_full_attn=full)
+
+    assert logits.shape == (2, 1, cfg.V)
+    torch.testing.assert_close(logits[:, -1], ref_logits[:, -1], atol=1e-5, rtol=1e-5)
+    assert trace["layer"] == 1
+    assert trace[key].shape == ref[key].shape and trace[key].dtype == ref[key].dtype
+    torch.testing.assert_close(trace[key], ref[key], atol=1e-6, rtol=1e-5)
+
+    with pytest.raises(ValueError):
+        fused.forward_with_attn_trace(x, trace_layer=cfg.L)
+
+
+def test_parity_over_corpus(small_model):
+    """Test greedy decoding through the fused forward against the reference."""
+    model, cfg = small_model
+    fused = FusedForward(model, cfg)
+
+    reports = run_parity(
+        lambda: ForwardEngine(model, cfg, trace_layer=2, full_attn=True),
+        lambda: ForwardEngine(fused, cfg, trace_layer=2, full_attn=True, name="fused"),
+        CORPUS,
+        max_new_tokens=8,
+    )
+
+    assert all(r.ok for r in reports), [r.first_divergence for r in reports if not r.ok]
+
+
+def test_wrapper_is_a_drop_in_model(small_model):
+    """Test that the wrapped model still serves cached decoding, sizing and streaming."""
+    model, cfg = small_model
+    fused = fuse_model(model, cfg)
+    assert fuse_model(fused, cfg) is fused
+    assert model_nbytes(fused) == model_nbytes(model)
+    ids = torch.randint(0, cfg.V, (1, 12))
+    torch.testing.assert_close(
+        make_decoder(fused, cfg).prefill(ids, layers=[0])[0],
+        make_decoder(model, cfg).prefill(ids, layers=[0])[0],
+    )
+
+    events = [collect_events(m, cfg) for m in (model, fused)]
+    assert [e["event"] for e in events[0]] == [e["event"] for e in events[1]]
+    assert events[0][-1]["data"]["reply"] == events[1][-1]["data"]["reply"]
+
+
+def test_falls_back_to_reference_forward(small_model, dummy_model, dummy_cfg, monkeypatch):
+    """Test that an unknown block layout or a failed load-time check leaves the model unwrapped."""
+    assert fuse_model(dummy_model, dummy_cfg) is dummy_model
+
+    model, cfg = small_model
+    monkeypatch.setattr(
+        "app.fused_forward.F.scaled_dot_product_attention",
+        lambda q, k, v, is_causal: torch.zeros_like(v),
+    )
+    assert fuse_model(model, cfg) is model
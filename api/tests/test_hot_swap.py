@@ -0,0 +1,101 @@
+"""Tests for zero-downtime checkpoint reload."""
+
+import asyncio
+import gc
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.hot_swap import HotSwapper
+from app.main import create_app
+from tests.conftest import DummyModel
+
+
+@pytest.fixture
+def app(dummy_model, dummy_cfg):
+    """App with a dummy model, admin token and a dummy reload loader."""
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    app.state.admin_token = "secret"
+    app.state.swapper = HotSwapper(app, loader=lambda: (DummyModel(), dummy_cfg))
+    return app
+
+
+def test_reload_requires_admin_token(app):
+    """Test that reload is forbidden without the admin token."""
+    client = TestClient(app)
+
+    response = client.post("/admin/reload")
+    assert response.status_code == 403
+    assert response.json()["code"] == "forbidden"
+
+    response = client.post("/admin/reload", headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 403
+
+
+def test_reload_swaps_model(app, dummy_model):
+    """Test that reload installs a new model and bumps the version."""
+    client = TestClient(app)
+
+    response = client.post("/admin/reload", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+    assert app.state.model is not dummy_model
+    assert app.state.model_ready
+    assert client.get("/health").json()["reload"]["version"] == 1
+
+
+def test_old_model_drains_then_frees(dummy_cfg):
+    """Test that a model held by an in-flight request is freed once released."""
+    app = create_app(model=DummyModel(), cfg=dummy_cfg)
+    swapper = HotSwapper(app, loader=lambda: (DummyModel(), dummy_cfg))
+
+    in_flight = app.state.model  # what a running stream would hold
+    asyncio.run(swapper.reload())
+    assert swapper.status()["draining"] == 1
+
+    del in_flight
+    gc.collect()
+    assert swapper.status()["draining"] == 0
+
+
+def test_failed_reload_keeps_serving(app, dummy_model, dummy_cfg):
+    """Test that a failing loader leaves the old model in place."""
+    def broken():
+        raise RuntimeError("corrupt checkpoint")
+
+    app.state.swapper = HotSwapper(app, loader=broken)
+    client = TestClient(app)
+
+    response = client.post("/admin/reload", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 500
+    assert response.json()["code"] == "reload_failed"
+    assert app.state.model is dummy_model
+    assert "corrupt checkpoint" in app.state.swapper.status()["last_error"]
+
+
+def test_watch_reloads_on_file_change(dummy_model, dummy_cfg, tmp_path):
+    """Test that the file watcher reloads once a changed file is stable."""
+    ckpt = tmp_path / "best.pt"
+    ckpt.write_bytes(b"v1")
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    swapper = HotSwapper(
+        app,
+        loader=lambda: (DummyModel(), dummy_cfg),
+        watch_path=ckpt,
+        poll_seconds=0.01,
+    )
+
+    async def scenario():
+        task = asyncio.create_task(swapper.watch())
+        await asyncio.sleep(0.03)
+        ckpt.write_bytes(b"version-2")
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if swapper.version == 1:
+                break
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert swapper.version == 1
@@ -0,0 +1,137 @@
+"""Tests for the attention inspection executor."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.inspect_pool import InspectBusy, InspectCancelled, InspectExecutor, InspectTimeout
+from app.main import create_app
+
+
+def test_blocking_job_leaves_loop_responsive():
+    """Test that a long inspection doesn't stall other coroutines."""
+    ticks = []
+
+    async def main():
+        executor = InspectExecutor(workers=1, queue=0, nice=0)
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        result = await executor.run(time.sleep, 0.3)
+        task.cancel()
+        executor.shutdown()
+        return result
+
+    assert asyncio.run(main()) is None
+    assert len(ticks) > 10
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.15
+
+
+def test_queue_limit_and_timeout():
+    """Test that jobs past workers + queue are refused and slow jobs time out."""
+    release = threading.Event()
+
+    async def main():
+        executor = InspectExecutor(workers=1, queue=1, timeout=0.2, nice=0)
+        running = asyncio.create_task(executor.run(release.wait))
+        queued = asyncio.create_task(executor.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(InspectBusy):
+            await executor.run(lambda: "refused")
+        for task in (running, queued):
+            with pytest.raises(InspectTimeout):
+                await task
+        # The abandoned job keeps its worker until it returns
+        assert executor.running == 1
+        release.set()
+        assert await executor.run(lambda: "after") == "after"
+        executor.shutdown()
+        return executor.status()
+
+    status = asyncio.run(main())
+    assert status["rejected_total"] == 1
+    assert status["timeouts_total"] == 2
+    assert status["running"] == 0 and status["queued"] == 0
+
+
+def test_waits_for_chat_steps_and_client():
+    """Test that jobs yield to waiting chat steps and give up on disconnect."""
+    class Scheduler:
+        waiting = 1
+        dispatched = 0
+
+    async def main():
+        scheduler = Scheduler()
+        executor = InspectExecutor(timeout=5, nice=0, scheduler=scheduler)
+        started = []
+        job = asyncio.create_task(executor.run(started.append, "x"))
+        await asyncio.sleep(0.2)
+        assert started == []
+        scheduler.waiting = 0
+        await job
+        assert started == ["x"]
+
+        scheduler.waiting = 1
+        gone = asyncio.Event()
+
+        async def is_disconnected():
+            return gone.is_set()
+
+        job = asyncio.create_task(executor.run(started.append, "y", is_disconnected=is_disconnected))
+        await asyncio.sleep(0.1)
+        gone.set()
+        with pytest.raises(InspectCancelled):
+            await job
+        executor.shutdown()
+        return started
+
+    assert asyncio.run(main()) == ["x"]
+
+
+def test_busy_chat_defers_a_job_only_so_long():
+    """Test that a job runs after max_deferred_steps even if chat steps never stop queueing."""
+    class Scheduler:
+        waiting = 2
+        dispatched = 0
+
+    async def main():
+        scheduler = Scheduler()
+        executor = InspectExecutor(timeout=5, nice=0, scheduler=scheduler, max_deferred_steps=3)
+        started = []
+        job = asyncio.create_task(executor.run(started.append, "x"))
+        for _ in range(3):
+            await asyncio.sleep(0.1)
+            assert started == []
+            scheduler.dispatched += 1
+        await asyncio.wait_for(job, 1)
+        executor.shutdown()
+        return started
+
+    assert asyncio.run(main()) == ["x"]
+
+
+def test_endpoints_use_inspect_pool(dummy_model, dummy_cfg):
+    """Test that inspection endpoints answer through the pool and map its errors."""
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    client = TestClient(app)
+    body = {"messages": [{"role": "user", "content": "hi"}], "trace_layer": 0, "head": 0}
+
+    response = client.post("/inspect/full_attn", json=body)
+    assert response.status_code == 200
+    assert len(response.json()["attn"]) == len(response.json()["tokens"])
+
+    app.state.inspect = InspectExecutor(workers=1, queue=0, nice=0)
+    app.state.inspect.pending = 1  # every place taken
+    response = client.post("/inspect/full_attn", json=body)
+    assert response.status_code == 503
+    assert response.json()["code"] == "inspect_busy"
+    assert app.state.memory.status()["reserved_bytes"] == 0
+
+    assert client.get("/health").json()["inspect"]["rejected_total"] == 1
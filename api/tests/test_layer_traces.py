@@ -0,0 +1,122 @@
+"""Tests for multi-layer trace capture and retrieval by generation id."""
+
+import pytest
+import torch
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.tracing import layers_from_mask, forward_with_layer_traces
+from tests.conftest import small_gpt
+from tests.test_sse_protocol import parse_sse_events
+
+
+@pytest.fixture
+def client(dummy_model, dummy_cfg):
+    """Create test client with dummy model."""
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    return TestClient(app)
+
+
+def stream(client, **overrides):
+    """POST /chat/stream and return (response, parsed events)."""
+    payload = {
+        "messages": [
+            {"role": "user", "content": "hello"}
+        ],
+        "trace_layer": 0,
+        "max_new_tokens": 3,
+        **overrides,
+    }
+    response = client.post("/chat/stream", json=payload)
+    return response, parse_sse_events(response.text)
+
+
+def test_layers_from_mask():
+    """Test bitmask expansion and bounds."""
+    assert layers_from_mask(0b1010, 4) == [1, 3]
+    assert layers_from_mask(0b1111, 4) == [0, 1, 2, 3]
+    with pytest.raises(ValueError):
+        layers_from_mask(0, 4)
+    with pytest.raises(ValueError):
+        layers_from_mask(0b10000, 4)
+
+
+def test_no_mask_has_no_generation_id(client):
+    """Test that plain requests keep the original done payload."""
+    response, events = stream(client)
+
+    assert "x-generation-id" not in response.headers
+    assert events[-1]["data"] == {"reply": events[-1]["data"]["reply"]}
+
+
+def test_all_layers_retrievable_without_recompute(client, dummy_cfg):
+    """Test that every masked layer can be fetched after the stream ends."""
+    response, events = stream(client, trace_layers=0b0110)
+
+    generation_id = response.headers["x-generation-id"]
+    assert events[-1]["data"]["generation_id"] == generation_id
+    n_steps = len([e for e in events if e["event"] == "trace"])
+
+    # trace_layer 0 is always captured alongside the mask
+    for layer in (0, 1, 2):
+        r = client.get(f"/traces/{generation_id}", params={"layer": layer})
+        assert r.status_code == 200
+        data = r.json()
+        assert data["layer"] == layer
+        assert data["layers"] == [0, 1, 2]
+        assert len(data["steps"]) == n_steps
+        assert len(data["steps"][0]["attn"]) == dummy_cfg.H
+        assert data["logit_lens"] is None
+
+
+def test_streamed_attn_matches_stored_layer(client):
+    """Test that the SSE attn equals the stored trace for trace_layer."""
+    response, events = stream(client, trace_layer=2, trace_layers=0b1111)
+    generation_id = response.headers["x-generation-id"]
+
+    stored = client.get(f"/traces/{generation_id}", params={"layer": 2}).json()
+    streamed = [e["data"]["attn"] for e in events if e["event"] == "trace"]
+    assert [s["attn"] for s in stored["steps"]] == streamed
+
+
+def test_logit_lens_summaries(client):
+    """Test that logit-lens summaries are recorded per step when requested."""
+    response, events = stream(client, trace_layers=0b0001, logit_lens=True)
+    generation_id = response.headers["x-generation-id"]
+
+    data = client.get(f"/traces/{generation_id}", params={"layer": 0}).json()
+    assert len(data["logit_lens"]) == len(data["steps"])
+    assert data["logit_lens"][0]["token_id"] == 72
+    assert {"token_display", "prob", "entropy"} <= set(data["logit_lens"][0])
+
+
+def test_untraced_layer_and_unknown_id(client):
+    """Test 422 for layers outside the mask and 404 for unknown ids."""
+    response, _ = stream(client, trace_layers=0b0001)
+    generation_id = response.headers["x-generation-id"]
+
+    r = client.get(f"/traces/{generation_id}", params={"layer": 3})
+    assert r.status_code == 422
+
+    r = client.get("/traces/does-not-exist", params={"layer": 0})
+    assert r.status_code == 404
+    assert r.json()["code"] == "trace_not_found"
+
+
+def test_invalid_mask_returns_422(client):
+    """Test that a mask selecting nonexistent layers is rejected."""
+    response, _ = stream(client, trace_layers=1 << 8)
+    assert response.status_code == 422
+
+
+def test_layer_traces_match_forward_with_attn_trace():
+    """Test that one multi-layer pass matches per-layer reference traces."""
+    model, cfg = small_gpt(T=32, L=3)
+    x = torch.randint(0, 256, (1, 17))
+
+    with torch.no_grad():
+        logits, traces = forward_with_layer_traces(model, x, layers=[0, 1, 2])
+        for layer in range(cfg.L):
+            ref_logits, ref = model.forward_with_attn_trace(x, trace_layer=layer)
+            assert torch.allclose(logits, ref_logits, atol=1e-6, rtol=0)
+            assert torch.allclose(traces["attn_rows"][layer], ref["attn_row"], atol=1e-6, rtol=0)
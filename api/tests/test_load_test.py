@@ -0,0 +1,73 @@
+"""Tests for the SSE load-testing harness."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+import app.main as main
+from tools.load_test import Sample, Scenario, percentiles, run_in_process, summarize
+
+SCENARIOS = Path(__file__).parent.parent / "tools" / "scenarios"
+
+
+@pytest.fixture(autouse=True)
+def restore_rate_limiter():
+    """The in-process runner swaps main.rate_limiter; put it back."""
+    original = main.rate_limiter
+    yield
+    main.rate_limiter = original
+
+
+def test_checked_in_scenarios_load():
+    """Test that every scenario file parses."""
+    paths = sorted(SCENARIOS.glob("*.json"))
+    assert paths
+    for path in paths:
+        assert Scenario.load(path).clients > 0
+
+
+def test_unknown_scenario_key_rejected(tmp_path):
+    """Test that typos in scenario files fail loudly."""
+    path = tmp_path / "bad.json"
+    path.write_text(json.dumps({"name": "bad", "clinets": 5}))
+    with pytest.raises(ValueError, match="clinets"):
+        Scenario.load(path)
+
+
+def test_summarize_rates_and_percentiles():
+    """Test error/429/503 rates and latency percentiles."""
+    samples = [
+        Sample("chat", 200, 0.0, 100.0, ttft_ms=10.0, gaps_ms=[5.0, 7.0], tokens=3),
+        Sample("chat", 429, 0.0, 1.0),
+        Sample("chat", 503, 0.0, 1.0),
+        Sample("full_attn", None, 0.0, 1.0, error="ConnectError: refused"),
+    ]
+
+    report = summarize(samples, duration_s=2.0, rss=[(0.0, 100.0), (1.0, 120.0)])
+
+    assert report["rates"] == {"error": 0.25, "429": 0.25, "503": 0.25}
+    assert report["ttft_ms"]["p50"] == 10.0
+    assert report["inter_token_ms"] == {"p50": 5.0, "p95": 7.0, "p99": 7.0}
+    assert report["throughput"]["tokens_per_s"] == 1.5
+    assert report["rss_mb"]["peak"] == 120.0
+    assert percentiles([]) == {"p50": None, "p95": None, "p99": None}
+
+
+def test_in_process_dummy_scenario():
+    """Test a small concurrent run against the app served in-process."""
+    scenario = Scenario(
+        name="tiny",
+        step_latency_ms=1,
+        clients=4,
+        requests_per_client=2,
+        full_attn_fraction=0.25,
+        chat={"messages": [{"role": "user", "content": "hi"}], "max_new_tokens": 4, "trace_layer": 0},
+    )
+
+    report = run_in_process(scenario)
+
+    assert report["requests"] == 8
+    assert report["rates"]["error"] == 0.0
+    assert report["ttft_ms"]["p50"] is not None
+    assert report["throughput"]["tokens_per_s"] > 0
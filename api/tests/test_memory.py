@@ -0,0 +1,120 @@
+"""Tests for per-request memory accounting and the memory budget."""
+
+import gc
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.memory import (
+    Estimate,
+    MemoryAccountant,
+    MemoryBudgetExceeded,
+    estimate_chat,
+    estimate_full_attn,
+)
+
+
+def test_estimates_grow_with_context(dummy_cfg):
+    """Test that attention dominates long crop-mode contexts and windows shrink full_attn."""
+    short = estimate_chat(dummy_cfg, prompt_tokens=8, max_new_tokens=8)
+    long = estimate_chat(dummy_cfg, prompt_tokens=200, max_new_tokens=56)
+    assert long.tensor_bytes > 50 * short.tensor_bytes  # 16x the tokens
+
+    whole = estimate_full_attn(dummy_cfg, tokens=200)
+    pooled = estimate_full_attn(dummy_cfg, tokens=200, resolution=16)
+    assert pooled.python_bytes == 16 * 16 * 32
+    assert whole.python_bytes == 200 * 200 * 32
+
+
+def test_budget_admission():
+    """Test that reservations count against the budget until released."""
+    accountant = MemoryAccountant(budget_bytes=1000)
+    first = accountant.reserve("chat", Estimate(600, 0))
+
+    with pytest.raises(MemoryBudgetExceeded) as busy:
+        accountant.reserve("chat", Estimate(600, 0))
+    assert busy.value.retryable
+    with pytest.raises(MemoryBudgetExceeded) as never:
+        accountant.reserve("chat", Estimate(2000, 0))
+    assert not never.value.retryable
+
+    accountant.release(first)
+    accountant.reserve("chat", Estimate(600, 0))
+    assert accountant.status()["rejected_total"] == 2
+
+
+def test_track_releases_on_completion_and_discard():
+    """Test that tracked streams release their reservation however they end."""
+    accountant = MemoryAccountant(budget_bytes=1000)
+
+    done = accountant.reserve("chat", Estimate(500, 0))
+    assert list(accountant.track(iter([1, 2, 3]), done)) == [1, 2, 3]
+
+    unstarted = accountant.reserve("chat", Estimate(500, 0))
+    stream = accountant.track(iter([1]), unstarted)
+    del stream
+    gc.collect()
+
+    assert accountant.status()["reserved_bytes"] == 0
+    finished = accountant.requests()["top"]
+    assert len(finished) == 2
+    growth = [r["process_maxrss_growth_bytes"] for r in finished]
+    assert all(g is None or g >= 0 for g in growth)
+
+
+def test_python_allocation_tracking():
+    """Test that a spike freed before the next event still raises the traced peak."""
+    was_tracing = tracemalloc.is_tracing()
+    accountant = MemoryAccountant(trace_python=True)
+    try:
+        tracemalloc.reset_peak()
+        usage = accountant.reserve("chat", Estimate(0, 0))
+
+        def events():
+            spike = [float(i) for i in range(100_000)]
+            del spike
+            yield "token"
+
+        assert list(accountant.track(events(), usage)) == ["token"]
+
+        assert accountant.requests()["top"][0]["process_traced_peak_growth_bytes"] > 100_000 * 24
+        assert accountant.python_top()["top"]
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def test_chat_rejected_over_budget(dummy_model, dummy_cfg):
+    """Test that /chat/stream refuses a request larger than the whole budget."""
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    app.state.memory = MemoryAccountant(budget_bytes=1024)
+    client = TestClient(app)
+
+    response = client.post(
+        "/chat/stream",
+        json={"messages": [{"role": "user", "content": "hi"}], "trace_layer": 0},
+    )
+
+    assert response.status_code == 413
+    assert response.json()["code"] == "memory_budget"
+
+
+def test_admin_memory(dummy_model, dummy_cfg):
+    """Test the admin report after a generation."""
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    app.state.admin_token = "secret"
+    client = TestClient(app)
+    body = {"messages": [{"role": "user", "content": "hi"}], "trace_layer": 0, "max_new_tokens": 3}
+    assert client.post("/chat/stream", json=body).status_code == 200
+
+    assert client.get("/admin/memory").status_code == 403
+    report = client.get("/admin/memory", headers={"X-Admin-Token": "secret"}).json()
+
+    assert report["budget"]["reserved_bytes"] == 0
+    assert [r["kind"] for r in report["requests"]["top"]] == ["chat"]
+    assert report["requests"]["active"] == []
+    assert "trace_store" in report["caches"]
+    assert any(c["name"].startswith("model:") for c in report["consumers"])
+    assert report["python"] is None
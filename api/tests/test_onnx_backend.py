@@ -0,0 +1,128 @@
+"""Parity tests for the ONNX Runtime backend against the torch model."""
+
+import pytest
+import torch
+
+pytest.importorskip("onnxruntime")
+
+from app.generation import generate_attn_summary, generate_full_attn
+from app.onnx_backend import (
+    DECODE_FILENAME,
+    META_FILENAME,
+    PREFILL_FILENAME,
+    OnnxModel,
+    export_onnx,
+    graph_dir,
+    load_onnx_model,
+    publish_onnx,
+)
+from tests.conftest import collect_events, small_gpt
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    """Small random-init GPT and its exported graphs."""
+    model, cfg = small_gpt(T=24)
+    out = export_onnx(model, cfg, tmp_path_factory.mktemp("onnx"))
+    return model, cfg, OnnxModel(out)
+
+
+def chat(model, cfg, **kwargs):
+    """All events of a greedy generation."""
+    params = {"messages": [{"role": "user", "content": "hello"}], "max_new_tokens": 20, "trace_layer": 1, **kwargs}
+    return collect_events(model, cfg, **params)
+
+
+def test_forward_parity(exported):
+    """Test last-position logits and attention match the torch forward."""
+    model, cfg, onnx_model = exported
+    x = torch.randint(0, cfg.V, (1, 10))
+
+    with torch.no_grad():
+        ref_logits, ref = model.forward_with_attn_trace(x, trace_layer=1, return_full_attn=True)
+    logits, trace = onnx_model.forward_with_attn_trace(x, trace_layer=1, return_full_attn=True)
+
+    assert torch.allclose(ref_logits[:, -1], logits[:, -1], atol=1e-4)
+    assert torch.allclose(ref["attn_full"], trace["attn_full"], atol=1e-5)
+
+
+@pytest.mark.parametrize("context_mode", ["crop", "rolling"])
+def test_stream_parity(exported, context_mode):
+    """Test greedy streams match token for token, including past the window."""
+    model, cfg, onnx_model = exported
+
+    ref = chat(model, cfg, context_mode=context_mode)
+    out = chat(onnx_model, cfg, context_mode=context_mode)
+
+    assert [e["data"].get("token_id") for e in ref] == [e["data"].get("token_id") for e in out]
+    for a, b in zip(ref, out):
+        if a["event"] == "trace":
+            assert torch.allclose(torch.tensor(a["data"]["attn"]), torch.tensor(b["data"]["attn"]), atol=1e-4)
+            assert a["data"].get("evicted") == b["data"].get("evicted")
+
+
+def test_parallel_samples_parity(exported):
+    """Test the batched decode graph with n samples."""
+    model, cfg, onnx_model = exported
+
+    assert chat(model, cfg, n=3)[-1] == chat(onnx_model, cfg, n=3)[-1]
+
+
+def test_full_attn_parity(exported):
+    """Test /inspect/full_attn output on the ONNX backend."""
+    model, cfg, onnx_model = exported
+    args = dict(messages=[{"role": "user", "content": "hi"}], trace_layer=0, head=1, device="cpu")
+
+    ref = generate_full_attn(model, cfg, **args)
+    out = generate_full_attn(onnx_model, cfg, **args)
+
+    assert ref["tokens"] == out["tokens"]
+    assert torch.allclose(torch.tensor(ref["attn"]), torch.tensor(out["attn"]), atol=1e-5)
+
+
+def test_attn_summary_parity(exported):
+    """Test /inspect/attn_summary output on the ONNX backend."""
+    model, cfg, onnx_model = exported
+    args = dict(messages=[{"role": "user", "content": "hi"}], device="cpu", top_k=3)
+
+    ref = generate_attn_summary(model, cfg, **args)
+    out = generate_attn_summary(onnx_model, cfg, **args)
+
+    assert ref["top_positions"] == out["top_positions"]
+    assert torch.allclose(torch.tensor(ref["entropy"]), torch.tensor(out["entropy"]), atol=1e-4)
+
+
+def test_reexport_when_checkpoint_changes(exported, tmp_path):
+    """Test that load_onnx_model exports once and again only when stale."""
+    model, cfg, _ = exported
+    ckpt = tmp_path / "best.pt"
+    ckpt.write_bytes(b"v1")
+    loads = []
+
+    def load_torch():
+        loads.append(1)
+        return model, cfg
+
+    load_onnx_model(tmp_path / "onnx", load_torch=load_torch, source=ckpt)
+    load_onnx_model(tmp_path / "onnx", load_torch=load_torch, source=ckpt)
+    assert len(loads) == 1
+
+    ckpt.write_bytes(b"version-2")
+    _, loaded_cfg = load_onnx_model(tmp_path / "onnx", load_torch=load_torch, source=ckpt)
+    assert len(loads) == 2
+    assert loaded_cfg.L == cfg.L
+
+
+def test_reexport_swaps_whole_graph_sets(exported, tmp_path):
+    """Test that a re-export publishes a complete new version via the pointer."""
+    model, cfg, _ = exported
+    onnx_dir = tmp_path / "onnx"
+    first = publish_onnx(model, cfg, onnx_dir)
+    second = publish_onnx(model, cfg, onnx_dir)
+    third = publish_onnx(model, cfg, onnx_dir)
+
+    assert graph_dir(onnx_dir) == third
+    assert sorted(p.name for p in third.iterdir()) == sorted([PREFILL_FILENAME, DECODE_FILENAME, META_FILENAME])
+    # The replaced version stays for readers that already resolved it
+    assert second.exists() and not first.exists()
+    assert OnnxModel(onnx_dir).cfg.L == cfg.L
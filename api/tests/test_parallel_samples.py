@@ -0,0 +1,104 @@
+"""Tests for n parallel samples decoded as one batch."""
+
+import json
+
+import torch
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.sse import forward_counter, stream_sse_events
+from tests.conftest import collect_events, small_gpt
+
+
+def run(model, cfg, *, n, seed=7, **kwargs):
+    """All events of a sampled generation."""
+    params = {"max_new_tokens": 6, "temperature": 1.0, "trace_layer": 1, "context_mode": "rolling", **kwargs}
+    return collect_events(model, cfg, n=n, seed=seed, **params)
+
+
+def tokens_by_sample(events):
+    """token ids per sample index."""
+    out = {}
+    for e in events:
+        if e["event"] == "token":
+            out.setdefault(e["data"].get("sample", 0), []).append(e["data"]["token_id"])
+    return out
+
+
+def test_events_tagged_with_sample_index(small_model):
+    """Test that every token/trace event names its sample and done has all replies."""
+    model, cfg = small_model
+
+    events = run(model, cfg, n=3)
+
+    body = [e for e in events if e["event"] in ("token", "trace")]
+    assert {e["data"]["sample"] for e in body} == {0, 1, 2}
+    done = events[-1]
+    assert done["event"] == "done"
+    assert len(done["data"]["replies"]) == 3
+    assert done["data"]["reply"] == done["data"]["replies"][0]
+
+
+def test_sample_seeds_are_deterministic(small_model):
+    """Test that sample i matches a single-sample run seeded with seed + i."""
+    model, cfg = small_model
+
+    batched = tokens_by_sample(run(model, cfg, n=3, seed=7))
+
+    for i in range(3):
+        single = tokens_by_sample(run(model, cfg, n=1, seed=7 + i))
+        assert batched[i] == single[0]
+    assert batched == tokens_by_sample(run(model, cfg, n=3, seed=7))
+
+
+def test_crop_mode_samples(small_model):
+    """Test that crop mode decodes n samples without eviction fields."""
+    model, cfg = small_model
+
+    events = run(model, cfg, n=2, context_mode="crop")
+
+    traces = [e["data"] for e in events if e["event"] == "trace"]
+    assert traces and all("evicted" not in t for t in traces)
+    assert len(tokens_by_sample(events)) == 2
+
+
+def test_crop_samples_match_single_crop_past_the_window():
+    """Test that n > 1 crop keeps crop semantics once the context outgrows cfg.T."""
+    model, cfg = small_gpt(T=32)
+    params = {"context_mode": "crop", "max_new_tokens": 24}
+
+    batched = run(model, cfg, n=2, **params)
+    assert max(len(e["data"]["attn"][0]) for e in batched if e["event"] == "trace") == cfg.T
+
+    for i in range(2):
+        single = run(model, cfg, n=1, seed=7 + i, **params)
+        assert tokens_by_sample(batched)[i] == tokens_by_sample(single)[0]
+        ours = [e["data"]["attn"] for e in batched if e["event"] == "trace" and e["data"]["sample"] == i]
+        reference = [e["data"]["attn"] for e in single if e["event"] == "trace"]
+        assert len(ours) == len(reference)
+        for a, b in zip(ours, reference):
+            assert torch.allclose(torch.tensor(a), torch.tensor(b), atol=1e-5)
+
+
+def test_batched_forward_counts_as_one_step(small_model):
+    """Test that n token events from one batched forward are one scheduler step."""
+    model, cfg = small_model
+    events = run(model, cfg, n=3)
+
+    is_forward = forward_counter()
+    forwards = sum(is_forward(chunk) for chunk in stream_sse_events(iter(events)))
+
+    assert forwards == len({e["data"]["step"] for e in events if e["event"] == "token"})
+    assert forwards < sum(e["event"] == "token" for e in events)
+
+
+def test_endpoint_validates_n(dummy_model, dummy_cfg):
+    """Test the n bounds and the trace_layers restriction."""
+    client = TestClient(create_app(model=dummy_model, cfg=dummy_cfg))
+    base = {"messages": [{"role": "user", "content": "hi"}], "trace_layer": 0}
+
+    assert client.post("/chat/stream", json={**base, "n": 0}).status_code == 422
+    assert client.post("/chat/stream", json={**base, "n": 1000}).status_code == 422
+    response = client.post("/chat/stream", json={**base, "n": 2, "trace_layers": 3})
+    assert response.status_code == 422
+    assert "n > 1" in json.dumps(response.json())
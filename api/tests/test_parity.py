@@ -0,0 +1,123 @@
+"""Tests for the numerical parity harness."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from niels_gpt.chat_format import format_chat
+from niels_gpt.tokenizer import encode
+
+from app.parity import CachedEngine, ForwardEngine, Tolerances, report_dict, run_parity
+from tests.conftest import small_gpt
+
+CORPUS = json.loads((Path(__file__).parent.parent / "tools" / "parity" / "corpus.json").read_text())
+
+
+@pytest.fixture(scope="module")
+def small_model():
+    """Small random-init GPT with a context window the corpus fits in."""
+    return small_gpt(T=256)
+
+
+class Perturbed:
+    """Model wrapper that shifts one logit once the context reaches a length."""
+
+    def __init__(self, model, from_length: int):
+        self.model = model
+        self.from_length = from_length
+
+    def forward_with_attn_trace(self, x, trace_layer=0, return_full_attn=False):
+        logits, trace = self.model.forward_with_attn_trace(x, trace_layer=trace_layer, return_full_attn=return_full_attn)
+        if x.shape[1] >= self.from_length:
+            logits = logits.clone()
+            logits[..., 0] += 0.5
+        return logits, trace
+
+
+def reference(model, cfg):
+    return lambda: ForwardEngine(model, cfg, trace_layer=1, full_attn=True)
+
+
+@pytest.mark.parametrize("temperature,top_k", [(0.0, None), (0.9, 50)])
+def test_cached_decoding_matches_reference(small_model, temperature, top_k):
+    """Test the torch KV cache over the whole corpus, greedy and sampled."""
+    model, cfg = small_model
+
+    reports = run_parity(
+        reference(model, cfg),
+        lambda: CachedEngine(model, cfg, trace_layer=1),
+        CORPUS,
+        max_new_tokens=12,
+        temperature=temperature,
+        top_k=top_k,
+    )
+
+    assert [r.name for r in reports] == [entry["name"] for entry in CORPUS]
+    assert all(r.ok for r in reports), report_dict(reports)
+    assert all(r.steps > 0 for r in reports)
+
+
+def test_full_attn_compared_for_forward_candidates(small_model):
+    """Test that two full-context engines also compare attn_full."""
+    model, cfg = small_model
+
+    reports = run_parity(reference(model, cfg), reference(model, cfg), CORPUS[:1], max_new_tokens=3)
+
+    assert reports[0].max_error["attn_full"] == 0.0
+
+
+def test_reports_first_divergent_step(small_model):
+    """Test that a candidate drifting mid-generation is caught at that step."""
+    model, cfg = small_model
+    prompt_len = len(encode(format_chat(CORPUS[0]["messages"])))
+
+    reports = run_parity(
+        reference(model, cfg),
+        lambda: ForwardEngine(Perturbed(model, prompt_len + 3), cfg, trace_layer=1, full_attn=True, name="perturbed"),
+        CORPUS[:1],
+        max_new_tokens=8,
+    )
+
+    divergence = reports[0].first_divergence
+    assert divergence is not None
+    assert (divergence.step, divergence.metric) == (3, "logits")
+    assert divergence.error == pytest.approx(0.5, abs=1e-3)
+
+    summary = report_dict(reports)
+    assert summary["ok"] is False
+    assert summary["prompts"][0]["first_divergence"]["step"] == 3
+
+
+def test_tolerances_are_configurable(small_model):
+    """Test that loosening a tolerance accepts the same drift."""
+    model, cfg = small_model
+
+    reports = run_parity(
+        reference(model, cfg),
+        lambda: ForwardEngine(Perturbed(model, 0), cfg, trace_layer=1, full_attn=True),
+        CORPUS[:1],
+        max_new_tokens=4,
+        tolerances=Tolerances(logits=1.0),
+    )
+
+    assert reports[0].ok
+
+
+def test_numpy_engine_matches_reference(small_model, tmp_path):
+    """Test the NumPy engine's cached decoding through the harness."""
+    pytest.importorskip("numpy")
+    from app.numpy_engine import NumpyGPT, export_weights
+    from app.parity import NumpyCachedEngine
+
+    model, cfg = small_model
+    engine = NumpyGPT.load(export_weights(model, cfg, tmp_path / "weights.npz"))
+
+    reports = run_parity(
+        reference(model, cfg),
+        lambda: NumpyCachedEngine(engine, trace_layer=1),
+        CORPUS,
+        max_new_tokens=8,
+    )
+
+    assert all(r.ok for r in reports), report_dict(reports)
@@ -0,0 +1,138 @@
+"""Tests for adaptive QoS degradation under load."""
+
+import json
+
+import torch
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.qos import LEVELS, QosController, QosStream, thin_attn
+from tests.conftest import collect_events
+
+
+class LoadGauge:
+    """Scheduler stand-in exposing the measurements QosController reads."""
+
+    def __init__(self, waiting=0, busy=0, step_latency=0.0, slots=1):
+        self.waiting = waiting
+        self.busy = busy
+        self.step_latency = step_latency
+        self.slots = slots
+
+
+def sse_events(text: str) -> list[tuple[str, dict]]:
+    """Parse an SSE body into (event, data) pairs."""
+    events = []
+    for frame in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_level_follows_queue_depth_and_latency():
+    """Test pressure thresholds from both measurements."""
+    gauge = LoadGauge()
+    qos = QosController(gauge, queue_depth=4, target_step_ms=100)
+
+    assert qos.level().name == "normal"
+    gauge.waiting = 4
+    assert qos.level().name == "elevated"
+    gauge.waiting, gauge.busy, gauge.step_latency = 0, 1, 0.5  # 500ms steps
+    assert qos.level().name == "critical"
+
+
+def test_idle_scheduler_has_no_latency_pressure():
+    """Test that a stale latency measurement doesn't keep an idle server degraded."""
+    qos = QosController(LoadGauge(step_latency=10.0), target_step_ms=100)
+
+    assert qos.pressure() == 0.0
+
+
+def test_recovers_one_level_at_a_time():
+    """Test hysteresis on the way down."""
+    gauge = LoadGauge(waiting=100)
+    qos = QosController(gauge, queue_depth=4, recover_seconds=5)
+    assert qos.level(now=0).name == "critical"
+
+    gauge.waiting = 0
+    assert qos.level(now=1).name == "critical"
+    assert qos.level(now=5.9).name == "critical"
+    assert qos.level(now=6).name == "high"
+    assert qos.level(now=11).name == "elevated"
+    assert qos.level(now=16).name == "normal"
+
+
+def test_disabled_is_always_normal():
+    """Test that QOS_ENABLED=false ignores load."""
+    qos = QosController(LoadGauge(waiting=100), enabled=False)
+
+    assert qos.level() is LEVELS[0]
+    assert qos.cap_tokens(500) == 500
+
+
+def test_thin_attn():
+    """Test cadence, head and precision reduction of one step's attention."""
+    attn = torch.tensor([[0.123456, 0.876544]] * 4)
+    high = next(level for level in LEVELS if level.name == "high")
+
+    thinned = thin_attn(attn, 4, high)
+    assert thinned["attn"] == [[0.12, 0.88]] * 2
+    assert thinned["heads"] == [0, 1]
+    assert thin_attn(attn, 5, high) == {}
+    assert thin_attn(attn, 5, LEVELS[0])["attn"] == attn.tolist()
+
+
+def test_stream_flags_degradation():
+    """Test qos events at the start of a degraded stream and on recovery."""
+    gauge = LoadGauge(waiting=100)
+    qos = QosController(gauge, queue_depth=4, recover_seconds=0)
+    stream = qos.stream(requested_tokens=256, max_new_tokens=64)
+
+    assert stream.step() == {"event": "qos", "data": qos.describe(LEVELS[3], 64)}
+    assert stream.step() is None
+    gauge.waiting = 0
+    assert stream.step()["data"]["level"] == "high"
+
+
+def test_degraded_generation_thins_traces_at_source(dummy_model, dummy_cfg):
+    """Test that generation builds only the attention a degraded level keeps."""
+    critical = LEVELS[3]
+    events = collect_events(
+        dummy_model, dummy_cfg, max_new_tokens=10, qos=QosStream(lambda: critical, capped_tokens=10)
+    )
+
+    assert events[0] == {"event": "qos", "data": QosController.describe(critical, 10)}
+    traces = [e["data"] for e in events if e["event"] == "trace"]
+    assert all("entropy" in t and "topk" in t for t in traces)
+    kept = [t for t in traces if "attn" in t]
+    assert [t["step"] for t in kept] == [s for s in range(len(traces)) if s % critical.trace_every == 0]
+    assert all(len(t["attn"]) == 1 and t["heads"] == [0] for t in kept)
+
+
+def test_normal_stream_is_untouched(dummy_model, dummy_cfg):
+    """Test that an unloaded stream has no qos events and full traces."""
+    qos = QosController(LoadGauge())
+    stream = qos.stream(requested_tokens=4, max_new_tokens=4)
+
+    assert collect_events(dummy_model, dummy_cfg, qos=stream) == collect_events(dummy_model, dummy_cfg)
+
+
+def test_endpoints_under_load(dummy_model, dummy_cfg):
+    """Test capped tokens, flagged stream and disabled full attention."""
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    app.state.qos = QosController(LoadGauge(waiting=100))
+    client = TestClient(app)
+    messages = [{"role": "user", "content": "hi"}]
+
+    response = client.post(
+        "/chat/stream",
+        json={"messages": messages, "trace_layer": 0, "max_new_tokens": 100},
+    )
+    events = sse_events(response.text)
+    assert events[0] == ("qos", QosController.describe(LEVELS[3], 64))
+    assert sum(name == "token" for name, _ in events) <= 64
+
+    response = client.post("/inspect/full_attn", json={"messages": messages, "trace_layer": 0, "head": 0})
+    assert response.status_code == 503
+    assert response.json()["code"] == "degraded"
+    assert client.get("/health").json()["qos"]["level"] == "critical"
@@ -0,0 +1,127 @@
+"""Tests for the multi-checkpoint model registry."""
+
+import pytest
+import torch
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.registry import ModelRegistry, ModelNotFound, model_nbytes
+
+
+class SizedModel(torch.nn.Module):
+    """Module with a known parameter footprint."""
+
+    def __init__(self, n: int):
+        super().__init__()
+        self.w = torch.nn.Parameter(torch.zeros(n))
+
+
+@pytest.fixture
+def ckpt_dir(tmp_path):
+    """Checkpoint directory with three (empty) checkpoint files."""
+    for name in ("a", "b", "c"):
+        (tmp_path / f"{name}.pt").write_bytes(b"")
+    return tmp_path
+
+
+def test_model_nbytes_counts_tied_once():
+    """Test that shared parameters are only counted once."""
+    model = torch.nn.Module()
+    model.emb = torch.nn.Embedding(10, 4)
+    model.head = torch.nn.Linear(4, 10, bias=False)
+    model.head.weight = model.emb.weight
+
+    assert model_nbytes(model) == 10 * 4 * 4
+
+
+def test_lazy_load_and_lru_eviction(ckpt_dir):
+    """Test on-demand loading and LRU eviction within the byte budget."""
+    loads = []
+
+    def loader(path):
+        loads.append(path.stem)
+        return SizedModel(100), {"id": path.stem}  # 400 bytes each
+
+    registry = ModelRegistry(ckpt_dir, budget_bytes=800, loader=loader)
+
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # hit; b is now least recently used
+    registry.get("c")  # evicts b
+
+    warm = [m["id"] for m in registry.status()["warm"]]
+    assert warm == ["a", "c"]
+    assert loads == ["a", "b", "c"]
+    assert registry.status()["metrics"]["b"]["evictions"] == 1
+
+
+def test_pinned_model_never_evicted(ckpt_dir):
+    """Test that the pinned default survives budget pressure."""
+    registry = ModelRegistry(ckpt_dir, budget_bytes=400, loader=lambda p: (SizedModel(100), None))
+    registry.put("default", SizedModel(100), None, pinned=True)
+
+    registry.get("a")
+    registry.get("b")
+
+    warm = [m["id"] for m in registry.status()["warm"]]
+    assert "default" in warm
+    assert warm[-1] == "b"
+
+
+def test_unknown_and_malformed_ids(ckpt_dir):
+    """Test that missing or path-like ids are rejected."""
+    registry = ModelRegistry(ckpt_dir, budget_bytes=0, loader=lambda p: (None, None))
+
+    with pytest.raises(ModelNotFound):
+        registry.get("missing")
+    with pytest.raises(ModelNotFound):
+        registry.get("../a")
+    for i in range(100):
+        with pytest.raises(ModelNotFound):
+            registry.get(f"random-{i}")
+    assert registry._load_locks == {}
+
+
+def test_failed_load_leaves_no_lock(ckpt_dir):
+    """Test that a loader error doesn't keep per-id state and can be retried."""
+    attempts = []
+
+    def loader(path):
+        attempts.append(path.stem)
+        if len(attempts) == 1:
+            raise RuntimeError("corrupt checkpoint")
+        return SizedModel(10), None
+
+    registry = ModelRegistry(ckpt_dir, budget_bytes=1000, loader=loader)
+    with pytest.raises(RuntimeError):
+        registry.get("a")
+    assert registry._load_locks == {}
+
+    registry.get("a")
+    assert attempts == ["a", "a"]
+
+
+def test_request_with_model_id(dummy_model, dummy_cfg, ckpt_dir):
+    """Test that requests can target a registry model and health reports it."""
+    registry = ModelRegistry(
+        ckpt_dir, budget_bytes=1 << 20, loader=lambda p: (dummy_model, dummy_cfg)
+    )
+    client = TestClient(create_app(model=dummy_model, cfg=dummy_cfg, registry=registry))
+
+    payload = {
+        "messages": [{"role": "user", "content": "hello"}],
+        "trace_layer": 0,
+        "head": 0,
+        "model": "b",
+    }
+    assert client.post("/inspect/full_attn", json=payload).status_code == 200
+
+    payload["model"] = "nope"
+    response = client.post("/inspect/full_attn", json=payload)
+    assert response.status_code == 404
+    assert response.json()["code"] == "model_not_found"
+
+    models = client.get("/health").json()["models"]
+    assert {m["id"] for m in models["warm"]} >= {"b"}
+    assert models["metrics"]["b"]["requests"] == 1
+    assert set(models["available"]) >= {"a", "b", "c"}
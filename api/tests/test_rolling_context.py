@@ -0,0 +1,92 @@
+"""Tests for KV-cached rolling-context decoding."""
+
+import pytest
+import torch
+
+from app.kv_cache import CachedDecoder, KVCache
+from tests.conftest import collect_events, small_gpt
+
+
+@pytest.fixture
+def small_model():
+    """Small random-init GPT with a short context window."""
+    return small_gpt(T=24)
+
+
+def run(model, cfg, *, context_mode, content="hi", max_new_tokens=4):
+    """Collect trace events from a greedy generation."""
+    events = collect_events(
+        model,
+        cfg,
+        messages=[{"role": "user", "content": content}],
+        max_new_tokens=max_new_tokens,
+        trace_layer=1,
+        context_mode=context_mode,
+    )
+    return [e["data"] for e in events if e["event"] == "trace"]
+
+
+def test_rolling_matches_crop_within_window(small_model):
+    """Test that cached decoding matches full recompute while t <= T."""
+    model, cfg = small_model
+
+    crop = run(model, cfg, context_mode="crop")
+    rolling = run(model, cfg, context_mode="rolling")
+
+    assert len(crop) == len(rolling)
+    for a, b in zip(crop, rolling):
+        assert [c["token_id"] for c in a["topk"]] == [c["token_id"] for c in b["topk"]]
+        assert torch.allclose(torch.tensor(a["attn"]), torch.tensor(b["attn"]), atol=1e-5)
+        assert b["evicted"] == 0
+
+
+def test_rolling_continues_past_window(small_model):
+    """Test that attention stays bounded by T once the window rolls."""
+    model, cfg = small_model
+
+    traces = run(model, cfg, context_mode="rolling", max_new_tokens=20)
+
+    widths = [len(t["attn"][0]) for t in traces]
+    assert max(widths) == cfg.T
+    assert traces[-1]["evicted"] > 0
+
+
+def test_prefill_keeps_sinks_for_long_prompt(small_model):
+    """Test that an over-long prompt keeps the sink tokens plus the tail."""
+    model, cfg = small_model
+    decoder = CachedDecoder(model, cfg, sinks=3)
+    ids = torch.randint(0, 256, (1, cfg.T + 10))
+
+    logits, traces = decoder.prefill(ids, layers=[0])
+
+    assert logits.shape == (1, cfg.V)
+    assert decoder.cache.length == cfg.T
+    assert decoder.cache.evicted == 10
+    assert traces["attn_rows"][0].shape == (1, cfg.H, cfg.T)
+
+
+def test_kv_cache_evicts_after_sinks():
+    """Test that eviction drops the oldest non-sink positions."""
+    cache = KVCache(n_layers=1, capacity=4, sinks=1)
+    k = torch.arange(4.0).view(1, 1, 4, 1)
+    cache.append(0, k, k)
+
+    cache.make_room(2)
+    cache.append(0, torch.tensor([[[[4.0], [5.0]]]]), torch.tensor([[[[4.0], [5.0]]]]))
+
+    assert cache.k[0].flatten().tolist() == [0.0, 3.0, 4.0, 5.0]
+    assert cache.evicted == 2
+
+
+def test_fork_repeats_batch(small_model):
+    """Test that forking a prefilled decoder yields independent batch rows."""
+    model, cfg = small_model
+    decoder = CachedDecoder(model, cfg)
+    decoder.prefill(torch.randint(0, 256, (1, 5)), layers=[0])
+
+    forked = decoder.fork(3)
+    logits, _ = forked.step(torch.tensor([1, 2, 3]), layers=[0])
+
+    assert logits.shape == (3, cfg.V)
+    assert decoder.cache.k[0].shape[0] == 1
+    assert forked.cache.length == 6
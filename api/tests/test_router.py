@@ -0,0 +1,160 @@
+"""Tests for the session-affinity router."""
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.router import AffinityRouter, HashRing, NoNodeAvailable, create_router
+from tests.test_sse_protocol import parse_sse_events
+
+NODES = ["http://node-a", "http://node-b", "http://node-c"]
+KEYS = [f"conversation-{i}" for i in range(2000)]
+PARAMS = {"trace_layer": 0, "max_new_tokens": 3, "seed": 1}
+
+
+class NodeTransport(httpx.AsyncBaseTransport):
+    """Routes upstream requests to in-process apps by host; unknown hosts refuse."""
+
+    def __init__(self, apps: dict):
+        self.transports = {host: httpx.ASGITransport(app=app) for host, app in apps.items()}
+
+    async def handle_async_request(self, request):
+        transport = self.transports.get(request.url.host)
+        if transport is None:
+            raise httpx.ConnectError("connection refused", request=request)
+        return await transport.handle_async_request(request)
+
+
+def owners(ring: HashRing) -> dict:
+    return {key: ring.candidates(key)[0] for key in KEYS}
+
+
+def test_ring_moves_only_the_joining_or_leaving_nodes_keys():
+    """Test that membership changes move about 1/N of the keys, and only to or from that node."""
+    ring = HashRing(vnodes=64)
+    for node in NODES:
+        ring.add(node)
+    before = owners(ring)
+    assert set(before.values()) == set(NODES)
+
+    ring.add("http://node-d")
+    joined = owners(ring)
+    moved = [k for k in KEYS if joined[k] != before[k]]
+    assert all(joined[k] == "http://node-d" for k in moved)
+    assert 0.1 < len(moved) / len(KEYS) < 0.4
+
+    ring.remove("http://node-b")
+    left = owners(ring)
+    moved = [k for k in KEYS if left[k] != joined[k]]
+    assert all(joined[k] == "http://node-b" for k in moved)
+    assert sorted(set(ring.candidates("x"))) == sorted(set(NODES + ["http://node-d"]) - {"http://node-b"})
+
+
+def test_order_skips_unavailable_and_overloaded_nodes():
+    """Test spilling to the next node clockwise, then to the least loaded one."""
+    router = AffinityRouter(NODES, max_load=2.0)
+    key = "conversation-1"
+    first, second, third = router.ring.candidates(key)
+    assert router.order(key)[0].url == first
+
+    router.update(first, {"ok": True, "model_ready": True, "scheduler": {"slots": 1, "waiting": 5}})
+    assert router.order(key)[0].url == second
+    router.update(second, None, error="ConnectError")
+    assert router.order(key)[0].url == third
+
+    router.nodes[third].inflight = 9
+    assert router.order(key)[0].url == first  # every node loaded: least loaded first
+    assert router.status()["spills"] == 2
+
+    for url in (first, third):
+        router.update(url, {"ok": True, "model_ready": False})
+    with pytest.raises(NoNodeAvailable):
+        router.order(key)
+
+
+def test_conversations_stick_to_one_node(dummy_model, dummy_cfg, monkeypatch):
+    """Test that sessions and stateless follow-up turns reach the node that served them."""
+    monkeypatch.setattr("app.main.rate_limiter.allow", lambda client: True)
+    apps = {
+        "node-a": create_app(model=dummy_model, cfg=dummy_cfg),
+        "node-b": create_app(model=dummy_model, cfg=dummy_cfg),
+    }
+    app = create_router(
+        ["http://node-a", "http://node-b", "http://node-down"],
+        poll_seconds=0,
+        transport=NodeTransport(apps),
+    )
+
+    with TestClient(app) as client:
+        # Sessions: every turn goes to the node that created the session
+        created = client.post("/sessions", json={"messages": []})
+        session_id = created.json()["session_id"]
+        home = created.headers["x-routed-node"]
+        for content in ("hi", "again"):
+            turn = client.post(
+                f"/sessions/{session_id}/chat/stream",
+                json={"message": {"role": "user", "content": content}, **PARAMS},
+            )
+            assert turn.headers["x-routed-node"] == home
+            assert parse_sse_events(turn.text)[-1]["event"] == "done"
+
+        # A router that has not seen the session finds it on its node
+        app.state.router.unpin(session_id)
+        assert client.get(f"/sessions/{session_id}").headers["x-routed-node"] == home
+
+        # Stateless: later turns resend the opening, so they hash alike
+        opening = [{"role": "user", "content": "tell me a story"}]
+        first = client.post("/chat/stream", json={"messages": opening, **PARAMS})
+        later = opening + [
+            {"role": "assistant", "content": "once"},
+            {"role": "user", "content": "go on"},
+        ]
+        second = client.post("/chat/stream", json={"messages": later, **PARAMS})
+        assert first.headers["x-routed-node"] == second.headers["x-routed-node"]
+        assert first.headers["x-routed-node"] != "http://node-down"
+
+        status = client.get("/health").json()["router"]
+        nodes = {node["url"]: node for node in status["nodes"]}
+        assert all(node["inflight"] == 0 for node in nodes.values())
+        assert status["pinned_sessions"] == 1
+
+
+def test_admin_nodes(dummy_model, dummy_cfg):
+    """Test adding and removing nodes through the admin endpoints."""
+    apps = {"node-a": create_app(model=dummy_model, cfg=dummy_cfg)}
+    app = create_router([], poll_seconds=0, admin_token="secret", transport=NodeTransport(apps))
+    client = TestClient(app)
+    headers = {"X-Admin-Token": "secret"}
+
+    assert client.post("/chat/stream", json={"messages": []}).json()["code"] == "no_node_available"
+    assert client.post("/admin/nodes", json={"url": "http://node-a"}).status_code == 403
+
+    status = client.post("/admin/nodes", json={"url": "http://node-a"}, headers=headers).json()
+    assert status["nodes"][0]["available"]
+    assert client.get("/health").json()["ok"]
+
+    assert client.delete("/admin/nodes", params={"url": "http://node-a"}, headers=headers).status_code == 200
+    assert not client.get("/health").json()["ok"]
+
+
+def test_node_admin_requests_reach_every_node(dummy_model, dummy_cfg):
+    """Test that /admin/* is sent to all nodes rather than one hashed node."""
+    apps = {host: create_app(model=dummy_model, cfg=dummy_cfg) for host in ("node-a", "node-b")}
+    for node_app in apps.values():
+        node_app.state.admin_token = "secret"
+    app = create_router(
+        ["http://node-a", "http://node-b", "http://node-down"],
+        poll_seconds=0,
+        transport=NodeTransport(apps),
+    )
+    client = TestClient(app)
+
+    response = client.get("/admin/memory", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 207  # node-down could not be reached
+    results = {r["url"]: r for r in response.json()["nodes"]}
+    assert results["http://node-a"]["status_code"] == results["http://node-b"]["status_code"] == 200
+    assert "error" in results["http://node-down"]
+
+    app.state.router.remove_node("http://node-down")
+    assert client.get("/admin/memory").status_code == 403
@@ -0,0 +1,173 @@
+"""Tests for step-level weighted fair scheduling."""
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.scheduler import FairScheduler, parse_weights
+
+
+def steps(name: str, n: int, log: list, seconds: float = 0.002):
+    """Blocking iterator of n steps that logs which stream ran each one."""
+    for i in range(n):
+        time.sleep(seconds)
+        log.append(name)
+        yield f"{name}{i}"
+
+
+async def drain(scheduler: FairScheduler, items, client: str) -> list:
+    return [item async for item in scheduler.run(items, client)]
+
+
+def test_new_arrival_interleaves_with_long_streams():
+    """Test that a short request runs before a heavy client's backlog finishes."""
+    log = []
+
+    async def main():
+        scheduler = FairScheduler(slots=1)
+        heavy = [
+            asyncio.create_task(drain(scheduler, steps(f"a{i}-", 30, log), "heavy"))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0.02)
+        short = await drain(scheduler, steps("b", 3, log), "light")
+        await asyncio.gather(*heavy)
+        return short
+
+    short = asyncio.run(main())
+
+    assert short == ["b0", "b1", "b2"]
+    # The short stream finished long before the 90 heavy steps did
+    assert max(i for i, name in enumerate(log) if name == "b") < 40
+
+
+def test_weights_bound_cpu_share():
+    """Test that busy clients get steps in proportion to their weights."""
+    log = []
+
+    async def main():
+        scheduler = FairScheduler(slots=1, weights={"gold": 3.0})
+        await asyncio.gather(
+            drain(scheduler, steps("g", 200, log), "gold"),
+            drain(scheduler, steps("s", 200, log), "silver"),
+            # Extra streams don't raise a client's share
+            drain(scheduler, steps("s", 200, log), "silver"),
+        )
+
+    asyncio.run(main())
+
+    # While both are busy, gold runs about three steps per silver step
+    window = log[:120]
+    ratio = window.count("g") / window.count("s")
+    assert 2.0 < ratio < 4.5
+
+
+def test_cancelled_waiter_releases_queue():
+    """Test that a cancelled wait does not leak its place or a slot."""
+
+    async def main():
+        scheduler = FairScheduler(slots=1)
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.status()["waiting"] == 0
+        scheduler.release("a", 0.0)
+        assert scheduler.busy == 0
+
+    asyncio.run(main())
+
+
+def test_cancel_during_step_holds_slot_until_worker_returns():
+    """Test that a consumer cancelled mid-step keeps the slot and closes the iterator afterwards."""
+    log = []
+
+    def slow():
+        try:
+            time.sleep(0.2)
+            yield "first"
+            yield "second"
+        finally:
+            log.append("closed")
+
+    async def main():
+        scheduler = FairScheduler(slots=1)
+        consumer = asyncio.create_task(drain(scheduler, slow(), "a"))
+        await asyncio.sleep(0.05)
+        consumer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await consumer
+        # The worker is still sleeping inside next()
+        assert scheduler.busy == 1 and log == []
+
+        other = await drain(scheduler, steps("b", 1, log), "b")
+        return scheduler, other
+
+    scheduler, other = asyncio.run(main())
+
+    assert other == ["b0"]
+    assert log == ["closed", "b"]
+    assert scheduler.busy == 0
+
+
+def test_disabled_passes_through():
+    """Test that slots=0 runs the iterator directly."""
+    scheduler = FairScheduler(slots=0)
+
+    assert asyncio.run(drain(scheduler, iter([1, 2, 3]), "a")) == [1, 2, 3]
+
+
+def test_only_forwards_count_as_steps():
+    """Test that cheap events between forwards neither count as steps nor dilute step_latency."""
+
+    def events(n: int):
+        for i in range(n):
+            time.sleep(0.02)  # the forward
+            yield f"token{i}"
+            yield f"trace{i}"
+            yield f"qos{i}"
+        yield "done"
+
+    async def main():
+        scheduler = FairScheduler(slots=1)
+        counted = []
+        async for item in scheduler.run(events(15), "a", is_forward=lambda item: item.startswith("token")):
+            counted.append(scheduler.steps["a"])
+        return scheduler, counted
+
+    scheduler, counted = asyncio.run(main())
+
+    assert counted[-1] == 15 and counted[:3] == [1, 1, 1]
+    # EWMA of 15 forwards of 20ms from 0 is ~19ms; per event it would be ~7ms
+    assert scheduler.step_latency > 0.015
+
+
+def test_parse_weights():
+    """Test the CLIENT_WEIGHTS format."""
+    assert parse_weights("") == {}
+    assert parse_weights("key-1=2, 10.0.0.1=0.5") == {"key-1": 2.0, "10.0.0.1": 0.5}
+    with pytest.raises(ValueError):
+        parse_weights("nokey")
+    with pytest.raises(ValueError):
+        parse_weights("a=0")
+
+
+def test_endpoint_is_scheduled(dummy_model, dummy_cfg, monkeypatch):
+    """Test that /chat/stream runs through the scheduler and cleans up."""
+    monkeypatch.setattr("app.main.STEP_SLOTS", 1)
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    client = TestClient(app)
+    body = {"messages": [{"role": "user", "content": "hi"}], "trace_layer": 0, "max_new_tokens": 3}
+
+    response = client.post("/chat/stream", json=body, headers={"X-API-Key": "k"})
+
+    assert response.status_code == 200
+    assert "event: done" in response.text
+    status = client.get("/health").json()["scheduler"]
+    assert status["busy"] == 0 and status["clients"] == {}
+    assert app.state.scheduler.dispatched > 0
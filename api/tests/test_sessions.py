@@ -0,0 +1,171 @@
+"""Tests for server-side conversation sessions."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from niels_gpt.chat_format import format_chat
+
+from app.main import create_app
+from app.sessions import ChatEncoder, SessionBusy, SessionNotFound, SessionStore, SessionTooLarge
+from tests.test_sse_protocol import parse_sse_events
+
+SYSTEM = {"role": "system", "content": "be brief"}
+PARAMS = {"trace_layer": 0, "max_new_tokens": 4, "seed": 3}
+
+
+def store(**kwargs) -> SessionStore:
+    options = {"max_sessions": 8, "ttl_seconds": 60, "max_tokens": 4096, "encoder": ChatEncoder(format_chat)}
+    return SessionStore(**{**options, **kwargs})
+
+
+def done_event(reply: str) -> dict:
+    return {"event": "done", "data": {"reply": reply}}
+
+
+def test_incremental_prompt_matches_full_format():
+    """Test that delta encoding reproduces format_chat of the whole history."""
+    sessions = store()
+    assert sessions.encoder.incremental
+
+    session = sessions.create([SYSTEM])
+    user = {"role": "user", "content": "héllo"}
+    prompt_ids, messages = sessions.begin_turn(session, user)
+    list(sessions.commit(iter([done_event("hi there")]), session, user))
+
+    assert prompt_ids == list(format_chat([SYSTEM, user]).encode("utf-8"))
+    assert messages == [SYSTEM, user]
+    follow_up = {"role": "user", "content": "more"}
+    prompt_ids, _ = sessions.begin_turn(session, follow_up)
+    expected = [SYSTEM, user, {"role": "assistant", "content": "hi there"}, follow_up]
+    assert prompt_ids == list(format_chat(expected).encode("utf-8"))
+
+
+def test_non_concatenating_format_falls_back():
+    """Test that a format that isn't a per-message concatenation formats every turn."""
+    def numbered(messages):
+        return f"[{len(messages)}]" + format_chat(messages)
+
+    sessions = store(encoder=ChatEncoder(numbered))
+    assert not sessions.encoder.incremental
+
+    session = sessions.create([SYSTEM])
+    user = {"role": "user", "content": "hi"}
+    prompt_ids, _ = sessions.begin_turn(session, user)
+
+    assert prompt_ids == list(numbered([SYSTEM, user]).encode("utf-8"))
+
+
+def test_cancelled_turn_leaves_session_unchanged():
+    """Test that only a turn reaching done is committed, and the session is released."""
+    sessions = store()
+    session = sessions.create([SYSTEM])
+    user = {"role": "user", "content": "hi"}
+
+    sessions.begin_turn(session, user)
+    with pytest.raises(SessionBusy):
+        sessions.begin_turn(session, user)
+    stream = sessions.commit(iter([{"event": "token", "data": {}}, done_event("x")]), session, user)
+    next(stream)
+    stream.close()
+
+    assert session.messages == [SYSTEM]
+    assert not session.busy
+
+
+def test_eviction_and_limits(monkeypatch):
+    """Test LRU and idle expiry, and the prompt size limit."""
+    now = [1000.0]
+    monkeypatch.setattr("app.sessions.time.time", lambda: now[0])
+    sessions = store(max_sessions=2, ttl_seconds=10, max_tokens=64)
+
+    a, b = sessions.create([]), sessions.create([])
+    sessions.get(a.id)  # a is now most recent
+    sessions.create([])
+    with pytest.raises(SessionNotFound):
+        sessions.get(b.id)
+
+    now[0] += 11
+    with pytest.raises(SessionNotFound):
+        sessions.get(a.id)
+    assert sessions.status()["sessions"] == 0
+
+    session = sessions.create([])
+    with pytest.raises(SessionTooLarge):
+        sessions.begin_turn(session, {"role": "user", "content": "x" * 100})
+    assert not session.busy
+
+
+def test_session_turns_match_stateless_requests(dummy_model, dummy_cfg, monkeypatch):
+    """Test that session turns generate exactly what resending the history would."""
+    monkeypatch.setattr("app.main.rate_limiter.allow", lambda client: True)
+    client = TestClient(create_app(model=dummy_model, cfg=dummy_cfg))
+    session_id = client.post("/sessions", json={"messages": [SYSTEM]}).json()["session_id"]
+    history = [SYSTEM]
+
+    for content in ("hi", "and then?"):
+        user = {"role": "user", "content": content}
+        turn = parse_sse_events(client.post(
+            f"/sessions/{session_id}/chat/stream", json={"message": user, **PARAMS}
+        ).text)
+        stateless = parse_sse_events(client.post(
+            "/chat/stream", json={"messages": history + [user], **PARAMS}
+        ).text)
+
+        assert turn == stateless
+        history += [user, {"role": "assistant", "content": turn[-1]["data"]["reply"]}]
+
+    info = client.get(f"/sessions/{session_id}").json()
+    assert info["messages"] == history
+    assert info["tokens"] == len(format_chat(history).encode("utf-8")) - len(format_chat([]))
+
+
+def test_session_endpoint_errors(dummy_model, dummy_cfg):
+    """Test unknown, deleted and oversized sessions."""
+    client = TestClient(create_app(model=dummy_model, cfg=dummy_cfg))
+    turn = {"message": {"role": "user", "content": "hi"}, **PARAMS}
+
+    response = client.post("/sessions/nope/chat/stream", json=turn)
+    assert response.status_code == 404
+    assert response.json()["code"] == "session_not_found"
+
+    session_id = client.post("/sessions", json={}).json()["session_id"]
+    assert client.delete(f"/sessions/{session_id}").status_code == 200
+    assert client.get(f"/sessions/{session_id}").status_code == 404
+
+    huge = {"messages": [{"role": "user", "content": "x" * 20000}]}
+    assert client.post("/sessions", json=huge).json()["code"] == "prompt_too_large"
+
+
+def test_session_creation_is_rate_limited(dummy_model, dummy_cfg, monkeypatch):
+    """Test that creating sessions draws on the client's rate limit."""
+    monkeypatch.setattr("app.main.rate_limiter.allow", lambda client: False)
+    client = TestClient(create_app(model=dummy_model, cfg=dummy_cfg))
+
+    response = client.post("/sessions", json={"messages": [SYSTEM]})
+    assert response.status_code == 429
+    assert response.json()["code"] == "rate_limited"
+
+
+def test_turns_are_keyed_by_session_and_turn(dummy_model, dummy_cfg, tmp_path, monkeypatch):
+    """Test that turns coalesce and archive on (session, turn), not the full history."""
+    monkeypatch.setattr("app.main.rate_limiter.allow", lambda client: True)
+    monkeypatch.setattr("app.main.TRACE_ARCHIVE_DIR", tmp_path)
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    app.state.admin_token = "secret"
+    keys = []
+    make_key = app.state.coalescer.make_key
+    app.state.coalescer.make_key = lambda model, **params: keys.append(params) or make_key(model, **params)
+    client = TestClient(app, headers={"X-Admin-Token": "secret"})
+
+    session_id = client.post("/sessions", json={"messages": [SYSTEM]}).json()["session_id"]
+    for content in ("hi", "and then?"):
+        user = {"role": "user", "content": content}
+        client.post(f"/sessions/{session_id}/chat/stream", json={"message": user, **PARAMS})
+
+    assert [(k["session_id"], k["turn"]) for k in keys] == [(session_id, 1), (session_id, 2)]
+    assert all("messages" not in k for k in keys)
+
+    client.post("/admin/traces/flush")
+    records = sorted(client.get("/traces/archive").json()["records"], key=lambda r: r["turn"])
+    assert [r["message"]["content"] for r in records] == ["hi", "and then?"]
+    assert all(r["session_id"] == session_id and "messages" not in r for r in records)
@@ -0,0 +1,82 @@
+"""Tests for non-blocking startup and staged readiness."""
+
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+
+
+def wait_for_stage(client, stage, timeout=5.0):
+    """Poll /health until it reports the given stage."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        data = client.get("/health").json()
+        if data["stage"] == stage:
+            return data
+        time.sleep(0.01)
+    raise AssertionError(f"stage never reached {stage!r}: {data}")
+
+
+def test_importing_app_does_not_import_torch():
+    """Test that importing app.main defers torch and huggingface_hub."""
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('torch', 'huggingface_hub') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_health_answers_while_loading(monkeypatch, dummy_model, dummy_cfg):
+    """Test that /health and 503s report stages until the model is ready."""
+    release = threading.Event()
+
+    def slow_load(on_stage=None):
+        on_stage("downloading")
+        release.wait(5)
+        on_stage("loading")
+        return dummy_model, dummy_cfg
+
+    monkeypatch.setattr(main, "load_default_model", slow_load)
+    app = main.create_app(load_on_startup=True)
+
+    with TestClient(app) as client:
+        data = wait_for_stage(client, "downloading")
+        assert data["model_ready"] is False
+
+        response = client.post(
+            "/chat/stream",
+            json={"messages": [{"role": "user", "content": "hi"}], "trace_layer": 0},
+        )
+        assert response.status_code == 503
+        assert response.json()["code"] == "model_loading"
+        assert "downloading" in response.json()["error"]
+
+        release.set()
+        data = wait_for_stage(client, "ready")
+        assert data["model_ready"] is True
+
+
+def test_failed_load_is_reported(monkeypatch):
+    """Test that a failing background load surfaces as stage 'failed'."""
+    def broken(on_stage=None):
+        raise RuntimeError("hub unreachable")
+
+    monkeypatch.setattr(main, "load_default_model", broken)
+    app = main.create_app(load_on_startup=True)
+
+    with TestClient(app) as client:
+        data = wait_for_stage(client, "failed")
+        assert "hub unreachable" in data["stage_error"]
+        assert data["model_ready"] is False
@@ -0,0 +1,115 @@
+"""Tests for per-step and whole-stream server timings."""
+
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.scheduler import FairScheduler
+from app.timing import StepTimer, queue_wait
+from tests.conftest import collect_events, small_gpt
+from tests.test_sse_protocol import parse_sse_events
+
+STEP_KEYS = {"forward_ms", "sample_ms", "encode_ms", "queue_ms", "elapsed_ms"}
+
+
+def generate(model, cfg, **kwargs):
+    return collect_events(model, cfg, temperature=1.0, **kwargs)
+
+
+def test_timings_off_by_default(dummy_model, dummy_cfg):
+    """Test that events are unchanged unless timings are requested."""
+    events = generate(dummy_model, dummy_cfg)
+
+    assert all("timing" not in e["data"] for e in events)
+
+
+def test_step_and_done_timings(dummy_model, dummy_cfg):
+    """Test the trace timing fields and the done summary."""
+    events = generate(dummy_model, dummy_cfg, timings=True)
+    traces = [e["data"] for e in events if e["event"] == "trace"]
+    done = events[-1]["data"]["timing"]
+
+    for trace in traces:
+        assert set(trace["timing"]) == STEP_KEYS
+        assert all(v >= 0 for v in trace["timing"].values())
+    elapsed = [t["timing"]["elapsed_ms"] for t in traces]
+    assert elapsed == sorted(elapsed)
+
+    assert done["tokens"] == len(traces)
+    assert done["stop_reason"] in ("stop_sequence", "max_new_tokens")
+    assert done["stop_reason"] == "stop_sequence" or len(traces) == 4
+    assert 0 <= done["ttft_ms"] <= done["total_ms"]
+    assert done["tokens_per_s"] > 0
+    assert done["forward_ms"] >= max(t["timing"]["forward_ms"] for t in traces)
+
+
+def test_parallel_samples_share_forward_time():
+    """Test that n > 1 reports the batched forward on every sample's trace."""
+    model, cfg = small_gpt()
+    events = generate(model, cfg, timings=True, n=3, max_new_tokens=2)
+    step0 = [e["data"]["timing"] for e in events if e["event"] == "trace" and e["data"]["step"] == 0]
+    done = events[-1]["data"]["timing"]
+
+    assert len({t["forward_ms"] for t in step0}) == 1
+    assert len(done["stop_reasons"]) == 3
+    assert done["stop_reason"] == done["stop_reasons"][0]
+
+
+def test_queue_wait_reaches_the_generator():
+    """Test that the scheduler's slot wait is reported by the step that waited."""
+    seen = []
+
+    def stream(name: str, seconds: float):
+        timer = StepTimer(True)
+        for _ in range(3):
+            timer.mark()
+            time.sleep(seconds)
+            timer.lap("forward")
+            seen.append((name, timer.pop()["queue_ms"]))
+            yield name
+
+    async def main():
+        scheduler = FairScheduler(slots=1)
+        slow = asyncio.create_task(drain(scheduler, stream("slow", 0.05)))
+        await asyncio.sleep(0.01)
+        await drain(scheduler, stream("fast", 0.0), "other")
+        await slow
+
+    async def drain(scheduler, items, client="slow"):
+        return [item async for item in scheduler.run(items, client)]
+
+    asyncio.run(main())
+
+    # The first fast step queued behind a running 50ms slow step
+    assert next(ms for name, ms in seen if name == "fast") >= 20
+    assert queue_wait.get() == 0.0  # never leaks into the caller's context
+
+
+def test_disabled_timer_reads_no_clock(monkeypatch):
+    """Test that a disabled timer does no work."""
+    monkeypatch.setattr("app.timing.time.perf_counter_ns", lambda: 1 / 0)
+    timer = StepTimer(False)
+    timer.mark()
+    timer.lap("forward")
+    timer.token()
+
+    assert timer.pop() is None
+    assert timer.summary("max_new_tokens") is None
+
+
+def test_endpoint_timings(dummy_model, dummy_cfg):
+    """Test timings through /chat/stream."""
+    client = TestClient(create_app(model=dummy_model, cfg=dummy_cfg))
+    body = {"messages": [{"role": "user", "content": "hi"}], "trace_layer": 0, "max_new_tokens": 3}
+
+    plain = parse_sse_events(client.post("/chat/stream", json=body).text)
+    timed = parse_sse_events(client.post("/chat/stream", json={**body, "timings": True}).text)
+
+    assert "timing" not in plain[-1]["data"]
+    assert set(timed[1]["data"]["timing"]) == STEP_KEYS
+    assert timed[-1]["data"]["timing"]["tokens"] == sum(e["event"] == "token" for e in timed)
+    # Serialization happens after the generator yields, so the SSE layer adds it
+    assert timed[-1]["data"]["timing"]["serialize_ms"] >= 0
+
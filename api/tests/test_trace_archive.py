@@ -0,0 +1,187 @@
+"""Tests for trace recording and the archive reader."""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+np = pytest.importorskip("numpy")
+
+from app.main import create_app
+from app.trace_archive import TraceArchive, TraceRecorder
+from tests.conftest import collect_events
+
+
+def generate(model, cfg, *, seed=0, n=1):
+    return collect_events(model, cfg, max_new_tokens=5, temperature=1.0, seed=seed, trace_layer=1, n=n)
+
+
+def test_recorded_steps_match_events(small_model, tmp_path):
+    """Test round-trip of tokens, entropy, top-k and attention through shards."""
+    model, cfg = small_model
+    recorder = TraceRecorder(tmp_path, shard_generations=2)
+
+    streams = [list(recorder.record(generate(model, cfg, seed=s), {"seed": s})) for s in range(3)]
+    assert recorder.status()["pending"] == 1
+    recorder.flush()
+    assert recorder.status()["recorded"] == 3
+
+    archive = TraceArchive(tmp_path)
+    records = archive.index()
+    assert [r["seed"] for r in records] == [0, 1, 2]
+    assert len({r["shard"] for r in records}) == 2
+
+    for record, events in zip(records, streams):
+        tokens = [e["data"] for e in events if e["event"] == "token"]
+        traces = [e["data"] for e in events if e["event"] == "trace"]
+        data = archive.generation(record["id"])
+        assert data["token_ids"].tolist() == [t["token_id"] for t in tokens]
+        assert np.allclose(data["entropy"], [t["entropy"] for t in traces], atol=1e-6)
+        assert data["topk_ids"][0].tolist()[:len(traces[0]["topk"])] == [c["token_id"] for c in traces[0]["topk"]]
+        assert record["reply"] == events[-1]["data"]["reply"]
+        for step, trace in enumerate(traces):
+            attn = archive.attn(record["id"], step)
+            assert attn.shape == (cfg.H, len(trace["attn"][0]))
+            assert np.allclose(attn, trace["attn"], atol=1e-3)  # float16 storage
+
+
+def test_reads_are_memory_mapped(small_model, tmp_path):
+    """Test that columns and attention slices are views of the shard files."""
+    model, cfg = small_model
+    recorder = TraceRecorder(tmp_path, shard_generations=1)
+    list(recorder.record(generate(model, cfg), {}))
+    recorder.flush()
+
+    archive = TraceArchive(tmp_path)
+    generation_id = archive.index()[0]["id"]
+
+    assert isinstance(archive.generation(generation_id)["entropy"], np.memmap)
+    assert isinstance(archive.attn(generation_id, 2), np.memmap)
+
+
+def test_samples_recorded_separately(small_model, tmp_path):
+    """Test that n > 1 archives one generation per sample."""
+    model, cfg = small_model
+    recorder = TraceRecorder(tmp_path)
+    events = list(recorder.record(generate(model, cfg, n=3), {}))
+    recorder.flush()
+
+    records = TraceArchive(tmp_path).index()
+    assert sorted(r["sample"] for r in records) == [0, 1, 2]
+    assert [r["reply"] for r in sorted(records, key=lambda r: r["sample"])] == events[-1]["data"]["replies"]
+
+
+def test_cancelled_stream_not_recorded(small_model, tmp_path):
+    """Test that a stream closed before done leaves no record."""
+    model, cfg = small_model
+    recorder = TraceRecorder(tmp_path)
+    stream = recorder.record(generate(model, cfg), {})
+    next(stream)
+    stream.close()
+    recorder.flush()
+
+    assert len(TraceArchive(tmp_path)) == 0
+
+
+def test_reader_picks_up_new_shards(small_model, tmp_path):
+    """Test that refresh() sees shards written after the reader opened."""
+    model, cfg = small_model
+    recorder = TraceRecorder(tmp_path, shard_generations=1)
+    archive = TraceArchive(tmp_path)
+    assert len(archive) == 0
+
+    list(recorder.record(generate(model, cfg), {}))
+    recorder.flush()
+    archive.refresh()
+
+    assert len(archive) == 1
+
+
+def test_shard_writes_do_not_block_streams(small_model, tmp_path, monkeypatch):
+    """Test that a full buffer is written in the background while the stream finishes."""
+    model, cfg = small_model
+    recorder = TraceRecorder(tmp_path, shard_generations=1)
+    release = threading.Event()
+    write = recorder._write_shard
+
+    def slow_write(generations):
+        assert release.wait(5)
+        write(generations)
+
+    monkeypatch.setattr(recorder, "_write_shard", slow_write)
+    events = list(recorder.record(generate(model, cfg), {}))
+
+    assert events[-1]["event"] == "done"
+    assert recorder.status()["writing"] == 1
+    assert recorder.pending_bytes() > 0
+    release.set()
+    recorder.flush()
+    assert recorder.status()["recorded"] == 1
+    assert recorder.status()["writing"] == 0
+
+
+def test_concurrent_refresh_reads_each_record_once(small_model, tmp_path):
+    """Test that overlapping refresh() calls don't duplicate index records."""
+    model, cfg = small_model
+    recorder = TraceRecorder(tmp_path, shard_generations=1)
+    archive = TraceArchive(tmp_path)
+    for seed in range(4):
+        list(recorder.record(generate(model, cfg, seed=seed), {"seed": seed}))
+    recorder.flush()
+
+    threads = [threading.Thread(target=archive.refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(r["seed"] for r in archive.index()) == [0, 1, 2, 3]
+
+
+def test_endpoints(dummy_model, dummy_cfg, tmp_path, monkeypatch):
+    """Test recording through /chat/stream and reading back over HTTP."""
+    monkeypatch.setattr("app.main.TRACE_ARCHIVE_DIR", tmp_path)
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    app.state.admin_token = "secret"
+    client = TestClient(app, headers={"X-Admin-Token": "secret"})
+
+    body = {"messages": [{"role": "user", "content": "hi"}], "trace_layer": 0, "max_new_tokens": 3}
+    assert client.post("/chat/stream", json=body).status_code == 200
+    assert client.get("/traces/archive").json()["total"] == 0  # still buffered
+
+    flushed = client.post("/admin/traces/flush")
+    assert flushed.json()["recorded"] == 1
+
+    listing = client.get("/traces/archive").json()
+    assert listing["total"] == 1
+    record = listing["records"][0]
+    assert record["messages"] == body["messages"]
+
+    detail = client.get(f"/traces/archive/{record['id']}", params={"start": 1}).json()
+    assert [s["step"] for s in detail["steps"]] == [1, 2]
+    assert len(detail["steps"][0]["attn"]) == dummy_cfg.H
+    assert client.get("/traces/archive/nope").status_code == 404
+
+
+def test_endpoints_require_admin(dummy_model, dummy_cfg, tmp_path, monkeypatch):
+    """Test that recorded transcripts are not readable without the admin token."""
+    monkeypatch.setattr("app.main.TRACE_ARCHIVE_DIR", tmp_path)
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    app.state.admin_token = "secret"
+    client = TestClient(app)
+
+    for path in ("/traces/archive", "/traces/archive/some-id", "/admin/traces/flush"):
+        method = client.post if path.startswith("/admin") else client.get
+        assert method(path).status_code == 403
+        assert method(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+def test_endpoints_disabled(dummy_model, dummy_cfg):
+    """Test that the archive endpoints report when recording is off."""
+    app = create_app(model=dummy_model, cfg=dummy_cfg)
+    app.state.admin_token = "secret"
+    client = TestClient(app, headers={"X-Admin-Token": "secret"})
+
+    response = client.get("/traces/archive")
+    assert response.status_code == 404
+    assert response.json()["code"] == "archive_disabled"
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Numerical parity check of an inference path against the reference forward.
+
+Runs every prompt of a corpus step by step through the reference
+(full-context forward_with_attn_trace on the torch model) and a candidate
+engine, compares logits, sampled tokens, entropy, top-k and attention within
+tolerances, and reports the first divergent step per prompt. Exits non-zero
+on any divergence, so it can gate CI (CPU only, --random-init needs no
+checkpoint).
+
+Candidates:
+    cached        torch KV-cached decoding (CachedDecoder)
+    fused         torch forward with fused attention in untraced layers (FusedForward)
+    onnx          exported ONNX graphs, full-context forward
+    onnx-cached   exported ONNX graphs, KV-cached decode graph
+    numpy         NumPy engine, full-context forward
+    numpy-cached  NumPy engine, KV-cached decoding
+    module:attr   attr(model, cfg) returns a model with forward_with_attn_trace
+                  (e.g. a quantized or compiled copy)
+
+Usage:
+    python tools/check_parity.py --candidate cached --random-init
+    python tools/check_parity.py --candidate onnx-cached --temperature 0.9 --top-k 50
+    python tools/check_parity.py --candidate mypkg.quant:quantize --atol-logits 0.05 --out parity.json
+"""
+
+import argparse
+import importlib
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path so we can import from app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+DEFAULT_CORPUS = Path(__file__).parent / "parity" / "corpus.json"
+
+
+def candidate_factory(spec: str, model, cfg, *, trace_layer: int, full_attn: bool, workdir: Path):
+    """Build a factory of fresh candidate engines from a --candidate spec."""
+    from app.parity import CachedEngine, ForwardEngine, NumpyCachedEngine
+
+    if spec == "cached":
+        return lambda: CachedEngine(model, cfg, trace_layer=trace_layer)
+    if spec == "fused":
+        from app.fused_forward import FusedForward
+
+        fused = FusedForward(model, cfg)
+        return lambda: ForwardEngine(fused, cfg, trace_layer=trace_layer, full_attn=full_attn, name=spec)
+    if spec in ("onnx", "onnx-cached"):
+        from app.onnx_backend import OnnxModel, export_onnx
+
+        onnx_model = OnnxModel(export_onnx(model.cpu(), cfg, workdir / "onnx"))
+        if spec == "onnx":
+            return lambda: ForwardEngine(onnx_model, cfg, trace_layer=trace_layer, full_attn=full_attn, name=spec)
+        return lambda: CachedEngine(onnx_model, cfg, trace_layer=trace_layer, name=spec)
+    if spec in ("numpy", "numpy-cached"):
+        from app.numpy_engine import NumpyGPT, export_weights
+
+        engine = NumpyGPT.load(export_weights(model.cpu(), cfg, workdir / "weights.npz"))
+        if spec == "numpy":
+            return lambda: ForwardEngine(engine, cfg, trace_layer=trace_layer, full_attn=full_attn, name=spec)
+        return lambda: NumpyCachedEngine(engine, trace_layer=trace_layer)
+    if ":" in spec:
+        module, attr = spec.split(":", 1)
+        candidate = getattr(importlib.import_module(module), attr)(model, cfg)
+        return lambda: ForwardEngine(candidate, cfg, trace_layer=trace_layer, full_attn=full_attn, name=spec)
+    raise ValueError(f"Unknown candidate: {spec}")
+
+
+def main():
+    """Run the parity check."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidate", required=True, help="Engine to check (see above)")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="Prompt corpus JSON")
+    parser.add_argument("--ckpt", type=Path, default=None, help="Checkpoint (default: CKPT_PATH)")
+    parser.add_argument("--random-init", action="store_true", help="Use a random-init GPT instead")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-layer", type=int, default=0)
+    parser.add_argument("--full-attn", action="store_true", help="Also compare full attention (forward candidates)")
+    parser.add_argument("--atol-logits", type=float, default=None)
+    parser.add_argument("--atol-entropy", type=float, default=None)
+    parser.add_argument("--atol-topk", type=float, default=None)
+    parser.add_argument("--atol-attn", type=float, default=None)
+    parser.add_argument("--out", type=Path, default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    from app.checkpoint import build_random_model, ensure_checkpoint, load_checkpoint_file
+    from app.parity import ForwardEngine, Tolerances, report_dict, run_parity
+
+    if args.random_init:
+        model, cfg = build_random_model()
+    else:
+        model, cfg = load_checkpoint_file(args.ckpt or ensure_checkpoint())
+    model = model.cpu()
+
+    tolerances = Tolerances()
+    for name, value in (
+        ("logits", args.atol_logits),
+        ("entropy", args.atol_entropy),
+        ("topk_prob", args.atol_topk),
+        ("attn", args.atol_attn),
+    ):
+        if value is not None:
+            setattr(tolerances, name, value)
+
+    corpus = json.loads(args.corpus.read_text())
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            factory = candidate_factory(
+                args.candidate,
+                model,
+                cfg,
+                trace_layer=args.trace_layer,
+                full_attn=args.full_attn,
+                workdir=Path(workdir),
+            )
+        except (ValueError, ImportError) as e:
+            print(f"✗ {e}", file=sys.stderr)
+            return 2
+
+        reports = run_parity(
+            lambda: ForwardEngine(model, cfg, trace_layer=args.trace_layer, full_attn=args.full_attn),
+            factory,
+            corpus,
+            max_new_tokens=args.max_new_tokens,
+            temperature=args.temperature,
+            top_k=args.top_k,
+            seed=args.seed,
+            tolerances=tolerances,
+        )
+
+    print(f"Parity: {args.candidate} vs reference ({len(reports)} prompts, {tolerances})")
+    for r in reports:
+        worst = "  ".join(f"{k}={v:.2e}" for k, v in r.max_error.items())
+        if r.ok:
+            print(f"  ✓ {r.name:<16} {r.steps:>3} steps  {worst}")
+        else:
+            d = r.first_divergence
+            print(f"  ✗ {r.name:<16} diverged at step {d.step}: {d.metric} {d.error:.2e} > {d.tolerance:.0e}  ({worst})")
+
+    result = report_dict(reports)
+    if args.out is not None:
+        args.out.write_text(json.dumps(result, indent=2))
+        print(f"Wrote {args.out}")
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+NumPy weights export script.
+
+Writes the checkpoint's weights as an .npz for INFERENCE_BACKEND=numpy,
+after checking the NumPy engine reproduces the torch model. Ship the .npz
+(without torch) to run the API torch-free.
+
+Usage:
+    python tools/export_numpy.py
+    python tools/export_numpy.py --out /tmp/weights.npz --ckpt checkpoints/best.pt
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import from app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import NUMPY_WEIGHTS
+
+
+def main():
+    """Export and verify weights."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, default=NUMPY_WEIGHTS, help=f"Output .npz (default: {NUMPY_WEIGHTS})")
+    parser.add_argument("--ckpt", type=Path, default=None, help="Checkpoint (default: CKPT_PATH)")
+    parser.add_argument("--random-init", action="store_true", help="Export a random-init GPT instead")
+    args = parser.parse_args()
+
+    from app.checkpoint import build_random_model, ensure_checkpoint, load_checkpoint_file
+    from app.numpy_engine import NumpyGPT, export_weights
+
+    source = None
+    if args.random_init:
+        model, cfg = build_random_model()
+    else:
+        source = args.ckpt or ensure_checkpoint()
+        model, cfg = load_checkpoint_file(source)
+
+    try:
+        export_weights(model.cpu(), cfg, args.out, source=source)
+    except ValueError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 1
+
+    engine = NumpyGPT.load(args.out)
+    print(f"✓ Wrote {args.out} ({args.out.stat().st_size / (1024*1024):.1f} MB)")
+    print(f"  norm={engine.norm_kind} activation={engine.meta['activation']} rope={engine.rope_mode}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
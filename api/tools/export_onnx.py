@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+ONNX export script.
+
+Exports prefill and KV-cached decode graphs for the checkpoint (or a
+random-init model) into ONNX_DIR, for INFERENCE_BACKEND=onnx. The server
+also exports on startup when graphs are missing or stale; use this to
+export ahead of time, e.g. at build time.
+
+Usage:
+    python tools/export_onnx.py
+    python tools/export_onnx.py --no-attn --out /tmp/onnx
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import from app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import ONNX_DIR
+
+
+def main():
+    """Export graphs and report the parity of the exported prefill."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, default=ONNX_DIR, help=f"Output directory (default: {ONNX_DIR})")
+    parser.add_argument("--ckpt", type=Path, default=None, help="Checkpoint (default: CKPT_PATH)")
+    parser.add_argument("--random-init", action="store_true", help="Export a random-init GPT instead")
+    parser.add_argument("--no-attn", action="store_true", help="Omit attention outputs (no traces/full_attn)")
+    args = parser.parse_args()
+
+    import torch
+    from app.checkpoint import build_random_model, ensure_checkpoint, load_checkpoint_file
+    from app.onnx_backend import OnnxModel, publish_onnx
+
+    source = None
+    if args.random_init:
+        model, cfg = build_random_model()
+    else:
+        source = args.ckpt or ensure_checkpoint()
+        model, cfg = load_checkpoint_file(source)
+
+    print(f"Exporting to {args.out} (attention outputs: {not args.no_attn})...")
+    publish_onnx(model.cpu(), cfg, args.out, attn_outputs=not args.no_attn, source=source)
+
+    # Quick parity check of last-position logits
+    onnx_model = OnnxModel(args.out)
+    x = torch.randint(0, cfg.V, (1, min(64, cfg.T)))
+    with torch.no_grad():
+        ref, _ = model.forward_with_attn_trace(x, trace_layer=0, return_full_attn=False)
+    out, _ = onnx_model.forward_with_attn_trace(x, trace_layer=0, return_full_attn=False)
+    diff = (ref[0, -1] - out[0, -1]).abs().max().item()
+    print(f"✓ Exported; max |logit diff| vs torch = {diff:.2e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Concurrent SSE load-testing script.
+
+Drives many simultaneous /chat/stream clients mixed with /inspect/full_attn
+calls, either against the app served in-process by uvicorn (with a dummy
+model of configurable step latency, or a random-init GPT) or against an
+already running server, and reports:
+
+  - TTFT, inter-token latency and request latency percentiles (p50/p95/p99)
+  - token and request throughput
+  - error, 429 and 503 rates
+  - server RSS over time
+
+Scenarios are JSON files in tools/scenarios/.
+
+Usage:
+    python tools/load_test.py tools/scenarios/smoke.json
+    python tools/load_test.py tools/scenarios/mixed_100.json --out report.json
+    python tools/load_test.py tools/scenarios/mixed_100.json --url http://127.0.0.1:8000 --pid 1234
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+# Add parent directory to path so we can import from app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@dataclass
+class Scenario:
+    """Load scenario (see tools/scenarios/*.json)."""
+    name: str = "unnamed"
+    model: str = "dummy"  # "dummy" or "random" (random-init GPT); ignored with --url
+    step_latency_ms: float = 0.0  # artificial per-forward delay for the dummy model
+    clients: int = 10
+    requests_per_client: int = 3
+    ramp_s: float = 0.0  # spread client start times over this many seconds
+    think_ms: float = 0.0  # pause between a client's requests
+    full_attn_fraction: float = 0.0  # share of requests that hit /inspect/full_attn
+    rate_limit: dict | None = None  # {"per_min", "burst"} in-process; None = unlimited
+    rss_interval_s: float = 0.25
+    timeout_s: float = 120.0
+    seed: int = 0
+    chat: dict = field(default_factory=lambda: {
+        "messages": [{"role": "user", "content": "hello there"}],
+        "max_new_tokens": 32,
+        "trace_layer": 0,
+    })
+    full_attn: dict = field(default_factory=lambda: {
+        "messages": [{"role": "user", "content": "hello there"}],
+        "trace_layer": 0,
+        "head": 0,
+    })
+
+    @classmethod
+    def load(cls, path: Path) -> "Scenario":
+        data = json.loads(Path(path).read_text())
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"unknown scenario keys: {sorted(unknown)}")
+        return cls(**data)
+
+
+@dataclass
+class Sample:
+    """Outcome of one request."""
+    kind: str  # "chat" or "full_attn"
+    status: int | None  # None if the request failed before a response
+    start: float
+    latency_ms: float
+    ttft_ms: float | None = None
+    gaps_ms: list[float] = field(default_factory=list)
+    tokens: int = 0
+    error: str | None = None
+
+
+def percentiles(values: list[float]) -> dict:
+    """p50/p95/p99 (nearest rank) of values, or None for each if empty."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))], 3)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def summarize(samples: list[Sample], duration_s: float, rss: list[tuple[float, float]]) -> dict:
+    """
+    Aggregate samples into a report.
+
+    Errors are responses other than 2xx/429/503 plus requests that failed
+    without a response (connection errors, timeouts, broken streams).
+    """
+    n = len(samples)
+    ok = [s for s in samples if s.status is not None and 200 <= s.status < 300 and s.error is None]
+    chat = [s for s in ok if s.kind == "chat"]
+    full_attn = [s for s in ok if s.kind == "full_attn"]
+    n_429 = sum(s.status == 429 for s in samples)
+    n_503 = sum(s.status == 503 for s in samples)
+    n_err = n - len(ok) - n_429 - n_503
+    tokens = sum(s.tokens for s in chat)
+
+    def rate(k):
+        return round(k / n, 4) if n else 0.0
+
+    return {
+        "requests": n,
+        "duration_s": round(duration_s, 3),
+        "ttft_ms": percentiles([s.ttft_ms for s in chat if s.ttft_ms is not None]),
+        "inter_token_ms": percentiles([g for s in chat for g in s.gaps_ms]),
+        "chat_latency_ms": percentiles([s.latency_ms for s in chat]),
+        "full_attn_latency_ms": percentiles([s.latency_ms for s in full_attn]),
+        "throughput": {
+            "tokens_per_s": round(tokens / duration_s, 2) if duration_s else 0.0,
+            "requests_per_s": round(len(ok) / duration_s, 2) if duration_s else 0.0,
+        },
+        "rates": {"error": rate(n_err), "429": rate(n_429), "503": rate(n_503)},
+        "errors": sorted({s.error for s in samples if s.error})[:10],
+        "rss_mb": {
+            "peak": max((m for _, m in rss), default=None),
+            "series": [[round(t, 2), m] for t, m in rss],
+        },
+    }
+
+
+def rss_mb(pid: int) -> float | None:
+    """Resident set size of pid in MiB (Linux /proc), or None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+async def sample_rss(pid: int, interval: float, out: list, t0: float):
+    """Append (elapsed_s, rss_mb) every interval until cancelled."""
+    while True:
+        mb = rss_mb(pid)
+        if mb is not None:
+            out.append((time.perf_counter() - t0, mb))
+        await asyncio.sleep(interval)
+
+
+async def chat_request(client, payload: dict) -> Sample:
+    """POST /chat/stream and time the first and each following token event."""
+    start = time.perf_counter()
+    sample = Sample(kind="chat", status=None, start=start, latency_ms=0.0)
+    try:
+        async with client.stream("POST", "/chat/stream", json=payload) as resp:
+            sample.status = resp.status_code
+            if resp.status_code == 200:
+                last = None
+                async for line in resp.aiter_lines():
+                    if line == "event: token":
+                        now = time.perf_counter()
+                        if last is None:
+                            sample.ttft_ms = (now - start) * 1000
+                        else:
+                            sample.gaps_ms.append((now - last) * 1000)
+                        last = now
+                        sample.tokens += 1
+                    elif line == "event: error":
+                        sample.error = "stream error event"
+            else:
+                await resp.aread()
+    except Exception as e:
+        sample.error = f"{type(e).__name__}: {e}"
+    sample.latency_ms = (time.perf_counter() - start) * 1000
+    return sample
+
+
+async def full_attn_request(client, payload: dict) -> Sample:
+    """POST /inspect/full_attn and time the whole response."""
+    start = time.perf_counter()
+    sample = Sample(kind="full_attn", status=None, start=start, latency_ms=0.0)
+    try:
+        resp = await client.post("/inspect/full_attn", json=payload)
+        sample.status = resp.status_code
+    except Exception as e:
+        sample.error = f"{type(e).__name__}: {e}"
+    sample.latency_ms = (time.perf_counter() - start) * 1000
+    return sample
+
+
+async def run_client(index: int, client, scenario: Scenario, out: list[Sample]):
+    """One simulated user issuing requests_per_client requests back to back."""
+    rng = random.Random(scenario.seed * 100003 + index)
+    if scenario.ramp_s:
+        await asyncio.sleep(scenario.ramp_s * index / max(1, scenario.clients))
+    for i in range(scenario.requests_per_client):
+        if rng.random() < scenario.full_attn_fraction:
+            out.append(await full_attn_request(client, scenario.full_attn))
+        else:
+            payload = {**scenario.chat, "seed": rng.randrange(1 << 30)}
+            out.append(await chat_request(client, payload))
+        if scenario.think_ms and i + 1 < scenario.requests_per_client:
+            await asyncio.sleep(scenario.think_ms / 1000)
+
+
+async def run_scenario(scenario: Scenario, base_url: str, pid: int) -> dict:
+    """
+    Run all clients of a scenario against base_url and summarize.
+
+    Args:
+        scenario: Scenario to run
+        base_url: Server base URL
+        pid: Server process id for RSS sampling
+
+    Returns:
+        Report dict (see summarize)
+    """
+    import httpx
+
+    samples: list[Sample] = []
+    rss: list[tuple[float, float]] = []
+    limits = httpx.Limits(max_connections=scenario.clients + 10, max_keepalive_connections=scenario.clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=scenario.timeout_s, limits=limits) as client:
+        t0 = time.perf_counter()
+        sampler = asyncio.create_task(sample_rss(pid, scenario.rss_interval_s, rss, t0))
+        await asyncio.gather(*(run_client(i, client, scenario, samples) for i in range(scenario.clients)))
+        duration = time.perf_counter() - t0
+        sampler.cancel()
+        rss.append((duration, rss_mb(pid)))
+
+    report = summarize(samples, duration, [r for r in rss if r[1] is not None])
+    report["scenario"] = scenario.name
+    report["clients"] = scenario.clients
+    return report
+
+
+def build_model(scenario: Scenario):
+    """(model, cfg) for an in-process scenario."""
+    if scenario.model == "random":
+        from app.checkpoint import build_random_model
+
+        return build_random_model(seed=scenario.seed)
+    if scenario.model == "dummy":
+        from tests.conftest import DummyConfig, DummyModel
+
+        class SlowDummyModel(DummyModel):
+            """Dummy model that sleeps step_latency_ms per forward."""
+
+            def forward_with_attn_trace(self, x, trace_layer=0, return_full_attn=False):
+                time.sleep(scenario.step_latency_ms / 1000)
+                return super().forward_with_attn_trace(x, trace_layer, return_full_attn)
+
+        return SlowDummyModel(), DummyConfig()
+    raise ValueError(f"unknown model {scenario.model!r}; expected 'dummy' or 'random'")
+
+
+class InProcessServer:
+    """The app served by uvicorn on a free local port in a background thread."""
+
+    def __init__(self, app):
+        import uvicorn
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def run_in_process(scenario: Scenario) -> dict:
+    """Build the app around the scenario's model and load-test it locally."""
+    import app.main as main
+    from app.rate_limit import RateLimiter
+
+    model, cfg = build_model(scenario)
+    limit = scenario.rate_limit
+    main.rate_limiter = (
+        RateLimiter(capacity=limit["burst"], refill_rate=limit["per_min"] / 60.0)
+        if limit
+        else RateLimiter(capacity=float("inf"), refill_rate=0.0)
+    )
+    app = main.create_app(model=model, cfg=cfg, load_on_startup=False)
+    with InProcessServer(app) as base_url:
+        return asyncio.run(run_scenario(scenario, base_url, os.getpid()))
+
+
+def print_report(report: dict):
+    """Human-readable summary."""
+    print(f"Scenario {report['scenario']}: {report['clients']} clients, "
+          f"{report['requests']} requests in {report['duration_s']}s")
+    for key in ("ttft_ms", "inter_token_ms", "chat_latency_ms", "full_attn_latency_ms"):
+        p = report[key]
+        print(f"  {key:<22} p50={p['p50']}  p95={p['p95']}  p99={p['p99']}")
+    t = report["throughput"]
+    print(f"  throughput             {t['tokens_per_s']} tok/s, {t['requests_per_s']} req/s")
+    r = report["rates"]
+    print(f"  rates                  error={r['error']}  429={r['429']}  503={r['503']}")
+    print(f"  peak RSS               {report['rss_mb']['peak']} MiB")
+    for err in report["errors"]:
+        print(f"  ! {err}")
+
+
+def main():
+    """Run a scenario and print (and optionally save) the report."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", type=Path, help="Scenario JSON file")
+    parser.add_argument("--url", default=None, help="Target a running server instead of in-process")
+    parser.add_argument("--pid", type=int, default=None, help="Server pid for RSS sampling (with --url)")
+    parser.add_argument("--clients", type=int, default=None, help="Override the scenario's client count")
+    parser.add_argument("--out", type=Path, default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    scenario = Scenario.load(args.scenario)
+    if args.clients is not None:
+        scenario.clients = args.clients
+
+    if args.url:
+        report = asyncio.run(run_scenario(scenario, args.url, args.pid or -1))
+    else:
+        report = run_in_process(scenario)
+
+    print_report(report)
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2))
+        print(f"✓ Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
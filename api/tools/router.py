@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Session-affinity router in front of several API nodes.
+
+Consistent-hashes each conversation onto a node so its next turns (and its
+server-side session) land where its state already is, spilling to the
+next node on the ring when the owner is down or overloaded (per the
+/health each node reports). Node admin requests (/admin/*, e.g. reload
+or trace flush) are sent to every node. Nodes come from --node /
+ROUTER_NODES, or --spawn starts local ones on the ports after --port.
+
+Usage:
+    python tools/router.py --spawn 2
+    python tools/router.py --node http://10.0.0.5:8000 --node http://10.0.0.6:8000 --port 8000
+
+Nodes see clients through X-Forwarded-For; uvicorn trusts it only from
+FORWARDED_ALLOW_IPS (127.0.0.1 by default), so set that on remote nodes to
+the router's address.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path so we can import from app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import (
+    ADMIN_TOKEN,
+    ROUTER_MAX_LOAD,
+    ROUTER_NODES,
+    ROUTER_POLL_SECONDS,
+    ROUTER_VNODES,
+)
+
+
+def spawn_nodes(count: int, host: str, first_port: int) -> tuple[list[str], list[subprocess.Popen]]:
+    """Start count API nodes (uvicorn app.main:app) on consecutive ports."""
+    urls, processes = [], []
+    for i in range(count):
+        port = first_port + i
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", host, "--port", str(port)],
+            cwd=Path(__file__).parent.parent,
+            env=os.environ.copy(),
+        ))
+        urls.append(f"http://{host}:{port}")
+    return urls, processes
+
+
+def main():
+    """Run the router (and any spawned nodes) until interrupted."""
+    import uvicorn
+
+    from app.router import create_router
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--node", action="append", default=None, help="Node base URL (repeatable)")
+    parser.add_argument("--spawn", type=int, default=0, help="Start this many local nodes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--vnodes", type=int, default=ROUTER_VNODES, help="Ring points per node")
+    parser.add_argument("--max-load", type=float, default=ROUTER_MAX_LOAD, help="Load at which a node is skipped")
+    parser.add_argument("--poll-seconds", type=float, default=ROUTER_POLL_SECONDS, help="Node /health interval")
+    args = parser.parse_args()
+
+    nodes = list(args.node or ROUTER_NODES)
+    processes = []
+    if args.spawn:
+        spawned, processes = spawn_nodes(args.spawn, "127.0.0.1", args.port + 1)
+        nodes += spawned
+    if not nodes:
+        parser.error("no nodes: pass --node, --spawn or set ROUTER_NODES")
+
+    print(f"Routing {args.host}:{args.port} -> {', '.join(nodes)}")
+    app = create_router(
+        nodes,
+        vnodes=args.vnodes,
+        max_load=args.max_load,
+        poll_seconds=args.poll_seconds,
+        admin_token=ADMIN_TOKEN,
+    )
+    try:
+        uvicorn.run(app, host=args.host, port=args.port)
+    finally:
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + 10
+        for process in processes:
+            try:
+                process.wait(timeout=max(deadline - time.monotonic(), 0.1))
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Recorded trace archive inspection and bulk export.
+
+Reads the shards written with TRACE_ARCHIVE_DIR set (no model needed).
+From Python, use app.trace_archive.TraceArchive directly for zero-copy
+access to the memory-mapped columns.
+
+Usage:
+    python tools/trace_archive.py list ./traces
+    python tools/trace_archive.py export ./traces --out subset.npz --model best --limit 500
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import from app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from app.trace_archive import TraceArchive
+
+
+def list_generations(archive: TraceArchive, records: list[dict]):
+    """Print one line per generation."""
+    for r in records:
+        steps = r["step_end"] - r["step_start"]
+        entropy = archive.generation(r["id"])["entropy"]
+        mean = float(entropy.mean()) if steps else float("nan")
+        print(f"{r['id']}  {r.get('model', '-'):<12} steps={steps:<4} heads={r['heads']}  mean_entropy={mean:.3f}")
+    print(f"{len(records)} generations")
+
+
+def export(archive: TraceArchive, records: list[dict], out: Path):
+    """
+    Concatenate the selected generations into one .npz.
+
+    Per-step arrays are concatenated; "generation" maps each step to its
+    row in "ids", and attn rows are flattened with "attn_offsets" as in
+    the shards.
+    """
+    columns = {k: [] for k in ("token_ids", "entropy", "topk_ids", "topk_probs", "attn")}
+    generation, offsets = [], [0]
+    for i, r in enumerate(records):
+        data = archive.generation(r["id"])
+        for key in ("token_ids", "entropy", "topk_ids", "topk_probs"):
+            columns[key].append(data[key])
+        for step in range(len(data["token_ids"])):
+            row = archive.attn(r["id"], step).reshape(-1)
+            columns["attn"].append(row)
+            offsets.append(offsets[-1] + row.size)
+        generation.append(np.full(len(data["token_ids"]), i, dtype=np.int32))
+
+    def cat(parts, dtype, shape=(0,)):
+        return np.concatenate(parts) if parts else np.zeros(shape, dtype=dtype)
+
+    np.savez(
+        out,
+        ids=np.array([r["id"] for r in records]),
+        generation=cat(generation, np.int32),
+        token_ids=cat(columns["token_ids"], np.int32),
+        entropy=cat(columns["entropy"], np.float32),
+        topk_ids=cat(columns["topk_ids"], np.int32, (0, 10)),
+        topk_probs=cat(columns["topk_probs"], np.float32, (0, 10)),
+        attn=cat(columns["attn"], np.float16),
+        attn_offsets=np.asarray(offsets, dtype=np.int64),
+        heads=np.array([r["heads"] for r in records], dtype=np.int32),
+    )
+    print(f"✓ Wrote {len(records)} generations ({offsets[-1]} attention weights) to {out}")
+
+
+def main():
+    """Run a subcommand."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["list", "export"])
+    parser.add_argument("root", type=Path, help="Archive directory (TRACE_ARCHIVE_DIR)")
+    parser.add_argument("--out", type=Path, default=Path("traces.npz"), help="export: output .npz")
+    parser.add_argument("--model", default=None, help="Only generations from this model id")
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    if not args.root.exists():
+        print(f"✗ No archive at {args.root}", file=sys.stderr)
+        return 1
+
+    archive = TraceArchive(args.root)
+    filters = {"model": args.model} if args.model is not None else {}
+    records = archive.index(offset=args.offset, limit=args.limit, **filters)
+
+    if args.command == "list":
+        list_generations(archive, records)
+    else:
+        export(archive, records, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+CPU thread and worker-layout tuning script.
+
+Benchmarks the model across intra-op thread counts and worker layouts
+(processes x threads, each worker pinned to its own cores) for both
+objectives:
+
+  latency     batch 1, single stream: lowest per-token step time
+  throughput  batched, all workers busy: highest aggregate tokens/s
+
+and writes a profile the server applies at startup via CPU_PROFILE.
+
+Usage:
+    python tools/tune_cpu.py --out checkpoints/cpu_profile.json
+    python tools/tune_cpu.py --random-init --steps 10 --out /tmp/profile.json
+"""
+
+import argparse
+import sys
+from functools import partial
+from pathlib import Path
+
+# Add parent directory to path so we can import from app
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.cpu_tuning import (
+    available_cores,
+    build_profile,
+    candidate_layouts,
+    run_layout,
+    save_profile,
+)
+
+
+def random_model(**cfg_overrides):
+    """Random-init GPT (no download)."""
+    from app.checkpoint import build_random_model
+
+    return build_random_model(**cfg_overrides)
+
+
+def checkpoint_model(path: str):
+    """Model loaded from a checkpoint file."""
+    from app.checkpoint import load_checkpoint_file
+
+    return load_checkpoint_file(Path(path))
+
+
+def main():
+    """Benchmark layouts and write the profile."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, required=True, help="Profile path (use as CPU_PROFILE)")
+    parser.add_argument("--ckpt", type=Path, default=None, help="Checkpoint (default: CKPT_PATH)")
+    parser.add_argument("--random-init", action="store_true", help="Benchmark a random-init GPT instead")
+    parser.add_argument("--C", type=int, default=256, help="Random-init model width")
+    parser.add_argument("--L", type=int, default=4, help="Random-init layer count")
+    parser.add_argument("--batch", type=int, default=8, help="Batch size for the throughput objective")
+    parser.add_argument("--context", type=int, default=128, help="Tokens per sequence")
+    parser.add_argument("--steps", type=int, default=20, help="Timed forwards per run")
+    parser.add_argument("--no-pin", action="store_true", help="Don't pin workers to cores")
+    args = parser.parse_args()
+
+    if args.random_init:
+        build = partial(random_model, C=args.C, L=args.L, D=args.C // 4, d_ff=4 * args.C)
+    else:
+        from app.checkpoint import ensure_checkpoint
+
+        build = partial(checkpoint_model, str(args.ckpt or ensure_checkpoint()))
+
+    cores = available_cores()
+    print(f"Tuning on {len(cores)} cores: {cores}")
+
+    results = []
+    for layout in candidate_layouts(len(cores)):
+        batches = [1, args.batch] if layout.workers == 1 else [args.batch]
+        for batch in batches:
+            r = run_layout(
+                build,
+                layout,
+                batch=batch,
+                steps=args.steps,
+                context=args.context,
+                pin=not args.no_pin,
+                cores=cores,
+            )
+            results.append(r)
+            print(
+                f"  workers={layout.workers:<3} threads={layout.intra_op_threads:<3} batch={batch:<3} "
+                f"p50={r.step_ms_p50:7.2f}ms p95={r.step_ms_p95:7.2f}ms {r.tokens_per_s:9.1f} tok/s"
+            )
+
+    profile = build_profile(results, cores)
+    save_profile(profile, args.out)
+    for objective, rec in profile["recommended"].items():
+        print(
+            f"{objective}: {rec['workers']} worker(s) x {rec['intra_op_threads']} thread(s) "
+            f"({rec['step_ms_p50']:.2f}ms/step, {rec['tokens_per_s']:.1f} tok/s)"
+        )
+    print(f"✓ Wrote {args.out}; set CPU_PROFILE={args.out} (and WEB_CONCURRENCY to the worker count)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,9 +7,10 @@ import {
   TokenEvent,
   TraceEvent,
   DoneEvent,
+  QosEvent,
 } from "@/lib/types";
 import { streamSSE } from "@/lib/sse";
-import { API_BASE_URL } from "@/lib/api";
+import { API_BASE_URL, createSession } from "@/lib/api";
 import ChatPane from "@/components/ChatPane";
 import InspectorPane from "@/components/InspectorPane";
 import Toast from "@/components/Toast";
@@ -27,8 +28,11 @@ export default function Home() {
   const [selectedLayer, setSelectedLayer] = useState(0);
   const [renderMode, setRenderMode] = useState<"ascii" | "utf-8">("ascii");
   const [error, setError] = useState<string | null>(null);
+  const [notice, setNotice] = useState<string | null>(null);
 
   const abortControllerRef = useRef<AbortController | null>(null);
+  // Server-side history of `messages`; dropped whenever the two may differ
+  const sessionIdRef = useRef<string | null>(null);
 
   const handleSendMessage = async (content: string) => {
     const userMessage: Message = { role: "user", content };
@@ -44,18 +48,38 @@ export default function Home() {
     const traceEvents: TraceEvent[] = [];
 
     abortControllerRef.current = new AbortController();
+    const signal = abortControllerRef.current.signal;
 
-    try {
-      await streamSSE(
-        `${API_BASE_URL}/chat/stream`,
-        {
-          messages: newMessages,
-          max_new_tokens: 256,
-          temperature: 0.9,
-          top_k: 50,
-          seed: 42,
-          trace_layer: selectedLayer,
-        },
+    const params = {
+      max_new_tokens: 256,
+      temperature: 0.9,
+      top_k: 50,
+      seed: 42,
+      trace_layer: selectedLayer,
+    };
+
+    // Send only the new message; (re)create the session from the local
+    // history when there is none or it expired server-side
+    const openTurn = async (retry: boolean): Promise<void> => {
+      if (sessionIdRef.current === null) {
+        const session = await createSession({ messages });
+        sessionIdRef.current = session.session_id;
+      }
+      try {
+        await streamTurn(sessionIdRef.current);
+      } catch (err) {
+        if (retry && err instanceof Error && err.message.startsWith("Session not found")) {
+          sessionIdRef.current = null;
+          return openTurn(false);
+        }
+        throw err;
+      }
+    };
+
+    const streamTurn = (sessionId: string) =>
+      streamSSE(
+        `${API_BASE_URL}/sessions/${sessionId}/chat/stream`,
+        { ...params, message: userMessage },
         (event) => {
           if (event.event === "token") {
             const tokenData = event.data as TokenEvent;
@@ -70,6 +94,17 @@ export default function Home() {
               (t) => t.step === traceData.step
             );
             if (matchingToken) {
+              // Thinned traces carry some heads only (or none); keep rows at
+              // their head index so head selection still lines up
+              let attn: number[][] = [];
+              if (traceData.attn && traceData.heads) {
+                traceData.heads.forEach((h, i) => {
+                  attn[h] = traceData.attn![i];
+                });
+                attn = Array.from(attn, (row) => row || []);
+              } else if (traceData.attn) {
+                attn = traceData.attn;
+              }
               const stepData: StepData = {
                 step: traceData.step,
                 token_id: matchingToken.token_id,
@@ -77,11 +112,19 @@ export default function Home() {
                 token_display: matchingToken.token_display,
                 entropy: traceData.entropy,
                 topk: traceData.topk,
-                attn: traceData.attn,
+                attn,
               };
               tempSteps.push(stepData);
               setSteps([...tempSteps]);
             }
+          } else if (event.event === "qos") {
+            const qos = event.data as QosEvent;
+            setNotice(
+              qos.degraded
+                ? `Server busy: attention traces reduced (${qos.level})` +
+                    (qos.max_new_tokens ? `, reply capped at ${qos.max_new_tokens} tokens` : "")
+                : "Server load back to normal: full traces restored"
+            );
           } else if (event.event === "done") {
             const doneData = event.data as DoneEvent;
             setMessages((prev) => [
@@ -91,12 +134,15 @@ export default function Home() {
             setAssistantCompletion("");
           }
         },
-        (err) => {
-          setError(err.message);
-        },
-        abortControllerRef.current.signal
+        undefined,
+        signal
       );
+
+    try {
+      await openTurn(true);
     } catch (err) {
+      // The server kept its history without this turn; resync next time
+      sessionIdRef.current = null;
       if (err instanceof Error) {
         // Check for specific error codes
         if (err.message.includes("prompt_too_large")) {
@@ -119,6 +165,8 @@ export default function Home() {
       abortControllerRef.current = null;
     }
     setIsStreaming(false);
+    // The server drops cancelled turns; resync from local history next time
+    sessionIdRef.current = null;
 
     // Append partial completion to chat history
     if (assistantCompletion) {
@@ -158,6 +206,7 @@ export default function Home() {
 
       {/* Error toast */}
       <Toast message={error} type="error" onClose={() => setError(null)} />
+      <Toast message={notice} type="info" onClose={() => setNotice(null)} />
     </div>
   );
 }
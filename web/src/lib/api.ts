@@ -2,6 +2,10 @@ import {
   ChatStreamRequest,
   FullAttentionRequest,
   FullAttentionResponse,
+  AttentionSummaryRequest,
+  AttentionSummaryResponse,
+  SessionCreateRequest,
+  SessionInfo,
 } from "./types";
 
 export const API_BASE_URL =
@@ -29,6 +33,50 @@ export async function fetchFullAttention(
   return response.json();
 }
 
+/**
+ * Fetch per-layer/per-head attention statistics from backend
+ */
+export async function fetchAttentionSummary(
+  request: AttentionSummaryRequest
+): Promise<AttentionSummaryResponse> {
+  const response = await fetch(`${API_BASE_URL}/inspect/attn_summary`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify(request),
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.error || `HTTP ${response.status}`);
+  }
+
+  return response.json();
+}
+
+/**
+ * Start a server-side conversation; turns then send only the new message
+ */
+export async function createSession(
+  request: SessionCreateRequest
+): Promise<SessionInfo> {
+  const response = await fetch(`${API_BASE_URL}/sessions`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify(request),
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.error || `HTTP ${response.status}`);
+  }
+
+  return response.json();
+}
+
 /**
  * Check API health
  */
@@ -12,10 +12,36 @@ export interface ChatStreamRequest {
   top_k: number;
   seed: number;
   trace_layer: number;
+  n?: number; // parallel samples (seeds seed..seed+n-1)
+  timings?: boolean; // server timing in trace and done events
 }
 
+// POST /sessions: start a server-side conversation
+export interface SessionCreateRequest {
+  messages: Message[];
+  model?: string;
+}
+
+export interface SessionInfo {
+  session_id: string;
+  model: string | null;
+  messages: Message[];
+  tokens: number | null;
+  created: number;
+  last_used: number;
+  busy: boolean;
+  ttl_seconds?: number;
+}
+
+// POST /sessions/{id}/chat/stream: same options as ChatStreamRequest, but
+// only the new message (the server keeps the history)
+export type SessionTurnRequest = Omit<ChatStreamRequest, "messages"> & {
+  message: Message;
+};
+
 // SSE event types from backend
 export interface TokenEvent {
+  sample?: number; // set when n > 1
   step: number;
   token_id: number;
   token_text: string;
@@ -30,14 +56,52 @@ export interface TopKCandidate {
 }
 
 export interface TraceEvent {
+  sample?: number; // set when n > 1
   step: number;
   entropy: number;
   topk: TopKCandidate[];
-  attn: number[][]; // H x t (heads x sequence length)
+  attn?: number[][]; // H x t (heads x sequence length); omitted on thinned steps
+  heads?: number[]; // head index of each attn row when degraded to fewer heads
+  timing?: StepTiming; // set when requested with timings
+}
+
+// Server-side milliseconds spent on one step (perf_counter_ns)
+export interface StepTiming {
+  forward_ms: number;
+  sample_ms: number;
+  encode_ms: number; // top-k summary, token decode, attention to lists
+  queue_ms: number; // wait for a scheduler step slot
+  elapsed_ms: number; // since the stream started, when the event was built
+}
+
+export interface StreamTiming {
+  ttft_ms: number | null;
+  total_ms: number;
+  tokens: number;
+  tokens_per_s: number;
+  stop_reason: "stop_sequence" | "max_new_tokens";
+  stop_reasons?: ("stop_sequence" | "max_new_tokens")[]; // one per sample when n > 1
+  forward_ms: number;
+  sample_ms: number;
+  encode_ms: number;
+  queue_ms: number;
+}
+
+// Load-shedding notice: sent when a stream starts degraded and on every change
+export interface QosEvent {
+  level: "normal" | "elevated" | "high" | "critical";
+  degraded: boolean;
+  trace_every: number; // attention only on every Nth step
+  max_heads: number | null;
+  precision: number | null;
+  full_attn: boolean;
+  max_new_tokens?: number; // set when this generation was capped
 }
 
 export interface DoneEvent {
   reply: string;
+  replies?: string[]; // one per sample when n > 1
+  timing?: StreamTiming; // set when requested with timings
 }
 
 // Combined step data for visualization
@@ -68,12 +132,48 @@ export interface FullAttentionRequest {
   messages: Message[];
   trace_layer: number;
   head: number;
+  // Optional window [start, end) and overview downsampling
+  row_start?: number;
+  row_end?: number;
+  col_start?: number;
+  col_end?: number;
+  resolution?: number;
+  pool?: "max" | "mean";
+  stream?: boolean; // NDJSON rows instead of one JSON body
 }
 
 export interface FullAttentionResponse {
   layer: number;
   head: number;
+  t: number;
+  token_ids: number[];
+  tokens_display: string[];
+  rows: [number, number];
+  cols: [number, number];
+  shape: [number, number];
+  pool: "max" | "mean" | null; // null when not downsampled
+  row_starts: number[]; // absolute position each output row starts at
+  col_starts: number[];
+  attn: number[][]; // shape[0] x shape[1] (t x t by default)
+}
+
+// Attention summary request/response (every layer and head, one forward)
+export interface AttentionSummaryRequest {
+  messages: Message[];
+  top_k?: number; // most-attended positions per head (default 5)
+}
+
+export interface AttentionSummaryResponse {
+  layers: number;
+  heads: number;
+  t: number;
   token_ids: number[];
   tokens_display: string[];
-  attn: number[][]; // t x t
+  // All statistics are indexed [layer][head]
+  entropy: number[][][]; // per-query entropy (nats), [layer][head][query]
+  mean_entropy: number[][];
+  mean_distance: number[][]; // attention-weighted query - key distance
+  first_token: number[][]; // fraction of attention on position 0
+  top_positions: number[][][]; // most-attended key positions
+  top_weights: number[][][]; // their attention averaged over queries
 }